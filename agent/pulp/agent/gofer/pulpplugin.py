@@ -18,13 +18,14 @@ from gofer.pmon import PathMonitor
 from gofer.agent.rmi import Context
 from gofer.messaging.auth import ValidationFailed
 
+from pulp.common import unit_profile
 from pulp.common.bundle import Bundle
 from pulp.common.config import parse_bool
 from pulp.agent.lib.dispatcher import Dispatcher
 from pulp.agent.lib.conduit import Conduit as HandlerConduit
 from pulp.bindings.server import PulpConnection
 from pulp.bindings.bindings import Bindings
-from pulp.bindings.exceptions import NotFoundException
+from pulp.bindings.exceptions import BadRequestException, NotFoundException
 from pulp.client.consumer.config import read_config
 
 
@@ -45,6 +46,9 @@ plugin = Plugin.find(__name__)
 # registration status
 registered = False
 
+# the (hash, profile) last sent to the server, by (consumer ID, content type ID)
+sent_profiles = {}
+
 
 class ValidateRegistrationFailed(Exception):
     """
@@ -495,9 +499,52 @@ class Profile(object):
                 continue
 
             details = profile_report['details']
-            http = bindings.profile.send(consumer_id, type_id, details)
-
-            msg = _('profile (%(t)s), reported: %(r)s')
-            log.info(msg, {'t': type_id, 'r': http.response_code})
+            profile_hash = unit_profile.calculate_hash(details)
+            if self._send_changes(bindings, consumer_id, type_id, details, profile_hash):
+                msg = _('profile (%(t)s), up to date')
+                log.info(msg, {'t': type_id})
+            else:
+                http = bindings.profile.send(consumer_id, type_id, details)
+                msg = _('profile (%(t)s), reported: %(r)s')
+                log.info(msg, {'t': type_id, 'r': http.response_code})
+            sent_profiles[(consumer_id, type_id)] = (profile_hash, details)
 
         return report.dict()
+
+    @staticmethod
+    def _send_changes(bindings, consumer_id, type_id, profile, profile_hash):
+        """
+        Bring the server's copy of a profile up to date without uploading the whole profile.
+        When the profile did not change since it was last sent, the server is only asked
+        whether it still has it. When a list of packages changed, the delta is sent.
+        :param bindings: The pulp bindings.
+        :type bindings: PulpBindings
+        :param consumer_id: The consumer ID.
+        :type consumer_id: str
+        :param type_id: The profile (content) type ID.
+        :type type_id: str
+        :param profile: The current profile.
+        :type profile: object
+        :param profile_hash: The hash of the current profile.
+        :type profile_hash: str
+        :return: True if the server has the current profile.
+        :rtype: bool
+        """
+        previous = sent_profiles.get((consumer_id, type_id))
+        try:
+            if previous is None or previous[0] == profile_hash:
+                http = bindings.profile.check(consumer_id, type_id, profile_hash)
+            elif isinstance(previous[1], list) and isinstance(profile, list):
+                delta = unit_profile.calculate_delta(previous[1], profile)
+                merged = unit_profile.apply_delta(previous[1], delta)
+                if unit_profile.calculate_hash(merged) != profile_hash:
+                    # the server would not end up with the packages in the same order
+                    return False
+                http = bindings.profile.send_delta(
+                    consumer_id, type_id, delta, previous[0], profile_hash)
+            else:
+                return False
+        except BadRequestException:
+            # the server does not support conditional profile uploads
+            return False
+        return http.response_body['current']
@@ -5,6 +5,8 @@ from gofer.messaging.auth import ValidationFailed
 from M2Crypto import RSA, BIO
 from mock import patch, Mock
 
+from pulp.bindings.exceptions import BadRequestException
+from pulp.common import unit_profile
 from pulp.common.config import Config
 from pulp.devel.unit.util import SideEffect
 
@@ -866,6 +868,7 @@ class TestProfile(PluginTest):
         _report.dict = Mock(return_value=_report.details)
 
         mock_dispatcher().profile.return_value = _report
+        mock_bindings().profile.check.return_value.response_body = {'current': False}
 
         # test
         profile = self.plugin.Profile()
@@ -873,4 +876,99 @@ class TestProfile(PluginTest):
 
         # validation
         mock_dispatcher().profile.assert_called_with(mock_conduit())
+        mock_bindings().profile.check.assert_called_once_with(
+            TEST_CN, 'BB', unit_profile.calculate_hash(5678))
         mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', 5678)
+
+    def _send(self, mock_bindings, mock_dispatcher, mock_bundle, details):
+        mock_bundle().cn = Mock(return_value=TEST_CN)
+        _report = Mock()
+        _report.details = {'BB': {'succeeded': True, 'details': details}}
+        mock_dispatcher().profile.return_value = _report
+        mock_bindings.reset_mock()
+        profile = self.plugin.Profile()
+        profile.send()
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_current(self, mock_bindings, mock_dispatcher, mock_conduit, mock_bundle):
+        mock_bindings().profile.check.return_value.response_body = {'current': True}
+
+        # test
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, [{'name': 'zsh'}])
+
+        # validation
+        self.assertTrue(mock_bindings().profile.check.called)
+        self.assertFalse(mock_bindings().profile.send.called)
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_delta(self, mock_bindings, mock_dispatcher, mock_conduit, mock_bundle):
+        previous = [{'name': 'zsh'}, {'name': 'vim'}]
+        current = [{'name': 'zsh'}, {'name': 'tmux'}]
+        mock_bindings().profile.check.return_value.response_body = {'current': False}
+        mock_bindings().profile.send_delta.return_value.response_body = {'current': True}
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, previous)
+
+        # test
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, current)
+
+        # validation
+        mock_bindings().profile.send_delta.assert_called_once_with(
+            TEST_CN, 'BB', {'added': [{'name': 'tmux'}], 'removed': [{'name': 'vim'}]},
+            unit_profile.calculate_hash(previous), unit_profile.calculate_hash(current))
+        self.assertFalse(mock_bindings().profile.check.called)
+        self.assertFalse(mock_bindings().profile.send.called)
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_delta_rejected(self, mock_bindings, mock_dispatcher, mock_conduit,
+                                 mock_bundle):
+        current = [{'name': 'tmux'}]
+        mock_bindings().profile.check.return_value.response_body = {'current': False}
+        mock_bindings().profile.send_delta.return_value.response_body = {'current': False}
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, [{'name': 'zsh'}])
+
+        # test
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, current)
+
+        # validation
+        self.assertTrue(mock_bindings().profile.send_delta.called)
+        mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', current)
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_delta_reordered(self, mock_bindings, mock_dispatcher, mock_conduit,
+                                  mock_bundle):
+        """No delta is sent when the server would not end up with the same order."""
+        current = [{'name': 'tmux'}, {'name': 'zsh'}]
+        mock_bindings().profile.check.return_value.response_body = {'current': False}
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, [{'name': 'zsh'}])
+
+        # test
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, current)
+
+        # validation
+        self.assertFalse(mock_bindings().profile.send_delta.called)
+        mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', current)
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_not_supported(self, mock_bindings, mock_dispatcher, mock_conduit, mock_bundle):
+        mock_bindings().profile.check.side_effect = BadRequestException({})
+
+        # test
+        self._send(mock_bindings, mock_dispatcher, mock_bundle, [{'name': 'zsh'}])
+
+        # validation
+        mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', [{'name': 'zsh'}])
@@ -173,6 +173,48 @@ class ProfilesAPI(PulpAPI):
         data = {'content_type': content_type, 'profile': profile}
         return self.server.POST(path, data)
 
+    def check(self, id, content_type, profile_hash):
+        """
+        Find out whether the server already has a profile, without uploading it.
+
+        :param id:           The consumer ID.
+        :type  id:           str
+        :param content_type: The profile (content) type ID.
+        :type  content_type: str
+        :param profile_hash: The hash of the profile, as calculated by
+                             pulp.common.unit_profile.calculate_hash
+        :type  profile_hash: str
+        :return: A response with a body of {'current': <bool>}
+        :rtype:  pulp.bindings.responses.Response
+        """
+        path = self.BASE_PATH % id
+        data = {'content_type': content_type, 'profile_hash': profile_hash}
+        return self.server.POST(path, data)
+
+    def send_delta(self, id, content_type, delta, base_hash, profile_hash):
+        """
+        Update a profile that is a list of packages with the packages added and removed since
+        it was last uploaded.
+
+        :param id:           The consumer ID.
+        :type  id:           str
+        :param content_type: The profile (content) type ID.
+        :type  content_type: str
+        :param delta:        The delta, as calculated by pulp.common.unit_profile.calculate_delta
+        :type  delta:        dict
+        :param base_hash:    The hash of the profile that was last uploaded.
+        :type  base_hash:    str
+        :param profile_hash: The hash of the current profile.
+        :type  profile_hash: str
+        :return: A response with a body of {'current': <bool>}. When it is False, the delta
+                 was not applied and the whole profile must be sent.
+        :rtype:  pulp.bindings.responses.Response
+        """
+        path = self.BASE_PATH % id
+        data = {'content_type': content_type, 'profile_hash': profile_hash,
+                'base_hash': base_hash, 'delta': delta}
+        return self.server.POST(path, data)
+
 
 class ConsumerHistoryAPI(PulpAPI):
     """
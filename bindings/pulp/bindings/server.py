@@ -1,8 +1,12 @@
 from types import NoneType
 import base64
+import errno
+import httplib
 import locale
 import logging
 import os
+import socket
+import threading
 import urllib
 try:
     import oauth2 as oauth
@@ -19,6 +23,10 @@ from pulp.common.constants import DEFAULT_CA_PATH
 from pulp.common.util import ensure_utf_8, encode_unicode
 
 
+# The maximum number of idle connections kept by the PooledHTTPSServerWrapper for each server.
+POOL_SIZE = 8
+
+
 class PulpConnection(object):
     """
     Stub for invoking methods against the Pulp server. By default, the
@@ -27,6 +35,10 @@ class PulpConnection(object):
     parameter can be used to pass in another mechanism to make the actual
     call to the server. The likely use of this is a duck-typed mock object
     for unit testing purposes.
+
+    When pooled is True, the default server wrapper reuses the SSL context and
+    keep-alive connections to the server between requests. See
+    PooledHTTPSServerWrapper.
     """
 
     def __init__(self,
@@ -44,7 +56,8 @@ class PulpConnection(object):
                  cert_filename=None,
                  server_wrapper=None,
                  verify_ssl=True,
-                 ca_path=DEFAULT_CA_PATH):
+                 ca_path=DEFAULT_CA_PATH,
+                 pooled=False):
 
         self.host = host
         self.port = port
@@ -77,6 +90,8 @@ class PulpConnection(object):
         # Server Wrapper
         if server_wrapper:
             self.server_wrapper = server_wrapper
+        elif pooled:
+            self.server_wrapper = PooledHTTPSServerWrapper(self)
         else:
             self.server_wrapper = HTTPSServerWrapper(self)
 
@@ -281,8 +296,24 @@ class HTTPSServerWrapper(object):
                        returned as a string.
         :rtype:        tuple
         """
-        headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
+        headers = self._build_headers(method, url)
+        ssl_context = self._build_ssl_context()
+
+        connection = httpslib.HTTPSConnection(
+            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+
+        response = self._send(connection, method, url, body, headers)
+        return self._read(response)
+
+    def _build_ssl_context(self):
+        """
+        Build the SSL context used to connect to the server, loading the CA
+        certificates and the client certificate as configured.
 
+        :return: The SSL context.
+        :rtype:  M2Crypto.SSL.Context
+        :raises MissingCAPathException: if the configured CA path does not exist
+        """
         # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
         # the underlying openssl implementation.
         ssl_context = SSL.Context('sslv23')
@@ -305,12 +336,28 @@ class HTTPSServerWrapper(object):
                 raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
         ssl_context.set_session_timeout(self.pulp_connection.timeout)
 
+        if not (self.pulp_connection.username and self.pulp_connection.password) and \
+                self.pulp_connection.cert_filename:
+            ssl_context.load_cert(self.pulp_connection.cert_filename)
+        return ssl_context
+
+    def _build_headers(self, method, url):
+        """
+        Build the request headers, including the basic auth or oauth credentials.
+
+        :param method: The HTTP method to be used for the request (GET, POST, etc.)
+        :type  method: str
+        :param url:    The Pulp URL to make the request against
+        :type  url:    str
+        :return:       The request headers.
+        :rtype:        dict
+        """
+        headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
+
         if self.pulp_connection.username and self.pulp_connection.password:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.encodestring(raw)[:-1]
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
-            ssl_context.load_cert(self.pulp_connection.cert_filename)
 
         # oauth configuration. This block is only True if oauth is not None, so it won't run on RHEL
         # 5.
@@ -330,14 +377,21 @@ class HTTPSServerWrapper(object):
                 oauth_header[k] = encode_unicode(v)
             headers.update(oauth_header)
             headers['pulp-user'] = self.pulp_connection.oauth_user
+        return headers
 
-        connection = httpslib.HTTPSConnection(
-            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+    def _send(self, connection, method, url, body, headers):
+        """
+        Send the request and get the response, translating SSL errors to binding exceptions.
 
+        :param connection: The connection to the server.
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        :return:           The response.
+        :rtype:            httplib.HTTPResponse
+        """
         try:
             # Request against the server
             connection.request(method, url, body=body, headers=headers)
-            response = connection.getresponse()
+            return connection.getresponse()
         except SSL.SSLError, err:
             # Translate stale login certificate to an auth exception
             if 'sslv3 alert certificate expired' == str(err):
@@ -348,6 +402,16 @@ class HTTPSServerWrapper(object):
             else:
                 raise exceptions.ConnectionException(None, str(err), None)
 
+    @staticmethod
+    def _read(response):
+        """
+        Read the response body.
+
+        :param response: The response.
+        :type  response: httplib.HTTPResponse
+        :return:         A 2-tuple of the status_code and response_body.
+        :rtype:          tuple
+        """
         # Attempt to deserialize the body (should pass unless the server is busted)
         response_body = response.read()
 
@@ -356,3 +420,161 @@ class HTTPSServerWrapper(object):
         except:
             pass
         return response.status, response_body
+
+
+class PooledHTTPSServerWrapper(HTTPSServerWrapper):
+    """
+    A server wrapper that builds the SSL context once and keeps idle keep-alive
+    connections to the server in a pool, so consecutive requests do not each pay
+    for loading the certificates and a full TLS handshake. New connections resume
+    the last TLS session negotiated with the server.
+
+    A connection is taken out of the pool for the duration of a request, so the
+    wrapper may be shared by threads.
+    """
+
+    def __init__(self, pulp_connection, pool_size=POOL_SIZE):
+        """
+        :param pulp_connection: A pulp connection object.
+        :type pulp_connection: PulpConnection
+        :param pool_size: The maximum number of idle connections kept for each server.
+        :type pool_size: int
+        """
+        super(PooledHTTPSServerWrapper, self).__init__(pulp_connection)
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._ssl_context = None
+        self._idle = {}
+        self._sessions = {}
+
+    def request(self, method, url, body):
+        """
+        Make the request against the Pulp server, returning a tuple of (status_code, respose_body).
+        An idle connection is reused when there is one.  The server may have closed a reused
+        connection in the meantime, so a request is retried once on a new connection when the
+        reused one turns out to be closed before the response starts.  Any other failure, such as
+        a timeout or an error while the response is read, is not retried, since the server may
+        have already handled the request.
+
+        :param method: The HTTP method to be used for the request (GET, POST, etc.)
+        :type  method: str
+        :param url:    The Pulp URL to make the request against
+        :type  url:    str
+        :param body:   The body to pass with the request
+        :type  body:   str
+        :return:       A 2-tuple of the status_code and response_body.
+        :rtype:        tuple
+        """
+        headers = self._build_headers(method, url)
+        key = (self.pulp_connection.host, self.pulp_connection.port)
+        connection, reused = self._checkout(key)
+        try:
+            try:
+                response = self._send(connection, method, url, body, headers)
+            except (httplib.BadStatusLine, socket.error), err:
+                if not reused or not self._closed_by_server(err):
+                    raise
+                connection.close()
+                connection = self._connect(key)
+                # the retry is signed again so that the OAuth nonce is not reused
+                headers = self._build_headers(method, url)
+                response = self._send(connection, method, url, body, headers)
+            result = self._read(response)
+        except:
+            connection.close()
+            raise
+        self._checkin(key, connection, response)
+        return result
+
+    @staticmethod
+    def _closed_by_server(error):
+        """
+        Determine whether an error raised while sending a request on a reused connection means
+        that the server had closed the connection, so the request never reached it.
+
+        :param error: The error raised while sending the request.
+        :type  error: Exception
+        :return:      True if the connection was closed by the server.
+        :rtype:       bool
+        """
+        if isinstance(error, httplib.BadStatusLine):
+            return True
+        if isinstance(error, socket.timeout):
+            return False
+        return error.errno in (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+    def close(self):
+        """
+        Close all the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _checkout(self, key):
+        """
+        Get an idle connection to the server, or a new one.
+
+        :param key: The (host, port) of the server.
+        :type  key: tuple
+        :return:    A 2-tuple of the connection and whether it was reused.
+        :rtype:     tuple
+        """
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+        return self._connect(key), False
+
+    def _checkin(self, key, connection, response):
+        """
+        Return a connection to the pool once its response has been read.  The connection is
+        closed instead when the server does not keep it alive or the pool is full.
+
+        :param key:        The (host, port) of the server.
+        :type  key:        tuple
+        :param connection: The connection.
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        :param response:   The response read from the connection.
+        :type  response:   httplib.HTTPResponse
+        """
+        if connection.sock is not None:
+            try:
+                session = connection.get_session()
+            except (AttributeError, SSL.SSLError):
+                session = None
+            if session is not None:
+                with self._lock:
+                    self._sessions[key] = session
+        if response.will_close:
+            connection.close()
+            return
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.pool_size:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def _connect(self, key):
+        """
+        Create a connection to the server using the shared SSL context, resuming the last
+        TLS session negotiated with the server.
+
+        :param key: The (host, port) of the server.
+        :type  key: tuple
+        :return:    The connection.
+        :rtype:     M2Crypto.httpslib.HTTPSConnection
+        """
+        with self._lock:
+            if self._ssl_context is None:
+                self._ssl_context = self._build_ssl_context()
+            ssl_context = self._ssl_context
+            session = self._sessions.get(key)
+        host, port = key
+        connection = httpslib.HTTPSConnection(host, port, ssl_context=ssl_context)
+        if session is not None:
+            connection.set_session(session)
+        return connection
@@ -10,6 +10,9 @@ import pulp.common.tags as tag_util
 
 class TasksAPI(PulpAPI):
 
+    # Number of tasks retrieved in each request by iter_tasks
+    PAGE_SIZE = 500
+
     def __init__(self, pulp_connection):
         super(TasksAPI, self).__init__(pulp_connection)
 
@@ -71,6 +74,78 @@ class TasksAPI(PulpAPI):
         response.response_body = tasks
         return response
 
+    def get_tasks_page(self, tags=(), states=(), started_after=None, started_before=None,
+                       include=(), limit=PAGE_SIZE, after=None, grouped=False):
+        """
+        Retrieves a page of the tasks in the system, in the order they were created. The
+        progress report and result of the tasks are only retrieved when they are included.
+
+        :param tags:           if specified, only tasks that contain all tags in the given list
+                               are returned
+        :type  tags:           list
+        :param states:         if specified, only tasks in one of the given states are returned
+        :type  states:         list
+        :param started_after:  if specified, only tasks started at or after this ISO8601 datetime
+                               are returned
+        :type  started_after:  str
+        :param started_before: if specified, only tasks started before this ISO8601 datetime are
+                               returned
+        :type  started_before: str
+        :param include:        names of the fields to include in the tasks among
+                               'progress_report' and 'result'
+        :type  include:        list
+        :param limit:          maximum number of tasks in the page
+        :type  limit:          int
+        :param after:          the cursor returned with the previous page; None for the first page
+        :type  after:          str
+        :param grouped:        if True, tasks that belong to a task group are returned as well
+        :type  grouped:        bool
+        :return:               response with a dict holding the list of Task objects of the page
+                               in 'tasks', and the cursor of the next page in 'next', which is None
+                               on the last page
+        :rtype:                Response
+        """
+        path = '/v2/tasks/'
+        queries = [('tag', t) for t in tags]
+        queries.extend(('state', s) for s in states)
+        queries.extend(('include', f) for f in include)
+        if started_after:
+            queries.append(('started_after', started_after))
+        if started_before:
+            queries.append(('started_before', started_before))
+        queries.append(('limit', limit))
+        if after:
+            queries.append(('after', after))
+        if grouped:
+            queries.append(('grouped', 'true'))
+
+        response = self.server.GET(path, queries=queries)
+
+        page = response.response_body
+        response.response_body = {'tasks': [Task(doc) for doc in page['tasks']],
+                                  'next': page['next']}
+        return response
+
+    def iter_tasks(self, tags=(), states=(), started_after=None, started_before=None,
+                   include=(), grouped=False):
+        """
+        Retrieves the tasks in the system a page at a time, in the order they were created. The
+        arguments are the filters described in get_tasks_page.
+
+        :return: generator of Task objects
+        :rtype:  generator
+        """
+        after = None
+        while True:
+            page = self.get_tasks_page(tags=tags, states=states, started_after=started_after,
+                                       started_before=started_before, include=include,
+                                       after=after, grouped=grouped).response_body
+            for task in page['tasks']:
+                yield task
+            after = page['next']
+            if after is None:
+                return
+
     def purge_tasks(self, states=()):
         """
         Deletes completed tasks (except tasks in state 'canceled') in the system.
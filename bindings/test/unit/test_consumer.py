@@ -2,7 +2,7 @@ import unittest
 
 import mock
 
-from pulp.bindings.consumer import ConsumerSearchAPI
+from pulp.bindings.consumer import ConsumerSearchAPI, ProfilesAPI
 
 
 class TestConsumerSearchAPI(unittest.TestCase):
@@ -10,3 +10,25 @@ class TestConsumerSearchAPI(unittest.TestCase):
         api = ConsumerSearchAPI(mock.MagicMock())
         self.assertTrue(api.PATH is not None)
         self.assertTrue(len(api.PATH) > 0)
+
+
+class TestProfilesAPI(unittest.TestCase):
+    def setUp(self):
+        self.api = ProfilesAPI(mock.MagicMock())
+
+    def test_check(self):
+        response = self.api.check('c1', 'rpm', 'abc')
+
+        self.api.server.POST.assert_called_once_with(
+            '/v2/consumers/c1/profiles/', {'content_type': 'rpm', 'profile_hash': 'abc'})
+        self.assertTrue(response is self.api.server.POST.return_value)
+
+    def test_send_delta(self):
+        delta = {'added': [], 'removed': []}
+
+        response = self.api.send_delta('c1', 'rpm', delta, 'xyz', 'abc')
+
+        self.api.server.POST.assert_called_once_with(
+            '/v2/consumers/c1/profiles/',
+            {'content_type': 'rpm', 'profile_hash': 'abc', 'base_hash': 'xyz', 'delta': delta})
+        self.assertTrue(response is self.api.server.POST.return_value)
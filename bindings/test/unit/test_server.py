@@ -172,6 +172,143 @@ class TestHTTPSServerWrapper(unittest.TestCase):
         load_verify_locations.assert_called_once_with(cafile=ca_path)
 
 
+@mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+@mock.patch('pulp.bindings.server.SSL.Context')
+class TestPooledHTTPSServerWrapper(unittest.TestCase):
+    """
+    This class contains tests for the PooledHTTPSServerWrapper class.
+    """
+    def setUp(self):
+        self.conn = server.PulpConnection('host', verify_ssl=False)
+        self.wrapper = server.PooledHTTPSServerWrapper(self.conn, pool_size=1)
+
+    @staticmethod
+    def response(will_close=False):
+        return mock.Mock(status=200, will_close=will_close, read=mock.Mock(return_value='{}'))
+
+    def test_reuses_connection(self, Context, HTTPSConnection):
+        """
+        Assert that the SSL context and the connection are reused between requests.
+        """
+        connection = HTTPSConnection.return_value
+        connection.getresponse.return_value = self.response()
+
+        self.assertEqual(self.wrapper.request('GET', '/a/', ''), (200, {}))
+        self.assertEqual(self.wrapper.request('GET', '/b/', ''), (200, {}))
+
+        Context.assert_called_once_with('sslv23')
+        HTTPSConnection.assert_called_once_with('host', 443, ssl_context=Context.return_value)
+        self.assertEqual(connection.request.call_count, 2)
+        self.assertFalse(connection.close.called)
+
+    def test_resumes_session(self, Context, HTTPSConnection):
+        """
+        Assert that new connections resume the last TLS session.
+        """
+        first, second = mock.Mock(), mock.Mock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.return_value = self.response(will_close=True)
+        second.getresponse.return_value = self.response()
+
+        self.wrapper.request('GET', '/a/', '')
+        self.wrapper.request('GET', '/b/', '')
+
+        first.close.assert_called_once_with()
+        self.assertFalse(first.set_session.called)
+        second.set_session.assert_called_once_with(first.get_session.return_value)
+
+    def test_retries_stale_connection(self, Context, HTTPSConnection):
+        """
+        Assert that a request failing on a reused connection is retried on a new connection.
+        """
+        stale, fresh = mock.Mock(), mock.Mock()
+        HTTPSConnection.side_effect = [stale, fresh]
+        stale.getresponse.side_effect = [self.response(), server.httplib.BadStatusLine('')]
+        fresh.getresponse.return_value = self.response()
+        self.wrapper.request('GET', '/a/', '')
+
+        self.assertEqual(self.wrapper.request('GET', '/b/', ''), (200, {}))
+
+        stale.close.assert_called_once_with()
+        fresh.request.assert_called_once_with('GET', '/b/', body='', headers=mock.ANY)
+
+    def test_retries_reset_connection(self, Context, HTTPSConnection):
+        """
+        Assert that a request sent on a reused connection reset by the server is retried with
+        new headers.
+        """
+        stale, fresh = mock.Mock(), mock.Mock()
+        HTTPSConnection.side_effect = [stale, fresh]
+        stale.getresponse.return_value = self.response()
+        stale.request.side_effect = [None, server.socket.error(server.errno.EPIPE, 'Broken pipe')]
+        fresh.getresponse.return_value = self.response()
+        self.wrapper.request('GET', '/a/', '')
+
+        with mock.patch.object(self.wrapper, '_build_headers') as _build_headers:
+            self.assertEqual(self.wrapper.request('POST', '/b/', '{}'), (200, {}))
+
+        self.assertEqual(_build_headers.call_count, 2)
+        fresh.request.assert_called_once_with('POST', '/b/', body='{}',
+                                              headers=_build_headers.return_value)
+
+    def test_timeout_not_retried(self, Context, HTTPSConnection):
+        """
+        Assert that a request timing out on a reused connection is not retried, since the server
+        may still be handling it.
+        """
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = [self.response(), server.socket.timeout()]
+        self.wrapper.request('GET', '/a/', '')
+
+        self.assertRaises(server.socket.timeout, self.wrapper.request, 'POST', '/b/', '{}')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        self.assertEqual(connection.request.call_count, 2)
+
+    def test_read_error_not_retried(self, Context, HTTPSConnection):
+        """
+        Assert that a request failing while its response is read is not retried.
+        """
+        connection = HTTPSConnection.return_value
+        failed = self.response()
+        failed.read.side_effect = server.httplib.IncompleteRead('')
+        connection.getresponse.side_effect = [self.response(), failed]
+        self.wrapper.request('GET', '/a/', '')
+
+        self.assertRaises(server.httplib.IncompleteRead, self.wrapper.request, 'DELETE', '/b/', '')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        connection.close.assert_called_once_with()
+
+    def test_new_connection_not_retried(self, Context, HTTPSConnection):
+        """
+        Assert that a request failing on a new connection is not retried.
+        """
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = server.socket.error()
+
+        self.assertRaises(server.socket.error, self.wrapper.request, 'GET', '/a/', '')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        connection.close.assert_called_once_with()
+
+    def test_pool_size(self, Context, HTTPSConnection):
+        """
+        Assert that idle connections beyond the pool size are closed.
+        """
+        first, second = mock.Mock(), mock.Mock()
+        for connection in (first, second):
+            connection.getresponse.return_value = self.response()
+        self.wrapper._checkin(('host', 443), first, self.response())
+
+        self.wrapper._checkin(('host', 443), second, self.response())
+        self.wrapper.close()
+
+        self.assertEqual(second.close.call_count, 1)
+        self.assertEqual(first.close.call_count, 1)
+        self.assertEqual(self.wrapper._idle, {})
+
+
 class TestPulpConnection(unittest.TestCase):
     """
     This class contains tests for the PulpConnection object.
@@ -239,3 +376,12 @@ class TestPulpConnection(unittest.TestCase):
         connection = server.PulpConnection('host', verify_ssl=True)
 
         self.assertEqual(connection.verify_ssl, True)
+
+    def test___init___pooled(self):
+        """
+        Test __init__() with pooled set to True.
+        """
+        connection = server.PulpConnection('host', pooled=True)
+
+        self.assertTrue(isinstance(connection.server_wrapper, server.PooledHTTPSServerWrapper))
+        self.assertEqual(connection.server_wrapper.pulp_connection, connection)
@@ -76,6 +76,49 @@ class TestGetAllTasks(unittest.TestCase):
             self.assertTrue(isinstance(task, responses.Task))
 
 
+class TestGetTasksPage(unittest.TestCase):
+    def setUp(self):
+        self.server = mock.MagicMock()
+        self.api = tasks.TasksAPI(self.server)
+
+    def test_get_tasks_page(self):
+        self.server.GET.return_value.response_body = {'tasks': copy.deepcopy(TASKS[:2]),
+                                                      'next': 'abc'}
+
+        ret = self.api.get_tasks_page(tags=['t1'], states=['running', 'waiting'],
+                                      started_after='2014-06-05T15:56:11Z', include=['result'],
+                                      limit=2, after='xyz').response_body
+
+        self.server.GET.assert_called_once_with(
+            '/v2/tasks/', queries=[('tag', 't1'), ('state', 'running'), ('state', 'waiting'),
+                                   ('include', 'result'),
+                                   ('started_after', '2014-06-05T15:56:11Z'), ('limit', 2),
+                                   ('after', 'xyz')])
+        self.assertEqual([t.task_id for t in ret['tasks']],
+                         [TASKS[0]['task_id'], TASKS[1]['task_id']])
+        self.assertTrue(isinstance(ret['tasks'][0], responses.Task))
+        self.assertEqual(ret['next'], 'abc')
+
+    def test_iter_tasks(self):
+        first = mock.MagicMock(response_body={'tasks': copy.deepcopy(TASKS[:2]), 'next': 'abc'})
+        last = mock.MagicMock(response_body={'tasks': copy.deepcopy(TASKS[2:]), 'next': None})
+        self.server.GET.side_effect = [first, last]
+
+        ret = list(self.api.iter_tasks(states=['finished']))
+
+        self.assertEqual([t.task_id for t in ret], [t['task_id'] for t in TASKS])
+        self.assertEqual(self.server.GET.call_count, 2)
+        self.assertEqual(self.server.GET.call_args_list[1][1]['queries'][-1], ('after', 'abc'))
+
+    def test_iter_tasks_grouped(self):
+        self.server.GET.return_value.response_body = {'tasks': [], 'next': None}
+
+        list(self.api.iter_tasks(grouped=True))
+
+        self.server.GET.assert_called_once_with(
+            '/v2/tasks/', queries=[('limit', tasks.TasksAPI.PAGE_SIZE), ('grouped', 'true')])
+
+
 class TestPurgeTasks(unittest.TestCase):
     def setUp(self):
         self.server = mock.MagicMock()
@@ -250,8 +250,6 @@ class BaseTasksSection(PulpCliSection):
 
 
 class AllTasksSection(BaseTasksSection):
-    FIELDS = ('tags', 'task_id', 'state', 'start_time', 'finish_time')
-
     # Flags for purge command
     purge_all = PulpCliFlag('--all', _('if specified, all tasks in "successful, '
                                        'skipped and failed" states will be purged'),
@@ -280,19 +278,16 @@ class AllTasksSection(BaseTasksSection):
         """
 
         if kwargs.get(self.all_flag.keyword):
-            tasks = self.context.server.tasks_search.search(fields=self.FIELDS)
-        elif kwargs.get(self.state_option.keyword):
+            # unlike the other listings, --all includes the tasks that belong to a task group
+            return list(self.context.server.tasks.iter_tasks(grouped=True))
+        if kwargs.get(self.state_option.keyword):
             states = kwargs[self.state_option.keyword]
             # This is a temorary fix(because of backward incompatible reasons)
             # until #1028 and #1041 are fixed.
             self.translate_state_discrepancy(states)
-            tasks = self.context.server.tasks_search.search(
-                filters={'state': {'$in': states}, 'group_id': None}, fields=self.FIELDS)
         else:
-            tasks = self.context.server.tasks_search.search(
-                filters={'state': {'$in': ['running', 'waiting']}, 'group_id': None},
-                fields=self.FIELDS)
-        return tasks
+            states = ('running', 'waiting')
+        return list(self.context.server.tasks.iter_tasks(states=states))
 
     def purge(self, **kwargs):
         """
@@ -355,5 +350,5 @@ class RepoTasksSection(BaseTasksSection):
         :rtype:     list
         """
         repo_id = kwargs['repo-id']
-        response = self.context.server.tasks.get_repo_tasks(repo_id)
-        return response.response_body
+        repo_tag = tag_utils.resource_tag(tag_utils.RESOURCE_REPOSITORY_TYPE, repo_id)
+        return list(self.context.server.tasks.iter_tasks(tags=[repo_tag]))
@@ -61,14 +61,14 @@ class AllTasksTests(base_builtins.PulpClientTests):
 
         self.all_tasks_section = tasks.AllTasksSection(self.context, 'tasks', 'desc')
 
-    @mock.patch('pulp.bindings.search.SearchAPI.search')
-    def test_list_no_tasks(self, mock_search):
+    @mock.patch('pulp.bindings.tasks.TasksAPI.iter_tasks')
+    def test_list_no_tasks(self, mock_iter_tasks):
         # Setup
         data = {
             'all': False,
             'state': None
         }
-        mock_search.return_value = []
+        mock_iter_tasks.return_value = iter([])
 
         # Test
         self.all_tasks_section.list(**data)
@@ -76,15 +76,15 @@ class AllTasksTests(base_builtins.PulpClientTests):
         # Verify correct output
         self.assertTrue('No tasks found\n' in self.recorder.lines)
 
-    @mock.patch('pulp.bindings.search.SearchAPI.search')
-    def test_list(self, mock_search):
+    def test_list(self):
         # Setup
         data = {
             'all': False,
             'state': None
         }
 
-        mock_search.return_value = [copy.copy(EXAMPLE_LIST_REPORT)]
+        self.server_mock.request.return_value = (200, {'tasks': [copy.copy(EXAMPLE_LIST_REPORT)],
+                                                       'next': None})
 
         # Test
         self.all_tasks_section.list(**data)
@@ -95,52 +95,50 @@ class AllTasksTests(base_builtins.PulpClientTests):
         self.assertTrue('No tasks found\n' not in self.recorder.lines)
         self.assertTrue('Result:           Incomplete\n' not in self.recorder.lines)
 
-    @mock.patch('pulp.bindings.search.SearchAPI.search')
-    def test_list_all(self, mock_search):
+    @mock.patch('pulp.bindings.tasks.TasksAPI.iter_tasks')
+    def test_list_all(self, mock_iter_tasks):
         # Setup
         data = {
             'all': True,
             'state': None
         }
+        mock_iter_tasks.return_value = iter([])
 
         # Test
         self.all_tasks_section.list(**data)
 
         # Verify
-        mock_search.assert_called_once_with(fields=('tags', 'task_id', 'state', 'start_time',
-                                                    'finish_time'))
+        mock_iter_tasks.assert_called_once_with(grouped=True)
 
-    @mock.patch('pulp.bindings.search.SearchAPI.search')
-    def test_list_default(self, mock_search):
+    @mock.patch('pulp.bindings.tasks.TasksAPI.iter_tasks')
+    def test_list_default(self, mock_iter_tasks):
         # Setup
         data = {
             'all': False,
             'state': None
         }
+        mock_iter_tasks.return_value = iter([])
 
         # Test
         self.all_tasks_section.list(**data)
 
         # Verify
-        fields = ('tags', 'task_id', 'state', 'start_time', 'finish_time')
-        filters = {'state': {'$in': ['running', 'waiting']}, 'group_id': None}
-        mock_search.assert_called_once_with(fields=fields, filters=filters)
+        mock_iter_tasks.assert_called_once_with(states=('running', 'waiting'))
 
-    @mock.patch('pulp.bindings.search.SearchAPI.search')
-    def test_list_state(self, mock_search):
+    @mock.patch('pulp.bindings.tasks.TasksAPI.iter_tasks')
+    def test_list_state(self, mock_iter_tasks):
         # Setup
         data = {
             'all': False,
-            'state': 'canceled,error'
+            'state': ['canceled', 'failed']
         }
+        mock_iter_tasks.return_value = iter([])
 
         # Test
         self.all_tasks_section.list(**data)
 
         # Verify
-        fields = ('tags', 'task_id', 'state', 'start_time', 'finish_time')
-        filters = {'state': {'$in': 'canceled,error'}, 'group_id': None}
-        mock_search.assert_called_once_with(fields=fields, filters=filters)
+        mock_iter_tasks.assert_called_once_with(states=['canceled', 'error'])
 
     def test_list_all_state(self):
         # Setup
@@ -339,7 +337,8 @@ class RepoTasksTests(base_builtins.PulpClientTests):
 
     def test_list(self):
         # Setup
-        self.server_mock.request.return_value = (200, [copy.copy(EXAMPLE_CALL_REPORT)])
+        self.server_mock.request.return_value = (200, {'tasks': [copy.copy(EXAMPLE_CALL_REPORT)],
+                                                       'next': None})
 
         # Test
         self.repo_tasks_section.list(**{'repo-id': 'repo_1'})
@@ -9,11 +9,13 @@ import copy
 import errno
 import os
 import pickle
+from multiprocessing.pool import ThreadPool
 
 from pulp.common.lock import LockFile
 
 
 DEFAULT_CHUNKSIZE = 1048576  # 1 MB per upload call
+DEFAULT_CONCURRENCY = 1  # segments uploaded at once
 
 
 class ManagerUninitializedException(Exception):
@@ -71,7 +73,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -84,10 +87,18 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of segments uploaded at once; when greater
+               than 1, segments are uploaded by a pool of threads and may reach
+               the server in any order. The bindings should then use a
+               pooled connection (see PulpConnection) to reuse connections
+               between segments.
+        @type  concurrency: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
 
         # Internal state
         self.tracker_files = {}
@@ -196,6 +207,11 @@ class UploadManager(object):
 
         The callback_func should have a signature of (int, int).
 
+        When the manager's concurrency is greater than 1, segments are uploaded
+        in parallel and the tracker records which of them completed, so an
+        interrupted upload only resends the missing segments. The callback is
+        then invoked with the number of bytes uploaded so far.
+
         This call will raise an exception if an upload is already in progress
         for the given upload_id. If that isn't the case and the tracker file's
         running flag is stale, the force parameter will bypass this check and
@@ -235,6 +251,11 @@ class UploadManager(object):
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
 
+            if self.concurrency > 1:
+                self._upload_parallel(tracker_file, source_file_size, callback_func)
+                tracker_file.is_finished_uploading = True
+                return
+
             f = open(tracker_file.source_filename, 'r')
             while True:
                 # Load the chunk to upload
@@ -259,6 +280,49 @@ class UploadManager(object):
             tracker_file.is_running = False
             tracker_file.save()
 
+    def _upload_parallel(self, tracker_file, source_file_size, callback_func):
+        """
+        Upload the segments not yet completed using a pool of threads. The
+        tracker is saved after each segment completes.
+
+        @param tracker_file: tracker of the upload
+        @type  tracker_file: UploadTracker
+
+        @param source_file_size: size in bytes of the file being uploaded
+        @type  source_file_size: int
+
+        @param callback_func: optional method to be called after each upload
+               call to the server
+        @type  callback_func: func
+        """
+        tracker_file.start_segments(self.chunk_size, source_file_size)
+        segment_size = tracker_file.segment_size
+        pending = tracker_file.missing_segments()
+        if not pending:
+            return
+
+        def upload_segment(index):
+            offset = index * segment_size
+            f = open(tracker_file.source_filename, 'r')
+            try:
+                f.seek(offset)
+                data = f.read(segment_size)
+            finally:
+                f.close()
+            self.bindings.uploads.upload_segment(tracker_file.upload_id, offset, data)
+            return index
+
+        pool = ThreadPool(min(self.concurrency, len(pending)))
+        try:
+            for index in pool.imap_unordered(upload_segment, pending):
+                tracker_file.segment_completed(index)
+                tracker_file.save()
+                if callback_func:
+                    callback_func(tracker_file.bytes_completed, source_file_size)
+        finally:
+            pool.terminate()
+            pool.join()
+
     def import_upload(self, upload_id):
         """
         Once the file is finished uploading, this call will request the server
@@ -410,6 +474,78 @@ class UploadTracker(object):
         self.is_running = False
         self.is_finished_uploading = False
 
+        # Parallel uploads: one bit per segment of segment_size bytes, set
+        # when the segment has been uploaded
+        self.file_size = None
+        self.segment_size = None
+        self.segment_count = 0
+        self.completed_segments = None
+        self.bytes_completed = 0
+
+    def __setstate__(self, state):
+        # Trackers saved before parallel uploads were supported lack the
+        # segment fields.
+        self.__init__(state['filename'])
+        self.__dict__.update(state)
+
+    def start_segments(self, segment_size, file_size):
+        """
+        Prepare the completed segments bitmap, unless the upload was already
+        started in parallel. Segments before the offset reached by a sequential
+        upload are marked completed.
+
+        @param segment_size: size in bytes of each segment
+        @type  segment_size: int
+
+        @param file_size: size in bytes of the file being uploaded
+        @type  file_size: int
+        """
+        if self.completed_segments is not None:
+            return
+        self.file_size = file_size
+        self.segment_size = segment_size
+        self.segment_count = (file_size + segment_size - 1) // segment_size
+        self.completed_segments = bytearray((self.segment_count + 7) // 8)
+        for index in range((self.offset or 0) // segment_size):
+            self.segment_completed(index)
+
+    def segment_completed(self, index):
+        """
+        Mark a segment as uploaded and advance the offset past the segments
+        uploaded without a gap, so sequential uploads can resume from it.
+
+        @param index: index of the segment
+        @type  index: int
+        """
+        if self.is_segment_completed(index):
+            return
+        self.completed_segments[index // 8] |= 1 << (index % 8)
+        segment_end = min((index + 1) * self.segment_size, self.file_size)
+        self.bytes_completed += segment_end - index * self.segment_size
+
+        contiguous = (self.offset or 0) // self.segment_size
+        while contiguous < self.segment_count and self.is_segment_completed(contiguous):
+            contiguous += 1
+        offset = min(contiguous * self.segment_size, self.file_size)
+        self.offset = max(self.offset or 0, offset)
+
+    def is_segment_completed(self, index):
+        """
+        @param index: index of the segment
+        @type  index: int
+
+        @return: true if the segment has been uploaded
+        @rtype:  bool
+        """
+        return bool(self.completed_segments[index // 8] & (1 << (index % 8)))
+
+    def missing_segments(self):
+        """
+        @return: indexes of the segments not uploaded yet
+        @rtype:  list
+        """
+        return [i for i in range(self.segment_count) if not self.is_segment_completed(i)]
+
     def save(self):
         """
         Saves the current state of the tracker file. This will lock on the file
@@ -289,6 +289,110 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_parallel(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        num_upload_calls = int(math.ceil(float(rpm_size) / float(self.upload_manager.chunk_size)))
+        self.assertEqual(num_upload_calls, self.mock_upload_bindings.upload_segment.call_count)
+
+        # Reassemble the segments, which may have been sent in any order
+        segments = {}
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            self.assertEqual(upload_id, single_call_args[0][0])
+            segments[single_call_args[0][1]] = single_call_args[0][2]
+        with open(TEST_RPM_FILENAME, 'r') as f:
+            self.assertEqual(f.read(), ''.join(segments[o] for o in sorted(segments)))
+
+        # The progress only moves forward and ends with the whole file
+        progress = [c[0][0] for c in mock_callback.update_status.call_args_list]
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(rpm_size, progress[-1])
+
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual([], tracker.missing_segments())
+        self.assertEqual(True, tracker.is_finished_uploading)
+        self.assertEqual(False, tracker.is_running)
+
+    def test_upload_parallel_resume(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        # sequential upload reached 250, then segments 4 and 6 were uploaded in parallel
+        tracker.offset = 250
+        tracker.start_segments(100, rpm_size)
+        tracker.segment_completed(4)
+        tracker.segment_completed(6)
+
+        # Test
+        self.upload_manager.upload(upload_id, mock.Mock())
+
+        # Verify
+        offsets = sorted(c[0][1] for c in self.mock_upload_bindings.upload_segment.call_args_list)
+        expected = [o for o in range(200, rpm_size, 100) if o not in (400, 600)]
+        self.assertEqual(expected, offsets)
+        self.assertEqual(rpm_size, tracker.offset)
+
+    def test_upload_parallel_failure(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        self.mock_upload_bindings.upload_segment.side_effect = NotFoundException({})
+
+        # Test
+        self.assertRaises(NotFoundException, self.upload_manager.upload, upload_id, mock.Mock())
+
+        # Verify
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(False, tracker.is_finished_uploading)
+        self.assertEqual(False, tracker.is_running)
+
+    def test_tracker_segments(self):
+        tracker = upload_util.UploadTracker('tracker')
+        tracker.start_segments(10, 35)
+
+        tracker.segment_completed(3)
+        tracker.segment_completed(1)
+        self.assertEqual(0, tracker.offset)
+        self.assertEqual(15, tracker.bytes_completed)
+        self.assertEqual([0, 2], tracker.missing_segments())
+
+        tracker.segment_completed(0)
+        self.assertEqual(20, tracker.offset)
+        tracker.segment_completed(2)
+        self.assertEqual(35, tracker.offset)
+        self.assertEqual(35, tracker.bytes_completed)
+
+    def test_tracker_load_without_segments(self):
+        os.makedirs(self.upload_working_dir)
+        tracker = upload_util.UploadTracker(os.path.join(self.upload_working_dir, 'tracker'))
+        del tracker.completed_segments
+        del tracker.segment_size
+        tracker.save()
+
+        loaded = upload_util.UploadTracker.load(tracker.filename)
+
+        self.assertEqual(None, loaded.completed_segments)
+        self.assertEqual(None, loaded.segment_size)
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -13,6 +13,9 @@ PROGRESS_DETAILS_KEY = u'details'
 PROGRESS_STATE_KEY = u'state'
 PROGRESS_ERROR_DETAILS_KEY = u'error_details'
 PROGRESS_SUB_STEPS_KEY = u'sub_steps'
+PROGRESS_UNITS_PER_SECOND_KEY = u'units_per_second'
+PROGRESS_QUEUE_DEPTH_KEY = u'queue_depth'
+PROGRESS_REQUESTS_PER_SECOND_KEY = u'requests_per_second'
 
 STATE_NOT_STARTED = u'NOT_STARTED'
 STATE_RUNNING = u'IN_PROGRESS'
@@ -0,0 +1,86 @@
+"""
+Utilities shared by consumers and the server to compare and incrementally update unit profiles.
+
+A profile is identified by its hash, so a consumer can tell whether the server already has the
+profile it is about to upload. Profiles that are lists of packages can also be updated with a
+delta of the packages added and removed since the previous upload.
+"""
+
+import hashlib
+
+from pulp.common.compat import json
+
+
+# Keys of a profile delta
+DELTA_ADDED = 'added'
+DELTA_REMOVED = 'removed'
+
+
+def calculate_hash(profile):
+    """
+    Return a hash of a profile. This hash is useful for quickly comparing profiles to determine
+    if they are the same.
+
+    :param profile: The profile structure you wish to hash
+    :type  profile: object
+    :return:        Hash of profile
+    :rtype:         basestring
+    """
+    # Don't use any whitespace in the json separators, and sort dictionary keys to be repeatable
+    serialized_profile = json.dumps(profile, separators=(',', ':'), sort_keys=True)
+    hasher = hashlib.sha256(serialized_profile)
+    return hasher.hexdigest()
+
+
+def package_key(package):
+    """
+    Return a key identifying a package of a profile, so packages can be compared regardless of
+    the ordering of their dictionary keys or the type of their strings.
+
+    :param package: A package of a profile
+    :type  package: object
+    :return:        A key identifying the package
+    :rtype:         str
+    """
+    return json.dumps(package, separators=(',', ':'), sort_keys=True)
+
+
+def calculate_delta(previous, current):
+    """
+    Return the delta between two profiles that are lists of packages.
+
+    :param previous: The profile that was previously uploaded
+    :type  previous: list
+    :param current:  The current profile
+    :type  current:  list
+    :return:         A dict with the packages that were added, and those that were removed
+    :rtype:          dict
+    """
+    previous_keys = set(package_key(p) for p in previous)
+    current_keys = set(package_key(p) for p in current)
+    added = [p for p in current if package_key(p) not in previous_keys]
+    removed = [p for p in previous if package_key(p) not in current_keys]
+    return {DELTA_ADDED: added, DELTA_REMOVED: removed}
+
+
+def apply_delta(profile, delta):
+    """
+    Apply a delta to a profile that is a list of packages. The removed packages are dropped,
+    and the added packages that are not already in the profile are appended to it.
+
+    :param profile: A profile
+    :type  profile: list
+    :param delta:   A delta, as returned by calculate_delta
+    :type  delta:   dict
+    :return:        The updated profile
+    :rtype:         list
+    """
+    removed_keys = set(package_key(p) for p in delta.get(DELTA_REMOVED, []))
+    merged = [p for p in profile if package_key(p) not in removed_keys]
+    merged_keys = set(package_key(p) for p in merged)
+    for package in delta.get(DELTA_ADDED, []):
+        key = package_key(package)
+        if key not in merged_keys:
+            merged_keys.add(key)
+            merged.append(package)
+    return merged
@@ -0,0 +1,60 @@
+import unittest
+
+from pulp.common import unit_profile
+
+
+class TestCalculateHash(unittest.TestCase):
+
+    def test_key_order(self):
+        """
+        The hash does not depend on the ordering of dictionary keys.
+        """
+        self.assertEqual(unit_profile.calculate_hash({'a': 1, 'b': 2}),
+                         unit_profile.calculate_hash({'b': 2, 'a': 1}))
+
+    def test_string_type(self):
+        """
+        The hash does not depend on whether strings are unicode.
+        """
+        self.assertEqual(unit_profile.calculate_hash([{'name': 'zsh'}]),
+                         unit_profile.calculate_hash([{u'name': u'zsh'}]))
+
+    def test_list_order(self):
+        """
+        The ordering of lists is significant.
+        """
+        self.assertNotEqual(unit_profile.calculate_hash([1, 2]),
+                            unit_profile.calculate_hash([2, 1]))
+
+
+class TestDelta(unittest.TestCase):
+
+    PREVIOUS = [{'name': 'zsh', 'version': '1.0'}, {'name': 'vim', 'version': '7.0'}]
+    CURRENT = [{'version': '2.0', 'name': 'zsh'}, {'version': '7.0', 'name': 'vim'},
+               {'name': 'tmux', 'version': '1.8'}]
+
+    def test_calculate_delta(self):
+        delta = unit_profile.calculate_delta(self.PREVIOUS, self.CURRENT)
+
+        self.assertEqual(delta, {'added': [self.CURRENT[0], self.CURRENT[2]],
+                                 'removed': [self.PREVIOUS[0]]})
+
+    def test_calculate_delta_unchanged(self):
+        delta = unit_profile.calculate_delta(self.PREVIOUS, list(reversed(self.PREVIOUS)))
+
+        self.assertEqual(delta, {'added': [], 'removed': []})
+
+    def test_apply_delta(self):
+        delta = unit_profile.calculate_delta(self.PREVIOUS, self.CURRENT)
+
+        merged = unit_profile.apply_delta(self.PREVIOUS, delta)
+
+        self.assertEqual(merged, [self.PREVIOUS[1], self.CURRENT[0], self.CURRENT[2]])
+
+    def test_apply_delta_existing_package(self):
+        """
+        Packages that are already in the profile are not added again.
+        """
+        merged = unit_profile.apply_delta(self.PREVIOUS, {'added': [self.PREVIOUS[1]]})
+
+        self.assertEqual(merged, self.PREVIOUS)
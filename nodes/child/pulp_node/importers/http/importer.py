@@ -14,6 +14,7 @@
 from logging import getLogger
 from gettext import gettext as _
 from threading import Event
+import shutil
 import warnings
 
 from nectar.downloaders.threaded import HTTPThreadedDownloader as Downloader
@@ -27,7 +28,7 @@ from pulp_node.error import CaughtException, NodeDeprecationWarning, \
     TASK_DEPRECATION_WARNING
 from pulp_node.reports import RepositoryProgress
 from pulp_node.importers.reports import SummaryReport, ProgressListener
-from pulp_node.importers.strategies import find_strategy, Request
+from pulp_node.importers.strategies import find_strategy, manifest_dir, Request
 
 
 log = getLogger(__name__)
@@ -144,6 +145,16 @@ class NodesHttpImporter(Importer):
         report = conduit.build_success_report({}, summary_report.dict())
         return report
 
+    def importer_removed(self, repo, config):
+        """
+        Remove the manifest kept for the repository between synchronizations.
+        :param repo: A repository object.
+        :type repo: pulp.plugins.model.Repository
+        :param config: The importer configuration.
+        :type config: pulp.plugins.config.PluginCallConfiguration
+        """
+        shutil.rmtree(manifest_dir(repo.id), ignore_errors=True)
+
     def cancel_sync_repo(self, call_request, call_report):
         """
         Cancel an in-progress repository synchronization.
@@ -1,69 +1,64 @@
-from pulp_node import constants
-
-
-class UniqueKey(object):
-    """
-    A unique unit key consisting of a unit's type_id & unit_key.
-    The unit key is sorted to ensure consistency.
-    :ivar uid: The unique ID.
-    :type uid: A tuple of: (type_id, unit_key)
-    """
-
-    def __init__(self, unit):
-        """
-        :param unit: A content unit.
-        :type unit: dict
-        """
-        type_id = unit['type_id']
-        unit_key = tuple(sorted(unit['unit_key'].items()))
-        self.uid = (type_id, unit_key)
-
-    def __hash__(self):
-        return hash(self.uid)
-
-    def __eq__(self, other):
-        return self.uid == other.uid
+from array import array
 
-    def __ne__(self, other):
-        return self.uid != other.uid
+from pulp_node import constants
+from pulp_node.manifest import unit_digest
 
 
 class UnitInventory(object):
     """
     The unit inventory contains both the parent and child inventory
-    of content units associated with a specific repository.  Each is contained
-    within a dictionary keyed by {UnitKey} to ensure uniqueness.
+    of content units associated with a specific repository.  Each is indexed
+    by unit digest (see: unit_digest()) to ensure uniqueness.
+
+    To keep the memory footprint small for large repositories, the inventory
+    does not keep the units.  For each parent unit, it keeps the reference used
+    to fetch the unit and its last_updated.  For each child unit, it keeps the
+    type_id, unit_key, unit_id and last_updated.  Parent units are fetched when
+    they are listed.
     """
 
-    @staticmethod
-    def _import_parent_units(units):
-        _units = {}
+    def _import_parent_units(self, units):
         for unit, ref in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = (unit, ref)
-        return _units
+            position = self._parent_index.get(unit_digest(unit))
+            if position is None:
+                self._parent_index[unit_digest(unit)] = len(self._parent_refs)
+                self._parent_refs.append(ref)
+                self._parent_last_updated.append(_last_updated(unit))
+            else:
+                self._parent_refs[position] = ref
+                self._parent_last_updated[position] = _last_updated(unit)
 
-    @staticmethod
-    def _import_child_units(units):
-        _units = {}
+    def _import_child_units(self, units):
         for unit in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = unit
-        return _units
+            child_unit = (unit['type_id'], unit['unit_key'], unit.get('unit_id'))
+            position = self._child_index.get(unit_digest(unit))
+            if position is None:
+                self._child_index[unit_digest(unit)] = len(self._child_units)
+                self._child_units.append(child_unit)
+                self._child_last_updated.append(_last_updated(unit))
+            else:
+                self._child_units[position] = child_unit
+                self._child_last_updated[position] = _last_updated(unit)
 
     def __init__(self, base_URL, parent_units, child_units):
         """
         :param base_URL: The base URL for downloading parent units.
         :param parent_units: The content units in the parent node.
-        :type parent_units: iterable
+        :type parent_units: iterable of: (unit, ref)
         :param child_units: The content units in the child node.
         :type child_units: iterable
         """
         self.base_URL = base_URL
-        self.parent_units = self._import_parent_units(parent_units)
-        self.child_units = self._import_child_units(child_units)
+        # parent: digest -> position of the ref and last_updated
+        self._parent_index = {}
+        self._parent_refs = []
+        self._parent_last_updated = array('d')
+        # child: digest -> position of the (type_id, unit_key, unit_id) and last_updated
+        self._child_index = {}
+        self._child_units = []
+        self._child_last_updated = array('d')
+        self._import_parent_units(parent_units)
+        self._import_child_units(child_units)
 
     def units_on_parent_only(self):
         """
@@ -72,7 +67,8 @@ class UnitInventory(object):
         :return: List of (unit, ref).
         :rtype: list
         """
-        return [r for k, r in self.parent_units.items() if k not in self.child_units]
+        return [self._parent_unit(p) for k, p in self._parent_index.items()
+                if k not in self._child_index]
 
     def units_on_child_only(self):
         """
@@ -81,7 +77,13 @@ class UnitInventory(object):
         :return: List of units that need to be purged.
         :rtype: list
         """
-        return [u for k, u in self.child_units.items() if k not in self.parent_units]
+        units = []
+        for key, position in self._child_index.items():
+            if key in self._parent_index:
+                continue
+            type_id, unit_key, unit_id = self._child_units[position]
+            units.append(dict(type_id=type_id, unit_key=unit_key, unit_id=unit_id))
+        return units
 
     def updated_units(self):
         """
@@ -90,12 +92,35 @@ class UnitInventory(object):
         :rtype: list
         """
         updated = []
-        for key, (unit, ref) in self.parent_units.items():
-            child_unit = self.child_units.get(key)
-            if child_unit is None:
+        for key, position in self._parent_index.items():
+            child_position = self._child_index.get(key)
+            if child_position is None:
                 continue
-            parent_last_updated = unit.get(constants.LAST_UPDATED, 0)
-            child_last_updated = child_unit.get(constants.LAST_UPDATED, 0)
+            parent_last_updated = self._parent_last_updated[position]
+            child_last_updated = self._child_last_updated[child_position]
             if parent_last_updated > child_last_updated:
-                updated.append((unit, ref))
+                updated.append(self._parent_unit(position))
         return updated
+
+    def _parent_unit(self, position):
+        """
+        Fetch a parent unit.
+        :param position: The position of the unit in the parent inventory.
+        :type position: int
+        :return: The unit, without its metadata, and its ref.
+        :rtype: tuple
+        """
+        ref = self._parent_refs[position]
+        unit = ref.fetch()
+        unit.pop('metadata', None)
+        return unit, ref
+
+
+def _last_updated(unit):
+    """
+    :param unit: A content unit.
+    :type unit: dict
+    :return: The last_updated of the unit.
+    :rtype: float
+    """
+    return float(unit.get(constants.LAST_UPDATED) or 0)
@@ -30,6 +30,24 @@ _log = getLogger(__name__)
 
 STRATEGY_UNSUPPORTED = _('Importer strategy "%(s)s" not supported')
 
+# The directory, relative to the storage directory, in which the last manifest
+# fetched for each repository is kept along with its units file.
+MANIFEST_DIR = 'nodes/manifests'
+
+
+def manifest_dir(repo_id):
+    """
+    Get the directory in which the last manifest fetched for a repository is kept.
+    Unlike the working directory, it is kept between synchronizations so the units
+    file can be updated using deltas.  It is removed with the importer.
+    :param repo_id: A repository ID.
+    :type repo_id: str
+    :return: The absolute path to the directory.
+    :rtype: str
+    """
+    storage_dir = pulp_conf.get('server', 'storage_dir')
+    return pathlib.join(storage_dir, MANIFEST_DIR, repo_id)
+
 
 class Request(object):
     """
@@ -50,6 +68,9 @@ class Request(object):
     :type repo_id: str
     :ivar working_dir: The absolute path to a directory to be used as temporary storage.
     :type working_dir: str
+    :ivar manifest_dir: The absolute path to the directory in which the last fetched
+        manifest is kept.
+    :type manifest_dir: str
     """
 
     def __init__(self, cancel_event, conduit, config, downloader, progress, summary, repo):
@@ -78,6 +99,7 @@ class Request(object):
         self.summary = summary
         self.repo_id = repo.id
         self.working_dir = repo.working_dir
+        self.manifest_dir = manifest_dir(repo.id)
 
     def started(self):
         """
@@ -173,7 +195,8 @@ class ImporterStrategy(object):
         try:
             request.progress.begin_manifest_download()
             url = request.config.get(constants.MANIFEST_URL_KEYWORD)
-            manifest = Manifest(request.working_dir)
+            pathlib.mkdir(request.manifest_dir)
+            manifest = Manifest(request.manifest_dir)
             try:
                 manifest.read()
             except IOError, e:
@@ -182,12 +205,13 @@ class ImporterStrategy(object):
             except ValueError:
                 # json decoding failed
                 pass
-            fetched_manifest = RemoteManifest(url, request.downloader, request.working_dir)
+            fetched_manifest = RemoteManifest(url, request.downloader, request.manifest_dir)
             fetched_manifest.fetch()
             if manifest != fetched_manifest or \
                     not manifest.is_valid() or not manifest.has_valid_units():
-                fetched_manifest.write()
-                fetched_manifest.fetch_units()
+                if not self._fetch_deltas(request, manifest, fetched_manifest):
+                    fetched_manifest.write()
+                    fetched_manifest.fetch_units()
                 manifest = fetched_manifest
             if not manifest.is_valid():
                 raise InvalidManifestError()
@@ -203,6 +227,29 @@ class ImporterStrategy(object):
         inventory = UnitInventory(base_URL, parent_units, child_units)
         return inventory
 
+    def _fetch_deltas(self, request, manifest, fetched_manifest):
+        """
+        Update the units file of the previously fetched manifest using the deltas
+        published with the fetched manifest rather than fetching all of the units.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :param manifest: The previously fetched manifest.
+        :type manifest: Manifest
+        :param fetched_manifest: The fetched manifest.
+        :type fetched_manifest: RemoteManifest
+        :return: True if the deltas were applied.  False when the full units
+            file needs to be fetched.
+        :rtype: bool
+        """
+        if not manifest.id or not manifest.is_valid() or not manifest.has_valid_units():
+            return False
+        try:
+            return fetched_manifest.fetch_deltas(manifest)
+        except Exception:
+            _log.warn(_('Fetching deltas for repository %(r)s failed'), {'r': request.repo_id},
+                      exc_info=True)
+            return False
+
     def _reset_storage_path(self, unit):
         """
         Reset the storage_path using the storage_dir defined in
@@ -19,7 +19,9 @@ json encoded file.  For performance reasons, the unit files are compressed.
 import os
 import gzip
 import errno
+import mmap
 
+from hashlib import sha1
 from logging import getLogger
 
 from nectar.request import DownloadRequest
@@ -49,6 +51,17 @@ UNITS_PATH = 'path'
 UNITS_TOTAL = 'total'
 UNITS_SIZE = 'size'
 
+DELTAS = 'deltas'
+DELTA_DIR = 'deltas'
+DELTA_BASE = 'base'
+DELTA_ACTION = '_delta'
+DELTA_ADDED = 'added'
+DELTA_UPDATED = 'updated'
+DELTA_REMOVED = 'removed'
+
+# The number of deltas kept in the chain published with the manifest.
+MAX_DELTAS = 10
+
 
 # --- utils -----------------------------------------------------------------------------
 
@@ -76,6 +89,130 @@ def unzip(path, destination, bfrlen=65535):
         fp_in.close()
 
 
+def unit_digest(unit):
+    """
+    Get a digest uniquely identifying a unit by its type_id & unit_key.
+    The unit key is sorted to ensure consistency.
+    :param unit: A content unit.
+    :type unit: dict
+    :return: The (binary) digest.
+    :rtype: str
+    """
+    unit_key = sorted(unit['unit_key'].items())
+    return sha1(json.dumps([unit['type_id'], unit_key], default=unicode)).digest()
+
+
+def read_units(path):
+    """
+    Read the units in a units file, which may be compressed.
+    :param path: The absolute path to the units file.
+    :type path: str
+    :return: A generator of units.
+    :rtype: generator
+    :raise IOError: on I/O errors.
+    :raise ValueError: json decoding errors
+    """
+    if path.endswith('.gz'):
+        fp = gzip.open(path)
+    else:
+        fp = open(path)
+    try:
+        for json_unit in fp:
+            yield json.loads(json_unit)
+    finally:
+        fp.close()
+
+
+def build_delta(previous_path, path, delta_path):
+    """
+    Write the delta between two units files.  The delta is a units file containing
+    the units added and updated in the current file and the type_id & unit_key of
+    the units removed from it, each marked by DELTA_ACTION.
+    :param previous_path: The absolute path to the previously published units file.
+    :type previous_path: str
+    :param path: The absolute path to the current units file.
+    :type path: str
+    :param delta_path: The absolute path to the delta file to be written.
+    :type delta_path: str
+    :return: The closed writer used to write the delta.
+    :rtype: UnitWriter
+    :raise IOError: on I/O errors.
+    """
+    previous = {}
+    for unit in read_units(previous_path):
+        previous[unit_digest(unit)] = _content_digest(unit)
+    with UnitWriter(delta_path) as writer:
+        for unit in read_units(path):
+            digest = unit_digest(unit)
+            content = previous.pop(digest, None)
+            if content is None:
+                unit[DELTA_ACTION] = DELTA_ADDED
+            elif content != _content_digest(unit):
+                unit[DELTA_ACTION] = DELTA_UPDATED
+            else:
+                continue
+            writer.add(unit)
+        if previous:
+            for unit in read_units(previous_path):
+                if unit_digest(unit) in previous:
+                    writer.add({
+                        'type_id': unit['type_id'],
+                        'unit_key': unit['unit_key'],
+                        DELTA_ACTION: DELTA_REMOVED
+                    })
+    return writer
+
+
+def apply_deltas(path, delta_paths, destination):
+    """
+    Apply a chain of deltas (see: build_delta()) to a units file.
+    :param path: The absolute path to the units file.
+    :type path: str
+    :param delta_paths: The absolute paths to the delta files, oldest first.
+    :type delta_paths: list
+    :param destination: The absolute path to the (uncompressed) units file to be written.
+    :type destination: str
+    :return: The number of units written.
+    :rtype: int
+    :raise IOError: on I/O errors.
+    :raise ValueError: json decoding errors
+    """
+    changed = {}
+    for delta_path in delta_paths:
+        for unit in read_units(delta_path):
+            action = unit.pop(DELTA_ACTION)
+            if action == DELTA_REMOVED:
+                changed[unit_digest(unit)] = None
+            else:
+                changed[unit_digest(unit)] = unit
+    total = 0
+    with open(destination, 'w') as fp:
+        for unit in read_units(path):
+            if unit_digest(unit) in changed:
+                continue
+            fp.write(json.dumps(unit))
+            fp.write('\n')
+            total += 1
+        for unit in changed.itervalues():
+            if unit is None:
+                continue
+            fp.write(json.dumps(unit))
+            fp.write('\n')
+            total += 1
+    return total
+
+
+def _content_digest(unit):
+    """
+    Get a digest of the content of a unit used to detect updated units.
+    :param unit: A content unit.
+    :type unit: dict
+    :return: The (binary) digest.
+    :rtype: str
+    """
+    return sha1(json.dumps(unit, sort_keys=True, default=unicode)).digest()
+
+
 # --- manifest --------------------------------------------------------------------------
 
 
@@ -104,6 +241,7 @@ class Manifest(object):
         self.version = MANIFEST_VERSION
         self.units = {UNITS_PATH: None, UNITS_TOTAL: 0, UNITS_SIZE: 0}
         self.publishing_details = {}
+        self.deltas = []
         if os.path.isdir(path):
             path = pathlib.join(path, MANIFEST_FILE_NAME)
         self.path = path
@@ -118,7 +256,8 @@ class Manifest(object):
             ID: self.id,
             VERSION: self.version,
             UNITS: self.units,
-            PUBLISHING_DETAILS: self.publishing_details
+            PUBLISHING_DETAILS: self.publishing_details,
+            DELTAS: self.deltas
         }
         with open(self.path, 'w+') as fp:
             json.dump(state, fp, indent=2)
@@ -138,6 +277,7 @@ class Manifest(object):
         self.version = d.get(VERSION, 0)
         self.units = d.get(UNITS, {UNITS_PATH: None, UNITS_TOTAL: 0, UNITS_SIZE: 0})
         self.publishing_details = d.get(PUBLISHING_DETAILS, {})
+        self.deltas = d.get(DELTAS, [])
 
     def get_units(self):
         """
@@ -164,6 +304,47 @@ class Manifest(object):
         self.units[UNITS_TOTAL] = unit_writer.total_units
         self.units[UNITS_SIZE] = unit_writer.bytes_written
 
+    def delta_published(self, base_id, unit_writer):
+        """
+        Add a delta to the chain published with the manifest.  The oldest deltas
+        are dropped to keep at most MAX_DELTAS.
+        :param base_id: The ID of the manifest the delta is based on.
+        :type base_id: str
+        :param unit_writer: The writer used to publish the delta.
+        :type unit_writer: UnitWriter
+        """
+        delta = {
+            DELTA_BASE: base_id,
+            ID: self.id,
+            PATH: pathlib.join(DELTA_DIR, os.path.basename(unit_writer.path)),
+            UNITS_TOTAL: unit_writer.total_units,
+            UNITS_SIZE: unit_writer.bytes_written,
+        }
+        self.deltas.append(delta)
+        self.deltas = self.deltas[-MAX_DELTAS:]
+
+    def delta_chain(self, base_id):
+        """
+        Get the chain of deltas leading from the manifest with the specified ID
+        to this manifest.
+        :param base_id: The ID of a previous manifest.
+        :type base_id: str
+        :return: The list of deltas, oldest first, or None when the chain is
+            broken or does not reach back to the specified manifest.
+        :rtype: list
+        """
+        for n, delta in enumerate(self.deltas):
+            if delta[DELTA_BASE] != base_id:
+                continue
+            chain = self.deltas[n:]
+            for previous, delta in zip(chain, chain[1:]):
+                if delta[DELTA_BASE] != previous[ID]:
+                    return None
+            if chain[-1][ID] != self.id:
+                return None
+            return chain
+        return None
+
     def published(self, details):
         """
         Update the publishing details.
@@ -292,6 +473,63 @@ class RemoteManifest(Manifest):
             report = listener.failed_reports[0]
             raise ManifestDownloadError(self.url, report.error_msg)
 
+    def fetch_deltas(self, manifest):
+        """
+        Bring the units file of a previously fetched manifest up to date by fetching
+        and applying the chain of deltas leading from it to this manifest.  On success,
+        this manifest references the updated units file and is written.
+        :param manifest: The previously fetched manifest.
+        :type manifest: Manifest
+        :return: True if the deltas were applied.  False when the chain of deltas is
+            broken or the result does not match the manifest.
+        :rtype: bool
+        :raise ManifestDownloadError: on downloading errors.
+        :raise IOError: on I/O errors.
+        :raise ValueError: on json decoding errors
+        """
+        chain = self.delta_chain(manifest.id)
+        if not chain:
+            return False
+        base_url = self.url.rsplit('/', 1)[0]
+        dir_path = os.path.dirname(self.path)
+        requests = []
+        delta_paths = []
+        for delta in chain:
+            url = pathlib.join(base_url, delta[PATH])
+            destination = pathlib.join(dir_path, DELTA_DIR, os.path.basename(delta[PATH]))
+            pathlib.mkdir(os.path.dirname(destination))
+            requests.append(DownloadRequest(str(url), destination))
+            delta_paths.append(destination)
+        listener = AggregatingEventListener()
+        self.downloader.event_listener = listener
+        self.downloader.download(requests)
+        if listener.failed_reports:
+            report = listener.failed_reports[0]
+            raise ManifestDownloadError(self.url, report.error_msg)
+        try:
+            for delta, path in zip(chain, delta_paths):
+                if os.path.getsize(path) != delta[UNITS_SIZE]:
+                    return False
+            path = manifest.units_path()
+            destination = pathlib.join(dir_path, UNITS_FILE_NAME[:-3])
+            tmp_path = destination + '.delta'
+            total = apply_deltas(path, delta_paths, tmp_path)
+            if total != self.units[UNITS_TOTAL]:
+                os.unlink(tmp_path)
+                return False
+            os.rename(tmp_path, destination)
+            if path != destination:
+                os.unlink(path)
+        finally:
+            for path in delta_paths:
+                if os.path.exists(path):
+                    os.unlink(path)
+        self.units[UNITS_PATH] = destination
+        self.units[UNITS_SIZE] = os.path.getsize(destination)
+        self.write()
+        log.debug('applied %d deltas to %s', len(chain), destination)
+        return True
+
 
 class UnitWriter(object):
     """
@@ -369,6 +607,56 @@ class UnitWriter(object):
         return False
 
 
+class UnitsFile(object):
+    """
+    A downloaded and uncompressed units file, memory mapped once so that units
+    can be read by offset without opening the file for each one.
+    :ivar path: The absolute path to the units file.
+    :type path: str
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path to the units file.
+        :type path: str
+        """
+        self.path = path
+        self._map = None
+
+    def open(self):
+        """
+        Map the file into memory.  This method is idempotent.
+        :return: The memory map of the file, or None when the file is empty.
+        :rtype: mmap.mmap
+        :raise IOError: on I/O errors.
+        """
+        if self._map is None and os.path.getsize(self.path):
+            with open(self.path, 'rb') as fp:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read(self, offset, length):
+        """
+        Read a unit from the file.
+        :param offset: The offset of the unit within the file.
+        :type offset: int
+        :param length: The length of the unit within the file.
+        :type length: int
+        :return: The json encoded unit.
+        :rtype: str
+        :raise IOError: on I/O errors.
+        """
+        return self.open()[offset:offset + length]
+
+    def close(self):
+        """
+        Unmap the file.  This method is idempotent.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
 class UnitIterator:
     """
     Used to iterate content units inventory file associated with a manifest.
@@ -378,18 +666,21 @@ class UnitIterator:
 
     @staticmethod
     def get_units(path):
-        with open(path) as fp:
-            while True:
-                begin = fp.tell()
-                json_unit = fp.readline()
-                end = fp.tell()
-                if json_unit:
-                    unit = json.loads(json_unit)
-                    length = (end - begin)
-                    ref = UnitRef(path, begin, length)
-                    yield (unit, ref)
-                else:
-                    break
+        units_file = UnitsFile(path)
+        fp = units_file.open()
+        if fp is None:
+            return
+        while True:
+            begin = fp.tell()
+            json_unit = fp.readline()
+            end = fp.tell()
+            if json_unit:
+                unit = json.loads(json_unit)
+                length = (end - begin)
+                ref = UnitRef(path, begin, length, units_file)
+                yield (unit, ref)
+            else:
+                break
 
     def __init__(self, path, total_units):
         """
@@ -420,9 +711,14 @@ class UnitRef(object):
     :type offset: int
     :ivar length: The length of a specific unit within the file.
     :type length: int
+    :ivar units_file: The (optional) mapped units file the unit is read from.
+    :type units_file: UnitsFile
     """
 
-    def __init__(self, path, offset, length):
+    # a reference is kept for every unit in the parent inventory
+    __slots__ = ('path', 'offset', 'length', 'units_file')
+
+    def __init__(self, path, offset, length, units_file=None):
         """
         :param path: The absolute path to the units file.
         :type path: str
@@ -430,10 +726,14 @@ class UnitRef(object):
         :type offset: int
         :param length: The length of a specific unit within the file.
         :type length: int
+        :param units_file: The (optional) mapped units file the unit is read from.
+            When not specified, the file is opened to read the unit.
+        :type units_file: UnitsFile
         """
         self.path = path
         self.offset = offset
         self.length = length
+        self.units_file = units_file
 
     def fetch(self):
         """
@@ -443,6 +743,8 @@ class UnitRef(object):
         :raise IOError: on I/O errors.
         :raise ValueError: json decoding errors
         """
+        if self.units_file is not None:
+            return json.loads(self.units_file.read(self.offset, self.length))
         with open(self.path) as fp:
             fp.seek(self.offset)
             json_unit = fp.read(self.length)
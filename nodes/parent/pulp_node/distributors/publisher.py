@@ -10,6 +10,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import os
+import shutil
 import tarfile
 
 from uuid import uuid4
@@ -18,7 +19,7 @@ from logging import getLogger
 
 from pulp_node import constants
 from pulp_node import pathlib
-from pulp_node.manifest import Manifest, UnitWriter
+from pulp_node.manifest import Manifest, UnitWriter, build_delta, DELTA_DIR, PATH
 
 
 log = getLogger(__name__)
@@ -128,10 +129,42 @@ class FilePublisher(Publisher):
         manifest_id = str(uuid4())
         manifest = Manifest(self.tmp_dir, manifest_id)
         manifest.units_published(writer)
+        self.publish_deltas(manifest)
         manifest.write()
         self.staged = True
         return manifest.path
 
+    def publish_deltas(self, manifest):
+        """
+        Publish the delta between the units previously published and the units
+        just written, along with the chain of deltas published with the previous
+        manifest.  This lets a child node that has the previous units fetch only
+        what changed.  Nothing is published when there are no (valid) previously
+        published units.
+        :param manifest: The manifest being published.
+        :type manifest: Manifest
+        """
+        previous = Manifest(self.publish_dir)
+        try:
+            previous.read()
+        except (IOError, ValueError):
+            return
+        if not previous.is_valid() or not previous.has_valid_units():
+            return
+        delta_dir = pathlib.join(self.tmp_dir, DELTA_DIR)
+        pathlib.mkdir(delta_dir)
+        manifest.deltas = []
+        for delta in previous.deltas:
+            path = pathlib.join(self.publish_dir, delta[PATH])
+            if os.path.exists(path):
+                shutil.copy(path, pathlib.join(self.tmp_dir, delta[PATH]))
+                manifest.deltas.append(delta)
+        delta_path = pathlib.join(delta_dir, manifest.id + '.json.gz')
+        writer = build_delta(previous.units_path(), manifest.units_path(), delta_path)
+        manifest.delta_published(previous.id, writer)
+        log.debug('published delta of %d units from manifest %s', writer.total_units,
+                  previous.id)
+
     def publish_unit(self, unit):
         """
         Publish the file associated with the unit into the publish directory.
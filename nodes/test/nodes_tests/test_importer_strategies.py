@@ -9,7 +9,7 @@ from mock import Mock, patch
 from pulp.plugins.model import Unit
 from pulp.server.config import config as pulp_conf
 
-from pulp_node import constants, error
+from pulp_node import constants, error, manifest
 from pulp_node.importers import strategies
 from pulp_node.importers.inventory import UnitInventory
 from pulp_node.importers.reports import SummaryReport, ProgressListener
@@ -80,6 +80,16 @@ MANIFEST_ERROR = error.ManifestDownloadError('http://redhat.com/manifest', DOWNL
 UNIT_ERROR = error.UnitDownloadError('http://redhat.com/unit', REPO_ID, DOWNLOADER_ERROR_REPORT)
 
 
+class TestManifestDir(TestCase):
+
+    @patch('pulp_node.importers.strategies.pulp_conf')
+    def test_manifest_dir(self, mock_conf):
+        mock_conf.get.return_value = '/var/lib/pulp'
+        path = strategies.manifest_dir(REPO_ID)
+        mock_conf.get.assert_called_once_with('server', 'storage_dir')
+        self.assertEqual(path, '/var/lib/pulp/nodes/manifests/' + REPO_ID)
+
+
 class TestBase(TestCase):
 
     @classmethod
@@ -93,6 +103,11 @@ class TestBase(TestCase):
     def setUp(self):
         super(TestBase, self).setUp()
         self.tmp_dir = mkdtemp()
+        self.manifest_dir = os.path.join(self.tmp_dir, 'manifests', REPO_ID)
+        patcher = patch('pulp_node.importers.strategies.manifest_dir',
+                        return_value=self.manifest_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def tearDown(self):
         super(TestBase, self).tearDown()
@@ -242,6 +257,112 @@ class TestBase(TestCase):
         self.assertEqual(request.cancel_event.call_count, 2)
         self.assertFalse(mock_download.called)
 
+    def test_fetch_deltas(self):
+        # Setup
+        request = self.request()
+        manifest = Mock(id='123')
+        fetched_manifest = Mock()
+        strategy = strategies.ImporterStrategy()
+        # Test
+        fetched = strategy._fetch_deltas(request, manifest, fetched_manifest)
+        # Verify
+        self.assertTrue(fetched)
+        fetched_manifest.fetch_deltas.assert_called_once_with(manifest)
+
+    def test_fetch_deltas_no_manifest(self):
+        # Setup
+        request = self.request()
+        manifest = Mock(id=None)
+        fetched_manifest = Mock()
+        strategy = strategies.ImporterStrategy()
+        # Test
+        fetched = strategy._fetch_deltas(request, manifest, fetched_manifest)
+        # Verify
+        self.assertFalse(fetched)
+        self.assertFalse(fetched_manifest.fetch_deltas.called)
+
+    def test_fetch_deltas_failed(self):
+        # Setup
+        request = self.request()
+        manifest = Mock(id='123')
+        fetched_manifest = Mock()
+        fetched_manifest.fetch_deltas.side_effect = MANIFEST_ERROR
+        strategy = strategies.ImporterStrategy()
+        # Test
+        fetched = strategy._fetch_deltas(request, manifest, fetched_manifest)
+        # Verify
+        self.assertFalse(fetched)
+
+    def download(self, requests):
+        for request in requests:
+            shutil.copy(request.url[len('file://'):], request.destination)
+
+    def publish(self, parent_dir, manifest_id, units, base_id=None):
+        units_path = os.path.join(parent_dir, manifest.UNITS_FILE_NAME)
+        previous_path = os.path.join(parent_dir, 'previous.json.gz')
+        if base_id:
+            os.rename(units_path, previous_path)
+        with manifest.UnitWriter(units_path) as writer:
+            for unit in units:
+                writer.add(unit)
+        published = manifest.Manifest(parent_dir, manifest_id)
+        published.units_published(writer)
+        published.published({constants.BASE_URL: BASE_URL})
+        if base_id:
+            delta_path = os.path.join(parent_dir, manifest.DELTA_DIR, manifest_id + '.json.gz')
+            published.delta_published(
+                base_id, manifest.build_delta(previous_path, units_path, delta_path))
+        published.write()
+        return published
+
+    def sync_request(self, published, task_id):
+        working_dir = os.path.join(self.tmp_dir, task_id)
+        os.makedirs(working_dir)
+        request = strategies.Request(
+            CancelEvent(0),
+            conduit=TestConduit(),
+            config={constants.MANIFEST_URL_KEYWORD: 'file://%s' % published.path},
+            downloader=Mock(download=self.download),
+            progress=Mock(),
+            summary=SummaryReport(),
+            repo=TestRepo(REPO_ID, working_dir))
+        return request
+
+    @staticmethod
+    def parent_keys(inventory):
+        return sorted(unit['unit_key']['n'] for unit, ref in inventory.units_on_parent_only())
+
+    @patch('pulp_node.manifest.AggregatingEventListener')
+    @patch('pulp_node.conduit.NodesConduit.get_units', return_value=[])
+    def test_unit_inventory_deltas(self, mock_get_units, mock_listener):
+        """
+        The units fetched by a synchronization are updated using deltas by the next one,
+        although each synchronization task has its own working directory.
+        """
+        mock_listener.return_value.failed_reports = []
+        parent_dir = os.path.join(self.tmp_dir, 'parent')
+        os.makedirs(os.path.join(parent_dir, manifest.DELTA_DIR))
+        units = [dict(type_id='T', unit_key={'n': n}) for n in range(0, 3)]
+        strategy = strategies.ImporterStrategy()
+        # first synchronization
+        published = self.publish(parent_dir, 'A', units[:2])
+        request = self.sync_request(published, 'task_1')
+        inventory = strategy._unit_inventory(request)
+        self.assertEqual(self.parent_keys(inventory), [0, 1])
+        shutil.rmtree(request.working_dir)
+        # second synchronization
+        published = self.publish(parent_dir, 'B', units[1:], base_id='A')
+        request = self.sync_request(published, 'task_2')
+        with patch('pulp_node.manifest.RemoteManifest.fetch_units') as mock_fetch_units:
+            with patch('pulp_node.manifest.RemoteManifest.fetch_deltas',
+                       autospec=True,
+                       side_effect=manifest.RemoteManifest.fetch_deltas) as mock_fetch_deltas:
+                inventory = strategy._unit_inventory(request)
+        # validation
+        self.assertTrue(mock_fetch_deltas.called)
+        self.assertFalse(mock_fetch_units.called)
+        self.assertEqual(self.parent_keys(inventory), [1, 2])
+
     def test_needs_update(self):
         # Setup
         path = os.path.join(self.tmp_dir, 'unit_1')
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+from pulp_node import constants
+from pulp_node.importers.inventory import UnitInventory, unit_digest
+
+
+class TestUnitRef(object):
+
+    def __init__(self, unit):
+        self.unit = unit
+
+    def fetch(self):
+        return dict(self.unit)
+
+
+def unit(n, last_updated=0, unit_id=None):
+    return {
+        'type_id': 'T',
+        'unit_id': unit_id or str(n),
+        'unit_key': {'name': 'u%d' % n, 'version': n},
+        'metadata': {'size': n},
+        constants.LAST_UPDATED: last_updated,
+    }
+
+
+class TestUnitInventory(TestCase):
+
+    def inventory(self, parent_units, child_units):
+        parent_units = [(u, TestUnitRef(u)) for u in parent_units]
+        return UnitInventory('http://parent', parent_units, child_units)
+
+    def test_unit_digest(self):
+        key = {'a': 1, 'b': u'2', 'c': '3'}
+        same = {'c': u'3', 'b': '2', 'a': 1}
+        self.assertEqual(unit_digest(dict(type_id='T', unit_key=key)),
+                         unit_digest(dict(type_id='T', unit_key=same)))
+        self.assertNotEqual(unit_digest(dict(type_id='T', unit_key=key)),
+                            unit_digest(dict(type_id='X', unit_key=key)))
+
+    def test_units_on_parent_only(self):
+        inventory = self.inventory([unit(1), unit(2)], [unit(2)])
+        # test
+        units = inventory.units_on_parent_only()
+        # validation
+        self.assertEqual(len(units), 1)
+        parent_unit, ref = units[0]
+        self.assertEqual(parent_unit['unit_key'], unit(1)['unit_key'])
+        self.assertFalse('metadata' in parent_unit)
+        self.assertEqual(ref.fetch()['metadata'], {'size': 1})
+
+    def test_units_on_child_only(self):
+        inventory = self.inventory([unit(2)], [unit(1, unit_id='abc'), unit(2)])
+        # test
+        units = inventory.units_on_child_only()
+        # validation
+        self.assertEqual(units, [dict(type_id='T', unit_key=unit(1)['unit_key'], unit_id='abc')])
+
+    def test_updated_units(self):
+        parent_units = [unit(1, 20), unit(2, 10), unit(3, 10)]
+        child_units = [unit(1, 10), unit(2, 10), unit(3, None)]
+        inventory = self.inventory(parent_units, child_units)
+        # test
+        units = inventory.updated_units()
+        # validation
+        keys = sorted(u['unit_key']['version'] for u, r in units)
+        self.assertEqual(keys, [1, 3])
+
+    def test_duplicates(self):
+        inventory = self.inventory([unit(1, 10), unit(1, 30)], [unit(1, 20), unit(1, 5)])
+        # test
+        units = inventory.updated_units()
+        # validation
+        self.assertEqual(len(units), 1)
+        self.assertEqual(units[0][0][constants.LAST_UPDATED], 30)
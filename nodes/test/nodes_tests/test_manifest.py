@@ -5,6 +5,7 @@ import shutil
 import tempfile
 from unittest import TestCase
 
+from mock import Mock, patch
 from nectar.config import DownloaderConfig
 from nectar.downloaders.local import LocalFileDownloader
 
@@ -120,3 +121,161 @@ class TestManifest(TestCase):
             _unit = ref.fetch()
             self.assertEqual(unit, _unit)
         self.verify(units, units_in)
+
+
+class TestUnitIterator(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'units')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_units(self):
+        units = [dict(unit_id=i, type_id='T', unit_key={'n': i}) for i in range(0, 3)]
+        with open(self.path, 'w') as fp:
+            for unit in units:
+                fp.write(json.dumps(unit))
+                fp.write('\n')
+        # test
+        units_in = list(manifest.UnitIterator(self.path, len(units)))
+        # validation
+        self.assertEqual([u for u, r in units_in], units)
+        units_file = units_in[0][1].units_file
+        for unit, ref in units_in:
+            self.assertTrue(ref.units_file is units_file)
+            self.assertEqual(ref.fetch(), unit)
+            self.assertEqual(manifest.UnitRef(ref.path, ref.offset, ref.length).fetch(), unit)
+        units_file.close()
+
+    def test_get_units_empty(self):
+        open(self.path, 'w').close()
+        self.assertEqual(list(manifest.UnitIterator(self.path, 0)), [])
+
+
+class TestDeltas(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, units):
+        path = os.path.join(self.tmp_dir, name)
+        with manifest.UnitWriter(path) as writer:
+            for unit in units:
+                writer.add(unit)
+        return writer
+
+    def test_build_and_apply(self):
+        units = [dict(type_id='T', unit_key={'n': n}, metadata={'v': 0}) for n in range(0, 4)]
+        previous_path = self.write('previous.json.gz', units).path
+        units = [dict(u) for u in units]
+        units[1]['metadata'] = {'v': 1}
+        del units[2]
+        units.append(dict(type_id='T', unit_key={'n': 4}, metadata={'v': 0}))
+        path = self.write('units.json.gz', units).path
+        delta_path = os.path.join(self.tmp_dir, 'delta.json.gz')
+        # test
+        writer = manifest.build_delta(previous_path, path, delta_path)
+        destination = os.path.join(self.tmp_dir, 'units.json')
+        total = manifest.apply_deltas(previous_path, [delta_path], destination)
+        # validation
+        actions = sorted(u[manifest.DELTA_ACTION] for u in manifest.read_units(delta_path))
+        self.assertEqual(actions, ['added', 'removed', 'updated'])
+        self.assertEqual(writer.total_units, 3)
+        self.assertEqual(writer.bytes_written, os.path.getsize(delta_path))
+        self.assertEqual(total, len(units))
+        units_in = sorted(manifest.read_units(destination), key=lambda u: u['unit_key']['n'])
+        self.assertEqual(units_in, units)
+
+    def test_build_unchanged(self):
+        units = [dict(type_id='T', unit_key={'n': n}) for n in range(0, 2)]
+        previous_path = self.write('previous.json.gz', units).path
+        path = self.write('units.json.gz', reversed(units)).path
+        delta_path = os.path.join(self.tmp_dir, 'delta.json.gz')
+        # test
+        writer = manifest.build_delta(previous_path, path, delta_path)
+        # validation
+        self.assertEqual(writer.total_units, 0)
+
+    def download(self, requests):
+        for request in requests:
+            shutil.copy(request.url[len('file://'):], request.destination)
+
+    @patch('pulp_node.manifest.AggregatingEventListener')
+    def test_fetch_deltas(self, listener):
+        listener.return_value.failed_reports = []
+        parent_dir = os.path.join(self.tmp_dir, 'parent')
+        child_dir = os.path.join(self.tmp_dir, 'child')
+        os.makedirs(os.path.join(parent_dir, manifest.DELTA_DIR))
+        os.makedirs(child_dir)
+        units = [dict(type_id='T', unit_key={'n': n}) for n in range(0, 3)]
+        # previously fetched
+        previous = manifest.Manifest(child_dir, 'A')
+        previous.units_published(self.write('child/units.json.gz', units[:2]))
+        previous.write()
+        # published
+        writer = self.write('parent/units.json.gz', units[1:])
+        published = manifest.Manifest(parent_dir, 'B')
+        published.units_published(writer)
+        delta_path = os.path.join(parent_dir, manifest.DELTA_DIR, 'B.json.gz')
+        published.delta_published(
+            'A', manifest.build_delta(previous.units_path(), writer.path, delta_path))
+        published.write()
+        # test
+        url = 'file://%s' % published.path
+        downloader = Mock(download=self.download)
+        fetched = manifest.RemoteManifest(url, downloader, child_dir)
+        fetched.fetch()
+        applied = fetched.fetch_deltas(previous)
+        # validation
+        self.assertTrue(applied)
+        self.assertTrue(fetched.has_valid_units())
+        self.assertEqual([u for u, r in fetched.get_units()], units[1:])
+        self.assertFalse(os.path.exists(previous.units_path()))
+        self.assertEqual(os.listdir(os.path.join(child_dir, manifest.DELTA_DIR)), [])
+
+    def test_fetch_deltas_no_chain(self):
+        previous = manifest.Manifest(self.tmp_dir, 'A')
+        fetched = manifest.RemoteManifest('file:///manifest.json', Mock(), self.tmp_dir)
+        self.assertFalse(fetched.fetch_deltas(previous))
+        self.assertFalse(fetched.downloader.download.called)
+
+    def test_delta_chain(self):
+        m = manifest.Manifest(self.tmp_dir, 'C')
+        m.deltas = [
+            {manifest.DELTA_BASE: 'A', manifest.ID: 'B'},
+            {manifest.DELTA_BASE: 'B', manifest.ID: 'C'},
+        ]
+        self.assertEqual(m.delta_chain('A'), m.deltas)
+        self.assertEqual(m.delta_chain('B'), m.deltas[1:])
+        self.assertEqual(m.delta_chain('X'), None)
+        # broken
+        m.deltas[0][manifest.ID] = 'X'
+        self.assertEqual(m.delta_chain('A'), None)
+        # does not lead to this manifest
+        m.id = 'D'
+        self.assertEqual(m.delta_chain('B'), None)
+
+    def test_delta_published(self):
+        m = manifest.Manifest(self.tmp_dir, 'B')
+        m.deltas = [{manifest.DELTA_BASE: str(n), manifest.ID: str(n)}
+                    for n in range(0, manifest.MAX_DELTAS)]
+        writer = manifest.UnitWriter(os.path.join(self.tmp_dir, 'B.json.gz'))
+        writer.close()
+        # test
+        m.delta_published('A', writer)
+        m.write()
+        m.read()
+        # validation
+        self.assertEqual(len(m.deltas), manifest.MAX_DELTAS)
+        self.assertEqual(m.deltas[-1], {
+            manifest.DELTA_BASE: 'A',
+            manifest.ID: 'B',
+            manifest.PATH: 'deltas/B.json.gz',
+            manifest.UNITS_TOTAL: 0,
+            manifest.UNITS_SIZE: writer.bytes_written,
+        })
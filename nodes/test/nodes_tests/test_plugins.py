@@ -16,6 +16,7 @@ from nectar.config import DownloaderConfig
 from pulp_node.distributors.http.distributor import (NodesHttpDistributor,
                                                      entry_point as dist_entry_point)
 from pulp_node.importers.http.importer import NodesHttpImporter, entry_point as imp_entry_point
+from pulp_node.importers.strategies import MANIFEST_DIR
 from pulp_node.profilers.nodes import NodeProfiler, entry_point as profiler_entry_point
 from pulp_node.handlers.handler import NodeHandler, RepositoryHandler
 
@@ -602,6 +603,17 @@ class ImporterTest(PluginTestBase):
         self.assertTrue('node' in md['types'])
         self.assertTrue('repository' in md['types'])
 
+    @patch('pulp_node.importers.http.importer.shutil.rmtree')
+    def test_importer_removed(self, mock_rmtree):
+        # Test
+        importer = NodesHttpImporter()
+        repo = plugin_model.Repository(self.REPO_ID)
+        with mock_config.patch({'server': {'storage_dir': self.childfs}}):
+            importer.importer_removed(repo, {})
+        # Verify
+        mock_rmtree.assert_called_once_with(
+            os.path.join(self.childfs, MANIFEST_DIR, self.REPO_ID), ignore_errors=True)
+
     def test_valid_config(self):
         # Test
         importer = NodesHttpImporter()
@@ -707,8 +719,10 @@ class ImporterTest(PluginTestBase):
             units_path = os.path.join(os.path.dirname(manifest_path), UNITS_FILE_NAME)
             manifest = Manifest(manifest_path)
             manifest.read()
-            shutil.copy(manifest_path, os.path.join(working_dir, MANIFEST_FILE_NAME))
-            shutil.copy(units_path, os.path.join(working_dir, UNITS_FILE_NAME))
+            cached_dir = os.path.join(self.childfs, MANIFEST_DIR, self.REPO_ID)
+            os.makedirs(cached_dir)
+            shutil.copy(manifest_path, os.path.join(cached_dir, MANIFEST_FILE_NAME))
+            shutil.copy(units_path, os.path.join(cached_dir, UNITS_FILE_NAME))
             # Test
             importer = NodesHttpImporter()
             manifest_url = pathlib.url_join(publisher.base_url, manifest_path)
@@ -748,7 +762,9 @@ class ImporterTest(PluginTestBase):
             manifest_path = publisher.manifest_path()
             manifest = Manifest(manifest_path)
             manifest.read()
-            shutil.copy(manifest_path, os.path.join(working_dir, MANIFEST_FILE_NAME))
+            cached_dir = os.path.join(self.childfs, MANIFEST_DIR, self.REPO_ID)
+            os.makedirs(cached_dir)
+            shutil.copy(manifest_path, os.path.join(cached_dir, MANIFEST_FILE_NAME))
             # Test
             importer = NodesHttpImporter()
             manifest_url = pathlib.url_join(publisher.base_url, manifest_path)
@@ -787,8 +803,10 @@ class ImporterTest(PluginTestBase):
             manifest_path = publisher.manifest_path()
             manifest = Manifest(manifest_path)
             manifest.read()
-            shutil.copy(manifest_path, os.path.join(working_dir, MANIFEST_FILE_NAME))
-            with open(os.path.join(working_dir, UNITS_FILE_NAME), 'w+') as fp:
+            cached_dir = os.path.join(self.childfs, MANIFEST_DIR, self.REPO_ID)
+            os.makedirs(cached_dir)
+            shutil.copy(manifest_path, os.path.join(cached_dir, MANIFEST_FILE_NAME))
+            with open(os.path.join(cached_dir, UNITS_FILE_NAME), 'w+') as fp:
                 fp.write('invalid-units')
             # Test
             importer = NodesHttpImporter()
@@ -9,7 +9,7 @@ from nectar.downloaders.local import LocalFileDownloader
 
 from pulp_node import constants, pathlib
 from pulp_node.distributors.http.publisher import HttpPublisher
-from pulp_node.manifest import RemoteManifest
+from pulp_node.manifest import Manifest, RemoteManifest, read_units, DELTA_ACTION
 
 
 class TestHttp(TestCase):
@@ -136,3 +136,31 @@ class TestHttp(TestCase):
             p.publish(units)
         # verify
         self.assertFalse(os.path.exists(p.tmp_dir))
+
+    def test_publish_deltas(self):
+        # setup
+        units = self.populate()
+        repo_id = 'test_repo'
+        base_url = 'file://'
+        publish_dir = os.path.join(self.tmpdir, 'nodes/repos')
+        repo_publish_dir = os.path.join(publish_dir, repo_id)
+        virtual_host = (publish_dir, publish_dir)
+        manifests = []
+        # test
+        for n in range(0, 3):
+            with HttpPublisher(base_url, virtual_host, repo_id, repo_publish_dir) as p:
+                manifest = Manifest(p.publish(units[:n + 1]))
+                manifest.read()
+                manifests.append(manifest.id)
+                p.commit()
+        # verify
+        manifest = Manifest(repo_publish_dir)
+        manifest.read()
+        self.assertEqual(len(manifest.deltas), 2)
+        chain = manifest.delta_chain(manifests[0])
+        self.assertEqual(chain, manifest.deltas)
+        self.assertEqual(chain[1]['base'], manifests[1])
+        delta = list(read_units(pathlib.join(repo_publish_dir, chain[1]['path'])))
+        self.assertEqual(len(delta), 1)
+        self.assertEqual(delta[0]['unit_key'], {'n': 2})
+        self.assertEqual(delta[0][DELTA_ACTION], 'added')
@@ -19,13 +19,17 @@ from ConfigParser import NoOptionError, SafeConfigParser, NoSectionError
 
 from rhsm import certificate
 
-from pulp.repoauth.protected_repo_utils import ProtectedRepoUtils
+from pulp.repoauth import cache
+from pulp.repoauth.protected_repo_utils import ProtectedRepoIndex, ProtectedRepoUtils
 from pulp.repoauth.repo_cert_utils import RepoCertUtils
 
 # This needs to be accessible on both Pulp and the CDS instances, so a
 # separate config file for repo auth purposes is used.
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# The validator built from the configuration, built again when the file changes
+_validators = cache.FileCache('OID validator')
+
 
 def authenticate(environ, config=None):
     '''
@@ -37,7 +41,10 @@ def authenticate(environ, config=None):
     wsgi_error_logger = environ["wsgi.errors"].write
 
     if config is None:
-        config = _config()
+        validator = _validators.get(CONFIG_FILENAME, [CONFIG_FILENAME], _cached_validator)
+        config = validator.config
+    else:
+        validator = OidValidator(config)
 
     # Attempt to retrieve the client certificate, and if it isn't available, reject.
     cert_pem = ''
@@ -56,7 +63,6 @@ def authenticate(environ, config=None):
             wsgi_error_logger(error)
         return False
 
-    validator = OidValidator(config)
     valid = validator.is_valid(environ["REQUEST_URI"], cert_pem, wsgi_error_logger)
     return valid
 
@@ -67,12 +73,33 @@ def _config():
     return config
 
 
+def _cached_validator():
+    """
+    :return: a validator for the configuration file, which caches what it reads from disk
+    :rtype:  OidValidator
+    """
+    return OidValidator(_config(), cached=True)
+
+
 class OidValidator:
-    def __init__(self, config):
+    def __init__(self, config, cached=False):
+        """
+        :param config: repo auth configuration
+        :type  config: ConfigParser.SafeConfigParser
+        :param cached: when True, the protected repo listings and CA certificates are cached
+                       until their files change, and verdicts are cached for each client
+                       certificate and requested URL
+        :type  cached: bool
+        """
         self.config = config
         self.repo_cert_utils = RepoCertUtils(config)
         self.protected_repo_utils = ProtectedRepoUtils(config)
         self.repo_url_prefixes = self._get_repo_url_prefixes_from_config(config)
+        self.files = None
+        self.verdicts = None
+        if cached:
+            self.files = cache.FileCache('Protected repo and CA certificate')
+            self.verdicts = cache.VerdictCache('OID verdict')
 
     def is_valid(self, dest, cert_pem, log_func):
         '''
@@ -94,14 +121,50 @@ class OidValidator:
         repo_bundle = self._matching_repo_bundle(dest, self.repo_url_prefixes)
         # Load the global repo auth cert bundle and check it's CA against the client cert
         # if it didn't already pass the individual auth check
-        global_bundle = self.repo_cert_utils.read_global_cert_bundle(log_func=log_func,
-                                                                     pieces=['ca'])
+        global_bundle = self._read_global_cert_bundle(log_func)
         # If there were neither global nor repo auth credentials, auth passes.
         if global_bundle is None and repo_bundle is None:
             if self.repo_cert_utils.log_failed_cert_verbose:
                 log_func('No global bundle or repo bundle found. Allowing request.')
             return True
 
+        if self.verdicts is None:
+            return self._check_certificate(dest, cert_pem, log_func, verify_ssl, repo_bundle,
+                                           global_bundle)
+
+        # The entitlements are checked against the whole destination, so a verdict only applies
+        # to that destination, for as long as the credentials it was checked against.
+        key = (cache.fingerprint(cert_pem), dest,
+               repo_bundle and repo_bundle['ca'], global_bundle and global_bundle['ca'])
+        is_valid = self.verdicts.get(key)
+        if is_valid is None:
+            is_valid = self._check_certificate(dest, cert_pem, log_func, verify_ssl, repo_bundle,
+                                               global_bundle)
+            self.verdicts.set(key, is_valid)
+        elif not is_valid:
+            log_func('Request denied to destination [%s]' % dest)
+        return is_valid
+
+    def _check_certificate(self, dest, cert_pem, log_func, verify_ssl, repo_bundle,
+                           global_bundle):
+        """
+        Checks the client certificate against the CA certificates and the requested destination.
+
+        :param dest: destination URL trying to be accessed
+        :type  dest: str
+        :param cert_pem: PEM encoded client certificate sent with the request
+        :type  cert_pem: str
+        :param log_func: function used for logging
+        :type  log_func: callable taking 1 argument of type basestring
+        :param verify_ssl: whether the client certificate signature is verified
+        :type  verify_ssl: bool
+        :param repo_bundle: consumer cert bundle of the requested repo, if it is protected
+        :type  repo_bundle: dict or None
+        :param global_bundle: global repo auth cert bundle, if there is one
+        :type  global_bundle: dict or None
+        :return: True iff request is authorized, else False
+        :rtype:  bool
+        """
         if verify_ssl:
             passes_individual_ca = False
             if repo_bundle is not None:
@@ -145,8 +208,8 @@ class OidValidator:
 
     def _matching_repo_bundle(self, dest, repo_url_prefixes):
 
-        # Load the path -> repo ID mappings
-        prot_repos = self.protected_repo_utils.read_protected_repo_listings()
+        # Load the index of protected relative paths
+        prot_repos = self._read_protected_repo_index()
 
         repo_id = None
         for prefix in repo_url_prefixes:
@@ -155,16 +218,9 @@ class OidValidator:
             #   Repo Portion: /my-repo/pulp/fedora-13/i386/repodata/repomd.xml
             repo_url = dest[dest.find(prefix) + len(prefix):]
 
-            # If the repo portion of the URL starts with any of the protected relative URLs,
+            # If the repo portion of the URL contains any of the protected relative URLs,
             # it is considered to be a request against that protected repo
-            for relative_repo_url in prot_repos.keys():
-
-                # Relative URL is inconsistent in Pulp, so a simple "startswith" tends to
-                # break. Changing this to a find helps remove issues where the leading /
-                # is missing, present, or duplicated.
-                if repo_url.find(relative_repo_url) != -1:
-                    repo_id = prot_repos[relative_repo_url]
-                    break
+            repo_id = prot_repos.match(repo_url)
 
             # break out of checking URLs once we find a matching repo id
             if repo_id:
@@ -173,8 +229,43 @@ class OidValidator:
         # if we did not find a repo, return None
         if not repo_id:
             return None
-        bundle = self.repo_cert_utils.read_consumer_cert_bundle(repo_id, ['ca'])
-        return bundle
+        if self.files is None:
+            return self.repo_cert_utils.read_consumer_cert_bundle(repo_id, ['ca'])
+        path = self.repo_cert_utils.consumer_cert_bundle_path(repo_id, 'ca')
+        return self.files.get(('consumer', repo_id), [path],
+                              lambda: self.repo_cert_utils.read_consumer_cert_bundle(repo_id,
+                                                                                     ['ca']))
+
+    def _read_protected_repo_index(self):
+        """
+        :return: index of the protected relative paths, built again when the listing changes
+        :rtype:  pulp.repoauth.protected_repo_utils.ProtectedRepoIndex
+        """
+        if self.files is None:
+            return self._build_protected_repo_index()
+        path = self.config.get('repos', 'protected_repo_listing_file')
+        return self.files.get('listings', [path], self._build_protected_repo_index)
+
+    def _build_protected_repo_index(self):
+        """
+        :return: index of the protected relative paths
+        :rtype:  pulp.repoauth.protected_repo_utils.ProtectedRepoIndex
+        """
+        return ProtectedRepoIndex(self.protected_repo_utils.read_protected_repo_listings())
+
+    def _read_global_cert_bundle(self, log_func):
+        """
+        :param log_func: function used for logging
+        :type  log_func: callable taking 1 argument of type basestring
+        :return: the CA of the global repo auth cert bundle, or None if there is none
+        :rtype:  dict
+        """
+        if self.files is None:
+            return self.repo_cert_utils.read_global_cert_bundle(log_func=log_func, pieces=['ca'])
+        path = self.repo_cert_utils.global_cert_bundle_path('ca')
+        return self.files.get('global', [path],
+                              lambda: self.repo_cert_utils.read_global_cert_bundle(
+                                  log_func=log_func, pieces=['ca']))
 
     def _check_extensions(self, cert_pem, dest, log_func, repo_url_prefixes):
         """
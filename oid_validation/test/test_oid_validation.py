@@ -51,6 +51,7 @@ class TestOidValidation(unittest.TestCase):
     def setUp(self):
         self.config = SafeConfigParser()
         self.config.read(CONFIG_FILENAME)
+        oid_validation._validators.clear()
 
     def print_debug(self):
         valid_ca = X509.load_cert_string(VALID_CA)
@@ -655,6 +656,64 @@ class TestOidValidation(unittest.TestCase):
         self.assertTrue(response_y)
         self.assertTrue(response_xx)
 
+    @mock.patch(
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_consumer_cert_bundle')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_global_cert_bundle')
+    def test_cached_verdicts(self, mock_read_global_bundle, mock_read_bundle,
+                             mock_read_listings):
+        """
+        The cached validator reads the listings and bundles once, and reuses the verdict for
+        requests from the same client to the same destination.
+        """
+        mock_read_global_bundle.return_value = None
+        mock_read_listings.return_value = {'/pulp/pulp/fedora-14/x86_64': 'repo-x'}
+        mock_read_bundle.return_value = {'ca': INVALID_CA, 'key': ANYKEY, 'cert': ANYCERT}
+        validator = oid_validation.OidValidator(self.config, cached=True)
+        validator._check_certificate = mock.Mock(return_value=False)
+        log_func = mock.Mock()
+        dest = '/pulp/repos/pulp/pulp/fedora-14/x86_64/a.rpm'
+
+        self.assertFalse(validator.is_valid(dest, FULL_CLIENT_CERT, log_func))
+        self.assertFalse(validator.is_valid(dest, FULL_CLIENT_CERT, log_func))
+
+        self.assertEqual(1, validator._check_certificate.call_count)
+        self.assertEqual(1, mock_read_listings.call_count)
+        self.assertEqual(1, mock_read_bundle.call_count)
+        log_func.assert_called_once_with('Request denied to destination [%s]' % dest)
+
+    @mock.patch(
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_global_cert_bundle')
+    def test_cached_verdicts_sibling_paths(self, mock_read_global_bundle, mock_read_listings):
+        """
+        A verdict cached for a destination is not reused for another destination in the same
+        directory, which the client may not be entitled to.
+        """
+        mock_read_global_bundle.return_value = {'ca': VALID_CA, 'key': ANYKEY, 'cert': ANYCERT}
+        mock_read_listings.return_value = {}
+        validator = oid_validation.OidValidator(self.config, cached=True)
+        validator._check_certificate = mock.Mock(side_effect=[True, False])
+        log_func = mock.Mock()
+
+        self.assertTrue(validator.is_valid('/pulp/repos/foo', FULL_CLIENT_CERT, log_func))
+        self.assertFalse(validator.is_valid('/pulp/repos/bar', FULL_CLIENT_CERT, log_func))
+        self.assertTrue(validator.is_valid('/pulp/repos/foo', FULL_CLIENT_CERT, log_func))
+        self.assertFalse(validator.is_valid('/pulp/repos/bar', FULL_CLIENT_CERT, log_func))
+
+        self.assertEqual(2, validator._check_certificate.call_count)
+
+    @mock.patch("pulp.oid_validation.oid_validation._config")
+    @mock.patch("pulp.oid_validation.oid_validation.OidValidator")
+    def test_authenticate_caches_validator(self, mock_validator, mock_config):
+        environ = mock_environ(FULL_CLIENT_CERT, 'https://nowhere/path/to')
+
+        oid_validation.authenticate(environ)
+        oid_validation.authenticate(environ)
+
+        mock_validator.assert_called_once_with(mock_config.return_value, cached=True)
+        self.assertEqual(2, mock_validator.return_value.is_valid.call_count)
+
     @mock.patch("pulp.oid_validation.oid_validation._config")
     @mock.patch("pulp.oid_validation.oid_validation.OidValidator")
     def test_authenticate_loads_config(self, mock_validator, mock_config):
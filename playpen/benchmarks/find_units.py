@@ -0,0 +1,121 @@
+#!/usr/bin/env python2
+"""
+Compare looking up units by unit key with a $or of unit keys, as find_units used to do, with
+the $in on the indexed unit key digest used by find_units now.
+
+A synthetic unit collection is seeded in a scratch database (pulp_find_units_benchmark by
+default, never the real pulp database), and both implementations are timed while looking up
+a set of units of which only a fraction exists, as when a sync checks the units listed in the
+upstream metadata.
+
+    ./find_units.py --units 100000 --existing 0.9
+
+Pass --keep to reuse an already seeded database on the next run.
+"""
+
+import argparse
+import random
+import time
+
+import mongoengine
+
+from pulp.plugins.util import misc
+from pulp.server.controllers import units as units_controller
+from pulp.server.db import connection, model
+
+
+SEED_BATCH = 10000
+
+
+class BenchmarkUnit(model.ContentUnit):
+    name = mongoengine.StringField(required=True)
+    version = mongoengine.StringField(required=True)
+    arch = mongoengine.StringField(required=True)
+    _content_type_id = mongoengine.StringField(required=True, default='benchmark_find_units')
+
+    unit_key_fields = ('name', 'version', 'arch')
+
+    meta = {'collection': 'units_benchmark_find_units',
+            'indexes': [{'fields': unit_key_fields, 'unique': True}],
+            'allow_inheritance': False}
+
+
+def unit_key(i):
+    return {'name': 'package-%d' % (i // 4), 'version': '1.%d' % (i % 4), 'arch': 'x86_64'}
+
+
+def seed(num_units):
+    collection = BenchmarkUnit._get_collection()
+    collection.drop()
+    BenchmarkUnit.ensure_indexes()
+    batch = []
+    for i in xrange(num_units):
+        document = unit_key(i)
+        document.update({'_id': 'unit-%d' % i, '_last_updated': 0,
+                         '_content_type_id': 'benchmark_find_units',
+                         '_unit_key_digest': model.ContentUnit.digest_unit_key(unit_key(i))})
+        batch.append(document)
+        if len(batch) >= SEED_BATCH:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def find_units_or(units, pagination_size=50):
+    """
+    The original implementation: a $or of the unit keys of each page of units.
+    """
+    for units_group in misc.paginate(units, pagination_size):
+        q_object = mongoengine.Q()
+        for unit in units_group:
+            q_object = q_object | mongoengine.Q(**unit.unit_key)
+        for found_unit in BenchmarkUnit.objects(q_object):
+            yield found_unit
+
+
+def find_units_digest(units):
+    return units_controller.find_units(units)
+
+
+def timed(label, func, units):
+    start = time.time()
+    found = sum(1 for unit in func(units))
+    elapsed = time.time() - start
+    print '%-8s %10d found %10.2f seconds' % (label, found, elapsed)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='pulp_find_units_benchmark')
+    parser.add_argument('--units', type=int, default=100000)
+    parser.add_argument('--existing', type=float, default=0.9,
+                        help='fraction of the looked up units that exist in the database')
+    parser.add_argument('--keep', action='store_true', help='do not reseed the database')
+    parser.add_argument('--skip-old', action='store_true',
+                        help='only time the digest implementation')
+    args = parser.parse_args()
+
+    connection.initialize(name=args.db)
+
+    if not args.keep:
+        start = time.time()
+        seed(args.units)
+        print 'seeded %d units in %.2f seconds' % (args.units, time.time() - start)
+
+    # Units that are not in the database are numbered past the seeded ones.
+    missing = int(args.units * (1 - args.existing))
+    numbers = range(args.units - missing) + range(args.units, args.units + missing)
+    random.shuffle(numbers)
+    units = [BenchmarkUnit(**unit_key(i)) for i in numbers]
+
+    new = timed('$in', find_units_digest, units)
+    if not args.skip_old:
+        old = timed('$or', find_units_or, units)
+        assert old == new, 'implementations disagree: %d != %d' % (old, new)
+
+
+if __name__ == '__main__':
+    main()
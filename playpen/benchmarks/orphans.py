@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+"""
+Compare the per-unit orphan search with the paginated set-based search used by the
+OrphanManager.
+
+A synthetic unit collection is seeded in a scratch database (pulp_orphan_benchmark by default,
+never the real pulp database), a fraction of the units is associated with a handful of
+repositories, and both implementations are timed while counting the orphans.
+
+    ./orphans.py --units 1000000 --associated 0.9
+
+Pass --keep to reuse an already seeded database on the next run.
+"""
+
+import argparse
+import time
+import uuid
+
+from pulp.server.db import connection
+from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.managers.content.orphan import OrphanManager
+
+
+TYPE_ID = 'benchmark_orphan'
+COLLECTION_NAME = 'units_' + TYPE_ID
+SEED_BATCH = 10000
+
+
+def seed(database, num_units, associated, num_repos):
+    units = database[COLLECTION_NAME]
+    associations = database[RepoContentUnit.collection_name]
+    units.drop()
+    associations.remove({'unit_type_id': TYPE_ID})
+    associations.create_index('unit_id')
+
+    associated_per_hundred = int(associated * 100)
+    unit_batch = []
+    association_batch = []
+    for i in xrange(num_units):
+        unit_id = str(uuid.uuid4())
+        unit_batch.append({'_id': unit_id, 'name': 'unit-%d' % i,
+                           '_storage_path': None, '_content_type_id': TYPE_ID})
+        if i % 100 < associated_per_hundred:
+            for repo in xrange(num_repos):
+                association_batch.append({'repo_id': 'repo-%d' % repo, 'unit_id': unit_id,
+                                          'unit_type_id': TYPE_ID})
+        if len(unit_batch) >= SEED_BATCH:
+            units.insert_many(unit_batch)
+            unit_batch = []
+        if len(association_batch) >= SEED_BATCH:
+            associations.insert_many(association_batch)
+            association_batch = []
+    if unit_batch:
+        units.insert_many(unit_batch)
+    if association_batch:
+        associations.insert_many(association_batch)
+
+
+def count_per_unit(database):
+    """
+    The original implementation: one count query per unit.
+    """
+    units = database[COLLECTION_NAME]
+    associations = database[RepoContentUnit.collection_name]
+    count = 0
+    for unit in units.find({}, projection=['_id']):
+        if associations.find({'unit_id': unit['_id']}).count() == 0:
+            count += 1
+    return count
+
+
+def count_set_based(database):
+    count = 0
+    for page in OrphanManager.generate_orphan_pages(database[COLLECTION_NAME]):
+        count += len(page)
+    return count
+
+
+def timed(label, func, *args):
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    print '%-12s %10d orphans %10.2f seconds' % (label, result, elapsed)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='pulp_orphan_benchmark')
+    parser.add_argument('--units', type=int, default=1000000)
+    parser.add_argument('--associated', type=float, default=0.9,
+                        help='fraction of units associated with repositories')
+    parser.add_argument('--repos', type=int, default=3,
+                        help='number of repositories each associated unit belongs to')
+    parser.add_argument('--keep', action='store_true', help='do not reseed the database')
+    parser.add_argument('--skip-old', action='store_true',
+                        help='only time the set-based implementation')
+    args = parser.parse_args()
+
+    connection.initialize(name=args.db)
+    database = connection.get_database()
+
+    if not args.keep:
+        start = time.time()
+        seed(database, args.units, args.associated, args.repos)
+        print 'seeded %d units in %.2f seconds' % (args.units, time.time() - start)
+
+    new = timed('set-based', count_set_based, database)
+    if not args.skip_old:
+        old = timed('per-unit', count_per_unit, database)
+        assert old == new, 'implementations disagree: %d != %d' % (old, new)
+
+
+if __name__ == '__main__':
+    main()
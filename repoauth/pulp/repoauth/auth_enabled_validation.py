@@ -7,10 +7,15 @@ doesn't care at all about repo authentication.
 
 from ConfigParser import SafeConfigParser
 
+from pulp.repoauth import cache
+
 # This needs to be accessible on both Pulp and the CDS instances, so a
 # separate config file for repo auth purposes is used.
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# The parsed configuration, loaded again when the file changes
+_configs = cache.FileCache('Repo auth configuration')
+
 
 # -- framework------------------------------------------------------------------
 
@@ -18,7 +23,7 @@ def authenticate(environ):
     '''
     Framework hook method.
     '''
-    config = _config()
+    config = _configs.get(CONFIG_FILENAME, [CONFIG_FILENAME], _config)
     is_enabled = config.getboolean('main', 'enabled')
     is_verbose = config.getboolean('main', 'log_failed_cert_verbose')
     if not is_enabled and is_verbose:
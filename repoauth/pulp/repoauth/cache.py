@@ -0,0 +1,206 @@
+"""
+In-process caches used to authorize content requests.
+
+The access checks run for every request served by the web server, so the configuration,
+protected repository listings and CA certificates they read from disk are kept in memory and
+loaded again when the files change. The verdicts reached for clients are kept for a short time,
+so repeated requests from the same client are authorized with a dictionary lookup.
+"""
+
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import time
+from threading import Lock
+
+
+LOG = logging.getLogger(__name__)
+
+# Number of seconds a cached file is assumed not to have changed before it is checked again
+STAT_INTERVAL = 1
+
+# Number of seconds an authorization verdict is cached
+VERDICT_TTL = 60
+
+# Maximum number of authorization verdicts cached
+VERDICT_CACHE_SIZE = 10000
+
+# Number of lookups between two reports of the hit rate of a cache in the debug log
+REPORT_INTERVAL = 1000
+
+
+class CacheStats(object):
+    """
+    Hit and miss counters of a cache, periodically reported in the debug log.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: name of the cache used in the debug log
+        :type  name: str
+        """
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        """
+        Count a lookup, and report the hit rate once every REPORT_INTERVAL lookups.
+
+        :param hit: whether the lookup was served from the cache
+        :type  hit: bool
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        lookups = self.hits + self.misses
+        if lookups % REPORT_INTERVAL == 0:
+            LOG.debug('%s cache: %d hits, %d misses, %.1f%% hit rate' %
+                      (self.name, self.hits, self.misses, 100.0 * self.hits / lookups))
+
+
+class FileCache(object):
+    """
+    Caches values loaded from files. A value is loaded again when the modification time, size
+    or inode of one of its files changes, or when one of them is created or removed. The files
+    are checked at most once per stat interval.
+    """
+
+    def __init__(self, name, stat_interval=STAT_INTERVAL):
+        """
+        :param name:          name of the cache used in the debug log
+        :type  name:          str
+        :param stat_interval: number of seconds files are not checked after they were checked
+        :type  stat_interval: int
+        """
+        self.stat_interval = stat_interval
+        self.stats = CacheStats(name)
+        self._lock = Lock()
+        self._entries = {}
+
+    def get(self, key, paths, loader):
+        """
+        Get a cached value, loading it if it is not cached or its files changed.
+
+        :param key:    identifies the value in the cache
+        :type  key:    hashable
+        :param paths:  absolute paths of the files the value is loaded from
+        :type  paths:  list of str
+        :param loader: called with no arguments to load the value
+        :type  loader: callable
+
+        :return: the value
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            checked_until, stamps, value = entry
+            if now < checked_until:
+                self.stats.record(True)
+                return value
+
+        new_stamps = [_stamp(path) for path in paths]
+        if entry is not None and new_stamps == stamps:
+            hit = True
+        else:
+            hit = False
+            value = loader()
+        with self._lock:
+            self._entries[key] = (now + self.stat_interval, new_stamps, value)
+        self.stats.record(hit)
+        return value
+
+    def clear(self):
+        """
+        Remove all the cached values.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class VerdictCache(object):
+    """
+    A size-bounded LRU cache of authorization verdicts, which expire after a TTL.
+    """
+
+    def __init__(self, name, ttl=VERDICT_TTL, max_size=VERDICT_CACHE_SIZE):
+        """
+        :param name:     name of the cache used in the debug log
+        :type  name:     str
+        :param ttl:      number of seconds a verdict is cached
+        :type  ttl:      int
+        :param max_size: maximum number of verdicts cached
+        :type  max_size: int
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = CacheStats(name)
+        self._lock = Lock()
+        self._verdicts = OrderedDict()
+
+    def get(self, key):
+        """
+        :param key: identifies the request the verdict was reached for
+        :type  key: hashable
+
+        :return: the cached verdict, or None if there is none
+        :rtype:  bool
+        """
+        with self._lock:
+            cached = self._verdicts.pop(key, None)
+            if cached is not None and time.time() < cached[0]:
+                self._verdicts[key] = cached
+                verdict = cached[1]
+            else:
+                verdict = None
+        self.stats.record(verdict is not None)
+        return verdict
+
+    def set(self, key, verdict):
+        """
+        :param key:     identifies the request the verdict was reached for
+        :type  key:     hashable
+        :param verdict: whether the request is authorized
+        :type  verdict: bool
+        """
+        with self._lock:
+            self._verdicts.pop(key, None)
+            self._verdicts[key] = (time.time() + self.ttl, verdict)
+            while len(self._verdicts) > self.max_size:
+                self._verdicts.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all the cached verdicts.
+        """
+        with self._lock:
+            self._verdicts.clear()
+
+
+def fingerprint(pem):
+    """
+    :param pem: PEM encoded certificate
+    :type  pem: str
+
+    :return: a digest identifying the certificate
+    :rtype:  str
+    """
+    return hashlib.sha256(pem).hexdigest()
+
+
+def _stamp(path):
+    """
+    :param path: absolute path of a file
+    :type  path: str
+
+    :return: the modification time, size and inode of the file, or None if it does not exist
+    :rtype:  tuple
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size, st.st_ino
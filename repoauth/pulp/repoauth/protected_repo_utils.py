@@ -96,6 +96,7 @@ class ProtectedRepoListingFile:
 
         self.filename = filename
         self.listings = {}  # mapping of relative path to repo ID
+        self.index = ProtectedRepoIndex()  # the listings, indexed for matching request URLs
 
     def delete(self):
         '''
@@ -127,7 +128,7 @@ class ProtectedRepoListingFile:
         for line in contents.split('\n'):
             pieces = line.split(',')
             if len(pieces) == 2:
-                self.listings[pieces[0]] = pieces[1]
+                self.add_protected_repo_path(pieces[0], pieces[1])
 
     def save(self):
         '''
@@ -162,6 +163,7 @@ class ProtectedRepoListingFile:
         @type  repo_id: str
         '''
         self.listings[relative_path_url] = repo_id
+        self.index.add(relative_path_url, repo_id)
 
     def remove_protected_repo_path(self, relative_path_url):
         '''
@@ -173,3 +175,84 @@ class ProtectedRepoListingFile:
         @type  relative_path_url: str
         '''
         self.listings.pop(relative_path_url, None)  # will not error if key isn't present
+        # other listings may differ from the removed one only in their slashes
+        self.index = ProtectedRepoIndex(self.listings)
+
+
+class ProtectedRepoIndex:
+    '''
+    Trie of the path segments of protected relative paths, used to find the protected repo
+    a request URL belongs to without scanning every listing.
+
+    Relative paths are inconsistent in Pulp, so leading, trailing and duplicated slashes are
+    ignored, and a relative path matches wherever its segments appear in a request URL.
+    '''
+
+    # Key of a trie node holding the ID of the repo whose relative path ends at that node
+    REPO_ID = None
+
+    def __init__(self, listings=None):
+        '''
+        @param listings: mapping of relative path to repo ID to index
+        @type  listings: dict {str, str}
+        '''
+        self.root = {}
+        for relative_path_url, repo_id in (listings or {}).items():
+            self.add(relative_path_url, repo_id)
+
+    def add(self, relative_path_url, repo_id):
+        '''
+        Indexes a protected relative path. If the path is already indexed, its repo ID is
+        replaced.
+
+        @param relative_path_url: relative path for the repo
+        @type  relative_path_url: str
+
+        @param repo_id: id of the repo
+        @type  repo_id: str
+        '''
+        segments = _segments(relative_path_url)
+        if not segments:
+            return
+        node = self.root
+        for segment in segments:
+            node = node.setdefault(segment, {})
+        node[self.REPO_ID] = repo_id
+
+    def match(self, url):
+        '''
+        Finds the protected repo a URL belongs to. When several relative paths match, the
+        one appearing first in the URL wins, and of those, the longest one.
+
+        The cost of a lookup depends on the depth of the URL, not on the number of
+        protected repos.
+
+        @param url: repo portion of a request URL
+        @type  url: str
+
+        @return: id of the matching repo, or None if the URL is not protected
+        @rtype:  str
+        '''
+        segments = _segments(url)
+        for start in range(len(segments)):
+            repo_id = None
+            node = self.root
+            for segment in segments[start:]:
+                node = node.get(segment)
+                if node is None:
+                    break
+                repo_id = node.get(self.REPO_ID, repo_id)
+            if repo_id is not None:
+                return repo_id
+        return None
+
+
+def _segments(url):
+    '''
+    @param url: URL or relative path
+    @type  url: str
+
+    @return: the non-empty path segments of the URL
+    @rtype:  list of str
+    '''
+    return [segment for segment in url.split('/') if segment]
@@ -205,6 +205,32 @@ class RepoCertUtils:
 
         return result
 
+    def global_cert_bundle_path(self, piece):
+        '''
+        Returns the path of a piece of the global cert bundle, whether it exists or not.
+
+        @param piece: the bundle piece, one of VALID_BUNDLE_KEYS
+        @type  piece: str
+
+        @return: absolute path of the file holding the piece
+        @rtype:  str
+        '''
+        return os.path.join(self._global_cert_directory(), '%s.%s' % (GLOBAL_BUNDLE_PREFIX, piece))
+
+    def consumer_cert_bundle_path(self, repo_id, piece):
+        '''
+        Returns the path of a piece of a repo's consumer cert bundle, whether it exists or not.
+
+        @param repo_id: id of the repo
+        @type  repo_id: str
+        @param piece:   the bundle piece, one of VALID_BUNDLE_KEYS
+        @type  piece:   str
+
+        @return: absolute path of the file holding the piece
+        @rtype:  str
+        '''
+        return os.path.join(self._repo_cert_directory(repo_id), 'consumer-%s.%s' % (repo_id, piece))
+
     # -- write calls ----------------------------------------------------------------
 
     def write_feed_cert_bundle(self, repo_id, bundle):
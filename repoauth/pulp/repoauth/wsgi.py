@@ -1,11 +1,14 @@
 from ConfigParser import SafeConfigParser
 from pkg_resources import iter_entry_points
 
-from pulp.repoauth import auth_enabled_validation
+from pulp.repoauth import auth_enabled_validation, cache
 
 AUTH_ENTRY_POINT = 'pulp_content_authenticators'
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# The enabled authenticators, loaded again when the configuration file changes
+_authenticators = cache.FileCache('Authenticator')
+
 
 def allow_access(environ, host):
     """
@@ -28,18 +31,11 @@ def allow_access(environ, host):
     if auth_enabled_validation.authenticate(environ):
         return True
 
-    # find all of the authenticator methods we need to try
-    authenticators = {}
-    for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
-        authenticators.update({ep.name: ep.load()})
-
-    # load our list of disabled authenticators
-    disabled_authenticators = _get_disabled_authenticators()
+    authenticators = _authenticators.get(CONFIG_FILENAME, [CONFIG_FILENAME],
+                                         _load_authenticators)
 
     # loop through authenticators. If any return False, kick the user out.
     for auth_method in authenticators:
-        if auth_method in disabled_authenticators:
-            continue
         if not authenticators[auth_method](environ):
             return False
 
@@ -47,6 +43,25 @@ def allow_access(environ, host):
     return True
 
 
+def _load_authenticators():
+    """
+    Load the authenticator methods that are not disabled in the configuration.
+
+    :return: authenticator methods keyed by entry point name
+    :rtype:  dict
+    """
+    # find all of the authenticator methods we need to try
+    authenticators = {}
+    for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
+        authenticators.update({ep.name: ep.load()})
+
+    # load our list of disabled authenticators
+    for auth_method in _get_disabled_authenticators():
+        authenticators.pop(auth_method, None)
+
+    return authenticators
+
+
 def _get_disabled_authenticators():
     disabled_authenticators = []
     config = SafeConfigParser()
@@ -6,6 +6,9 @@ import pulp.repoauth.auth_enabled_validation as auth_enabled_validation
 
 class TestAuthEnabledValiation(unittest.TestCase):
 
+    def setUp(self):
+        auth_enabled_validation._configs.clear()
+
     @mock.patch("pulp.repoauth.auth_enabled_validation.SafeConfigParser")
     def test_config_read(self, mock_parser):
         mock_parser_instance = mock.Mock()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.repoauth import cache
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'file')
+        with open(self.path, 'w') as f:
+            f.write('a')
+        self.cache = cache.FileCache('test', stat_interval=0)
+        self.loader = mock.Mock(side_effect=lambda: open(self.path).read())
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_unchanged(self):
+        """An unchanged file is not loaded again."""
+        self.assertEqual(self.cache.get('key', [self.path], self.loader), 'a')
+        self.assertEqual(self.cache.get('key', [self.path], self.loader), 'a')
+
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(self.cache.stats.hits, 1)
+
+    def test_changed(self):
+        """A file is loaded again once it changes."""
+        self.cache.get('key', [self.path], self.loader)
+        with open(self.path, 'w') as f:
+            f.write('bb')
+
+        self.assertEqual(self.cache.get('key', [self.path], self.loader), 'bb')
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_created(self):
+        """A value is loaded again when one of its files is created."""
+        missing = os.path.join(self.working_dir, 'missing')
+        self.cache.get('key', [missing], self.loader)
+        open(missing, 'w').close()
+
+        self.cache.get('key', [missing], self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+
+    @mock.patch('pulp.repoauth.cache._stamp')
+    def test_stat_interval(self, mock_stamp):
+        """Files are not checked again within the stat interval."""
+        self.cache.stat_interval = 60
+        self.cache.get('key', [self.path], self.loader)
+        self.cache.get('key', [self.path], self.loader)
+
+        self.assertEqual(mock_stamp.call_count, 1)
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_clear(self):
+        self.cache.get('key', [self.path], self.loader)
+        self.cache.clear()
+        self.cache.get('key', [self.path], self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+
+
+class TestVerdictCache(unittest.TestCase):
+
+    def test_get(self):
+        verdicts = cache.VerdictCache('test')
+        verdicts.set('key', False)
+
+        self.assertEqual(verdicts.get('key'), False)
+        self.assertTrue(verdicts.get('other') is None)
+        self.assertEqual((verdicts.stats.hits, verdicts.stats.misses), (1, 1))
+
+    def test_expired(self):
+        verdicts = cache.VerdictCache('test', ttl=-1)
+        verdicts.set('key', True)
+
+        self.assertTrue(verdicts.get('key') is None)
+
+    def test_evicts_least_recently_used(self):
+        verdicts = cache.VerdictCache('test', max_size=2)
+        verdicts.set('a', True)
+        verdicts.set('b', True)
+        verdicts.get('a')
+
+        verdicts.set('c', True)
+
+        self.assertTrue(verdicts.get('a'))
+        self.assertTrue(verdicts.get('b') is None)
+        self.assertTrue(verdicts.get('c'))
+
+
+class TestCacheStats(unittest.TestCase):
+
+    @mock.patch('pulp.repoauth.cache.LOG')
+    @mock.patch('pulp.repoauth.cache.REPORT_INTERVAL', 2)
+    def test_report(self, mock_log):
+        stats = cache.CacheStats('test')
+        stats.record(True)
+        self.assertFalse(mock_log.debug.called)
+
+        stats.record(False)
+
+        mock_log.debug.assert_called_once_with('test cache: 1 hits, 1 misses, 50.0% hit rate')
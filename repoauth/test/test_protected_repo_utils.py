@@ -5,7 +5,8 @@ import os
 import shutil
 import unittest
 
-from pulp.repoauth.protected_repo_utils import ProtectedRepoListingFile, ProtectedRepoUtils
+from pulp.repoauth.protected_repo_utils import (ProtectedRepoIndex, ProtectedRepoListingFile,
+                                                ProtectedRepoUtils)
 
 
 # -- constants -----------------------------------------------------------------------
@@ -102,6 +103,7 @@ class TestProtectedRepoListingFile(unittest.TestCase):
         self.assertEqual(1, len(f.listings))
         self.assertTrue('foo' in f.listings)
         self.assertEqual('repo1', f.listings['foo'])
+        self.assertEqual('repo1', f.index.match('/foo/bar'))
 
         # Test Delete
         f.delete()
@@ -149,6 +151,7 @@ class TestProtectedRepoListingFile(unittest.TestCase):
 
         # Verify
         self.assertEqual(0, len(f.listings))
+        self.assertEqual(None, f.index.match('foo'))
 
     def test_remove_non_existent(self):
         """
@@ -166,3 +169,37 @@ class TestProtectedRepoListingFile(unittest.TestCase):
 
         # Verify
         self.assertEqual(1, len(f.listings))
+
+
+class TestProtectedRepoIndex(unittest.TestCase):
+
+    def test_match_ignores_slashes(self):
+        index = ProtectedRepoIndex({'/pulp/fedora-14/x86_64': 'repo-x'})
+
+        self.assertEqual('repo-x', index.match('pulp//fedora-14/x86_64/'))
+        self.assertEqual('repo-x', index.match('/pulp/fedora-14/x86_64/repodata/repomd.xml'))
+
+    def test_match_within_url(self):
+        """
+        A relative path matches wherever its segments appear in the URL.
+        """
+        index = ProtectedRepoIndex({'/pulp/fedora-14/x86_64': 'repo-x'})
+
+        self.assertEqual('repo-x', index.match('/repos/pulp/fedora-14/x86_64/a.rpm'))
+
+    def test_match_whole_segments(self):
+        index = ProtectedRepoIndex({'/pulp/fedora-1': 'repo-x'})
+
+        self.assertEqual(None, index.match('/pulp/fedora-14/x86_64'))
+        self.assertEqual(None, index.match('/pulp'))
+
+    def test_match_longest(self):
+        index = ProtectedRepoIndex({'pulp': 'repo-x', 'pulp/fedora-14': 'repo-y'})
+
+        self.assertEqual('repo-y', index.match('/pulp/fedora-14/x86_64'))
+        self.assertEqual('repo-x', index.match('/pulp/fedora-13/x86_64'))
+
+    def test_empty_path_ignored(self):
+        index = ProtectedRepoIndex({'/': 'repo-x'})
+
+        self.assertEqual(None, index.match('/pulp'))
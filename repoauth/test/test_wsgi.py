@@ -1,6 +1,7 @@
 import unittest
 import mock
 
+from pulp.repoauth import wsgi
 from pulp.repoauth.wsgi import allow_access, _get_disabled_authenticators
 
 
@@ -22,6 +23,7 @@ class TestWsgi(unittest.TestCase):
         entrypoint_two.load.return_value = self.auth_two
 
         self.entrypoint_list = [entrypoint_one, entrypoint_two]
+        wsgi._authenticators.clear()
 
     @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
     def test_auth_disabled(self, auth_enabled):
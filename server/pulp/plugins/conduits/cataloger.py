@@ -1,9 +1,16 @@
 from pulp.server.managers import factory as managers
 
 
+# Number of added entries buffered before they are written to the catalog
+CATALOG_BATCH_SIZE = 1000
+
+
 class CatalogerConduit(object):
     """
     Provides access to pulp platform API.
+
+    Added entries are buffered and written to the catalog in bulk, so the
+    conduit must be flushed once the refresh is finished.
     """
 
     def __init__(self, source_id, expires):
@@ -18,6 +25,7 @@ class CatalogerConduit(object):
         self.expires = expires
         self.added_count = 0
         self.deleted_count = 0
+        self._pending = []
 
     def add_entry(self, type_id, unit_key, url):
         """
@@ -29,9 +37,10 @@ class CatalogerConduit(object):
         :param url: The URL used to download content associated with the unit.
         :type url: str
         """
-        manager = managers.content_catalog_manager()
-        manager.add_entry(self.source_id, self.expires, type_id, unit_key, url)
+        self._pending.append((type_id, unit_key, url))
         self.added_count += 1
+        if len(self._pending) >= CATALOG_BATCH_SIZE:
+            self.flush()
 
     def delete_entry(self, type_id, unit_key):
         """
@@ -41,10 +50,23 @@ class CatalogerConduit(object):
         :param unit_key: The content unit key.
         :type unit_key: dict
         """
+        # Entries added before the deletion must be written first.
+        self.flush()
         manager = managers.content_catalog_manager()
         manager.delete_entry(self.source_id, type_id, unit_key)
         self.deleted_count += 1
 
+    def flush(self):
+        """
+        Write the buffered entries to the content catalog.
+        """
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        manager = managers.content_catalog_manager()
+        manager.add_entries(self.source_id, self.expires, pending)
+
     def reset(self):
         """
         Reset statistics.
@@ -5,10 +5,10 @@ import sys
 from pymongo.errors import DuplicateKeyError
 
 from pulp.plugins.model import Unit, PublishReport
+from pulp.server.async import progress
 from pulp.server.async.tasks import get_current_task_id
 from pulp.server.controllers import units as units_controller
 from pulp.server.db import model
-from pulp.server.db.model import TaskStatus
 from pulp.server import exceptions as pulp_exceptions
 import pulp.plugins.conduits._common as common_utils
 import pulp.server.managers.factory as manager_factory
@@ -595,15 +595,21 @@ class StatusMixin(object):
         self.progress_report = {}
         self.task_id = get_current_task_id()
 
-    def set_progress(self, status):
+    def set_progress(self, status, force=False):
         """
         Informs the server of the current state of the publish operation. The
         contents of the status is dependent on how the distributor
         implementation chooses to divide up the publish process.
 
+        Progress is written at most once per tasks.progress_interval seconds;
+        status reported in the meantime is written at the end of the interval,
+        and when the task finishes.
+
         @param status: contains arbitrary data to describe the state of the
                publish; the contents may contain whatever information is relevant
                to the distributor implementation so long as it is serializable
+        @param force: write the status now
+        @type  force: bool
         """
 
         if self.task_id is None:
@@ -612,8 +618,7 @@ class StatusMixin(object):
 
         try:
             self.progress_report[self.report_id] = status
-            TaskStatus.objects(task_id=self.task_id).update_one(
-                set__progress_report=self.progress_report)
+            progress.get_writer(self.task_id).update(self.report_id, status, force=force)
         except Exception, e:
             _logger.exception(
                 'Exception from server setting progress for report [%s]' % self.report_id)
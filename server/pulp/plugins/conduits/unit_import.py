@@ -81,6 +81,32 @@ class ImportUnitConduit(ImporterScratchPadMixin, RepoScratchPadMixin,
             _logger.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def associate_units(self, units):
+        """
+        Associates the given units with the destination repository for the import, using bulk
+        writes rather than one database round trip per unit.
+
+        This call is idempotent. Units that are already associated are left as they are.
+
+        :param units: unit objects returned from the init_unit call
+        :type  units: iterable of pulp.plugins.model.Unit
+
+        :return: number of units that were newly associated
+        :rtype:  int
+        """
+        try:
+            units_by_type = {}
+            for unit in units:
+                units_by_type.setdefault(unit.type_id, []).append(unit.id)
+            added = 0
+            for type_id, unit_ids in units_by_type.items():
+                added += self.__association_manager.associate_all_by_ids(
+                    self.dest_repo_id, type_id, unit_ids)
+            return added
+        except Exception, e:
+            _logger.exception(_('Content unit association failed'))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
     def get_source_units(self, criteria=None, as_generator=False):
         """
         Returns the collection of content units associated with the source
@@ -241,3 +241,28 @@ class Profiler(object):
         :rtype:               list of str
         """
         raise NotImplementedError()
+
+    def calculate_applicable_units_batch(self, unit_profiles, bound_repo_id, config, conduit):
+        """
+        Calculate the applicability of a batch of consumer unit profiles against the given bound
+        repository.
+
+        Profilers that can load the content of the repository once for the whole batch should
+        override this method. By default, calculate_applicable_units is called for each profile.
+
+        :param unit_profiles: consumer unit profiles keyed by profile hash
+        :type  unit_profiles: dict
+        :param bound_repo_id: repo id of a repository to be used to calculate applicability
+                              against the given consumer profiles
+        :type  bound_repo_id: str
+        :param config:        plugin configuration
+        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
+        :param conduit:       provides access to relevant Pulp functionality
+        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
+        :return:              the value returned by calculate_applicable_units for each profile,
+                              keyed by profile hash
+        :rtype:               dict
+        """
+        return dict((profile_hash, self.calculate_applicable_units(unit_profile, bound_repo_id,
+                                                                   config, conduit))
+                    for profile_hash, unit_profile in unit_profiles.iteritems())
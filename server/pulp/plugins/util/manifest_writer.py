@@ -1,13 +1,23 @@
 import csv
+from gettext import gettext as _
 import hashlib
+import json
+import logging
+from multiprocessing.pool import ThreadPool
 import os
+import stat
 
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 
 
+_logger = logging.getLogger(__name__)
+
 # not much science behind this
 CHUNK_SIZE = 2 ** 16
 
+# number of files hashed concurrently; hashlib releases the GIL while hashing
+HASH_WORKERS = 4
+
 
 def make_manifest_for_dir(path):
     """
@@ -47,3 +57,139 @@ def get_sha256_checksum(path):
             hasher.update(chunk)
             chunk = open_file.read(CHUNK_SIZE)
     return hasher.hexdigest()
+
+
+class ManifestBuilder(object):
+    """
+    Creates a PULP_MANIFEST file in a directory, like make_manifest_for_dir does, hashing the
+    files on a pool of threads.
+
+    When a cache file is given, the checksums are saved in it, keyed by the inode, size and
+    modification time of each file, so that a file that did not change is not hashed again the
+    next time a manifest is built for the directory. The cache file should not be inside the
+    directory, since the directory is usually published.
+
+    :ivar hashed:   number of files hashed by the last build
+    :type hashed:   int
+    :ivar cached:   number of checksums found in the cache by the last build
+    :type cached:   int
+    """
+
+    def __init__(self, path, cache_path=None, workers=HASH_WORKERS):
+        """
+        :param path:        full path to the directory where the manifest should be created
+        :type  path:        basestring
+        :param cache_path:  full path to the checksum cache file; None to hash every file
+        :type  cache_path:  basestring
+        :param workers:     number of files hashed concurrently
+        :type  workers:     int
+        """
+        self.path = path
+        self.cache_path = cache_path
+        self.workers = workers
+        self.hashed = 0
+        self.cached = 0
+
+    def build(self):
+        """
+        Create the manifest, hashing only the files that are not in the cache, and save the
+        checksums of the files in the manifest to the cache.
+        """
+        files = []
+        for filename in os.listdir(self.path):
+            if filename == MANIFEST_FILENAME:
+                continue
+            st = os.stat(os.path.join(self.path, filename))
+            if stat.S_ISREG(st.st_mode):
+                files.append((filename, st))
+
+        cache = self._load_cache()
+        checksums = {}
+        missing = []
+        for filename, st in files:
+            key = self._cache_key(st)
+            if key in cache:
+                checksums[key] = cache[key]
+            else:
+                missing.append((key, os.path.join(self.path, filename)))
+
+        if missing:
+            keys, file_paths = zip(*missing)
+            checksums.update(zip(keys, self._hash(list(file_paths))))
+        self.hashed = len(missing)
+        self.cached = len(files) - len(missing)
+
+        with open(os.path.join(self.path, MANIFEST_FILENAME), 'w') as open_file:
+            writer = csv.writer(open_file)
+            for filename, st in files:
+                writer.writerow([filename, checksums[self._cache_key(st)], st.st_size])
+
+        self._save_cache(checksums)
+        _logger.debug(_('Created the manifest for %(path)s; %(hashed)d files hashed, '
+                        '%(cached)d checksums reused.') %
+                      {'path': self.path, 'hashed': self.hashed, 'cached': self.cached})
+
+    def _hash(self, file_paths):
+        """
+        :param file_paths:  full paths to the files to hash
+        :type  file_paths:  list of basestring
+
+        :return:    the sha256 checksums of the files, in the same order
+        :rtype:     list of basestring
+        """
+        if len(file_paths) < 2 or self.workers < 2:
+            return map(get_sha256_checksum, file_paths)
+        pool = ThreadPool(min(self.workers, len(file_paths)))
+        try:
+            return pool.map(get_sha256_checksum, file_paths)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _load_cache(self):
+        """
+        :return:    checksums keyed by cache key; empty if there is no cache or it cannot be read
+        :rtype:     dict
+        """
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path) as open_file:
+                cache = json.load(open_file)
+        except (IOError, ValueError), e:
+            _logger.debug(_('Could not read the manifest checksum cache %(p)s: %(e)s') %
+                          {'p': self.cache_path, 'e': e})
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def _save_cache(self, checksums):
+        """
+        Replace the cache with the checksums of the files in the manifest.
+
+        :param checksums:   checksums keyed by cache key
+        :type  checksums:   dict
+        """
+        if self.cache_path is None:
+            return
+        temp_path = self.cache_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as open_file:
+                json.dump(checksums, open_file)
+            os.rename(temp_path, self.cache_path)
+        except (IOError, OSError), e:
+            # the cache only saves time the next time the manifest is built
+            _logger.warning(_('Could not save the manifest checksum cache %(p)s: %(e)s') %
+                            {'p': self.cache_path, 'e': e})
+
+    @staticmethod
+    def _cache_key(st):
+        """
+        :param st:  result of os.stat for a file
+        :type  st:  posix.stat_result
+
+        :return:    key identifying the content of the file in the cache
+        :rtype:     basestring
+        """
+        return '%d:%d:%r' % (st.st_ino, st.st_size, st.st_mtime)
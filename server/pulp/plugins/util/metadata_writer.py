@@ -17,6 +17,45 @@ _LOG = logging.getLogger(__name__)
 BUFFER_SIZE = 1024
 
 
+class HashingFileWrapper(object):
+    """
+    Wraps a file object opened for writing and updates checksums with every write, so the
+    checksums of the written content are known without reading the file again. Any other
+    attribute is looked up on the wrapped file object.
+    """
+
+    def __init__(self, file_object, checksum_constructors):
+        """
+        :param file_object: file object to write to
+        :type  file_object: file
+        :param checksum_constructors: hashlib constructors of the checksums to calculate
+        :type  checksum_constructors: list of callable
+        """
+        self.file_object = file_object
+        self.hashers = [constructor() for constructor in checksum_constructors]
+
+    def write(self, data):
+        """
+        Write data to the file and add it to the checksums.
+
+        :param data: data to write
+        :type  data: str
+        """
+        self.file_object.write(data)
+        for hasher in self.hashers:
+            hasher.update(data)
+
+    def hexdigests(self):
+        """
+        :return: the checksums of everything written so far, in the order of the constructors
+        :rtype:  list of str
+        """
+        return [hasher.hexdigest() for hasher in self.hashers]
+
+    def __getattr__(self, name):
+        return getattr(self.file_object, name)
+
+
 class MetadataFileContext(object):
     """
     Context manager class for metadata file generation.
@@ -36,6 +75,10 @@ class MetadataFileContext(object):
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
         self.checksum = None
+        # checksum of the uncompressed content of gzipped metadata files
+        self.open_checksum = None
+        self._checksum_file_handle = None
+        self._open_checksum_file_handle = None
         if self.checksum_type is not None:
             checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
             if not checksum_function:
@@ -96,9 +139,13 @@ class MetadataFileContext(object):
         # Add calculated checksum to the filename
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
+            if self._checksum_file_handle is not None:
+                checksum = self._checksum_file_handle.hexdigests()[0]
+            else:
+                # the file handle was not opened by this class, so it was not hashed
+                checksum = self._file_checksum()
+            if self._open_checksum_file_handle is not None:
+                self.open_checksum = self._open_checksum_file_handle.hexdigests()[0]
 
             self.checksum = checksum
             file_name_with_checksum = checksum + '-' + file_name
@@ -109,6 +156,23 @@ class MetadataFileContext(object):
 
         # Set the metadata_file_handle to None so we don't double call finalize
         self.metadata_file_handle = None
+        self._checksum_file_handle = None
+        self._open_checksum_file_handle = None
+
+    def _file_checksum(self):
+        """
+        Calculate the checksum of the metadata file by reading it.
+
+        :return: the checksum of the metadata file
+        :rtype:  str
+        """
+        hasher = self.checksum_constructor()
+        with open(self.metadata_file_path, 'rb') as file_handle:
+            content = file_handle.read(BUFFER_SIZE)
+            while content:
+                hasher.update(content)
+                content = file_handle.read(BUFFER_SIZE)
+        return hasher.hexdigest()
 
     def _open_metadata_file_handle(self):
         """
@@ -142,11 +206,24 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
+        file_handle = open(self.metadata_file_path, 'wb')
+        if self.checksum_type is not None:
+            # the checksums are calculated as the content is written
+            file_handle = HashingFileWrapper(file_handle, [self.checksum_constructor])
+            self._checksum_file_handle = file_handle
+
         if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            gzip_file_handle = gzip.GzipFile(self.metadata_file_path, 'wb', fileobj=file_handle)
+            # close the file when the gzip file is closed, as gzip.open does
+            gzip_file_handle.myfileobj = file_handle
+            self.metadata_file_handle = gzip_file_handle
+            if self.checksum_type is not None:
+                self.metadata_file_handle = HashingFileWrapper(self.metadata_file_handle,
+                                                               [self.checksum_constructor])
+                self._open_checksum_file_handle = self.metadata_file_handle
 
         else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+            self.metadata_file_handle = file_handle
 
     def _write_file_header(self):
         """
@@ -184,6 +261,9 @@ class MetadataFileContext(object):
             # finalize has already been run or initialize has not been run
             return True
 
+        if isinstance(file_object, HashingFileWrapper):
+            file_object = file_object.file_object
+
         try:
             return file_object.closed
         except AttributeError:
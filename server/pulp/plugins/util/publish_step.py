@@ -1,6 +1,7 @@
 from gettext import gettext as _
 from itertools import chain, imap
 import copy
+import hashlib
 import itertools
 import logging
 import os
@@ -34,6 +35,9 @@ from pulp.server.util import copytree
 
 _logger = logging.getLogger(__name__)
 
+# Directory, inside the server's working directory, holding the PULP_MANIFEST checksum caches
+MANIFEST_CACHE_DIR = 'manifest_cache'
+
 
 def _post_order(step):
     """
@@ -103,12 +107,13 @@ class Step(object):
         self.error_details = []
         self.total_units = 1
         self.children = []
-        self.last_report_time = 0
         self.last_reported_state = self.state
         self.timestamp = str(time.time())
         self.non_halting_exceptions = non_halting_exceptions or []
         self.exceptions = []
         self.disable_reporting = disable_reporting
+        self.bulk_units = 0
+        self.bulk_seconds = 0.0
 
     def add_child(self, step):
         """
@@ -338,14 +343,22 @@ class Step(object):
         if self.parent:
             self.parent.report_progress(force)
         else:
-            if force:
-                self.get_status_conduit().set_progress(self.get_progress_report())
-            else:
-                current_time = time.time()
-                if current_time != self.last_report_time:
-                    # Update at most once a second
-                    self.get_status_conduit().set_progress(self.get_progress_report())
-                    self.last_report_time = current_time
+            # the status conduit coalesces the reports it receives within its progress interval,
+            # so every report is passed on and the latest one is always written
+            self.get_status_conduit().set_progress(self.get_progress_report(), force=force)
+
+    def record_bulk_throughput(self, units, seconds):
+        """
+        Record that a bulk database operation handled a number of units in a given time. The
+        accumulated throughput is included in the progress report as units per second.
+
+        :param units: number of units handled by the bulk operation
+        :type units: int
+        :param seconds: wall clock time spent in the bulk operation
+        :type seconds: float
+        """
+        self.bulk_units += units
+        self.bulk_seconds += seconds
 
     def get_progress_report(self):
         """
@@ -370,6 +383,9 @@ class Step(object):
             reporting_constants.PROGRESS_DESCRIPTION_KEY: self.description,
             reporting_constants.PROGRESS_DETAILS_KEY: self.progress_details
         }
+        if self.bulk_units and self.bulk_seconds:
+            report[reporting_constants.PROGRESS_UNITS_PER_SECOND_KEY] = \
+                round(self.bulk_units / self.bulk_seconds, 1)
         if self.children:
             child_reports = []
             for step in self.children:
@@ -1000,24 +1016,54 @@ class CreatePulpManifestStep(Step):
 
     If you already know the SHA256 checksums of the files going in the manifest, see an example
     in the FileDistributor that creates this file in a different way.
+
+    The checksums are cached, so a file that did not change since the last time the manifest
+    was created is not read again.
     """
-    def __init__(self, target_dir):
+    def __init__(self, target_dir, cache_path=None):
         """
         :param target_dir:  full path to the directory where the PULP_MANIFEST file should
                             be created
         :type  target_dir:  basestring
+        :param cache_path:  full path to the checksum cache file; defaults to a file in the
+                            server's working directory, see get_cache_path
+        :type  cache_path:  basestring
         """
         super(CreatePulpManifestStep, self).__init__(reporting_constants.STEP_CREATE_PULP_MANIFEST)
         self.target_dir = target_dir
+        self.cache_path = cache_path
         self.description = _('Creating PULP_MANIFEST')
 
+    def get_cache_path(self):
+        """
+        Return the path to the checksum cache file. Unless a path was given, the caches of a
+        repository are kept in the server's working directory, which outlives the working
+        directories of the publish tasks, and are named after the path of the target directory.
+        That path is taken relative to the parent step's working directory when the target
+        directory is inside it, since the working directory changes with each publish.
+
+        :return:    full path to the checksum cache file, or None if no path was given and the
+                    step has no parent to get the repository from
+        :rtype:     basestring
+        """
+        if self.cache_path or self.parent is None:
+            return self.cache_path
+        target_dir = os.path.realpath(self.target_dir)
+        working_dir = os.path.realpath(self.parent.get_working_dir())
+        if target_dir.startswith(working_dir + os.sep):
+            target_dir = os.path.relpath(target_dir, working_dir)
+        cache_dir = os.path.join(pulp_config.get('server', 'working_directory'),
+                                 MANIFEST_CACHE_DIR, self.parent.get_repo().id)
+        misc.mkdir(cache_dir)
+        return os.path.join(cache_dir, hashlib.sha256(encode_unicode(target_dir)).hexdigest())
+
     def process_main(self, item=None):
         """
         creates the manifest file
 
         :param item:    not used
         """
-        manifest_writer.make_manifest_for_dir(self.target_dir)
+        manifest_writer.ManifestBuilder(self.target_dir, cache_path=self.get_cache_path()).build()
 
 
 class CopyDirectoryStep(PublishStep):
@@ -1211,15 +1257,19 @@ class GetLocalUnitsStep(SaveUnitsStep):
     available_units attribute, but can be overridden in the constructor.
     """
 
-    def __init__(self, importer_type, unit_pagination_size=50, available_units=None, **kwargs):
+    def __init__(self, importer_type, unit_pagination_size=1000, available_units=None,
+                 association_batch_size=repo_controller.ASSOCIATE_BATCH_SIZE, **kwargs):
         """
         :param importer_type:        unique identifier for the type of importer
         :type  importer_type:        basestring
-        :param unit_pagination_size: How many units should be queried at one time (default 50)
+        :param unit_pagination_size: How many units should be queried at one time (default 1000)
         :type  importer_type:        int
         :param available_units:      An iterable of Units available for retrieval. This defaults to
                                      this step's parent's available_units attribute if not provided.
         :type  available_units:      iterable
+        :param association_batch_size: How many existing units should be associated with the
+                                       repository in a single bulk write
+        :type  association_batch_size: int
         """
         super(GetLocalUnitsStep, self).__init__(step_type=reporting_constants.SYNC_STEP_GET_LOCAL,
                                                 plugin_type=importer_type,
@@ -1229,6 +1279,7 @@ class GetLocalUnitsStep(SaveUnitsStep):
         # list of unit model instances
         self.units_to_download = []
         self.unit_pagination_size = unit_pagination_size
+        self.association_batch_size = association_batch_size
         self.available_units = available_units
 
     def process_main(self, item=None):
@@ -1249,18 +1300,40 @@ class GetLocalUnitsStep(SaveUnitsStep):
         else:
             available_units = self.parent.available_units
 
+        # units found in pulp that have not yet been associated with the repository
+        units_to_associate = []
+
         for units_group in misc.paginate(available_units, self.unit_pagination_size):
             # Get this group of units
             query = units_controller.find_units(units_group)
 
             for found_unit in query:
                 units_we_already_had.add(hash(found_unit))
-                repo_controller.associate_single_unit(self.get_repo().repo_obj, found_unit)
+                units_to_associate.append(found_unit)
 
             for unit in units_group:
                 if hash(unit) not in units_we_already_had:
                     self.units_to_download.append(unit)
 
+            if len(units_to_associate) >= self.association_batch_size:
+                self._associate(units_to_associate)
+                units_to_associate = []
+
+        if units_to_associate:
+            self._associate(units_to_associate)
+
+    def _associate(self, units):
+        """
+        Associate units with the repository in bulk and record the throughput.
+
+        :param units: units that already exist in pulp
+        :type  units: list of pulp.server.db.model.ContentUnit
+        """
+        start = time.time()
+        repo_controller.associate_units(self.get_repo().repo_obj, units,
+                                        self.association_batch_size)
+        self.record_bulk_throughput(len(units), time.time() - start)
+
 
 class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
 
@@ -0,0 +1,231 @@
+"""
+Coalesced writing of task progress reports.
+
+Plugins report progress often, sometimes for every unit they process. Rather than rewriting the
+whole progress report of the task every time, the reports are collected by a ProgressWriter for
+each task, which writes at most once per interval and only the parts of the reports that changed.
+Reports received between two writes are written together by a background timer, and the task
+flushes the writer when it finishes.
+"""
+
+from gettext import gettext as _
+import copy
+import logging
+import threading
+import time
+
+from pulp.server.config import config
+from pulp.server.db.model import TaskStatus
+
+
+_logger = logging.getLogger(__name__)
+
+PROGRESS_REPORT = 'progress_report'
+
+_lock = threading.Lock()
+_writers = {}
+
+
+class ProgressWriter(object):
+    """
+    Writes the progress reports of a task to its TaskStatus document.
+
+    The first write sets the whole progress report. Later writes use $set on the dotted paths of
+    the parts of the reports that changed since they were last written.
+
+    :ivar task_id:  The ID of the task.
+    :type task_id:  str
+    :ivar interval: The minimum number of seconds between two writes.
+    :type interval: float
+    :ivar updates:  The number of reports received.
+    :type updates:  int
+    :ivar writes:   The number of writes to the database.
+    :type writes:   int
+    """
+
+    def __init__(self, task_id, interval=None):
+        """
+        :param task_id:  The ID of the task.
+        :type  task_id:  str
+        :param interval: The minimum number of seconds between two writes; defaults to the
+                         tasks.progress_interval setting.
+        :type  interval: float
+        """
+        if interval is None:
+            interval = config.getfloat('tasks', 'progress_interval')
+        self.task_id = task_id
+        self.interval = interval
+        self.updates = 0
+        self.writes = 0
+        self._lock = threading.RLock()
+        self._reports = {}
+        self._written = None
+        self._dirty = False
+        self._last_write = 0
+        self._timer = None
+
+    def update(self, report_id, report, force=False):
+        """
+        Update a progress report. It is written now if the interval since the last write has
+        elapsed, or if forced. Otherwise it is written by a background timer at the end of the
+        interval.
+
+        :param report_id: Identifies the report in the progress report of the task.
+        :type  report_id: str
+        :param report:    The report, which must be serializable.
+        :type  report:    object
+        :param force:     Write the report now.
+        :type  force:     bool
+        """
+        with self._lock:
+            self._reports[report_id] = copy.deepcopy(report)
+            self._dirty = True
+            self.updates += 1
+            delay = self._last_write + self.interval - time.time()
+            if force or delay <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(delay, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Write the reports updated since the last write.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            if self._written is None:
+                TaskStatus.objects(task_id=self.task_id).update_one(
+                    set__progress_report=self._reports)
+            else:
+                changes = {}
+                for report_id, report in self._reports.items():
+                    path = '.'.join((PROGRESS_REPORT, report_id))
+                    if _valid_key(report_id) and report_id in self._written:
+                        changes.update(changed_fields(self._written[report_id], report, path))
+                    else:
+                        changes[path] = report
+                if changes:
+                    TaskStatus._get_collection().update_one(
+                        {'task_id': self.task_id}, {'$set': changes})
+            self._written = copy.deepcopy(self._reports)
+            self._dirty = False
+            self._last_write = time.time()
+            self.writes += 1
+
+    def close(self):
+        """
+        Write any pending reports and stop the background timer.
+        """
+        self.flush()
+        _logger.debug(_('Progress of task {task} written {writes} times for {updates} '
+                        'reports.').format(task=self.task_id, writes=self.writes,
+                                           updates=self.updates))
+
+    def _flush_later(self):
+        """
+        Called by the background timer at the end of the interval.
+        """
+        try:
+            with self._lock:
+                if self._timer is threading.current_thread():
+                    self._timer = None
+                self.flush()
+        except Exception:
+            _logger.exception(_('Writing the progress of task {task} failed.').format(
+                task=self.task_id))
+
+
+def changed_fields(old, new, path):
+    """
+    Find the fields of a document that changed.
+
+    Dictionaries with the same keys and lists with the same length are compared item by item,
+    so only the items that changed are returned. Any other change is returned as a whole.
+
+    :param old:  The document as it was written.
+    :type  old:  object
+    :param new:  The document.
+    :type  new:  object
+    :param path: The dotted path of the document.
+    :type  path: str
+
+    :return: The changed values, keyed by their dotted path.
+    :rtype:  dict
+    """
+    if old == new:
+        return {}
+    if isinstance(old, dict) and isinstance(new, dict) and \
+            set(old) == set(new) and all(_valid_key(k) for k in new):
+        items = [(k, old[k], new[k]) for k in new]
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        items = [(str(i), old[i], new[i]) for i in range(len(new))]
+    else:
+        return {path: new}
+    changes = {}
+    for key, old_value, new_value in items:
+        changes.update(changed_fields(old_value, new_value, '.'.join((path, key))))
+    return changes
+
+
+def get_writer(task_id):
+    """
+    Get the progress writer of a task, which is shared by all the reports of the task.
+
+    :param task_id: The ID of the task.
+    :type  task_id: str
+
+    :return: The progress writer.
+    :rtype:  ProgressWriter
+    """
+    with _lock:
+        writer = _writers.get(task_id)
+        if writer is None:
+            writer = _writers[task_id] = ProgressWriter(task_id)
+        return writer
+
+
+def close(task_id):
+    """
+    Write the pending progress reports of a task and forget its writer. This is called when the
+    task finishes.
+
+    :param task_id: The ID of the task.
+    :type  task_id: str
+
+    :return: The closed writer, or None if the task did not report progress.
+    :rtype:  ProgressWriter
+    """
+    with _lock:
+        writer = _writers.pop(task_id, None)
+    if writer is not None:
+        writer.close()
+    return writer
+
+
+def write_counts():
+    """
+    :return: The number of reports received and writes done by each task that is reporting
+             progress, keyed by task ID.
+    :rtype:  dict
+    """
+    with _lock:
+        writers = _writers.values()
+    return dict((w.task_id, {'updates': w.updates, 'writes': w.writes}) for w in writers)
+
+
+def _valid_key(key):
+    """
+    :param key: A key of a document.
+    :type  key: str
+
+    :return: True if the key can be used in a dotted path.
+    :rtype:  bool
+    """
+    return isinstance(key, basestring) and bool(key) and '.' not in key and \
+        not key.startswith('$')
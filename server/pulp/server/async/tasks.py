@@ -2,6 +2,7 @@ from datetime import datetime
 from gettext import gettext as _
 import logging
 import signal
+import threading
 import time
 import traceback
 import uuid
@@ -13,10 +14,12 @@ from bson import ObjectId
 from celery import task, Task as CeleryTask, current_task
 from celery.app import control, defaults
 from celery.result import AsyncResult
+from kombu import Consumer, Exchange, Queue
 from mongoengine.queryset import DoesNotExist
 
 from pulp.common.constants import RESOURCE_MANAGER_WORKER_NAME, SCHEDULER_WORKER_NAME
 from pulp.common import constants, dateutils, tags
+from pulp.server.async import progress
 from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE, \
     DEDICATED_QUEUE_EXCHANGE
 from pulp.server.exceptions import PulpException, MissingResource, \
@@ -24,7 +27,6 @@ from pulp.server.exceptions import PulpException, MissingResource, \
 from pulp.server.config import config
 from pulp.server.db.model import Worker, ReservedResource, TaskStatus, \
     ResourceManagerLock, CeleryBeatLock
-from pulp.server.exceptions import NoWorkers
 from pulp.server.managers.repo import _common as common_utils
 from pulp.server.managers import factory as managers
 from pulp.server.managers.schedule import utils
@@ -33,6 +35,13 @@ from pulp.server.managers.schedule import utils
 controller = control.Control(app=celery)
 _logger = logging.getLogger(__name__)
 
+# Fanout exchange used to tell the resource manager that a reservation was released
+RESERVATION_EXCHANGE = Exchange('pulp.reservations', type='fanout', durable=False)
+
+# Maximum number of seconds the reservation table is used before it is reloaded from the
+# database, so that changes to the workers and missed release notifications are picked up
+RESERVATION_RESYNC_INTERVAL = 5
+
 
 class PulpTask(CeleryTask):
     """
@@ -106,6 +115,267 @@ class PulpTask(CeleryTask):
         return super(PulpTask, self).__call__(*args, **kwargs)
 
 
+class ReservationTable(object):
+    """
+    An in-memory copy of the worker reservations, used by the resource manager to decide which
+    worker a reserved task is dispatched to without querying the database for every task.
+
+    The table is loaded from the Worker and ReservedResource collections when it is created, and
+    reservations are removed as release notifications arrive from the workers. Because workers
+    come and go and notifications can be lost, the table is reloaded from the database whenever
+    it is older than the resync interval.
+
+    :ivar dispatched:    The number of tasks dispatched.
+    :type dispatched:    int
+    :ivar waited:        The number of tasks which had to wait for a worker to become available.
+    :type waited:        int
+    :ivar total_latency: The total number of seconds spent finding workers for tasks.
+    :type total_latency: float
+    :ivar max_latency:   The largest number of seconds spent finding a worker for a task.
+    :type max_latency:   float
+    """
+
+    def __init__(self, resync_interval=RESERVATION_RESYNC_INTERVAL):
+        """
+        :param resync_interval: Maximum number of seconds the table is used before it is
+                                reloaded from the database.
+        :type  resync_interval: int
+        """
+        self.resync_interval = resync_interval
+        self.dispatched = 0
+        self.waited = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._condition = threading.Condition()
+        self._synced = None
+        self._tasks = {}
+        self._resources = {}
+        self._worker_counts = {}
+        self._idle = set()
+        with self._condition:
+            self._load()
+
+    def reserve(self, resource_id, task_id):
+        """
+        Reserve a resource for a task, blocking until a worker is available to run it.
+
+        A resource that is already reserved is assigned to the same worker, so tasks reserving
+        the same resource run one after the other. Otherwise, a worker with no reservations is
+        chosen.
+
+        :param resource_id: The name of the resource to reserve.
+        :type  resource_id: basestring
+        :param task_id:     The UUID of the task the resource is reserved for.
+        :type  task_id:     basestring
+
+        :return: The name of the worker the task must be dispatched to.
+        :rtype:  basestring
+        """
+        start = time.time()
+        waited = False
+        with self._condition:
+            while True:
+                if time.time() - self._synced >= self.resync_interval:
+                    self._load()
+                worker_name = self._find_worker(resource_id)
+                if worker_name is not None:
+                    break
+                if not waited:
+                    waited = True
+                    self.waited += 1
+                self._condition.wait(max(self._synced + self.resync_interval - time.time(), 0))
+            self._add(task_id, worker_name, resource_id)
+
+            latency = time.time() - start
+            self.dispatched += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            _logger.debug(_('Dispatched task %(task_id)s to %(worker)s in %(latency).3f seconds; '
+                            '%(reserved)d tasks are reserved on %(busy)d of %(workers)d '
+                            'workers.') % dict(task_id=task_id, worker=worker_name,
+                                               latency=latency, **self.stats()))
+        return worker_name
+
+    def release(self, task_id):
+        """
+        Remove the reservation made for a task and wake up any task waiting for a worker.
+
+        :param task_id: The UUID of the task whose reservation was released.
+        :type  task_id: basestring
+        """
+        with self._condition:
+            reservation = self._tasks.pop(task_id, None)
+            if reservation is None:
+                return
+            worker_name, resource_id = reservation
+            resource = self._resources[resource_id]
+            resource[1] -= 1
+            if not resource[1]:
+                del self._resources[resource_id]
+            self._worker_counts[worker_name] -= 1
+            if not self._worker_counts[worker_name]:
+                self._idle.add(worker_name)
+            self._condition.notify_all()
+
+    def stats(self):
+        """
+        :return: The number of known workers, how many of them have reservations, the number of
+                 tasks holding reservations, and the dispatch counters.
+        :rtype:  dict
+        """
+        with self._condition:
+            workers = len(self._worker_counts)
+            dispatched = self.dispatched
+            return {'workers': workers, 'busy': workers - len(self._idle),
+                    'reserved': len(self._tasks), 'dispatched': dispatched,
+                    'waited': self.waited, 'max_latency': self.max_latency,
+                    'mean_latency': self.total_latency / dispatched if dispatched else 0.0}
+
+    def _find_worker(self, resource_id):
+        """
+        Find the worker a task reserving a resource can be dispatched to. The caller must hold
+        the condition.
+
+        :param resource_id: The name of the resource to reserve.
+        :type  resource_id: basestring
+
+        :return: The name of the worker, or None if every worker is busy.
+        :rtype:  basestring
+        """
+        resource = self._resources.get(resource_id)
+        if resource is not None:
+            return resource[0]
+        for worker_name in self._idle:
+            return worker_name
+
+    def _add(self, task_id, worker_name, resource_id):
+        """
+        Record a reservation. The caller must hold the condition.
+
+        :param task_id:     The UUID of the task the resource is reserved for.
+        :type  task_id:     basestring
+        :param worker_name: The name of the worker the task is dispatched to.
+        :type  worker_name: basestring
+        :param resource_id: The name of the reserved resource.
+        :type  resource_id: basestring
+        """
+        if worker_name not in self._worker_counts or task_id in self._tasks:
+            return
+        self._tasks[task_id] = (worker_name, resource_id)
+        self._resources.setdefault(resource_id, [worker_name, 0])[1] += 1
+        self._worker_counts[worker_name] += 1
+        self._idle.discard(worker_name)
+
+    def _load(self):
+        """
+        Replace the content of the table with the workers and reservations in the database.
+        The caller must hold the condition, so that no release is applied to the table while
+        the database is read.
+
+        Reservations held on workers that no longer exist are ignored.
+        """
+        worker_names = [worker['name'] for worker in Worker.objects().only('name')]
+        self._tasks = {}
+        self._resources = {}
+        self._worker_counts = dict((name, 0) for name in worker_names if _is_worker(name))
+        self._idle = set(self._worker_counts)
+        for reservation in ReservedResource.objects.all():
+            resource = self._resources.get(reservation['resource_id'])
+            # A resource is only ever reserved on a single worker.
+            if resource is not None and resource[0] != reservation['worker_name']:
+                continue
+            self._add(reservation['task_id'], reservation['worker_name'],
+                      reservation['resource_id'])
+        self._synced = time.time()
+
+
+class ReleaseListener(threading.Thread):
+    """
+    A thread that applies the release notifications sent by the workers to a reservation table.
+    """
+
+    def __init__(self, table):
+        """
+        :param table: The reservation table releases are applied to.
+        :type  table: ReservationTable
+        """
+        super(ReleaseListener, self).__init__()
+        self.daemon = True
+        self.table = table
+
+    def run(self):
+        """
+        The thread entry point, which calls listen().
+
+        listen() is a blocking call, so any unexpected Exception is logged and listening starts
+        again. Releases missed in the meantime are picked up when the table is reloaded.
+        """
+        while True:
+            try:
+                self.listen()
+            except Exception as e:
+                _logger.error(e)
+            time.sleep(RESERVATION_RESYNC_INTERVAL)
+
+    def listen(self):
+        """
+        Consume release notifications from an exclusive queue bound to the reservation exchange.
+        """
+        queue = Queue(exchange=RESERVATION_EXCHANGE, exclusive=True, auto_delete=True,
+                      durable=False)
+        with celery.connection() as connection:
+            with Consumer(connection, queues=[queue], callbacks=[self.on_message]):
+                while True:
+                    connection.drain_events()
+
+    def on_message(self, body, message):
+        """
+        Release the reservation of the task named in a notification.
+
+        :param body:    The decoded notification.
+        :type  body:    dict
+        :param message: The notification message.
+        :type  message: kombu.message.Message
+        """
+        self.table.release(body['task_id'])
+        message.ack()
+
+
+_reservation_table = None
+
+
+def get_reservation_table():
+    """
+    Get the reservation table of this process. It is loaded from the database, and starts
+    listening for release notifications, the first time it is requested.
+
+    :return: The reservation table.
+    :rtype:  ReservationTable
+    """
+    global _reservation_table
+    if _reservation_table is None:
+        _reservation_table = ReservationTable()
+        ReleaseListener(_reservation_table).start()
+    return _reservation_table
+
+
+def _notify_release(task_id):
+    """
+    Tell the resource manager that the reservation of a task was released. Failures are only
+    logged, since the resource manager periodically reloads the reservations.
+
+    :param task_id: The UUID of the task whose reservation was released.
+    :type  task_id: basestring
+    """
+    try:
+        with celery.producer_or_acquire() as producer:
+            producer.publish({'task_id': task_id}, exchange=RESERVATION_EXCHANGE,
+                             declare=[RESERVATION_EXCHANGE], serializer='json')
+    except Exception as e:
+        _logger.warning(_('Could not send the release notification for task %(task_id)s: '
+                          '%(error)s') % {'task_id': task_id, 'error': e})
+
+
 @task(base=PulpTask, acks_late=True)
 def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
     """
@@ -117,7 +387,8 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
 
     The inner task is dispatched into a dedicated queue for a worker that is decided at dispatch
     time. The logic deciding which queue receives a task is controlled through the
-    find_worker function.
+    ReservationTable of the resource manager process, which waits for a worker to become
+    available when every worker is busy.
 
     :param name:          The name of the task to be called
     :type name:           basestring
@@ -132,34 +403,18 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
 
     :return: None
     """
-    while True:
-        try:
-            worker = get_worker_for_reservation(resource_id)
-        except NoWorkers:
-            pass
-        else:
-            break
+    worker_name = get_reservation_table().reserve(resource_id, task_id)
 
-        try:
-            worker = _get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        # No worker is ready for this work, so we need to wait
-        time.sleep(0.25)
-
-    ReservedResource(task_id=task_id, worker_name=worker['name'], resource_id=resource_id).save()
+    ReservedResource(task_id=task_id, worker_name=worker_name, resource_id=resource_id).save()
 
-    inner_kwargs['routing_key'] = worker.name
+    inner_kwargs['routing_key'] = worker_name
     inner_kwargs['exchange'] = DEDICATED_QUEUE_EXCHANGE
     inner_kwargs['task_id'] = task_id
 
     try:
         celery.tasks[name].apply_async(*inner_args, **inner_kwargs)
     finally:
-        _release_resource.apply_async((task_id, ), routing_key=worker.name,
+        _release_resource.apply_async((task_id, ), routing_key=worker_name,
                                       exchange=DEDICATED_QUEUE_EXCHANGE)
 
 
@@ -175,58 +430,6 @@ def _is_worker(worker_name):
     return True
 
 
-def get_worker_for_reservation(resource_id):
-    """
-    Return the Worker instance that is associated with a reservation of type resource_id. If
-    there are no workers with that reservation_id type a pulp.server.exceptions.NoWorkers
-    exception is raised.
-
-    :param resource_id:    The name of the resource you wish to reserve for your task.
-
-    :raises NoWorkers:     If all workers have reserved_resource entries associated with them.
-
-    :type resource_id:     basestring
-    :returns:              The Worker instance that has a reserved_resource entry of type
-                           `resource_id` associated with it.
-    :rtype:                pulp.server.db.model.resources.Worker
-    """
-    reservation = ReservedResource.objects(resource_id=resource_id).first()
-    if reservation:
-        return Worker.objects(name=reservation['worker_name']).first()
-    else:
-        raise NoWorkers()
-
-
-def _get_unreserved_worker():
-    """
-    Return the Worker instance that has no reserved_resource entries
-    associated with it. If there are no unreserved workers a
-    pulp.server.exceptions.NoWorkers exception is raised.
-
-    :raises NoWorkers: If all workers have reserved_resource entries associated with them.
-
-    :returns:          The Worker instance that has no reserved_resource
-                       entries associated with it.
-    :rtype:            pulp.server.db.model.resources.Worker
-    """
-
-    # Build a mapping of queue names to Worker objects
-    workers_dict = dict((worker['name'], worker) for worker in Worker.objects())
-    worker_names = workers_dict.keys()
-    reserved_names = [r['worker_name'] for r in ReservedResource.objects.all()]
-
-    # Find an unreserved worker using set differences of the names, and filter
-    # out workers that should not be assigned work.
-    # NB: this is a little messy but set comprehensions are in python 2.7+
-    unreserved_workers = set(filter(_is_worker, worker_names)) - set(reserved_names)
-
-    try:
-        return workers_dict[unreserved_workers.pop()]
-    except KeyError:
-        # All workers are reserved
-        raise NoWorkers()
-
-
 def _delete_worker(name, normal_shutdown=False):
     """
     Delete the Worker with _id name from the database, cancel any associated tasks and reservations
@@ -279,7 +482,7 @@ def _release_resource(task_id):
     the _queue_reserved_task task.
 
     When a resource-reserving task is complete, this method releases the resource by removing the
-    ReservedResource object by UUID.
+    ReservedResource object by UUID, and notifies the resource manager that the resource is free.
 
     :param task_id: The UUID of the task that requested the reservation
     :type  task_id: basestring
@@ -296,6 +499,7 @@ def _release_resource(task_id):
 
         new_task.on_failure(runtime_exception, task_id, (), {}, MyEinfo)
     ReservedResource.objects(task_id=task_id).delete()
+    _notify_release(task_id)
 
 
 class TaskResult(object):
@@ -515,6 +719,7 @@ class Task(PulpTask, ReservedTaskMixin):
         :param kwargs:  Original keyword arguments for the executed task.
         """
         _logger.debug("Task successful : [%s]" % task_id)
+        self._close_progress(task_id)
         if kwargs.get('scheduled_call_id') is not None:
             if not isinstance(retval, AsyncResult):
                 _logger.info(_('resetting consecutive failure count for schedule %(id)s')
@@ -576,6 +781,7 @@ class Task(PulpTask, ReservedTaskMixin):
         else:
             _logger.info(_('Task failed : [%s]') % task_id)
             # celery will log the traceback
+        self._close_progress(task_id)
         if kwargs.get('scheduled_call_id') is not None:
             utils.increment_failure_count(kwargs['scheduled_call_id'])
         if not self.request.called_directly:
@@ -598,6 +804,19 @@ class Task(PulpTask, ReservedTaskMixin):
 
             common_utils.delete_working_directory()
 
+    @staticmethod
+    def _close_progress(task_id):
+        """
+        Write the progress reported by the task that is still pending.
+
+        :param task_id: Unique id of the executed task.
+        :type  task_id: str
+        """
+        try:
+            progress.close(task_id)
+        except Exception:
+            _logger.exception(_('Writing the progress of task [%s] failed') % task_id)
+
 
 def cancel(task_id):
     """
@@ -80,6 +80,15 @@ _default_values = {
         'enabled': 'false',
         'from': 'pulp@localhost',
     },
+    'notifications': {
+        'http_workers': '4',
+        'email_workers': '2',
+        'queue_size': '1000',
+        'max_attempts': '5',
+        'retry_delay': '2',
+        'outbox': 'false',
+        'listener_cache_ttl': '30',
+    },
     'oauth': {
         'enabled': 'true',
         'oauth_key': '',
@@ -127,6 +136,7 @@ _default_values = {
         'keyfile': '/etc/pki/pulp/qpid/client.crt',
         'certfile': '/etc/pki/pulp/qpid/client.crt',
         'login_method': '',
+        'progress_interval': '1',
     },
     'lazy': {
         'redirect_host': socket.getfqdn(),
@@ -308,7 +308,10 @@ class ContentSource(object):
             report = RefreshReport(self.id, url)
             log.info(REFRESHING, self.id, url)
             try:
-                plugin.refresh(conduit, self.descriptor, url)
+                try:
+                    plugin.refresh(conduit, self.descriptor, url)
+                finally:
+                    conduit.flush()
                 log.info(REFRESH_SUCCEEDED, self.id, conduit.added_count, conduit.deleted_count)
                 report.succeeded = True
                 report.added_count = conduit.added_count
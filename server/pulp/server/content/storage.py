@@ -1,5 +1,7 @@
 import os
 import errno
+import fcntl
+import logging
 import shutil
 import tempfile
 
@@ -8,6 +10,18 @@ from hashlib import sha256
 from pulp.server.config import config
 
 
+_logger = logging.getLogger(__name__)
+
+# Strategies used by FileStorage.put to transfer a file into storage
+IMPORT_RENAME = 'rename'
+IMPORT_REFLINK = 'reflink'
+IMPORT_HARDLINK = 'hardlink'
+IMPORT_COPY = 'copy'
+
+# ioctl request cloning a file on copy-on-write filesystems (linux/fs.h)
+FICLONE = 0x40049409
+
+
 def mkdir(path):
     """
     Create a directory at the specified path.
@@ -105,11 +119,13 @@ class FileStorage(ContentStorage):
             digest[0:2],
             digest[2:])
 
-    def put(self, unit, path, location=None):
+    def put(self, unit, path, location=None, disposable=False):
         """
         Put the content defined by the content unit into storage.
         The file at the specified *path* is transferred into storage:
-         - Copy file to the temporary file at its final directory.
+         - Transfer the file to the temporary file at its final directory, using the
+           first strategy that works: rename or hardlink (only for a disposable file),
+           reflink or copy.
          - If possible, verify size of the file to make sure that file is not corrupted.
          - Do atomic rename.
 
@@ -120,6 +136,11 @@ class FileStorage(ContentStorage):
         :param location: The (optional) location within the path
             where the content is to be stored.
         :type location: str
+        :param disposable: The file at *path* is not needed anymore and may be moved into
+            storage.
+        :type disposable: bool
+        :return: The strategy used to transfer the file, one of the IMPORT_* constants.
+        :rtype: str
         """
         destination = unit.storage_path
         if location:
@@ -131,7 +152,7 @@ class FileStorage(ContentStorage):
         # going to use.
         os.close(fd)
 
-        shutil.copy(path, temp_destination)
+        strategy = self._transfer(path, temp_destination, disposable)
 
         try:
             unit.verify_size(temp_destination)
@@ -143,6 +164,46 @@ class FileStorage(ContentStorage):
             raise
 
         os.rename(temp_destination, destination)
+        return strategy
+
+    @staticmethod
+    def _transfer(path, temp_destination, disposable):
+        """
+        Transfer a file to a temporary file in storage, avoiding copying its content when
+        both are on the same filesystem.
+
+        Only a disposable file is renamed or hardlinked: the stored file would otherwise share
+        its inode, and with it the mode and SELinux label, with a file Pulp does not own.
+        A symlink is never renamed or linked, so that its target is what ends up in storage.
+
+        :param path: The absolute path to the file to be stored.
+        :type path: str
+        :param temp_destination: The absolute path to the temporary file in storage.
+        :type temp_destination: str
+        :param disposable: The file at *path* may be moved into storage.
+        :type disposable: bool
+        :return: The strategy used, one of the IMPORT_* constants.
+        :rtype: str
+        """
+        strategies = []
+        is_link = os.path.islink(path)
+        if disposable and not is_link:
+            strategies.append((IMPORT_RENAME, os.rename))
+            strategies.append((IMPORT_HARDLINK, _hardlink))
+        strategies.append((IMPORT_REFLINK, _reflink))
+
+        for strategy, transfer in strategies:
+            try:
+                transfer(path, temp_destination)
+                return strategy
+            except (IOError, OSError), e:
+                # typically, the files are on different filesystems or the filesystem does not
+                # support the strategy; the copy reports any problem with the file itself.
+                _logger.debug('Could not %(s)s %(p)s into storage: %(e)s' %
+                              {'s': strategy, 'p': path, 'e': e})
+
+        shutil.copy(path, temp_destination)
+        return IMPORT_COPY
 
     def get(self, unit):
         """
@@ -157,6 +218,37 @@ class FileStorage(ContentStorage):
         pass
 
 
+def _reflink(path, destination):
+    """
+    Clone a file, sharing its blocks on a copy-on-write filesystem.
+
+    :param path: The absolute path to the file to be cloned.
+    :type path: str
+    :param destination: The absolute path to the clone, which is overwritten.
+    :type destination: str
+    :raises IOError: if the filesystem cannot clone the file.
+    """
+    with open(path, 'rb') as source_file:
+        with open(destination, 'wb') as destination_file:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+    shutil.copymode(path, destination)
+
+
+def _hardlink(path, destination):
+    """
+    Link a file.
+
+    :param path: The absolute path to the file to be linked.
+    :type path: str
+    :param destination: The absolute path to the link, which is replaced.
+    :type destination: str
+    :raises OSError: if the file cannot be linked.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    os.link(path, destination)
+
+
 class SharedStorage(ContentStorage):
     """
     Direct shared storage.
@@ -10,7 +10,9 @@ import uuid
 
 from bson.objectid import ObjectId, InvalidId
 import celery
-from mongoengine import NotUniqueError, OperationError, ValidationError, DoesNotExist
+from mongoengine import NotUniqueError, OperationError, Q, ValidationError, DoesNotExist
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from nectar.config import DownloaderConfig
 from nectar.request import DownloadRequest
 from nectar.downloaders.threaded import HTTPThreadedDownloader
@@ -57,6 +59,18 @@ TYPE_ID = 'type_id'
 UNIT_FILES = 'unit_files'
 REQUEST = 'request'
 
+# Number of associations sent to the database in a single bulk write
+ASSOCIATE_BATCH_SIZE = 1000
+
+# Number of units whose download requests are built from a single catalog query
+DOWNLOAD_BATCH_SIZE = 1000
+
+# Number of associations read at a time when searching the content units of a repository
+FIND_PAGE_SIZE = 1000
+
+# MongoDB error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
 
 def get_associated_unit_ids(repo_id, unit_type, repo_content_unit_q=None):
     """
@@ -203,45 +217,85 @@ def find_repo_content_units(
         pulp.server.db.model.RepositoryContentUnit
 
     """
-
+    # Associations are read in pages, in the order they were created, and the units of each page
+    # are loaded with one query per content type, so memory use does not depend on the size of
+    # the repository. Without a units query every association yields a unit, so skip and limit
+    # can be applied to the association query itself.
     qs = model.RepositoryContentUnit.objects(q_obj=repo_content_unit_q,
-                                             repo_id=repository.repo_id)
+                                             repo_id=repository.repo_id).order_by('id')
+    if yield_content_unit:
+        qs = qs.only('id', 'unit_id', 'unit_type_id')
+
+    skip_count = skip or 0
+    yield_count = 0
+    last_id = None
+    while True:
+        page_size = FIND_PAGE_SIZE
+        if limit and units_q is None:
+            page_size = min(page_size, limit - yield_count)
+        if last_id is not None:
+            page_qs = qs.filter(id__gt=last_id)
+        elif units_q is None and skip_count:
+            page_qs = qs.skip(skip_count)
+            skip_count = 0
+        else:
+            page_qs = qs
+        page = list(page_qs.limit(page_size))
+        if not page:
+            return
+        last_id = page[-1].id
+
+        for repo_content_unit, unit in _find_associated_units(page, units_q, unit_fields):
+            if skip_count:
+                skip_count -= 1
+                continue
 
-    type_map = {}
-    content_units = {}
+            if yield_content_unit:
+                yield unit
+            else:
+                repo_content_unit.unit = unit
+                yield repo_content_unit
+
+            yield_count += 1
+            if limit and yield_count >= limit:
+                return
+
+        if len(page) < page_size:
+            return
 
-    yield_count = 1
-    skip_count = 0
 
-    for repo_content_unit in qs:
-        id_set = type_map.setdefault(repo_content_unit.unit_type_id, set())
-        id_set.add(repo_content_unit.unit_id)
-        content_unit_set = content_units.setdefault(repo_content_unit.unit_type_id, dict())
-        content_unit_set[repo_content_unit.unit_id] = repo_content_unit
+def _find_associated_units(repo_content_units, units_q=None, unit_fields=None):
+    """
+    Load the content units of a page of associations, with one query per content type.
 
+    :param repo_content_units: The associations whose units should be loaded.
+    :type repo_content_units: list of pulp.server.db.model.RepositoryContentUnit
+    :param units_q: Any query filters to apply to the ContentUnits.
+    :type units_q: mongoengine.Q
+    :param unit_fields: List of fields to fetch for the unit objects, defaults to all fields.
+    :type unit_fields: List of str
+
+    :return: Tuples of the association and its unit, in the order of the associations. Associations
+        whose unit does not match units_q are left out.
+    :rtype: generator of tuples
+    """
+    type_map = {}
+    for repo_content_unit in repo_content_units:
+        type_map.setdefault(repo_content_unit.unit_type_id, []).append(repo_content_unit.unit_id)
+
+    units = {}
     for unit_type, unit_ids in type_map.iteritems():
         _model = plugin_api.get_unit_model_by_id(unit_type)
-        qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': list(unit_ids)}})
+        qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': unit_ids}})
         if unit_fields:
             qs = qs.only(*unit_fields)
-
         for unit in qs:
-            if skip and skip_count < skip:
-                skip_count += 1
-                continue
+            units[(unit_type, unit.id)] = unit
 
-            if yield_content_unit:
-                yield unit
-            else:
-                cu = content_units[unit_type][unit.id]
-                cu.unit = unit
-                yield cu
-
-            if limit:
-                if yield_count >= limit:
-                    return
-
-            yield_count += 1
+    for repo_content_unit in repo_content_units:
+        unit = units.get((repo_content_unit.unit_type_id, repo_content_unit.unit_id))
+        if unit is not None:
+            yield repo_content_unit, unit
 
 
 def find_units_not_downloaded(repo_id):
@@ -334,6 +388,68 @@ def associate_single_unit(repository, unit):
         upsert=True)
 
 
+def associate_units(repository, units, batch_size=ASSOCIATE_BATCH_SIZE):
+    """
+    Associate many units to a repository using unordered bulk upserts.
+
+    This has the same effect as calling associate_single_unit for each unit, but sends
+    batch_size associations to the database per round trip.
+
+    :param repository: The repository to update.
+    :type repository: pulp.server.db.model.Repository
+    :param units: The units to associate to the repository.
+    :type units: iterable of pulp.server.db.model.ContentUnit
+    :param batch_size: maximum number of associations to write per bulk operation
+    :type batch_size: int
+    :return: number of associations that were created and number that already existed
+    :rtype: tuple of (int, int)
+    """
+    unit_type_and_ids = ((unit._content_type_id, unit.id) for unit in units)
+    return associate_units_by_id(repository.repo_id, unit_type_and_ids, batch_size)
+
+
+def associate_units_by_id(repo_id, unit_type_and_ids, batch_size=ASSOCIATE_BATCH_SIZE):
+    """
+    Associate many units, identified by type and id, to a repository using unordered bulk
+    upserts.
+
+    :param repo_id: id of the repository to update
+    :type repo_id: basestring
+    :param unit_type_and_ids: (unit_type_id, unit_id) pairs of the units to associate
+    :type unit_type_and_ids: iterable of tuple
+    :param batch_size: maximum number of associations to write per bulk operation
+    :type batch_size: int
+    :return: number of associations that were created and number that already existed
+    :rtype: tuple of (int, int)
+    """
+    collection = model.RepositoryContentUnit._get_collection()
+    inserted = 0
+    matched = 0
+    for page in paginate(unit_type_and_ids, batch_size):
+        formatted_datetime = dateutils.format_iso8601_utc_timestamp(
+            dateutils.now_utc_timestamp())
+        requests = [
+            UpdateOne({'repo_id': repo_id, 'unit_id': unit_id, 'unit_type_id': unit_type_id},
+                      {'$setOnInsert': {'created': formatted_datetime},
+                       '$set': {'updated': formatted_datetime}},
+                      upsert=True)
+            for unit_type_id, unit_id in page]
+        try:
+            result = collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # A concurrent upsert of the same association can lose the race on the unique
+            # index. The association exists either way, so only other errors are fatal.
+            details = e.details
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in details['writeErrors']):
+                raise
+            inserted += details['nUpserted']
+            matched += details['nMatched'] + len(details['writeErrors'])
+        else:
+            inserted += result.upserted_count
+            matched += result.matched_count
+    return inserted, matched
+
+
 def disassociate_units(repository, unit_iterable):
     """
     Disassociate all units in the iterable from the repository
@@ -1401,11 +1517,19 @@ def download_repo(repo_id, verify_all_units=False):
     :type  verify_all_units: bool
     """
     task_description = _('Download Repository Content')
-    if verify_all_units:
-        repo_unit_querysets = get_mongoengine_unit_querysets(repo_id)
-        missing_content_units = chain(*repo_unit_querysets)
-    else:
-        missing_content_units = find_units_not_downloaded(repo_id)
+    # The units are read a page at a time with a new query for each page, since they are
+    # consumed as they are downloaded and an idle cursor would time out.
+    unit_models = get_repo_unit_models(repo_id)
+    units_q = None
+    if not verify_all_units:
+        unit_models = filter(lambda m: issubclass(m, model.FileContentUnit), unit_models)
+        units_q = Q(downloaded=False)
+    unit_type_ids = [unit_model._content_type_id.default for unit_model in unit_models]
+    repo_content_unit_q = Q(unit_type_id__in=unit_type_ids)
+    repository = model.Repository.objects.get_repo_or_missing_resource(repo_id)
+    missing_content_units = find_repo_content_units(
+        repository, repo_content_unit_q=repo_content_unit_q, units_q=units_q,
+        yield_content_unit=True)
 
     download_requests = _create_download_requests(missing_content_units)
     download_step = LazyUnitDownloadStep(
@@ -1416,84 +1540,126 @@ def download_repo(repo_id, verify_all_units=False):
     download_step.start()
 
 
-def _get_deferred_content_units():
+def _get_deferred_content_units(batch_size=DOWNLOAD_BATCH_SIZE):
     """
-    Retrieve a list of units that have been added to the DeferredDownload collection.
+    Retrieve the units that have been added to the DeferredDownload collection. The entries
+    are read in batches and the units of each batch are loaded with one query per type.
+
+    :param batch_size: The number of DeferredDownload entries to handle at a time.
+    :type  batch_size: int
 
     :return: A generator of content units that correspond to DeferredDownload entries.
     :rtype:  generator of pulp.server.db.model.FileContentUnit
     """
-    for deferred_download in model.DeferredDownload.objects.filter():
-        try:
-            unit_model = plugin_api.get_unit_model_by_id(deferred_download.unit_type_id)
+    # Each batch is read with its own query, ordered by ID, so no cursor is left open while the
+    # units of a batch are downloaded.
+    deferred_downloads = model.DeferredDownload.objects.filter().only(
+        'unit_id', 'unit_type_id').order_by('id')
+    last_id = None
+    while True:
+        if last_id is not None:
+            batch_qs = deferred_downloads.filter(id__gt=last_id)
+        else:
+            batch_qs = deferred_downloads
+        batch = list(batch_qs.limit(batch_size))
+        if not batch:
+            return
+        last_id = batch[-1].id
+
+        unit_ids_by_type = {}
+        for deferred_download in batch:
+            unit_ids = unit_ids_by_type.setdefault(deferred_download.unit_type_id, [])
+            unit_ids.append(deferred_download.unit_id)
+
+        for unit_type_id, unit_ids in unit_ids_by_type.items():
+            unit_model = plugin_api.get_unit_model_by_id(unit_type_id)
             if unit_model is None:
                 _logger.error(_('Unable to find the model object for the {type} type.').format(
-                    type=deferred_download.unit_type_id))
-            else:
-                unit = unit_model.objects.filter(id=deferred_download.unit_id).get()
+                    type=unit_type_id))
+                continue
+            missing = set(unit_ids)
+            for unit in list(unit_model.objects.filter(id__in=unit_ids)):
+                missing.discard(unit.id)
                 yield unit
-        except DoesNotExist:
-            # This is normal if the content unit in question has been purged during an
-            # orphan cleanup.
-            _logger.debug(_('Unable to find the {type}:{id} content unit.').format(
-                type=deferred_download.unit_type_id, id=deferred_download.unit_id))
+            for unit_id in missing:
+                # This is normal if the content unit in question has been purged during an
+                # orphan cleanup.
+                _logger.debug(_('Unable to find the {type}:{id} content unit.').format(
+                    type=unit_type_id, id=unit_id))
+
+        if len(batch) < batch_size:
+            return
 
 
-def _create_download_requests(content_units):
+def _create_download_requests(content_units, batch_size=DOWNLOAD_BATCH_SIZE):
     """
-    Make a list of Nectar DownloadRequests for the given content units using
-    the lazy catalog.
+    Generate Nectar DownloadRequests for the given content units using the lazy catalog.
 
-    :param content_units: The content units to build a list of DownloadRequests for.
-    :type  content_units: list of pulp.server.db.model.FileContentUnit
+    The catalog entries are loaded with a single query for each batch of units, and the
+    requests are generated lazily so the download can start before every unit has been
+    read. All the requests for a unit are generated together, since each of them holds
+    the complete set of files in the unit.
 
-    :return: A list of DownloadRequests; each request includes a ``data``
+    :param content_units: The content units to generate DownloadRequests for.
+    :type  content_units: iterable of pulp.server.db.model.FileContentUnit
+    :param batch_size:    The number of units whose catalog entries are loaded at a time.
+    :type  batch_size:    int
+
+    :return: A generator of DownloadRequests; each request includes a ``data``
              instance variable which is a dict containing the FileContentUnit,
              the list of files in the unit, and the downloaded file's storage
              path.
-    :rtype:  list of nectar.request.DownloadRequest
+    :rtype:  generator of nectar.request.DownloadRequest
     """
-    requests = []
     working_dir = common_utils.get_working_directory()
     signing_key = Key.load(pulp_conf.get('authentication', 'rsa_key'))
 
-    for content_unit in content_units:
-        # All files in the unit; every request for a unit has a reference to this dict.
-        unit_files = {}
-        unit_working_dir = os.path.join(working_dir, content_unit.id)
-        for file_path in content_unit.list_files():
-            qs = model.LazyCatalogEntry.objects.filter(
-                unit_id=content_unit.id,
-                unit_type_id=content_unit.type_id,
-                path=file_path
-            )
-            catalog_entry = qs.order_by('revision').first()
-            if catalog_entry is None:
-                continue
-            signed_url = _get_streamer_url(catalog_entry, signing_key)
-
-            temporary_destination = os.path.join(
-                unit_working_dir,
-                os.path.basename(catalog_entry.path)
-            )
-            mkdir(unit_working_dir)
-            unit_files[temporary_destination] = {
-                CATALOG_ENTRY: catalog_entry,
-                PATH_DOWNLOADED: None,
-            }
-
-            request = DownloadRequest(signed_url, temporary_destination)
-            # For memory reasons, only hold onto the id and type_id so we can reload the unit
-            # once it's successfully downloaded.
-            request.data = {
-                TYPE_ID: content_unit.type_id,
-                UNIT_ID: content_unit.id,
-                UNIT_FILES: unit_files,
-                REQUEST: request
-            }
-            requests.append(request)
-
-    return requests
+    for batch in paginate(content_units, batch_size):
+        unit_files_by_id = dict((unit.id, unit.list_files()) for unit in batch)
+        paths = list(chain(*unit_files_by_id.values()))
+        # The query is on the indexed path; the lowest revision of each entry is used.
+        catalog_entries = {}
+        qs = model.LazyCatalogEntry.objects.filter(path__in=paths,
+                                                   unit_id__in=unit_files_by_id.keys())
+        for catalog_entry in qs.order_by('revision'):
+            key = (catalog_entry.unit_id, catalog_entry.unit_type_id, catalog_entry.path)
+            catalog_entries.setdefault(key, catalog_entry)
+
+        for content_unit in batch:
+            # All files in the unit; every request for a unit has a reference to this dict.
+            unit_files = {}
+            unit_requests = []
+            unit_working_dir = os.path.join(working_dir, content_unit.id)
+            for file_path in unit_files_by_id[content_unit.id]:
+                catalog_entry = catalog_entries.get(
+                    (content_unit.id, content_unit.type_id, file_path))
+                if catalog_entry is None:
+                    continue
+                signed_url = _get_streamer_url(catalog_entry, signing_key)
+
+                temporary_destination = os.path.join(
+                    unit_working_dir,
+                    os.path.basename(catalog_entry.path)
+                )
+                mkdir(unit_working_dir)
+                unit_files[temporary_destination] = {
+                    CATALOG_ENTRY: catalog_entry,
+                    PATH_DOWNLOADED: None,
+                }
+
+                request = DownloadRequest(signed_url, temporary_destination)
+                # For memory reasons, only hold onto the id and type_id so we can reload the
+                # unit once it's successfully downloaded.
+                request.data = {
+                    TYPE_ID: content_unit.type_id,
+                    UNIT_ID: content_unit.id,
+                    UNIT_FILES: unit_files,
+                    REQUEST: request
+                }
+                unit_requests.append(request)
+
+            for request in unit_requests:
+                yield request
 
 
 def _get_streamer_url(catalog_entry, signing_key):
@@ -1530,8 +1696,11 @@ class LazyUnitDownloadStep(DownloadEventListener):
     A Step that downloads all the given requests. The downloader is configured
     to download from the Pulp Streamer components.
 
+    The requests may be generated lazily; they are counted as the downloader consumes
+    them, and the step is only complete once they have all been generated and processed.
+
     :ivar download_requests: The download requests the step will process.
-    :type download_requests: list of nectar.request.DownloadRequest
+    :type download_requests: iterable of nectar.request.DownloadRequest
     :ivar download_config:   The keyword args used to initialize the Nectar
                              downloader configuration.
     :type download_config:   dict
@@ -1543,8 +1712,8 @@ class LazyUnitDownloadStep(DownloadEventListener):
         """
         Initializes a Step that downloads all the download requests provided.
 
-        :param download_requests:   List of download requests to process.
-        :type  download_requests:   list of nectar.request.DownloadRequest
+        :param download_requests:   Download requests to process.
+        :type  download_requests:   iterable of nectar.request.DownloadRequest
         """
         self.description = step_description
         self.download_requests = download_requests
@@ -1566,7 +1735,9 @@ class LazyUnitDownloadStep(DownloadEventListener):
         self.progress_successes = 0
         self.progress_failures = 0
         self.error_details = []
-        self.total_units = len(download_requests)
+        self.total_units = 0
+        self.generation_complete = False
+        self.requests_per_second = 0
         self.last_report_time = 0
         self.last_reported_state = self.state
         self.timestamp = str(time.time())
@@ -1578,7 +1749,27 @@ class LazyUnitDownloadStep(DownloadEventListener):
         """
         self.state = reporting_constants.STATE_RUNNING
         self.report()
-        self.downloader.download(self.download_requests)
+        self.downloader.download(self._generate_requests())
+        self.report()
+
+    def _generate_requests(self):
+        """
+        Pass the download requests on to the downloader, counting them and measuring the
+        rate at which they are generated.
+
+        :return: A generator of the download requests.
+        :rtype:  generator of nectar.request.DownloadRequest
+        """
+        start = time.time()
+        try:
+            for request in self.download_requests:
+                self.total_units += 1
+                elapsed = time.time() - start
+                if elapsed > 0:
+                    self.requests_per_second = self.total_units / elapsed
+                yield request
+        finally:
+            self.generation_complete = True
 
     def report(self):
         """
@@ -1587,7 +1778,7 @@ class LazyUnitDownloadStep(DownloadEventListener):
         progress reporting system when that has been implemented.
         """
         total_processed = self.progress_successes + self.progress_failures
-        if self.total_units == total_processed:
+        if self.generation_complete and self.total_units == total_processed:
             self.state = reporting_constants.STATE_COMPLETE
 
         if self.progress_failures > 0:
@@ -1603,7 +1794,9 @@ class LazyUnitDownloadStep(DownloadEventListener):
             reporting_constants.PROGRESS_NUM_FAILURES_KEY: self.progress_failures,
             reporting_constants.PROGRESS_ITEMS_TOTAL_KEY: self.total_units,
             reporting_constants.PROGRESS_DESCRIPTION_KEY: self.description,
-            reporting_constants.PROGRESS_DETAILS_KEY: self.progress_details
+            reporting_constants.PROGRESS_DETAILS_KEY: self.progress_details,
+            reporting_constants.PROGRESS_QUEUE_DEPTH_KEY: self.total_units - total_processed,
+            reporting_constants.PROGRESS_REQUESTS_PER_SECOND_KEY: self.requests_per_second,
         }
         report = {self.step_id: [progress]}
 
@@ -1700,14 +1893,17 @@ class LazyUnitDownloadStep(DownloadEventListener):
                 catalog_entry.checksum
             )
 
+            # The download is written to the working directory, so it can be moved into
+            # storage instead of copied.
             if len(report.data[UNIT_FILES]) == 1:
-                content_unit.import_content(report.destination)
+                content_unit.import_content(report.destination, disposable=True)
             else:
                 relative_path = os.path.relpath(
                     catalog_entry.path,
                     content_unit.storage_path,
                 )
-                content_unit.import_content(report.destination, location=relative_path)
+                content_unit.import_content(report.destination, location=relative_path,
+                                            disposable=True)
             self.progress_successes += 1
             path_entry[PATH_DOWNLOADED] = True
         except (InvalidChecksumType, VerificationException, IOError), e:
@@ -0,0 +1,49 @@
+"""
+This migration stores the digest of the unit key on every content unit whose type is defined by
+a mongoengine model, so units can be looked up by unit key with an indexed query.
+"""
+import logging
+
+from pymongo import UpdateOne
+
+from pulp.plugins.loader.manager import PluginManager
+
+
+_logger = logging.getLogger(__name__)
+
+# Number of units updated with a single bulk write
+BATCH_SIZE = 1000
+
+
+def migrate(*args, **kwargs):
+    """
+    Perform the migration as described in this module's docblock.
+
+    :param args:   unused
+    :type  args:   list
+    :param kwargs: unused
+    :type  kwargs: dict
+    """
+    for model_class in PluginManager().unit_models.values():
+        migrate_units(model_class)
+
+
+def migrate_units(model_class):
+    """
+    Store the digest of the unit key on the units of a content type that do not have one.
+
+    :param model_class: The model of the content type.
+    :type  model_class: pulp.server.db.model.ContentUnit
+    """
+    collection = model_class._get_collection()
+    units = model_class.objects(__raw__={'_unit_key_digest': {'$exists': False}})
+    units = units.only(*model_class.unit_key_fields).no_cache()
+    requests = []
+    for unit in units:
+        requests.append(UpdateOne({'_id': unit.id},
+                                  {'$set': {'_unit_key_digest': unit.unit_key_as_digest()}}))
+        if len(requests) >= BATCH_SIZE:
+            collection.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        collection.bulk_write(requests, ordered=False)
@@ -220,6 +220,10 @@ class RepositoryContentUnit(AutoRetryDocument):
                 {
                     # Used for reverse lookup of units to repositories
                     'fields': ['unit_id']
+                },
+                {
+                    # Used to page through the associations of a repository in order
+                    'fields': ['repo_id', 'id']
                 }
             ],
             'queryset_class': RepositoryContentUnitQuerySet
@@ -507,7 +511,9 @@ class TaskStatus(AutoRetryDocument, ReaperMixin):
     _ns = StringField(default='task_status')
 
     meta = {'collection': 'task_status',
-            'indexes': ['-tags', '-state', {'fields': ['-task_id'], 'unique': True}, '-group_id'],
+            'indexes': ['-tags', '-state', {'fields': ['-task_id'], 'unique': True}, '-group_id',
+                        # Used to page through the tasks in a state or with a tag in order
+                        {'fields': ['state', 'id']}, {'fields': ['tags', 'id']}],
             'allow_inheritance': False,
             'queryset_class': CriteriaQuerySet}
 
@@ -607,15 +613,19 @@ class ContentUnit(AutoRetryDocument):
     :type _last_updated: mongoengine.IntField
     :ivar _storage_path: The absolute path to associated content files.
     :type _storage_path: mongoengine.StringField
+    :ivar _unit_key_digest: The digest of the unit key, used to look up units by unit key.
+    :type _unit_key_digest: mongoengine.StringField
     """
 
     id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
     pulp_user_metadata = DictField()
     _last_updated = IntField(required=True)
     _storage_path = StringField()
+    _unit_key_digest = StringField()
 
     meta = {
         'abstract': True,
+        'indexes': ['_unit_key_digest'],
     }
 
     NAMED_TUPLE = _ContentUnitNamedTupleDescriptor()
@@ -698,7 +708,7 @@ class ContentUnit(AutoRetryDocument):
         """
         The signal that is triggered before a unit is saved, this is used to
         support the legacy behavior of generating the unit id and setting
-        the _last_updated timestamp
+        the _last_updated timestamp, and to store the digest of the unit key
 
         :param sender: sender class
         :type sender: object
@@ -706,6 +716,7 @@ class ContentUnit(AutoRetryDocument):
         :type document: ContentUnit
         """
         document._last_updated = dateutils.now_utc_timestamp()
+        document._unit_key_digest = document.unit_key_as_digest()
 
     def get_repositories(self):
         """
@@ -780,20 +791,64 @@ class ContentUnit(AutoRetryDocument):
         """
         The digest (hash) of the unit key.
 
+        :param algorithm: A hashing algorithm object. Uses SHA256 when not specified.
+        :type algorithm: hashlib.algorithm
+        :return: The hex digest of the unit key.
+        :rtype: str
+        """
+        return self.digest_unit_key(self.unit_key, algorithm)
+
+    @staticmethod
+    def digest_unit_key(unit_key, algorithm=None):
+        """
+        The digest (hash) of a unit key. This is the digest stored in the _unit_key_digest
+        field of units, so units can be looked up by unit key with a single indexed query.
+
+        :param unit_key: The unit key fields and their values.
+        :type unit_key: dict
         :param algorithm: A hashing algorithm object. Uses SHA256 when not specified.
         :type algorithm: hashlib.algorithm
         :return: The hex digest of the unit key.
         :rtype: str
         """
         _hash = algorithm or sha256()
-        for key, value in sorted(self.unit_key.items()):
+        for key, value in sorted(unit_key.items()):
             _hash.update(key)
-            if not isinstance(value, basestring):
+            if isinstance(value, unicode):
+                _hash.update(value.encode('utf-8'))
+            elif not isinstance(value, basestring):
                 _hash.update(str(value))
             else:
                 _hash.update(value)
         return _hash.hexdigest()
 
+    @staticmethod
+    def unit_keys_equal(unit_key, other_unit_key):
+        """
+        Whether two unit keys have the same fields and values.
+
+        Different unit keys may have the same digest, so units looked up by digest are
+        compared on their unit key fields as well. Text values are compared as UTF-8.
+
+        :param unit_key: The unit key fields and their values.
+        :type unit_key: dict
+        :param other_unit_key: The unit key fields and their values to compare with.
+        :type other_unit_key: dict
+        :return: True if both unit keys identify the same unit.
+        :rtype: bool
+        """
+        if set(unit_key) != set(other_unit_key):
+            return False
+        for key, value in unit_key.iteritems():
+            other_value = other_unit_key[key]
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            if isinstance(other_value, unicode):
+                other_value = other_value.encode('utf-8')
+            if type(value) is not type(other_value) or value != other_value:
+                return False
+        return True
+
     def list_files(self):
         """
         List absolute paths to files associated with this unit.
@@ -867,7 +922,7 @@ class FileContentUnit(ContentUnit):
                 raise ValueError(_('must be relative path'))
         self._storage_path = path
 
-    def import_content(self, path, location=None):
+    def import_content(self, path, location=None, disposable=False):
         """
         Import a content file into platform storage.
         The (optional) *location* may be used to specify a path within the unit
@@ -881,6 +936,12 @@ class FileContentUnit(ContentUnit):
         :param location: The (optional) location within the unit storage path
             where the content is to be stored.
         :type location: str
+        :param disposable: The file at *path* is not needed anymore, so it may be moved
+            into storage rather than copied.
+        :type disposable: bool
+        :return: The strategy used to import the file; one of the IMPORT_* constants
+            in pulp.server.content.storage.
+        :rtype: str
 
         :raises ImportError: if the unit has not been saved.
         :raises PulpCodedException: PLP0037 if *path* is not an existing file.
@@ -891,7 +952,10 @@ class FileContentUnit(ContentUnit):
         if not os.path.isfile(path):
             raise exceptions.PulpCodedException(error_code=error_codes.PLP0037, path=path)
         with FileStorage() as storage:
-            storage.put(self, path, location)
+            strategy = storage.put(self, path, location, disposable=disposable)
+        _logger.debug(_('Imported {path} into storage for unit {id} using {strategy}.').format(
+            path=path, id=self.id, strategy=strategy))
+        return strategy
 
     def save_and_import_content(self, path, location=None):
         """
@@ -1089,6 +1153,9 @@ class LazyCatalogEntry(AutoRetryDocument):
         """
         Add the entry using the next revision number.
         Previous revisions are deleted.
+
+        This takes three queries per entry; use pulp.server.lazy.catalog.LazyCatalogWriter
+        to add many entries.
         """
         revisions = set([0])
         query = dict(
@@ -12,12 +12,10 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
-import hashlib
-import json
 
 from pulp.server.db.model.base import Model
 from pulp.server.db.model.reaper_base import ReaperMixin
-from pulp.common import dateutils
+from pulp.common import dateutils, unit_profile
 
 
 # -- classes -----------------------------------------------------------------
@@ -265,6 +263,10 @@ class UnitProfile(Model):
     :type profile:      object
     :ivar  profile_hash: A hash of the profile, used for quick comparisons of profiles
     :type profile_hash: basestring
+    :ivar  upload_hash:  A hash of the profile as it was last uploaded by the consumer, before
+                         the profiler updated it. Consumers use it to skip uploading a profile
+                         the server already has.
+    :type upload_hash:  basestring
     """
 
     collection_name = 'consumer_unit_profiles'
@@ -272,7 +274,7 @@ class UnitProfile(Model):
         ('consumer_id', 'content_type'),
     )
 
-    def __init__(self, consumer_id, content_type, profile, profile_hash=None):
+    def __init__(self, consumer_id, content_type, profile, profile_hash=None, upload_hash=None):
         """
         :param consumer_id:  A consumer ID.
         :type  consumer_id:  str
@@ -284,12 +286,15 @@ class UnitProfile(Model):
                              None, the constructor will automatically calculate it based on the
                              profile.
         :type  profile_hash: basestring
+        :param upload_hash:  A hash of the profile as it was uploaded by the consumer.
+        :type  upload_hash:  basestring
         """
         super(UnitProfile, self).__init__()
         self.consumer_id = consumer_id
         self.content_type = content_type
         self.profile = profile
         self.profile_hash = profile_hash
+        self.upload_hash = upload_hash
 
         if self.profile_hash is None:
             self.profile_hash = self.calculate_hash(self.profile)
@@ -305,10 +310,92 @@ class UnitProfile(Model):
         :return:        Hash of profile
         :rtype:         basestring
         """
-        # Don't use any whitespace in the json separators, and sort dictionary keys to be repeatable
-        serialized_profile = json.dumps(profile, separators=(',', ':'), sort_keys=True)
-        hasher = hashlib.sha256(serialized_profile)
-        return hasher.hexdigest()
+        # Consumers hash the profiles they upload the same way
+        return unit_profile.calculate_hash(profile)
+
+
+class ApplicabilityReport(Model):
+    """
+    A materialized consumer applicability report for a consumer criteria, as queried through
+    retrieve_consumer_applicability.
+
+    The report records which consumers matched the criteria, and the consumers bound to each
+    combination of profile hash and repository are stored in ApplicabilityReportEntry documents.
+    The applicability itself is not stored, so regenerated applicability is reported as soon as
+    it is saved.
+
+    Consumers whose profiles or bindings change are added to the dirty consumers of the
+    reports that include them, and their entries are refreshed the next time the report is
+    queried.
+
+    :ivar report_key:         A digest of the consumer criteria the report was built for
+    :type report_key:         str
+    :ivar consumer_ids:       The IDs of the consumers the entries were built for
+    :type consumer_ids:       list
+    :ivar dirty_consumer_ids: The IDs of consumers whose entries need to be refreshed
+    :type dirty_consumer_ids: list
+    :ivar version:            Incremented each time consumers are marked dirty
+    :type version:            int
+    :ivar last_used:          The time the report was last queried, in seconds since the epoch
+    :type last_used:          float
+    """
+
+    collection_name = 'consumer_applicability_reports'
+    unique_indices = ('report_key',)
+    search_indices = ('consumer_ids', 'last_used')
+
+    def __init__(self, report_key, last_used):
+        """
+        :param report_key: A digest of the consumer criteria the report is built for
+        :type  report_key: str
+        :param last_used:  The time the report was queried, in seconds since the epoch
+        :type  last_used:  float
+        """
+        super(ApplicabilityReport, self).__init__()
+        self.report_key = report_key
+        self.consumer_ids = []
+        self.dirty_consumer_ids = []
+        self.version = 0
+        self.last_used = last_used
+
+        # The superclass puts an unnecessary id attribute on this model.
+        del self.id
+
+    @classmethod
+    def consumers_changed(cls, consumer_ids):
+        """
+        Mark the profiles or bindings of consumers as changed in all the reports that include
+        them.
+
+        :param consumer_ids: The IDs of the consumers that changed
+        :type  consumer_ids: list
+        """
+        cls.get_collection().update_many(
+            {'consumer_ids': {'$in': consumer_ids}},
+            {'$addToSet': {'dirty_consumer_ids': {'$each': consumer_ids}},
+             '$inc': {'version': 1}})
+
+
+class ApplicabilityReportEntry(Model):
+    """
+    The consumers of an ApplicabilityReport that are bound to a repository and have a profile
+    with a given hash.
+
+    :ivar report_id:    The ID of the ApplicabilityReport this entry belongs to
+    :type report_id:    bson.objectid.ObjectId
+    :ivar profile_hash: The hash of the profile
+    :type profile_hash: str
+    :ivar repo_id:      The ID of the repository
+    :type repo_id:      str
+    :ivar consumer_ids: The IDs of the consumers that have the profile and are bound to the
+                        repository
+    :type consumer_ids: list
+    """
+
+    collection_name = 'consumer_applicability_report_entries'
+    unique_indices = (
+        ('report_id', 'profile_hash', 'repo_id'),
+    )
 
 
 class ConsumerHistoryEvent(Model, ReaperMixin):
@@ -27,3 +27,32 @@ class EventListener(Model):
         self.notifier_type_id = notifier_type_id
         self.notifier_config = notifier_config
         self.event_types = event_types
+
+
+class EventOutboxEntry(Model):
+    """
+    A message a notifier has not delivered yet. Entries are only stored when the outbox is
+    enabled in the server configuration, and are removed once the message is delivered or
+    cannot be delivered.
+
+    An entry is leased by the process delivering it. When the lease expires, for instance
+    because the process exited, any process sending events may claim the entry and deliver it.
+
+    :ivar notifier_type_id: identifies the notifier that delivers the message
+    :type notifier_type_id: str
+    :ivar args:             the arguments the notifier's send function is called with
+    :type args:             list
+    :ivar lease_expires:    the time, in seconds since the epoch, after which another process
+                            may deliver the message
+    :type lease_expires:    float
+    """
+
+    collection_name = 'event_outbox'
+    search_indices = ('lease_expires',)
+
+    def __init__(self, notifier_type_id, args, lease_expires):
+        super(EventOutboxEntry, self).__init__()
+
+        self.notifier_type_id = notifier_type_id
+        self.args = args
+        self.lease_expires = lease_expires
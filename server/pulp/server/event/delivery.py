@@ -0,0 +1,243 @@
+"""
+Asynchronous delivery of the messages notifiers send to remote services.
+
+Each notifier type has a bounded pool of worker threads, rather than a thread per message.
+A message that could not be delivered because of a transient error is retried with an
+exponential backoff. The pool is started by the first message a process submits, so the
+workers of a forked process are started in that process.
+
+When the outbox is enabled in the server configuration, each message is also stored in the
+event_outbox collection until it is delivered. Messages that were not delivered when a process
+exited, or that did not fit in the pool's queue, are delivered again once their lease expires
+by the next process that sends messages.
+"""
+
+from collections import namedtuple
+from gettext import gettext as _
+import logging
+import os
+import Queue
+import threading
+import time
+
+from pulp.server.config import config
+from pulp.server.db.model.event import EventOutboxEntry
+
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of seconds between two attempts to deliver a message
+MAX_RETRY_DELAY = 300
+
+# Number of seconds an outbox entry is leased to the process delivering it
+OUTBOX_LEASE = 3600
+
+# Minimum number of seconds between two checks of the outbox for expired leases
+OUTBOX_POLL_INTERVAL = 60
+
+# Maximum number of outbox entries claimed by a single check
+OUTBOX_BATCH_SIZE = 100
+
+# A message submitted to a pool, with the ID of its outbox entry or None
+Message = namedtuple('Message', ('args', 'entry_id'))
+
+# Notifier type ID -> DeliveryPool, populated by the notifiers when they are imported
+_pools = {}
+
+_outbox_lock = threading.Lock()
+_next_outbox_poll = [0]
+
+
+class DeliveryFailed(Exception):
+    """
+    Raised by a send function when a message could not be delivered because of an error that
+    may not happen again, so delivering the message should be retried.
+    """
+    pass
+
+
+class DeliveryPool(object):
+    """
+    A bounded queue of messages for a notifier type, delivered by a fixed number of worker
+    threads.
+    """
+
+    def __init__(self, notifier_type_id, send, workers_option):
+        """
+        :param notifier_type_id: identifies the notifier that delivers the messages
+        :type  notifier_type_id: str
+        :param send:             called with the arguments of a message to deliver it;
+                                 raises DeliveryFailed when delivering it should be retried
+        :type  send:             callable
+        :param workers_option:   the option of the notifications section of the server
+                                 configuration that holds the number of workers
+        :type  workers_option:   str
+        """
+        self.notifier_type_id = notifier_type_id
+        self.send = send
+        self.workers_option = workers_option
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def submit(self, message):
+        """
+        Queue a message for delivery, starting the workers if needed.
+
+        :param message: the message to deliver
+        :type  message: Message
+
+        :return: False if the queue is full and the message was not queued
+        :rtype:  bool
+        """
+        queue = self._start()
+        try:
+            queue.put_nowait(message)
+        except Queue.Full:
+            return False
+        return True
+
+    def _start(self):
+        """
+        Start the workers, unless they were already started by this process.
+
+        :return: the queue of the workers
+        :rtype:  Queue.Queue
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = Queue.Queue(config.getint('notifications', 'queue_size'))
+                for i in range(config.getint('notifications', self.workers_option)):
+                    worker = threading.Thread(target=self._work, args=(self._queue,),
+                                              name='%s-notifier-%d' % (self.notifier_type_id, i))
+                    worker.daemon = True
+                    worker.start()
+            return self._queue
+
+    def _work(self, queue):
+        """
+        Deliver the messages of a queue until the process exits.
+
+        :param queue: the queue of the workers
+        :type  queue: Queue.Queue
+        """
+        while True:
+            message = queue.get()
+            try:
+                self.deliver(message)
+            except Exception:
+                _logger.exception(_('Unexpected error delivering a message of notifier type '
+                                    '[%(t)s]') % {'t': self.notifier_type_id})
+            finally:
+                queue.task_done()
+
+    def deliver(self, message):
+        """
+        Deliver a message, retrying with an exponential backoff while the send function raises
+        DeliveryFailed. The outbox entry of the message is removed once it is delivered or all
+        the attempts failed.
+
+        :param message: the message to deliver
+        :type  message: Message
+        """
+        max_attempts = config.getint('notifications', 'max_attempts')
+        delay = config.getfloat('notifications', 'retry_delay')
+        attempt = 1
+        while True:
+            try:
+                self.send(*message.args)
+                break
+            except DeliveryFailed, e:
+                if attempt >= max_attempts:
+                    _logger.error(_('Giving up delivering a message of notifier type [%(t)s] '
+                                    'after %(n)d attempts: %(e)s') %
+                                  {'t': self.notifier_type_id, 'n': attempt, 'e': e})
+                    break
+                _logger.warning(_('Attempt %(n)d to deliver a message of notifier type [%(t)s] '
+                                  'failed, retrying in %(d)s seconds: %(e)s') %
+                                {'t': self.notifier_type_id, 'n': attempt, 'd': delay, 'e': e})
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                attempt += 1
+        if message.entry_id is not None:
+            EventOutboxEntry.get_collection().remove({'_id': message.entry_id})
+
+
+def register(notifier_type_id, send, workers_option):
+    """
+    Create the delivery pool of a notifier type.
+
+    :param notifier_type_id: identifies the notifier that delivers the messages
+    :type  notifier_type_id: str
+    :param send:             called with the arguments of a message to deliver it; raises
+                             DeliveryFailed when delivering it should be retried
+    :type  send:             callable
+    :param workers_option:   the option of the notifications section of the server
+                             configuration that holds the number of workers
+    :type  workers_option:   str
+    """
+    _pools[notifier_type_id] = DeliveryPool(notifier_type_id, send, workers_option)
+
+
+def submit(notifier_type_id, *args):
+    """
+    Deliver a message in the background. The message is stored in the outbox first if it
+    is enabled.
+
+    :param notifier_type_id: identifies the notifier that delivers the message
+    :type  notifier_type_id: str
+    :param args:             the arguments the notifier's send function is called with; they
+                             must be serializable to BSON when the outbox is enabled
+    :type  args:             list
+    """
+    pool = _pools[notifier_type_id]
+    entry_id = None
+    if config.getboolean('notifications', 'outbox'):
+        _poll_outbox()
+        entry = EventOutboxEntry(notifier_type_id, list(args), time.time() + OUTBOX_LEASE)
+        entry_id = EventOutboxEntry.get_collection().save(entry)
+    if not pool.submit(Message(args, entry_id)):
+        if entry_id is not None:
+            _logger.warning(_('The queue of notifier type [%(t)s] is full, the message will be '
+                              'delivered from the outbox later') % {'t': notifier_type_id})
+        else:
+            _logger.error(_('The queue of notifier type [%(t)s] is full, the message was '
+                            'dropped') % {'t': notifier_type_id})
+
+
+def redeliver():
+    """
+    Claim the outbox entries whose lease expired and queue them for delivery.
+    """
+    collection = EventOutboxEntry.get_collection()
+    for i in range(OUTBOX_BATCH_SIZE):
+        now = time.time()
+        entry = collection.find_one_and_update({'lease_expires': {'$lt': now}},
+                                               {'$set': {'lease_expires': now + OUTBOX_LEASE}})
+        if entry is None:
+            return
+        pool = _pools.get(entry['notifier_type_id'])
+        if pool is None:
+            _logger.error(_('Discarding a message of unknown notifier type [%(t)s] from the '
+                            'outbox') % {'t': entry['notifier_type_id']})
+            collection.remove({'_id': entry['_id']})
+            continue
+        if not pool.submit(Message(entry['args'], entry['_id'])):
+            # The lease will expire again and the entry will be claimed by a later check
+            return
+
+
+def _poll_outbox():
+    """
+    Redeliver expired outbox entries, at most once per OUTBOX_POLL_INTERVAL in a process.
+    """
+    now = time.time()
+    with _outbox_lock:
+        if now < _next_outbox_poll[0]:
+            return
+        _next_outbox_poll[0] = now + OUTBOX_POLL_INTERVAL
+    try:
+        redeliver()
+    except Exception:
+        _logger.exception(_('Error redelivering messages from the outbox'))
@@ -6,31 +6,53 @@ url
   Full URL to contact with the event data. A POST request will be made to this
   URL with the contents of the events in the body.
 
-Eventually this should be enhanced to support authentication credentials as well.
+username, password
+  Optional credentials used to authenticate to the URL with basic authentication.
+
+The requests are made by the pool of HTTP notifier workers, each of which keeps its
+connections open between requests.
 """
 from gettext import gettext as _
 import logging
 import threading
 
 from pulp.server.compat import json, json_util
+from pulp.server.event import delivery
 
-from requests import post
+from requests import RequestException, Session
 from requests.auth import HTTPBasicAuth
 
 
 TYPE_ID = 'http'
 
+# Number of seconds to wait for the server to respond
+HTTP_TIMEOUT = 60
+
 _logger = logging.getLogger(__name__)
 
+# holds the HTTP session of each worker thread
+_local = threading.local()
+
 
 def handle_event(notifier_config, event):
-    # fire the actual http push function off in a separate thread to keep
+    # hand the actual http push off to the delivery workers to keep
     # pulp from blocking or deadlocking due to the tasking subsystem
     json_body = json.dumps(event.data(), default=json_util.default)
     _logger.info(json_body)
-    thread = threading.Thread(target=_send_post, args=[notifier_config, json_body])
-    thread.setDaemon(True)
-    thread.start()
+    delivery.submit(TYPE_ID, notifier_config, json_body)
+
+
+def _get_session():
+    """
+    Get the HTTP session of the current thread, which pools its connections.
+
+    :return: The HTTP session.
+    :rtype:  requests.Session
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = Session()
+    return session
 
 
 def _send_post(notifier_config, json_body):
@@ -43,6 +65,9 @@ def _send_post(notifier_config, json_body):
     :type notifier_config:  dict
     :param json_body:       The POST data that has been serialized to JSON.
     :param json_body:       dict
+
+    :raises pulp.server.event.delivery.DeliveryFailed: if the request failed and should be
+                                                       retried
     """
     if 'url' not in notifier_config or not notifier_config['url']:
         _logger.error(_('HTTP notifier configured without a URL; cannot fire event'))
@@ -55,7 +80,16 @@ def _send_post(notifier_config, json_body):
     else:
         auth = None
 
-    response = post(url, data=json_body, auth=auth, headers={'Content-Type': 'application/json'})
+    try:
+        response = _get_session().post(url, data=json_body, auth=auth, timeout=HTTP_TIMEOUT,
+                                       headers={'Content-Type': 'application/json'})
+    except RequestException, e:
+        raise delivery.DeliveryFailed(e)
     if response.status_code != 200:
         _logger.error(_('Received HTTP {code} from HTTP notifier to {url}.').format(
             code=response.status_code, url=url))
+        if response.status_code >= 500:
+            raise delivery.DeliveryFailed(response.status_code)
+
+
+delivery.register(TYPE_ID, _send_post, 'http_workers')
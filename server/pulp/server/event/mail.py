@@ -1,5 +1,7 @@
+from gettext import gettext as _
 import logging
 import smtplib
+import socket
 import threading
 
 try:
@@ -10,11 +12,15 @@ except ImportError:
 
 from pulp.server.compat import json, json_util
 from pulp.server.config import config
+from pulp.server.event import delivery
 
 
 TYPE_ID = 'email'
 _logger = logging.getLogger(__name__)
 
+# holds the SMTP connection of each worker thread
+_local = threading.local()
+
 
 def handle_event(notifier_config, event):
     """
@@ -37,14 +43,12 @@ def handle_event(notifier_config, event):
     addresses = notifier_config['addresses']
 
     for address in addresses:
-        thread = threading.Thread(target=_send_email, args=(subject, body, address))
-        thread.daemon = True
-        thread.start()
+        delivery.submit(TYPE_ID, subject, body, address)
 
 
 def _send_email(subject, body, to_address):
     """
-    Send a text email to one recipient
+    Send a text email to one recipient, using the SMTP connection of the current thread.
 
     :param subject: email subject
     :type  subject: basestring
@@ -53,6 +57,8 @@ def _send_email(subject, body, to_address):
     :param to_address:  email address to send to
     :type  to_address:  basestring
 
+    :raises pulp.server.event.delivery.DeliveryFailed: if the email could not be sent and
+                                                       should be retried
     :return: None
     """
     host = config.get('email', 'host')
@@ -64,17 +70,62 @@ def _send_email(subject, body, to_address):
     message['From'] = from_address
     message['To'] = to_address
 
+    connection = _get_connection(host, port)
+    reused = connection is not None
     try:
-        connection = smtplib.SMTP(host=host, port=port)
-    except smtplib.SMTPConnectError:
-        _logger.exception('SMTP connection failed to %s on %s' % (host, port))
-        return
-
-    try:
+        if connection is None:
+            connection = smtplib.SMTP(host=host, port=port)
+            _local.connection = (host, port, connection)
         connection.sendmail(from_address, to_address, message.as_string())
+    except smtplib.SMTPServerDisconnected, e:
+        _local.connection = None
+        if reused:
+            # the server closed the connection while it was idle
+            return _send_email(subject, body, to_address)
+        raise delivery.DeliveryFailed(e)
+    except (smtplib.SMTPConnectError, socket.error), e:
+        _close_connection()
+        _logger.error(_('SMTP connection failed to %(h)s on %(p)s') % {'h': host, 'p': port})
+        raise delivery.DeliveryFailed(e)
     except smtplib.SMTPException:
         try:
             _logger.exception('Error sending mail.')
         except AttributeError:
             _logger.error('SMTP error while sending mail')
-    connection.quit()
+
+
+def _get_connection(host, port):
+    """
+    Get the SMTP connection of the current thread, unless it is connected to another server.
+
+    :param host: host name of the MTA
+    :type  host: basestring
+    :param port: port of the MTA
+    :type  port: int
+
+    :return: the connection, or None if the thread has no connection to the MTA
+    :rtype:  smtplib.SMTP
+    """
+    cached = getattr(_local, 'connection', None)
+    if cached is None:
+        return None
+    if cached[:2] != (host, port):
+        _close_connection()
+        return None
+    return cached[2]
+
+
+def _close_connection():
+    """
+    Close the SMTP connection of the current thread, if it has one.
+    """
+    cached = getattr(_local, 'connection', None)
+    _local.connection = None
+    if cached is not None:
+        try:
+            cached[2].quit()
+        except (smtplib.SMTPException, socket.error):
+            pass
+
+
+delivery.register(TYPE_ID, _send_email, 'email_workers')
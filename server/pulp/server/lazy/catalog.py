@@ -0,0 +1,179 @@
+"""
+Bulk writing of lazy catalog entries.
+
+This module is deliberately not imported by the package, since the package is also
+used by the streamer's authentication WSGI application, which has no database access.
+"""
+
+from collections import OrderedDict
+from gettext import gettext as _
+import logging
+
+from pymongo import ReplaceOne
+
+from pulp.server.db import model
+
+
+_logger = logging.getLogger(__name__)
+
+# Number of entries buffered before they are written to the database
+CATALOG_BATCH_SIZE = 1000
+
+
+class LazyCatalogWriter(object):
+    """
+    Buffers LazyCatalogEntry documents for an importer and writes them in bulk.
+
+    By default, each entry replaces the existing entries for its path, like
+    LazyCatalogEntry.save_revision does, using three queries per batch rather than per
+    entry.
+
+    In revision swap mode, every entry is written as part of a new revision of the
+    importer's catalog. When the writer is closed, all older revisions are deleted with
+    a single query, so entries that were not written again are removed. Readers see the
+    old revision until the new one is complete. If the writer is used as a context
+    manager and an exception is raised, the new revision is deleted instead and the
+    old one is kept.
+
+    :ivar importer_id: The ID of the importer the entries belong to.
+    :type importer_id: str
+    :ivar revision:    The revision entries are written to in revision swap mode.
+    :type revision:    int
+    :ivar added_count: The number of entries written so far.
+    :type added_count: int
+    """
+
+    def __init__(self, importer_id, revision_swap=False, batch_size=CATALOG_BATCH_SIZE):
+        """
+        :param importer_id:   The ID of the importer the entries belong to.
+        :type  importer_id:   str
+        :param revision_swap: Replace the importer's whole catalog with the written entries.
+        :type  revision_swap: bool
+        :param batch_size:    The number of entries buffered before they are written.
+        :type  batch_size:    int
+        """
+        self.importer_id = importer_id
+        self.revision_swap = revision_swap
+        self.batch_size = batch_size
+        self.added_count = 0
+        self.revision = None
+        self._buffer = OrderedDict()
+        if revision_swap:
+            latest = model.LazyCatalogEntry.objects(importer_id=importer_id).only(
+                'revision').order_by('-revision').first()
+            self.revision = latest.revision + 1 if latest is not None else 1
+
+    def __enter__(self):
+        """
+        :return: The writer.
+        :rtype:  LazyCatalogWriter
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Close the writer, or discard the new revision if an exception was raised.
+        """
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, entry):
+        """
+        Add an entry to the catalog. The entry is validated immediately but written once
+        enough entries are buffered or the writer is flushed.
+
+        :param entry: The catalog entry to write.
+        :type  entry: pulp.server.db.model.LazyCatalogEntry
+
+        :raise ValueError: the entry belongs to a different importer.
+        :raise mongoengine.ValidationError: the entry is not valid.
+        """
+        if entry.importer_id != self.importer_id:
+            raise ValueError(_('The catalog entry for {path} does not belong to importer '
+                               '{importer}.').format(path=entry.path, importer=self.importer_id))
+        entry.validate()
+        # A later entry for the same path replaces an earlier one, as with save_revision.
+        self._buffer.pop(entry.path, None)
+        self._buffer[entry.path] = entry
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all the buffered entries.
+        """
+        if not self._buffer:
+            return
+        entries = self._buffer.values()
+        self._buffer = OrderedDict()
+        if self.revision_swap:
+            self._write_revision(entries)
+        else:
+            self._replace(entries)
+        self.added_count += len(entries)
+
+    def close(self):
+        """
+        Write all the buffered entries and, in revision swap mode, delete the older
+        revisions of the importer's catalog.
+        """
+        self.flush()
+        if self.revision_swap:
+            qs = model.LazyCatalogEntry.objects(importer_id=self.importer_id,
+                                                revision__lt=self.revision)
+            deleted = qs.delete()
+            _logger.debug(_('Replaced {deleted} catalog entries for importer {importer} with '
+                            '{added} entries.').format(deleted=deleted, added=self.added_count,
+                                                       importer=self.importer_id))
+
+    def abort(self):
+        """
+        Discard the buffered entries and, in revision swap mode, delete the entries of
+        the new revision that were already written.
+        """
+        self._buffer = OrderedDict()
+        if self.revision_swap:
+            model.LazyCatalogEntry.objects(importer_id=self.importer_id,
+                                           revision=self.revision).delete()
+
+    def _write_revision(self, entries):
+        """
+        Write entries as part of the new revision.
+
+        :param entries: The entries to write.
+        :type  entries: list of pulp.server.db.model.LazyCatalogEntry
+        """
+        requests = []
+        for entry in entries:
+            entry.revision = self.revision
+            document = entry.to_mongo()
+            key = {'importer_id': self.importer_id, 'path': entry.path,
+                   'revision': self.revision}
+            requests.append(ReplaceOne(key, document, upsert=True))
+        model.LazyCatalogEntry._get_collection().bulk_write(requests, ordered=False)
+
+    def _replace(self, entries):
+        """
+        Write entries using the revision after the latest existing one for each path, and
+        delete the existing entries.
+
+        :param entries: The entries to write.
+        :type  entries: list of pulp.server.db.model.LazyCatalogEntry
+        """
+        paths = [entry.path for entry in entries]
+        existing = model.LazyCatalogEntry.objects(importer_id=self.importer_id,
+                                                  path__in=paths).only('path', 'revision')
+        latest = {}
+        existing_ids = []
+        for entry in existing:
+            latest[entry.path] = max(latest.get(entry.path, 0), entry.revision)
+            existing_ids.append(entry.id)
+
+        for entry in entries:
+            entry.revision = latest.get(entry.path, 0) + 1
+        collection = model.LazyCatalogEntry._get_collection()
+        collection.insert_many([entry.to_mongo() for entry in entries], ordered=False)
+        if existing_ids:
+            model.LazyCatalogEntry.objects(id__in=existing_ids).delete()
@@ -5,8 +5,13 @@ Contains content applicability management classes
 from gettext import gettext as _
 from logging import getLogger
 from uuid import uuid4
+import hashlib
+import json
+import time
 
 from celery import task
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.config import PluginCallConfiguration
@@ -14,7 +19,8 @@ from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptio
 from pulp.plugins.profiler import Profiler
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
-from pulp.server.db.model.consumer import Bind, RepoProfileApplicability, UnitProfile
+from pulp.server.db.model.consumer import (ApplicabilityReport, ApplicabilityReportEntry, Bind,
+                                           RepoProfileApplicability, UnitProfile)
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.managers import factory as managers
 from pulp.server.managers.consumer.query import ConsumerQueryManager
@@ -23,6 +29,15 @@ from pulp.plugins.util.misc import paginate
 
 _logger = getLogger(__name__)
 
+# Number of existing applicabilities regenerated together
+REGENERATION_BATCH_SIZE = 100
+
+# Number of seconds a materialized applicability report is kept after it was last queried
+REPORT_TTL = 24 * 60 * 60
+
+# Number of consumers removed from the entries of an applicability report with a single query
+REPORT_REMOVAL_BATCH_SIZE = 1000
+
 
 class ApplicabilityRegenerationManager(object):
     @staticmethod
@@ -120,29 +135,19 @@ class ApplicabilityRegenerationManager(object):
         repo_criteria.fields = ['id']
         repo_ids = [r.repo_id for r in model.Repository.objects.find_by_criteria(repo_criteria)]
 
+        profiler_conduit = ProfilerConduit()
         for repo_id in repo_ids:
-            # Find all existing applicabilities for given repo_id. Setting batch size of 5 ensures
-            # the MongoDB cursor does not time out. See https://pulp.plan.io/issues/998#note-6 for
+            # Only the profile hashes are loaded up front, so that no cursor is held open while
+            # applicability is calculated. See https://pulp.plan.io/issues/998#note-6 for
             # more details.
-            existing_applicabilities = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id}).batch_size(5)
-            for existing_applicability in existing_applicabilities:
-                existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-                profile_hash = existing_applicability['profile_hash']
-                unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                     projection=['id',
-                                                                                 'content_type'])
-                if unit_profile is None:
-                    # Unit profiles change whenever packages are installed or removed on consumers,
-                    # and it is possible that existing_applicability references a UnitProfile
-                    # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                    # that will identify these dangling references and remove them.
-                    continue
-
-                # Regenerate applicability data for given unit_profile and repo id
-                ApplicabilityRegenerationManager.regenerate_applicability(
-                    profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                    existing_applicability)
+            profile_hashes = [applicability['profile_hash'] for applicability in
+                              RepoProfileApplicability.get_collection().find(
+                                  {'repo_id': repo_id}, projection=['profile_hash'])]
+            repo_content_types = \
+                ApplicabilityRegenerationManager._get_existing_repo_content_types(repo_id)
+            for batch in paginate(profile_hashes, REGENERATION_BATCH_SIZE):
+                ApplicabilityRegenerationManager._regenerate_applicability_batch(
+                    repo_id, list(batch), repo_content_types, profiler_conduit)
 
     @staticmethod
     def queue_regenerate_applicability_for_repos(repo_criteria):
@@ -182,25 +187,110 @@ class ApplicabilityRegenerationManager(object):
         :type profile_hashes: tuple of dicts in form of {'profile_hash': str}
         """
         profile_hash_list = [phash['profile_hash'] for phash in profile_hashes]
-        existing_applicabilities = RepoProfileApplicability.get_collection().find(
-            {"repo_id": repo_id, "profile_hash": {"$in": profile_hash_list}})
-        for existing_applicability in list(existing_applicabilities):
-                # Convert cursor to RepoProfileApplicability object
-            existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-            profile_hash = existing_applicability['profile_hash']
-            unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                 projection=['id', 'content_type'])
-            if unit_profile is None:
-                # Unit profiles change whenever packages are installed or removed on consumers,
-                # and it is possible that existing_applicability references a UnitProfile
-                # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                # that will identify these dangling references and remove them.
+        repo_content_types = \
+            ApplicabilityRegenerationManager._get_existing_repo_content_types(repo_id)
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            repo_id, profile_hash_list, repo_content_types, ProfilerConduit())
+
+    @staticmethod
+    def _regenerate_applicability_batch(repo_id, profile_hashes, repo_content_types,
+                                        profiler_conduit):
+        """
+        Regenerate and save the existing applicabilities of a repository for a batch of profile
+        hashes.
+
+        The applicabilities and the content types of their profiles are each loaded with a single
+        query, each profiler is given all the profiles of its content type at once, and the
+        results are written back with a single bulk write.
+
+        :param repo_id:            Repository id for which applicability is being calculated
+        :type  repo_id:            str
+        :param profile_hashes:     Consumer profile hashes of the existing applicabilities
+        :type  profile_hashes:     list of str
+        :param repo_content_types: Content types with units in the repository
+        :type  repo_content_types: list of str
+        :param profiler_conduit:   Conduit passed to the profilers
+        :type  profiler_conduit:   pulp.plugins.conduits.profiler.ProfilerConduit
+        """
+        collection = RepoProfileApplicability.get_collection()
+        existing_applicabilities = collection.find(
+            {'repo_id': repo_id, 'profile_hash': {'$in': profile_hashes}},
+            projection=['profile_hash', 'profile'])
+        applicabilities = dict((applicability['profile_hash'], applicability)
+                               for applicability in existing_applicabilities)
+        if not applicabilities:
+            return
+
+        # Unit profiles change whenever packages are installed or removed on consumers, and it is
+        # possible that an existing applicability references a UnitProfile that no longer exists.
+        # This is harmless, as Pulp has a monthly cleanup task that will identify these dangling
+        # references and remove them.
+        unit_profiles = UnitProfile.get_collection().find(
+            {'profile_hash': {'$in': applicabilities.keys()}},
+            projection=['profile_hash', 'content_type'])
+        content_type_hashes = {}
+        seen_hashes = set()
+        for unit_profile in unit_profiles:
+            if unit_profile['profile_hash'] not in seen_hashes:
+                seen_hashes.add(unit_profile['profile_hash'])
+                content_type_hashes.setdefault(unit_profile['content_type'], []).append(
+                    unit_profile['profile_hash'])
+
+        requests = []
+        for content_type, hashes in content_type_hashes.items():
+            profiler, profiler_cfg = ApplicabilityRegenerationManager._profiler(content_type)
+            # Skip profilers which do not support applicability, and profilers which handle
+            # none of the content types in the repo
+            if profiler.calculate_applicable_units == Profiler.calculate_applicable_units:
                 continue
+            if not set(repo_content_types) & set(profiler.metadata()['types']):
+                continue
+
+            call_config = PluginCallConfiguration(plugin_config=profiler_cfg,
+                                                  repo_plugin_config=None)
+            profiles = dict((profile_hash, applicabilities[profile_hash]['profile'])
+                            for profile_hash in hashes)
+            try:
+                results = ApplicabilityRegenerationManager._calculate_applicable_units_batch(
+                    profiler, profiles, repo_id, call_config, profiler_conduit)
+            except NotImplementedError:
+                msg = "Profiler for content type [%s] does not support applicability" % content_type
+                _logger.debug(msg)
+                continue
+
+            for profile_hash, applicability in results.items():
+                requests.append(UpdateOne({'_id': applicabilities[profile_hash]['_id']},
+                                          {'$set': {'applicability': applicability}}))
 
-            # Regenerate applicability data for given unit_profile and repo id
-            ApplicabilityRegenerationManager.regenerate_applicability(
-                profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                existing_applicability)
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+
+    @staticmethod
+    def _calculate_applicable_units_batch(profiler, unit_profiles, bound_repo_id, config,
+                                          conduit):
+        """
+        Calculate applicability for a batch of profiles, calling the profiler once per profile if
+        it does not provide calculate_applicable_units_batch.
+
+        :param profiler:      The profiler for the content type of the profiles
+        :type  profiler:      pulp.plugins.profiler.Profiler
+        :param unit_profiles: Consumer unit profiles keyed by profile hash
+        :type  unit_profiles: dict
+        :param bound_repo_id: Repository id for which applicability is being calculated
+        :type  bound_repo_id: str
+        :param config:        Plugin configuration
+        :type  config:        pulp.plugins.config.PluginCallConfiguration
+        :param conduit:       Conduit passed to the profiler
+        :type  conduit:       pulp.plugins.conduits.profiler.ProfilerConduit
+        :return:              Applicability keyed by profile hash
+        :rtype:               dict
+        """
+        if hasattr(type(profiler), 'calculate_applicable_units_batch'):
+            return profiler.calculate_applicable_units_batch(unit_profiles, bound_repo_id,
+                                                             config, conduit)
+        return dict((profile_hash, profiler.calculate_applicable_units(profile, bound_repo_id,
+                                                                       config, conduit))
+                    for profile_hash, profile in unit_profiles.items())
 
     @staticmethod
     def regenerate_applicability(profile_hash, content_type, profile_id,
@@ -476,71 +566,61 @@ def retrieve_consumer_applicability(consumer_criteria, content_types=None):
      {'consumers': ['consumer_2', 'consumer_3'],
       'applicability': {'content_type_1': ['unit_1', 'unit_2']}}]
 
-    :param consumer_ids:  A list of consumer ids that the applicability data should be retrieved
-                          against
-    :type  consumer_ids:  list
-    :param content_types: An optional list of content types that the caller wishes to limit the
-                          results to. Defaults to None, which will return data for all types
-    :type  content_types: list
+    :param consumer_criteria: The consumer selection criteria
+    :type  consumer_criteria: pulp.server.db.model.criteria.Criteria
+    :param content_types:     An optional list of content types that the caller wishes to limit
+                              the results to. Defaults to None, which will return data for all
+                              types
+    :type  content_types:     list
     :return: applicability data matching the consumer criteria query
     :rtype:  list
     """
+    return list(iter_consumer_applicability(consumer_criteria, content_types))
+
+
+def iter_consumer_applicability(consumer_criteria, content_types=None):
+    """
+    Query content applicability for consumers matched by a given consumer_criteria, optionally
+    limiting by content type, like retrieve_consumer_applicability does. The report is returned
+    as an iterator of its items, so it can be serialized one item at a time.
+
+    The consumers bound to each combination of profile hash and repository are materialized in
+    an ApplicabilityReport for the consumer criteria. Only the consumers that were added to or
+    removed from the criteria's results, or whose profiles or bindings changed, are queried
+    again when the report is refreshed. The applicability data is always read from the
+    RepoProfileApplicability collection, so it is never stale.
+
+    :param consumer_criteria: The consumer selection criteria
+    :type  consumer_criteria: pulp.server.db.model.criteria.Criteria
+    :param content_types:     An optional list of content types that the caller wishes to limit
+                              the results to. Defaults to None, which will return data for all
+                              types
+    :type  content_types:     list
+    :return: applicability data matching the consumer criteria query
+    :rtype:  iterator of dict
+    """
     # We only need the consumer ids
     consumer_criteria['fields'] = ['id']
+    report_key = _report_key(consumer_criteria)
     consumer_ids = [c['id'] for c in ConsumerQueryManager.find_by_criteria(consumer_criteria)]
-    consumer_map = dict([(c, {'profiles': [], 'repo_ids': []}) for c in consumer_ids])
-
-    # Fill out the mapping of consumer_ids to profiles, and store the list of profile_hashes
-    profile_hashes = _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map)
 
-    # Now add in repo_ids that the consumers are bound to
-    _add_repo_ids_to_consumer_map(consumer_ids, consumer_map)
+    # Bring the materialized report up to date with the consumers and their profiles and
+    # bindings
+    report_id = _refresh_report(report_key, consumer_ids)
     # We don't need the list of consumer_ids anymore, so let's free a little RAM
     del consumer_ids
 
-    # Now lets get all RepoProfileApplicability objects that have the profile hashes for our
-    # consumers
-    applicability_map = _get_applicability_map(profile_hashes, content_types)
-    # We don't need the profile_hashes anymore, so let's free some RAM
-    del profile_hashes
-
-    # Now we need to add consumers who match the applicability data to the applicability_map
-    _add_consumers_to_applicability_map(consumer_map, applicability_map)
-    # We don't need the consumer_map anymore, so let's free it up
-    del consumer_map
+    # Now lets get the applicability data for the report's profiles and repositories, with the
+    # consumers it applies to
+    applicability_map = _get_report_applicability_map(report_id, content_types)
 
     # Collate all the entries for the same sets of consumers together
     consumer_applicability_map = _get_consumer_applicability_map(applicability_map)
     # Free the applicability_map, we don't need it anymore
     del applicability_map
 
-    # Form the data into the expected output format and return
-    return _format_report(consumer_applicability_map)
-
-
-def _add_consumers_to_applicability_map(consumer_map, applicability_map):
-    """
-    For all consumers in the consumer_map, look for their profiles and repos in the
-    applicability_map, and if found, add the consumer_ids to the applicability_map.
-
-    :param consumer_map:      A dictionary mapping consumer_ids to dictionaries with keys
-                              'profiles' and 'repo_ids'. 'profiles' indexes a list of profiles
-                              for each consumer_id, and 'repo_ids' indexes a list of repo_ids
-                              that the consumer is bound to.
-    :type  consumer_map:      dict
-    :param applicability_map: The mapping of (profile_hash, repo_id) to applicability_data and
-                              consumer_ids the data applies to. This method appends
-                              consumer_ids to the appropriate lists of consumer_ids
-    :type  applicability_map: dict
-    """
-    for consumer_id, repo_profile_data in consumer_map.items():
-        for profile in repo_profile_data['profiles']:
-            for repo_id in repo_profile_data['repo_ids']:
-                repo_profile = (profile['profile_hash'], repo_id)
-                # Only add the consumer to the applicability map if there is applicability_data
-                # for this combination of repository and profile
-                if repo_profile in applicability_map:
-                    applicability_map[repo_profile]['consumers'].append(consumer_id)
+    # Form the data into the expected output format
+    return _iter_report(consumer_applicability_map)
 
 
 def _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map):
@@ -604,16 +684,26 @@ def _format_report(consumer_applicability_map):
                                        applicability data for those consumer_ids.
     :rtype:                            list
     """
-    report = []
+    return list(_iter_report(consumer_applicability_map))
+
+
+def _iter_report(consumer_applicability_map):
+    """
+    Generate the items of the report from the consumer_applicability_map, in the format
+    returned by _format_report.
+
+    :param consumer_applicability_map: A mapping of frozensets of consumers to their
+                                       applicability data
+    :type  consumer_applicability_map: dict
+    :return:                           A generator of dictionaries that have two keys,
+                                       consumers and applicability
+    :rtype:                            generator
+    """
     for consumers, applicability in consumer_applicability_map.iteritems():
         # If there are no consumers for this applicability data, there is no need to include
         # it in the report
         if consumers:
-            applicability_data = {'consumers': list(consumers),
-                                  'applicability': applicability}
-            report.append(applicability_data)
-
-    return report
+            yield {'consumers': list(consumers), 'applicability': applicability}
 
 
 def _get_applicability_map(profile_hashes, content_types):
@@ -693,3 +783,164 @@ def _get_consumer_applicability_map(applicability_map):
             # set all the applicability data we have to this consumer set
             consumer_applicability_map[consumers] = data['applicability']
     return consumer_applicability_map
+
+
+def _report_key(consumer_criteria):
+    """
+    Return the key of the materialized report for a consumer criteria.
+
+    :param consumer_criteria: The consumer selection criteria
+    :type  consumer_criteria: pulp.server.db.model.criteria.Criteria
+    :return:                  A digest of the criteria
+    :rtype:                   str
+    """
+    serialized = json.dumps(consumer_criteria.as_dict(), sort_keys=True, default=str)
+    return hashlib.sha256(serialized).hexdigest()
+
+
+def _refresh_report(report_key, consumer_ids):
+    """
+    Bring the materialized report for a consumer criteria up to date, creating it if it does not
+    exist yet. Reports that have not been queried for REPORT_TTL seconds are removed.
+
+    Consumers that are new to the report are added to its consumers, and marked dirty, before
+    the entries are refreshed, so that they are marked dirty again if they change meanwhile, and
+    so that a concurrent query refreshes them too instead of reading incomplete entries. The
+    consumers of the report are replaced, and the refreshed consumers are no longer dirty, only
+    after the entries have been written, and only if no consumers were marked dirty meanwhile.
+    Otherwise the next query refreshes them again.
+
+    :param report_key:   The key of the report
+    :type  report_key:   str
+    :param consumer_ids: The IDs of the consumers currently matched by the criteria
+    :type  consumer_ids: list
+    :return:             The ID of the report
+    :rtype:              bson.objectid.ObjectId
+    """
+    now = time.time()
+    collection = ApplicabilityReport.get_collection()
+    unused = collection.find({'last_used': {'$lt': now - REPORT_TTL}}, projection=['_id'])
+    _remove_reports([report['_id'] for report in unused])
+
+    if collection.find_one({'report_key': report_key}, projection=['_id']) is None:
+        try:
+            collection.insert(ApplicabilityReport(report_key, now))
+        except DuplicateKeyError:
+            # The report was created by a concurrent query
+            pass
+    report = collection.find_one_and_update(
+        {'report_key': report_key},
+        {'$set': {'last_used': now}},
+        projection=['consumer_ids', 'dirty_consumer_ids', 'version'],
+        return_document=ReturnDocument.AFTER)
+
+    previous_ids = set(report['consumer_ids'])
+    current_ids = set(consumer_ids)
+    dirty_ids = set(report['dirty_consumer_ids'])
+    new_ids = current_ids - previous_ids
+    try:
+        if new_ids:
+            collection.update_one(
+                {'_id': report['_id']},
+                {'$addToSet': {'consumer_ids': {'$each': list(new_ids)},
+                               'dirty_consumer_ids': {'$each': list(new_ids)}}})
+        _update_report_entries(report['_id'], (previous_ids - current_ids) | dirty_ids,
+                               new_ids | (dirty_ids & current_ids))
+    except Exception:
+        # The changes that were being applied are lost, so the report can not be trusted
+        _remove_reports([report['_id']])
+        raise
+    collection.update_one(
+        {'_id': report['_id'], 'version': report.get('version')},
+        {'$set': {'consumer_ids': consumer_ids},
+         '$pullAll': {'dirty_consumer_ids': list(dirty_ids | new_ids)}})
+    return report['_id']
+
+
+def _update_report_entries(report_id, removed_ids, added_ids):
+    """
+    Remove consumers from the entries of a materialized report, and add consumers to the entries
+    for their current profiles and bindings.
+
+    :param report_id:   The ID of the report
+    :type  report_id:   bson.objectid.ObjectId
+    :param removed_ids: The IDs of the consumers to remove
+    :type  removed_ids: set
+    :param added_ids:   The IDs of the consumers to add
+    :type  added_ids:   set
+    """
+    collection = ApplicabilityReportEntry.get_collection()
+    for page in paginate(removed_ids, REPORT_REMOVAL_BATCH_SIZE):
+        collection.update_many({'report_id': report_id, 'consumer_ids': {'$in': list(page)}},
+                               {'$pullAll': {'consumer_ids': list(page)}})
+    if removed_ids:
+        collection.remove({'report_id': report_id, 'consumer_ids': {'$size': 0}})
+
+    if not added_ids:
+        return
+    added_ids = list(added_ids)
+    consumer_map = dict([(c, {'profiles': [], 'repo_ids': []}) for c in added_ids])
+    _add_profiles_to_consumer_map_and_get_hashes(added_ids, consumer_map)
+    _add_repo_ids_to_consumer_map(added_ids, consumer_map)
+
+    entries = {}
+    for consumer_id, repo_profile_data in consumer_map.iteritems():
+        for profile in repo_profile_data['profiles']:
+            for repo_id in repo_profile_data['repo_ids']:
+                entries.setdefault((profile['profile_hash'], repo_id), set()).add(consumer_id)
+    del consumer_map
+
+    requests = [UpdateOne({'report_id': report_id, 'profile_hash': profile_hash,
+                           'repo_id': repo_id},
+                          {'$addToSet': {'consumer_ids': {'$each': list(consumers)}}},
+                          upsert=True)
+                for (profile_hash, repo_id), consumers in entries.iteritems()]
+    if requests:
+        try:
+            collection.bulk_write(requests, ordered=False)
+        except BulkWriteError:
+            # Entries created by a concurrent query make upserts fail on the unique index. The
+            # updates are idempotent, so they are applied again to the entries that now exist.
+            collection.bulk_write(requests, ordered=False)
+
+
+def _get_report_applicability_map(report_id, content_types):
+    """
+    Build an "applicability_map", like _get_applicability_map does, for the entries of a
+    materialized report, with the consumers of the entries added to it.
+
+    :param report_id:     The ID of the report
+    :type  report_id:     bson.objectid.ObjectId
+    :param content_types: If not None, content_types is a list of content_types to
+                          be included in the applicability data within the
+                          applicability_map
+    :type  content_types: list or None
+    :return:              The applicability map
+    :rtype:               dict
+    """
+    entries = ApplicabilityReportEntry.get_collection().find(
+        {'report_id': report_id}, projection=['profile_hash', 'repo_id', 'consumer_ids'])
+    consumers = dict(((e['profile_hash'], e['repo_id']), e['consumer_ids']) for e in entries)
+    profile_hashes = list(set(profile_hash for profile_hash, repo_id in consumers))
+
+    applicability_map = _get_applicability_map(profile_hashes, content_types)
+    for repo_profile in applicability_map.keys():
+        if repo_profile in consumers:
+            applicability_map[repo_profile]['consumers'] = consumers[repo_profile]
+        else:
+            # None of the consumers with this profile are bound to the repository
+            del applicability_map[repo_profile]
+    return applicability_map
+
+
+def _remove_reports(report_ids):
+    """
+    Remove materialized reports and their entries.
+
+    :param report_ids: The IDs of the reports
+    :type  report_ids: list
+    """
+    if not report_ids:
+        return
+    ApplicabilityReportEntry.get_collection().remove({'report_id': {'$in': report_ids}})
+    ApplicabilityReport.get_collection().remove({'_id': {'$in': report_ids}})
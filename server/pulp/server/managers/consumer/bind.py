@@ -10,7 +10,7 @@ from pymongo.errors import DuplicateKeyError
 
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
-from pulp.server.db.model.consumer import Bind
+from pulp.server.db.model.consumer import ApplicabilityReport, Bind
 from pulp.server.exceptions import MissingResource, InvalidValue
 from pulp.server.managers import factory
 
@@ -77,6 +77,7 @@ class BindManager(object):
             BindManager._update_binding(consumer_id, repo_id, distributor_id, notify_agent,
                                         binding_config)
             BindManager._reset_bind(consumer_id, repo_id, distributor_id)
+        ApplicabilityReport.consumers_changed([consumer_id])
         # fetch the inserted/updated bind
         bind = BindManager.get_bind(consumer_id, repo_id, distributor_id)
         # update history
@@ -151,6 +152,7 @@ class BindManager(object):
             # idempotent
             return
         BindManager.mark_deleted(consumer_id, repo_id, distributor_id)
+        ApplicabilityReport.consumers_changed([consumer_id])
         details = {
             'repo_id': repo_id,
             'distributor_id': distributor_id
@@ -168,6 +170,7 @@ class BindManager(object):
         collection = Bind.get_collection()
         query = dict(consumer_id=consumer_id)
         collection.remove(query)
+        ApplicabilityReport.consumers_changed([consumer_id])
 
     @staticmethod
     def get_bind(consumer_id, repo_id, distributor_id):
@@ -320,6 +323,7 @@ class BindManager(object):
         if not force:
             bind_id['deleted'] = True
         collection.remove(bind_id)
+        ApplicabilityReport.consumers_changed([consumer_id])
 
     def action_pending(self, consumer_id, repo_id, distributor_id, action, action_id):
         """
@@ -3,11 +3,12 @@ Contains profile management classes
 """
 from celery import task
 
+from pulp.common import unit_profile
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.plugins.profiler import Profiler
 from pulp.server.async.tasks import Task
-from pulp.server.db.model.consumer import UnitProfile
-from pulp.server.exceptions import MissingResource, MissingValue
+from pulp.server.db.model.consumer import ApplicabilityReport, UnitProfile
+from pulp.server.exceptions import InvalidValue, MissingResource, MissingValue
 from pulp.server.managers import factory
 
 
@@ -35,6 +36,8 @@ class ProfileManager(object):
         Update a unit profile.
         Created if not already exists.
 
+        Nothing is written when the profile did not change.
+
         :param consumer_id:  uniquely identifies the consumer.
         :type  consumer_id:  str
         :param content_type: The profile (content) type ID.
@@ -43,6 +46,103 @@ class ProfileManager(object):
         :type  profile:      object
         """
         consumer = factory.consumer_manager().get_consumer(consumer_id)
+        if profile is None:
+            raise MissingValue('profile')
+        try:
+            existing = ProfileManager.get_profile(consumer_id, content_type)
+        except MissingResource:
+            existing = None
+        upload_hash = UnitProfile.calculate_hash(profile)
+        return ProfileManager._save(consumer, consumer_id, content_type, profile, upload_hash,
+                                    existing)
+
+    @staticmethod
+    def merge(consumer_id, content_type, delta, base_hash, upload_hash):
+        """
+        Update a unit profile that is a list of packages with the packages added to and removed
+        from it since the consumer last uploaded it.
+
+        The delta is only applied when the stored profile is the one the consumer last uploaded,
+        and when the updated profile, packages being added at its end, has the hash calculated
+        by the consumer. Otherwise the consumer needs to upload the whole profile.
+
+        :param consumer_id:  uniquely identifies the consumer.
+        :type  consumer_id:  str
+        :param content_type: The profile (content) type ID.
+        :type  content_type: str
+        :param delta:        The packages that were added and removed, as calculated by
+                             pulp.common.unit_profile.calculate_delta
+        :type  delta:        dict
+        :param base_hash:    The hash of the profile the delta was calculated from.
+        :type  base_hash:    str
+        :param upload_hash:  The hash of the profile with the delta applied, as calculated by
+                             the consumer.
+        :type  upload_hash:  str
+        :return:             The updated profile, or None if the stored profile is not the one
+                             the delta was calculated from, or the updated profile does not
+                             match upload_hash.
+        :rtype:              dict or None
+        :raise InvalidValue: when the delta is not valid or the profile is not a list.
+        """
+        consumer = factory.consumer_manager().get_consumer(consumer_id)
+        if upload_hash is None:
+            raise MissingValue('profile_hash')
+        if not isinstance(delta, dict) or \
+                set(delta) - set([unit_profile.DELTA_ADDED, unit_profile.DELTA_REMOVED]) or \
+                not all(isinstance(packages, list) for packages in delta.values()):
+            raise InvalidValue(['delta'])
+        try:
+            existing = ProfileManager.get_profile(consumer_id, content_type)
+        except MissingResource:
+            return None
+        if base_hash is None or existing.get('upload_hash') != base_hash:
+            return None
+        if not isinstance(existing['profile'], list):
+            raise InvalidValue(['delta'])
+        profile = unit_profile.apply_delta(existing['profile'], delta)
+        if unit_profile.calculate_hash(profile) != upload_hash:
+            return None
+        return ProfileManager._save(consumer, consumer_id, content_type, profile, upload_hash,
+                                    existing)
+
+    @staticmethod
+    def is_current(consumer_id, content_type, upload_hash):
+        """
+        Get whether the stored profile is the one a consumer uploaded with the given hash.
+
+        :param consumer_id:  uniquely identifies the consumer.
+        :type  consumer_id:  str
+        :param content_type: The profile (content) type ID.
+        :type  content_type: str
+        :param upload_hash:  The hash of the profile, as calculated by the consumer.
+        :type  upload_hash:  str
+        :return:             True if the consumer does not need to upload the profile.
+        :rtype:              bool
+        """
+        collection = UnitProfile.get_collection()
+        query = dict(consumer_id=consumer_id, content_type=content_type, upload_hash=upload_hash)
+        return collection.find_one(query, {'_id': 1}) is not None
+
+    @staticmethod
+    def _save(consumer, consumer_id, content_type, profile, upload_hash, existing):
+        """
+        Let the profiler update a profile, and save it unless it did not change.
+
+        :param consumer:     The consumer the profile belongs to.
+        :type  consumer:     dict
+        :param consumer_id:  uniquely identifies the consumer.
+        :type  consumer_id:  str
+        :param content_type: The profile (content) type ID.
+        :type  content_type: str
+        :param profile:      The unit profile
+        :type  profile:      object
+        :param upload_hash:  The hash of the profile as uploaded by the consumer.
+        :type  upload_hash:  str
+        :param existing:     The stored profile, or None if there is none.
+        :type  existing:     dict or None
+        :return:             The saved profile.
+        :rtype:              dict
+        """
         try:
             profiler, config = plugin_api.get_profiler_by_type(content_type)
         except plugin_exceptions.PluginNotFound:
@@ -50,18 +150,26 @@ class ProfileManager(object):
             # Profiler
             profiler, config = (Profiler(), {})
         # Allow the profiler a chance to update the profile before we save it
-        if profile is None:
-            raise MissingValue('profile')
         profile = profiler.update_profile(consumer, content_type, profile, config)
-        try:
-            p = ProfileManager.get_profile(consumer_id, content_type)
-            p['profile'] = profile
-            # We store the profile's hash anytime the profile gets altered
-            p['profile_hash'] = UnitProfile.calculate_hash(profile)
-        except MissingResource:
-            p = UnitProfile(consumer_id, content_type, profile)
+        # We store the profile's hash anytime the profile gets altered
+        profile_hash = UnitProfile.calculate_hash(profile)
         collection = UnitProfile.get_collection()
+        if existing is not None and existing['profile_hash'] == profile_hash:
+            # The profile did not change, so neither did applicability or the consumer history
+            if existing.get('upload_hash') != upload_hash:
+                existing['upload_hash'] = upload_hash
+                collection.update({'_id': existing['_id']},
+                                  {'$set': {'upload_hash': upload_hash}})
+            return existing
+        if existing is not None:
+            p = existing
+            p['profile'] = profile
+            p['profile_hash'] = profile_hash
+            p['upload_hash'] = upload_hash
+        else:
+            p = UnitProfile(consumer_id, content_type, profile, profile_hash, upload_hash)
         collection.save(p)
+        ApplicabilityReport.consumers_changed([consumer_id])
         history_manager = factory.consumer_history_manager()
         history_manager.record_event(
             consumer_id,
@@ -81,6 +189,7 @@ class ProfileManager(object):
         profile = ProfileManager.get_profile(consumer_id, content_type)
         collection = UnitProfile.get_collection()
         collection.remove(profile)
+        ApplicabilityReport.consumers_changed([consumer_id])
 
     def consumer_deleted(self, id):
         """
@@ -92,6 +201,7 @@ class ProfileManager(object):
         collection = UnitProfile.get_collection()
         for p in self.get_profiles(id):
             collection.remove(p)
+        ApplicabilityReport.consumers_changed([id])
 
     @staticmethod
     def get_profile(consumer_id, content_type):
@@ -146,3 +256,4 @@ class ProfileManager(object):
 create = task(ProfileManager.create, base=Task)
 delete = task(ProfileManager.delete, base=Task, ignore_result=True)
 update = task(ProfileManager.update, base=Task)
+merge = task(ProfileManager.merge, base=Task)
@@ -60,6 +60,26 @@ class ContentCatalogManager(object):
         entry = ContentCatalog(source_id, expires, type_id, unit_key, url)
         collection.insert(entry)
 
+    def add_entries(self, source_id, expires, entries):
+        """
+        Add entries to the content catalog using a single database operation.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param expires: The entry expiration in seconds.
+        :type expires: int
+        :param entries: The entries to add as tuples of: (type_id, unit_key, url).
+        :type entries: iterable
+        :return: The number of entries added.
+        :rtype: int
+        """
+        documents = [ContentCatalog(source_id, expires, type_id, unit_key, url)
+                     for type_id, unit_key, url in entries]
+        if not documents:
+            return 0
+        collection = ContentCatalog.get_collection()
+        collection.insert_many(documents, ordered=False)
+        return len(documents)
+
     def delete_entry(self, source_id, type_id, unit_key):
         """
         Delete an entry from the content catalog.
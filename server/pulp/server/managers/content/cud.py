@@ -1,7 +1,9 @@
 import uuid
 
 from pulp.common import dateutils
+from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.types import database as content_types_db
+from pulp.server.db import model
 from pulp.server.exceptions import InvalidValue
 
 
@@ -32,6 +34,9 @@ class ContentManager(object):
             '_last_updated': dateutils.now_utc_timestamp()
         }
         unit_doc.update(unit_metadata)
+        model_class = plugin_api.get_unit_model_by_id(content_type)
+        if model_class is not None:
+            unit_doc['_unit_key_digest'] = _unit_key_digest(model_class, unit_doc)
         collection.insert(unit_doc)
         return unit_id
 
@@ -47,6 +52,13 @@ class ContentManager(object):
         """
         unit_metadata_delta['_last_updated'] = dateutils.now_utc_timestamp()
         collection = content_types_db.type_units_collection(content_type)
+        model_class = plugin_api.get_unit_model_by_id(content_type)
+        if model_class is not None and \
+                set(model_class.unit_key_fields).intersection(unit_metadata_delta):
+            unit_doc = collection.find_one({'_id': unit_id})
+            if unit_doc is not None:
+                unit_doc.update(unit_metadata_delta)
+                unit_metadata_delta['_unit_key_digest'] = _unit_key_digest(model_class, unit_doc)
         collection.update({'_id': unit_id}, {'$set': unit_metadata_delta})
 
     def remove_content_unit(self, content_type, unit_id):
@@ -107,3 +119,19 @@ class ContentManager(object):
         children = set(parent.get(key, []))
         parent[key] = list(children.difference(to_ids))
         collection.update({'_id': from_id}, parent)
+
+
+def _unit_key_digest(model_class, unit_doc):
+    """
+    Compute the digest of the unit key of a content unit document, as stored in the
+    _unit_key_digest field by the model of its type. Units are looked up by unit key
+    on that digest, so units saved without a model need it too.
+    @param model_class: the model of the unit's content type
+    @type model_class: pulp.server.db.model.ContentUnit
+    @param unit_doc: content unit document
+    @type unit_doc: dict
+    @return: the digest of the unit key
+    @rtype: str
+    """
+    unit_key = dict((field, unit_doc.get(field)) for field in model_class.unit_key_fields)
+    return model.ContentUnit.digest_unit_key(unit_key)
@@ -20,6 +20,9 @@ from pulp.server.exceptions import MissingResource
 
 _logger = logging.getLogger(__name__)
 
+# Number of units examined per query when searching for orphans
+ORPHAN_PAGE_SIZE = 1000
+
 
 class OrphanManager(object):
 
@@ -47,9 +50,10 @@ class OrphanManager(object):
         :return: count of orphaned units of the given type
         :rtype: int
         """
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
         count = 0
-        for unit in OrphanManager.generate_orphans_by_type(content_type_id):
-            count += 1
+        for page in OrphanManager.generate_orphan_pages(content_units_collection):
+            count += len(page)
         return count
 
     def generate_all_orphans(self, fields=None):
@@ -85,7 +89,7 @@ class OrphanManager(object):
                 yield content_unit
 
     @staticmethod
-    def generate_orphans_by_type(content_type_id, fields=None):
+    def generate_orphans_by_type(content_type_id, fields=None, content_unit_ids=None):
         """
         Return an generator of all orphaned content units of the given content type.
 
@@ -95,23 +99,94 @@ class OrphanManager(object):
         :type content_type_id: basestring
         :param fields: list of fields to include in each content unit
         :type fields: list or None
+        :param content_unit_ids: list of content unit ids to restrict the search to; None means
+                                 search all units of the type
+        :type content_unit_ids: iterable or None
         :return: generator of orphaned content units for the given content type
         :rtype: generator
         """
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        for page in OrphanManager.generate_orphan_pages(content_units_collection, fields,
+                                                        content_unit_ids):
+            for content_unit in page:
+                yield content_unit
+
+    @staticmethod
+    def generate_orphan_pages(content_units_collection, fields=None, content_unit_ids=None,
+                              page_size=ORPHAN_PAGE_SIZE):
+        """
+        Return a generator of pages of orphaned content units found in the given units collection.
 
+        Units are read in `_id` order, one page at a time. For each page, the ids that are
+        referenced by at least one repository are loaded with a single distinct query against
+        the repo_content_units collection, and the orphans are the set difference between the
+        two. This costs two queries per page rather than one query per unit.
+
+        If fields is not specified, only the `_id` field will be present.
+
+        :param content_units_collection: collection holding the units of a single content type
+        :type content_units_collection: pymongo.collection.Collection
+        :param fields: list of fields to include in each content unit
+        :type fields: list or None
+        :param content_unit_ids: list of content unit ids to restrict the search to; None means
+                                 search the whole collection
+        :type content_unit_ids: iterable or None
+        :param page_size: maximum number of units to examine per page
+        :type page_size: int
+        :return: generator of lists of orphaned content units
+        :rtype: generator
+        """
         fields = fields if fields is not None else ['_id']
-        content_units_collection = content_types_db.type_units_collection(content_type_id)
         repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, projection=fields):
+        for units_page in OrphanManager._generate_unit_pages(content_units_collection, fields,
+                                                             content_unit_ids, page_size):
+            unit_ids = [content_unit['_id'] for content_unit in units_page]
+            referenced_ids = set(repo_content_units_collection.distinct(
+                'unit_id', {'unit_id': {'$in': unit_ids}}))
+            orphans = [content_unit for content_unit in units_page
+                       if content_unit['_id'] not in referenced_ids]
+            if orphans:
+                yield orphans
 
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
+    @staticmethod
+    def _generate_unit_pages(content_units_collection, fields, content_unit_ids, page_size):
+        """
+        Return a generator of pages of content units sorted by `_id`.
 
-            if repo_content_units_cursor.count() > 0:
-                continue
+        When content_unit_ids is None, the collection is walked with range queries on `_id`
+        so that each page is a short indexed query and no cursor is held open between pages.
+        This also keeps the walk stable while orphans from earlier pages are being removed.
 
-            yield content_unit
+        :param content_units_collection: collection holding the units of a single content type
+        :type content_units_collection: pymongo.collection.Collection
+        :param fields: list of fields to include in each content unit
+        :type fields: list
+        :param content_unit_ids: list of content unit ids to restrict the walk to, or None
+        :type content_unit_ids: iterable or None
+        :param page_size: maximum number of units per page
+        :type page_size: int
+        :return: generator of lists of content units
+        :rtype: generator
+        """
+        if content_unit_ids is not None:
+            for ids_page in plugin_misc.paginate(sorted(set(content_unit_ids)), page_size):
+                units_page = list(content_units_collection.find(
+                    {'_id': {'$in': list(ids_page)}}, projection=fields).sort('_id'))
+                if units_page:
+                    yield units_page
+            return
+
+        spec = {}
+        while True:
+            units_page = list(content_units_collection.find(
+                spec, projection=fields).sort('_id').limit(page_size))
+            if not units_page:
+                return
+            yield units_page
+            if len(units_page) < page_size:
+                return
+            spec = {'_id': {'$gt': units_page[-1]['_id']}}
 
     @staticmethod
     def generate_orphans_by_type_with_unit_keys(content_type_id):
@@ -150,11 +225,8 @@ class OrphanManager(object):
                                  given content type and unit id
         """
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id):
-
-            if content_unit['_id'] != content_unit_id:
-                continue
-
+        for content_unit in OrphanManager.generate_orphans_by_type(
+                content_type_id, content_unit_ids=[content_unit_id]):
             return content_unit
 
         raise pulp_exceptions.MissingResource(content_type=content_type_id,
@@ -226,22 +298,22 @@ class OrphanManager(object):
         content_units_collection = content_types_db.type_units_collection(content_type_id)
 
         count = 0
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id,
-                                                                   fields=['_id', '_storage_path']):
-
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
-                continue
+        for page in OrphanManager.generate_orphan_pages(content_units_collection,
+                                                        fields=['_id', '_storage_path'],
+                                                        content_unit_ids=content_unit_ids):
+            orphan_ids = [content_unit['_id'] for content_unit in page]
 
             model.LazyCatalogEntry.objects(
-                unit_id=content_unit['_id'],
+                unit_id__in=orphan_ids,
                 unit_type_id=content_type_id
             ).delete()
-            content_units_collection.remove(content_unit['_id'])
+            content_units_collection.remove({'_id': {'$in': orphan_ids}})
 
-            storage_path = content_unit.get('_storage_path', None)
-            if storage_path is not None:
-                OrphanManager.delete_orphaned_file(storage_path)
-            count += 1
+            for content_unit in page:
+                storage_path = content_unit.get('_storage_path', None)
+                if storage_path is not None:
+                    OrphanManager.delete_orphaned_file(storage_path)
+            count += len(page)
         return count
 
     @staticmethod
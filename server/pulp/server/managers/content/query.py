@@ -3,10 +3,12 @@ from pprint import pformat
 import errno
 import os
 
+from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.types import database as content_types_db
 from pulp.plugins.util.misc import paginate
 from pulp.server import config as pulp_config
 from pulp.server.controllers import units as units_controller
+from pulp.server.db import model
 from pulp.server.exceptions import InvalidValue, MissingResource
 
 
@@ -149,6 +151,11 @@ class ContentQueryManager(object):
         """
         Look up multiple content units in the collection for the given content
         type collection that match the list of keys dictionaries.
+
+        Units of types defined by a mongoengine model are matched on the indexed digest of
+        their unit key, with a single $in query per page; units whose unit key differs from
+        the requested one despite the same digest are dropped.
+
         :param content_type: unique id of content collection
         :type content_type: str
         :param unit_keys_dicts: list of dictionaries whose key, value pairs can
@@ -163,10 +170,38 @@ class ContentQueryManager(object):
         :raises ValueError: if any of the keys dictionaries are invalid
         """
         collection = content_types_db.type_units_collection(content_type)
-        for segment in paginate(unit_keys_dicts, page_size=50):
-            spec = _build_multi_keys_spec(content_type, segment)
-            cursor = collection.find(spec, projection=model_fields)
+        if plugin_api.get_unit_model_by_id(content_type) is None:
+            for segment in paginate(unit_keys_dicts, page_size=50):
+                spec = _build_multi_keys_spec(content_type, segment)
+                cursor = collection.find(spec, projection=model_fields)
+                for unit_dict in cursor:
+                    yield unit_dict
+            return
+
+        for segment in paginate(unit_keys_dicts, page_size=1000):
+            spec = _build_multi_keys_digest_spec(content_type, segment)
+            unit_keys = {}
+            for keys_dict in segment:
+                digest = model.ContentUnit.digest_unit_key(keys_dict)
+                unit_keys.setdefault(digest, []).append(keys_dict)
+            # the validated keys dicts all have the unit key fields, which are fetched along
+            # with the digest to drop units that only share the digest with a requested key
+            key_fields = list(segment[0])
+            projection = model_fields
+            extra_fields = []
+            if model_fields is not None:
+                extra_fields = [field for field in key_fields + ['_unit_key_digest']
+                                if field not in model_fields]
+                projection = list(model_fields) + extra_fields
+            cursor = collection.find(spec, projection=projection)
             for unit_dict in cursor:
+                found_key = dict((field, unit_dict.get(field)) for field in key_fields)
+                candidates = unit_keys.get(unit_dict.get('_unit_key_digest'), [])
+                if not any(model.ContentUnit.unit_keys_equal(found_key, keys_dict)
+                           for keys_dict in candidates):
+                    continue
+                for field in extra_fields:
+                    unit_dict.pop(field, None)
                 yield unit_dict
 
     def get_multiple_units_by_ids(self, content_type, unit_ids, model_fields=None):
@@ -314,6 +349,44 @@ def _build_multi_keys_spec(content_type, unit_keys_dicts):
     :raises ValueError: if any of the key dictionaries do not match the unique
             fields of the collection
     """
+    _validate_multi_keys(content_type, unit_keys_dicts)
+    # Build the spec
+    spec = {'$or': unit_keys_dicts}
+    return spec
+
+
+def _build_multi_keys_digest_spec(content_type, unit_keys_dicts):
+    """
+    Build a mongo db spec document for a query on the given content_type
+    collection out of multiple content unit key dictionaries, matching the
+    digest of the unit keys. The content type must be defined by a mongoengine model.
+    :param content_type: unique id of the content type collection
+    :type content_type: str
+    :param unit_keys_dicts: list of key dictionaries whose key, value pairs can be
+                            used as unique identifiers for a single content unit
+    :type unit_keys_dicts: list of dict
+    :return: mongo db spec document for locating documents in a collection
+    :rtype: dict
+    :raises ValueError: if any of the key dictionaries do not match the unique
+            fields of the collection
+    """
+    _validate_multi_keys(content_type, unit_keys_dicts)
+    digests = [model.ContentUnit.digest_unit_key(keys_dict) for keys_dict in unit_keys_dicts]
+    return {'_unit_key_digest': {'$in': digests}}
+
+
+def _validate_multi_keys(content_type, unit_keys_dicts):
+    """
+    Validate that content unit key dictionaries match the unique fields of the
+    given content_type collection.
+    :param content_type: unique id of the content type collection
+    :type content_type: str
+    :param unit_keys_dicts: list of key dictionaries whose key, value pairs can be
+                            used as unique identifiers for a single content unit
+    :type unit_keys_dicts: list of dict
+    :raises ValueError: if any of the key dictionaries do not match the unique
+            fields of the collection
+    """
     # keys dicts validation constants
     try:
         unit_key_fields = units_controller.get_unit_key_fields_for_type(content_type)
@@ -340,6 +413,3 @@ def _build_multi_keys_spec(content_type, unit_keys_dicts):
     if keys_errors:
         value_error_msg = '\n'.join(keys_errors)
         raise ValueError(value_error_msg)
-    # Build the spec
-    spec = {'$or': unit_keys_dicts}
-    return spec
@@ -58,6 +58,9 @@ class ContentUploadManager(object):
         to retrieve the upload_id value and perform any steps necessary before
         bits can be saved.
 
+        Each call writes at its offset through its own file descriptor, so
+        segments may be saved concurrently and in any order.
+
         @param upload_id: upload request ID
         @type  upload_id: str
 
@@ -71,13 +74,20 @@ class ContentUploadManager(object):
         file_path = ContentUploadManager._upload_file_path(upload_id)
 
         # Make sure the upload was initialized first and hasn't been deleted
-        if not os.path.exists(file_path):
-            raise MissingResource(upload_request=upload_id)
+        try:
+            fd = os.open(file_path, os.O_WRONLY)
+        except OSError as e:
+            if e.errno == ENOENT:
+                raise MissingResource(upload_request=upload_id)
+            raise
 
-        f = open(file_path, 'r+')
-        f.seek(offset)
-        f.write(data)
-        f.close()
+        try:
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = 0
+            while written < len(data):
+                written += os.write(fd, buffer(data, written))
+        finally:
+            os.close(fd)
 
     def delete_upload(self, upload_id):
         """
@@ -6,7 +6,10 @@ in a consistent event format for that type.
 """
 
 import logging
+import threading
+import time
 
+from pulp.server.config import config
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import data as e, notifiers
 
@@ -14,6 +17,48 @@ from pulp.server.event import data as e, notifiers
 _logger = logging.getLogger(__name__)
 
 
+class ListenerCache(object):
+    """
+    Caches the configured event listeners, so they are not queried for every event fired.
+
+    The listeners are loaded again once the number of seconds set by the listener_cache_ttl
+    option of the notifications section of the server configuration have passed, or when the
+    cache is invalidated because the listeners were changed by this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = None
+        self._expires = 0
+
+    def get(self, event_type):
+        """
+        :param event_type: type of the event being fired
+        :type  event_type: str
+
+        :return: the listeners that should be notified of the event
+        :rtype:  list of dict
+        """
+        now = time.time()
+        with self._lock:
+            if self._listeners is None or now >= self._expires:
+                self._listeners = list(EventListener.get_collection().find())
+                self._expires = now + config.getint('notifications', 'listener_cache_ttl')
+            listeners = self._listeners
+        return [l for l in listeners
+                if event_type in l['event_types'] or '*' in l['event_types']]
+
+    def invalidate(self):
+        """
+        Load the listeners again the next time they are needed.
+        """
+        with self._lock:
+            self._listeners = None
+
+
+listener_cache = ListenerCache()
+
+
 class EventFireManager(object):
 
     def fire_repo_sync_started(self, repo_id):
@@ -62,8 +107,7 @@ class EventFireManager(object):
         @type  event: pulp.server.event.data.Event
         """
         # Determine which listeners should be notified
-        listeners = list(EventListener.get_collection().find(
-            {'$or': ({'event_types': event.event_type}, {'event_types': '*'})}))
+        listeners = listener_cache.get(event.event_type)
 
         # For each listener, retrieve the notifier and invoke it. Be sure that
         # an exception from a notifier is logged but does not interrupt the
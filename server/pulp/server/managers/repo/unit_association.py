@@ -122,15 +122,8 @@ class RepoUnitAssociationManager(object):
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
 
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
-
-        unique_count = 0
-        for unit_id in unit_id_list:
-            if not RepoUnitAssociationManager.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, False)
+        unit_type_and_ids = ((unit_type_id, unit_id) for unit_id in unit_id_list)
+        unique_count, _matched = repo_controller.associate_units_by_id(repo_id, unit_type_and_ids)
 
         # update the count of associated units on the repo object
         if unique_count:
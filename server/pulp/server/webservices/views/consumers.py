@@ -14,8 +14,8 @@ from pulp.server.managers import factory
 from pulp.server.managers.consumer import bind
 from pulp.server.managers.consumer import profile
 from pulp.server.managers.consumer import query as query_manager
-from pulp.server.managers.consumer.applicability import (regenerate_applicability_for_consumers,
-                                                         retrieve_consumer_applicability)
+from pulp.server.managers.consumer.applicability import (iter_consumer_applicability,
+                                                         regenerate_applicability_for_consumers)
 from pulp.server.managers.schedule.consumer import (UNIT_INSTALL_ACTION, UNIT_UNINSTALL_ACTION,
                                                     UNIT_UPDATE_ACTION)
 from pulp.server.webservices.views import search
@@ -24,6 +24,7 @@ from pulp.server.webservices.views.serializers import binding as serial_binding
 from pulp.server.webservices.views.util import (_ensure_input_encoding,
                                                 generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
+                                                generate_json_stream_response_with_pulp_encoder,
                                                 generate_redirect_response,
                                                 parse_json_body)
 
@@ -699,6 +700,22 @@ class ConsumerProfilesView(View):
         """
         Associate a profile with a consumer by content type ID.
 
+        body {content_type: <str>, profile: <object>}
+
+        Instead of the profile, the consumer may send the hash of its profile, as calculated by
+        pulp.common.unit_profile.calculate_hash, to find out whether it needs to upload it:
+
+        body {content_type: <str>, profile_hash: <str>}
+
+        A profile that is a list of packages may also be updated with the packages added and
+        removed since the consumer last uploaded it, along with the hash of that upload:
+
+        body {content_type: <str>, profile_hash: <str>, base_hash: <str>,
+              delta: {added: <array>, removed: <array>}}
+
+        Both return {current: <bool>}. When current is false, the server does not have the
+        profile and the consumer must upload the whole profile.
+
         :param request: WSGI request object
         :type request: django.core.handlers.wsgi.WSGIRequest
         :param consumer_id: A consumer ID.
@@ -713,11 +730,24 @@ class ConsumerProfilesView(View):
         body = request.body_as_json
         content_type = body.get('content_type')
         profile = body.get('profile')
+        profile_hash = body.get('profile_hash')
+        if content_type is None:
+            raise MissingValue('content_type')
 
         manager = factory.consumer_profile_manager()
+        if profile is None and profile_hash is not None:
+            if 'delta' in body:
+                merged = manager.merge(consumer_id, content_type, body['delta'],
+                                       body.get('base_hash'), profile_hash)
+                current = merged is not None
+            else:
+                # Check that the consumer exists and raise a MissingResource exception, in case
+                # it doesn't.
+                factory.consumer_manager().get_consumer(consumer_id)
+                current = manager.is_current(consumer_id, content_type, profile_hash)
+            return generate_json_response({'current': current})
+
         new_profile = manager.create(consumer_id, content_type, profile)
-        if content_type is None:
-            raise MissingValue('content_type')
         link = add_link_profile(new_profile)
         response = generate_json_response_with_pulp_encoder(new_profile)
         redirect_response = generate_redirect_response(response, link['_href'])
@@ -825,11 +855,13 @@ class ConsumerContentApplicabilityView(View):
          {'consumers': ['consumer_2', 'consumer_3'],
           'applicability': {'content_type_1': ['unit_1', 'unit_2']}}]
 
+        The array is streamed as it is serialized, so large reports are not held in memory.
+
         :param request: WSGI request object
         :type request: django.core.handlers.wsgi.WSGIRequest
 
         :return: Response containing applicability data matching the consumer criteria query
-        :rtype:  jango.http.HttpResponse
+        :rtype:  django.http.StreamingHttpResponse
         """
 
         # Get the consumer_ids that match the consumer criteria query that the requestor queried
@@ -841,8 +873,8 @@ class ConsumerContentApplicabilityView(View):
         except InvalidValue, e:
             return HttpResponseBadRequest(str(e))
 
-        response = retrieve_consumer_applicability(consumer_criteria, content_types)
-        return generate_json_response_with_pulp_encoder(response)
+        report = iter_consumer_applicability(consumer_criteria, content_types)
+        return generate_json_stream_response_with_pulp_encoder(report)
 
     def _get_consumer_criteria(self, request):
         """
@@ -3,12 +3,14 @@ This module contains views related to Pulp's task system models.
 """
 from datetime import datetime
 
+from bson.objectid import ObjectId
 from django.views.generic import View
 from django.http import HttpResponse
+from isodate import ISO8601Error
 from mongoengine.queryset import DoesNotExist
 
-from pulp.common import error_codes
-from pulp.common.constants import CALL_CANCELED_STATE, CALL_COMPLETE_STATES
+from pulp.common import dateutils, error_codes
+from pulp.common.constants import CALL_CANCELED_STATE, CALL_COMPLETE_STATES, CALL_STATES
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.async import tasks
 from pulp.server.auth import authorization
@@ -24,6 +26,12 @@ from pulp.server.webservices.views.util import (generate_json_response,
 # This constant set is used for deleting the completed tasks from the collection.
 VALID_STATES = set(filter(lambda state: state != CALL_CANCELED_STATE, CALL_COMPLETE_STATES))
 
+# Fields that are only included in a page of tasks when they are requested, since they can be large
+DETAIL_FIELDS = ('progress_report', 'result')
+
+# Maximum number of tasks in a page of tasks
+MAX_PAGE_SIZE = 1000
+
 
 def task_serializer(task):
     """
@@ -41,6 +49,28 @@ def task_serializer(task):
     return task
 
 
+def _parse_start_time(name, value):
+    """
+    Convert a start time filter to the representation start times are stored with, so they can
+    be compared.
+
+    :param name:  name of the GET parameter holding the start time
+    :type  name:  basestring
+    :param value: ISO8601 representation of the start time
+    :type  value: basestring
+
+    :return: ISO8601 representation of the start time in UTC
+    :rtype:  basestring
+    :raises pulp_exceptions.InvalidValue: if the start time is not a valid ISO8601 datetime
+    """
+    try:
+        start_time = dateutils.parse_iso8601_datetime(value)
+    except ISO8601Error:
+        raise pulp_exceptions.InvalidValue([name])
+    start_time = dateutils.to_utc_datetime(start_time, no_tz_equals_local_tz=False)
+    return dateutils.format_iso8601_datetime(start_time)
+
+
 class TaskSearchView(search.SearchView):
     """
     This view provides GET and POST searching on TaskStatus objects.
@@ -58,21 +88,80 @@ class TaskCollectionView(View):
     def get(self, request):
         """
         Return a response containing a list of all tasks or a response containing
-        a list of tasks filtered by the optional GET parameter 'tags'.
+        a list of tasks filtered by the optional GET parameters 'tag', 'state', 'started_after'
+        and 'started_before'. Tasks that belong to a task group are left out, unless the
+        optional GET parameter 'grouped' is 'true'.
+
+        When the optional GET parameter 'limit' is given, the tasks are returned a page at a time,
+        in the order they were created. The response is a dict with the 'tasks' of the page and
+        a 'next' cursor, which is passed as the 'after' parameter to get the next page and is None
+        on the last page. The fields listed in DETAIL_FIELDS are only included in the page when
+        they are requested with the 'include' parameter.
 
         :param request: WSGI request object
         :type  request: django.core.handlers.wsgi.WSGIRequest
 
-        :return: Response containing a serialized list of dicts, one for each task
+        :return: Response containing a serialized list of dicts, one for each task, or a page of
+                 tasks
         :rtype:  django.http.HttpResponse
+        :raises pulp_exceptions.InvalidValue: if one of the parameters is not valid
         """
+        criteria = {}
+        if request.GET.get('grouped', 'false').lower() != 'true':
+            criteria['group_id'] = None
         tags = request.GET.getlist('tag')
         if tags:
-            raw_tasks = TaskStatus.objects(tags__all=tags, group_id=None)
-        else:
-            raw_tasks = TaskStatus.objects(group_id=None)
+            criteria['tags__all'] = tags
+        states = request.GET.getlist('state')
+        if states:
+            if [state for state in states if state not in CALL_STATES]:
+                raise pulp_exceptions.InvalidValue(['state'])
+            criteria['state__in'] = states
+        started_after = request.GET.get('started_after')
+        if started_after:
+            criteria['start_time__gte'] = _parse_start_time('started_after', started_after)
+        started_before = request.GET.get('started_before')
+        if started_before:
+            criteria['start_time__lt'] = _parse_start_time('started_before', started_before)
+
+        limit = request.GET.get('limit')
+        if not limit:
+            raw_tasks = TaskStatus.objects(**criteria)
+            serialized_task_statuses = [task_serializer(task) for task in raw_tasks]
+            return generate_json_response_with_pulp_encoder(serialized_task_statuses)
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise pulp_exceptions.InvalidValue(['limit'])
+        if limit < 1:
+            raise pulp_exceptions.InvalidValue(['limit'])
+        limit = min(limit, MAX_PAGE_SIZE)
+        after = request.GET.get('after')
+        if after:
+            if not ObjectId.is_valid(after):
+                raise pulp_exceptions.InvalidValue(['after'])
+            criteria['id__gt'] = ObjectId(after)
+        include = request.GET.getlist('include')
+        if [field for field in include if field not in DETAIL_FIELDS]:
+            raise pulp_exceptions.InvalidValue(['include'])
+        excluded = [field for field in DETAIL_FIELDS if field not in include]
+
+        raw_tasks = TaskStatus.objects(**criteria)
+        if excluded:
+            raw_tasks = raw_tasks.exclude(*excluded)
+        # One more task than the page holds is fetched to know whether there is a next page
+        raw_tasks = raw_tasks.order_by('id').limit(limit + 1)
         serialized_task_statuses = [task_serializer(task) for task in raw_tasks]
-        return generate_json_response_with_pulp_encoder(serialized_task_statuses)
+        next_cursor = None
+        if len(serialized_task_statuses) > limit:
+            serialized_task_statuses = serialized_task_statuses[:limit]
+            next_cursor = serialized_task_statuses[-1]['id']
+        for task in serialized_task_statuses:
+            for field in excluded:
+                task.pop(field, None)
+        return generate_json_response_with_pulp_encoder({'tasks': serialized_task_statuses,
+                                                         'next': next_cursor})
 
     @auth_required(authorization.DELETE)
     def delete(self, request):
@@ -6,7 +6,7 @@ import httplib
 import json
 import sys
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.encoding import iri_to_uri
 
 from pulp.common import dateutils, error_codes
@@ -65,6 +65,46 @@ generate_json_response_with_pulp_encoder = functools.partial(
 )
 
 
+def generate_json_stream_response(content, default=None,
+                                  content_type='application/json; charset=utf-8'):
+    """
+    Serialize the items of an iterable as a JSON array and stream it in a django response, one
+    item at a time, so the whole array is never held in memory.
+
+    :param content        : items to be serialized
+    :type  content        : iterable of anything that is serializable by json.dumps
+    :param default        : function used by json.dumps to serialize content (also called default)
+    :type  default        : function or None
+    :param content_type   : type of returned content
+    :type  content_type   : str
+
+    :return               : response streaming the serialized content
+    :rtype                : StreamingHttpResponse
+    """
+
+    def _serialize():
+        yield '['
+        separator = ''
+        for item in content:
+            yield separator + json.dumps(item, default=default)
+            separator = ', '
+        yield ']'
+
+    return StreamingHttpResponse(_serialize(), content_type=content_type)
+
+
+"""
+Shortcut function to generate a streamed json response using the in house json_encoder.
+
+This function is equivalent to:
+generate_json_stream_response(content, default=pulp_json_encoder)
+"""
+generate_json_stream_response_with_pulp_encoder = functools.partial(
+    generate_json_stream_response,
+    default=pulp_json_encoder,
+)
+
+
 def generate_redirect_response(response, href):
     response['Location'] = iri_to_uri(href)
     response.status_code = httplib.CREATED
@@ -1,5 +1,7 @@
 from uuid import uuid4
 
+from mock import patch
+
 from ... import base
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.db.model.content import ContentCatalog
@@ -39,6 +41,8 @@ class TestCatalogerConduit(base.PulpServerTests):
         for unit_key, url in units:
             conduit.add_entry(TYPE_ID, unit_key, url)
         collection = ContentCatalog.get_collection()
+        self.assertEqual(0, collection.find().count())
+        conduit.flush()
         self.assertEqual(conduit.source_id, SOURCE_ID)
         self.assertEqual(conduit.expires, EXPIRES)
         self.assertEqual(len(units), collection.find().count())
@@ -78,3 +82,15 @@ class TestCatalogerConduit(base.PulpServerTests):
         conduit.reset()
         self.assertEqual(conduit.added_count, 0)
         self.assertEqual(conduit.deleted_count, 0)
+
+    def test_add_batch(self):
+        units = self.units(0, 5)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        with patch('pulp.plugins.conduits.cataloger.CATALOG_BATCH_SIZE', 2):
+            for unit_key, url in units:
+                conduit.add_entry(TYPE_ID, unit_key, url)
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(4, collection.find().count())
+        conduit.flush()
+        self.assertEqual(5, collection.find().count())
+        self.assertEqual(conduit.added_count, 5)
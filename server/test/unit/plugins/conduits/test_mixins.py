@@ -10,6 +10,7 @@ from pulp.plugins.conduits import mixins
 from pulp.plugins.model import Unit, PublishReport
 from pulp.server import constants
 from pulp.server import exceptions as pulp_exceptions
+from pulp.server.async import progress
 from pulp.server.controllers import distributor as dist_controller
 from pulp.server.db import model
 from pulp.server.exceptions import MissingResource
@@ -678,6 +679,9 @@ class StatusMixinTests(unittest.TestCase):
     def setUp(self):
         manager_factory.initialize()
 
+    def tearDown(self):
+        progress._writers.clear()
+
     @mock.patch('pulp.server.db.model.TaskStatus.objects')
     @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
     def test_set_progress(self, mock_get_task_id, mock_task_status_objects):
@@ -724,6 +728,25 @@ class StatusMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.ImporterConduitException, self.mixin.set_progress, 'foo')
 
+    @mock.patch('pulp.server.db.model.TaskStatus._get_collection')
+    @mock.patch('pulp.server.db.model.TaskStatus.objects')
+    @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
+    def test_set_progress_coalesced(self, mock_get_task_id, mock_task_status_objects,
+                                    mock_get_collection):
+        # Setup
+        mock_get_task_id.return_value = 'test-id'
+        self.mixin = mixins.StatusMixin('test-report', mixins.ImporterConduitException)
+
+        # Test
+        self.mixin.set_progress({'count': 1})
+        self.mixin.set_progress({'count': 2})
+        self.mixin.set_progress({'count': 3}, force=True)
+
+        # Verify
+        self.assertEqual(1, mock_task_status_objects.return_value.update_one.call_count)
+        mock_get_collection.return_value.update_one.assert_called_once_with(
+            {'task_id': 'test-id'}, {'$set': {'progress_report.test-report.count': 3}})
+
 
 class PublishReportMixinTests(unittest.TestCase):
 
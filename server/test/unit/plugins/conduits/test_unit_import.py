@@ -46,3 +46,17 @@ class ImportUnitConduitTests(base.PulpServerTests):
 
         # Verify the correct propagation to the mixin method
         mock_get.assert_called_once_with(self.dest_repo_id, criteria, ImporterConduitException)
+
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_all_by_ids')
+    def test_associate_units(self, mock_associate):
+        mock_associate.return_value = 1
+        units = [mock.Mock(type_id='t1', id='a'), mock.Mock(type_id='t2', id='b'),
+                 mock.Mock(type_id='t1', id='c')]
+
+        added = self.conduit.associate_units(units)
+
+        self.assertEqual(added, 2)
+        self.assertEqual(sorted(mock_associate.call_args_list),
+                         sorted([mock.call(self.dest_repo_id, 't1', ['a', 'c']),
+                                 mock.call(self.dest_repo_id, 't2', ['b'])]))
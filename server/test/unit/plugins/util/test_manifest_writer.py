@@ -1,5 +1,8 @@
 from cStringIO import StringIO
 import contextlib
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -92,3 +95,73 @@ class TestMakeManifestForDir(unittest.TestCase):
         expected = 'b,greatchecksum,17'
 
         self.assertEqual(fake_file.getvalue().strip(), expected)
+
+
+class TestManifestBuilder(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        for name, content in (('a', 'hi there\n'), ('b', '')):
+            with open(os.path.join(self.working_dir, name), 'w') as open_file:
+                open_file.write(content)
+        os.mkdir(os.path.join(self.working_dir, 'subdir'))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def read_manifest(self):
+        with open(os.path.join(self.working_dir, 'PULP_MANIFEST')) as open_file:
+            return sorted(open_file.read().splitlines())
+
+    def test_build(self):
+        builder = manifest_writer.ManifestBuilder(self.working_dir)
+
+        builder.build()
+
+        self.assertEqual(self.read_manifest(), [
+            'a,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9',
+            'b,e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855,0'])
+        self.assertEqual((builder.hashed, builder.cached), (2, 0))
+
+    def test_build_no_cache(self):
+        """Without a cache path, nothing but the manifest is written to the directory."""
+        manifest_writer.ManifestBuilder(self.working_dir).build()
+        builder = manifest_writer.ManifestBuilder(self.working_dir)
+
+        builder.build()
+
+        self.assertEqual((builder.hashed, builder.cached), (2, 0))
+        self.assertEqual(sorted(os.listdir(self.working_dir)),
+                         ['PULP_MANIFEST', 'a', 'b', 'subdir'])
+
+    def test_build_reuses_checksums(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_path = os.path.join(cache_dir, 'cache')
+        manifest_writer.ManifestBuilder(self.working_dir, cache_path=cache_path).build()
+        with open(os.path.join(self.working_dir, 'b'), 'w') as open_file:
+            open_file.write('hi there\n')
+        builder = manifest_writer.ManifestBuilder(self.working_dir, cache_path=cache_path)
+
+        with mock.patch.object(manifest_writer, 'get_sha256_checksum',
+                               wraps=manifest_writer.get_sha256_checksum) as mock_checksum:
+            builder.build()
+
+        mock_checksum.assert_called_once_with(os.path.join(self.working_dir, 'b'))
+        self.assertEqual((builder.hashed, builder.cached), (1, 1))
+        self.assertEqual(self.read_manifest(), [
+            'a,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9',
+            'b,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9'])
+
+    def test_build_corrupt_cache(self):
+        cache_path = os.path.join(self.working_dir, '..', 'cache')
+        with open(cache_path, 'w') as open_file:
+            open_file.write('not json')
+        builder = manifest_writer.ManifestBuilder(self.working_dir, cache_path=cache_path)
+
+        try:
+            builder.build()
+        finally:
+            os.remove(cache_path)
+
+        self.assertEqual(builder.hashed, 2)
+        self.assertEqual(len(self.read_manifest()), 2)
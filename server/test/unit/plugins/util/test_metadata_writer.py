@@ -12,9 +12,10 @@ from mock import Mock, patch
 from pulp.common.error_codes import PLP1005
 from pulp.devel.unit.server.util import assert_validation_exception
 from pulp.plugins.util.metadata_writer import MetadataFileContext, JSONArrayFileContext
+from pulp.plugins.util.metadata_writer import HashingFileWrapper
 from pulp.plugins.util.metadata_writer import XmlFileContext
 from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
-from pulp.server.util import TYPE_SHA1
+from pulp.server.util import TYPE_SHA1, TYPE_SHA256
 
 
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data'))
@@ -247,6 +248,48 @@ class MetadataWriterTests(unittest.TestCase):
                                                    expected_metadata_file_name)
         self.assertEquals(expected_metadata_file_path, context.metadata_file_path)
 
+    def test_finalize_checksum_of_written_content(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, TYPE_SHA256)
+        context.initialize()
+        context.metadata_file_handle.write('content')
+
+        with patch.object(context, '_file_checksum') as mock_file_checksum:
+            context.finalize()
+
+        self.assertFalse(mock_file_checksum.called)
+        self.assertEqual(context.checksum, hashlib.sha256('content').hexdigest())
+        with open(context.metadata_file_path) as h:
+            self.assertEqual(h.read(), 'content')
+        self.assertEqual(context.open_checksum, None)
+
+    def test_finalize_checksum_gzip(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, TYPE_SHA256)
+        context.initialize()
+        context.metadata_file_handle.write('content')
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as h:
+            self.assertEqual(context.checksum, hashlib.sha256(h.read()).hexdigest())
+        h = gzip.open(context.metadata_file_path)
+        self.assertEqual(h.read(), 'content')
+        h.close()
+        self.assertEqual(context.open_checksum, hashlib.sha256('content').hexdigest())
+
+    def test_finalize_checksum_not_hashed(self):
+        """
+        The checksum of a file handle the context did not open is read from the file.
+        """
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, TYPE_SHA1)
+        context.metadata_file_handle = open(path, 'w')
+        context.metadata_file_handle.write('content')
+
+        context.finalize()
+
+        self.assertEqual(context.checksum, hashlib.sha1('content').hexdigest())
+
     @patch('pulp.plugins.util.metadata_writer._LOG.exception')
     def test_finalize_error_on_footer(self, mock_logger):
 
@@ -294,6 +337,29 @@ class MetadataWriterTests(unittest.TestCase):
         context.initialize.assert_called_once_with()
 
 
+class TestHashingFileWrapper(unittest.TestCase):
+
+    def test_write(self):
+        file_object = Mock()
+        wrapper = HashingFileWrapper(file_object, [hashlib.md5, hashlib.sha1])
+
+        wrapper.write('a')
+        wrapper.write('b')
+
+        self.assertEqual(wrapper.hexdigests(), [hashlib.md5('ab').hexdigest(),
+                                                hashlib.sha1('ab').hexdigest()])
+        self.assertEqual(file_object.write.call_count, 2)
+
+    def test_delegates(self):
+        file_object = Mock()
+        wrapper = HashingFileWrapper(file_object, [])
+
+        wrapper.flush()
+
+        file_object.flush.assert_called_once_with()
+        self.assertEqual(wrapper.closed, file_object.closed)
+
+
 class TestJSONArrayFileContext(unittest.TestCase):
 
     def setUp(self):
@@ -9,7 +9,7 @@ import traceback
 import unittest
 
 import mongoengine
-from mock import Mock, patch, MagicMock
+from mock import call, Mock, patch, MagicMock
 from nectar.downloaders.local import LocalFileDownloader
 from nectar.request import DownloadRequest
 
@@ -199,6 +199,32 @@ class StepTests(PublisherBase):
         step.report_progress()
         self.assertFalse(step.status_conduit.report_progress.called)
 
+    def test_report_progress_every_report(self):
+        """
+        Every report is passed to the status conduit, which coalesces them, so that the
+        latest report is not lost.
+        """
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+        step.get_progress_report = Mock(side_effect=[{'n': 1}, {'n': 2}])
+
+        step.report_progress()
+        step.report_progress()
+
+        self.assertEqual(step.status_conduit.set_progress.call_args_list,
+                         [call({'n': 1}, force=False), call({'n': 2}, force=False)])
+
+    def test_report_progress_state_changed(self):
+        """A change of state forces the report to be written."""
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+        step.state = reporting_constants.STATE_RUNNING
+
+        step.report_progress()
+
+        step.status_conduit.set_progress.assert_called_once_with(step.get_progress_report(),
+                                                                 force=True)
+
 
 class TestStepProcessBlock(unittest.TestCase):
     def test_increments_progress(self):
@@ -357,6 +383,14 @@ class PluginStepTests(PluginBase):
 
         compare_dict(report[0], target_report)
 
+    def test_get_progress_report_bulk_throughput(self):
+        step = publish_step.PluginStep('foo_step')
+        step.record_bulk_throughput(300, 1.5)
+        step.record_bulk_throughput(100, 0.5)
+        report = step.get_progress_report()
+
+        self.assertEqual(report[0][reporting_constants.PROGRESS_UNITS_PER_SECOND_KEY], 200.0)
+
     def test_get_progress_report_description(self):
         step = publish_step.PluginStep('bar_step')
         step.description = 'bar'
@@ -1063,7 +1097,7 @@ class DownloadStepTests(unittest.TestCase):
         dlstep.cancel()
 
 
-@patch('pulp.plugins.util.publish_step.repo_controller.associate_single_unit')
+@patch('pulp.plugins.util.publish_step.repo_controller.associate_units')
 @patch('pulp.plugins.util.publish_step.units_controller.find_units')
 class TestGetLocalUnitsStep(unittest.TestCase):
 
@@ -1121,7 +1155,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
 
         self.step.process_main()
 
-        mock_paginate.assert_called_once_with(self.step.parent.available_units, 50)
+        mock_paginate.assert_called_once_with(self.step.parent.available_units, 1000)
 
     def test_saves_unit(self, mock_find_units, mock_associate):
         """
@@ -1133,12 +1167,31 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.return_value = [existing_demo]
 
         self.step.process_main()
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo], 1000)
         mock_find_units.assert_called_once_with((demo, ))
 
         # Ensure that the unit was not marked for download
         self.assertEqual(self.step.units_to_download, [])
 
+    def test_associates_in_batches(self, mock_find_units, mock_associate):
+        """
+        Test that existing units are associated in bulk once a batch is full, and that the
+        throughput is recorded in the progress report.
+        """
+        demos = [self.DemoModel(key_field=str(i)) for i in range(3)]
+        existing = [self.DemoModel(key_field=str(i), id=str(i)) for i in range(3)]
+        self.parent.available_units = demos
+        mock_find_units.side_effect = [[existing[0]], [existing[1]], [existing[2]]]
+        self.step.unit_pagination_size = 1
+        self.step.association_batch_size = 2
+
+        self.step.process_main()
+
+        self.assertEqual(mock_associate.call_args_list,
+                         [call('fake_repo', existing[:2], 2), call('fake_repo', existing[2:], 2)])
+        self.assertEqual(self.step.bulk_units, 3)
+        self.assertEqual(self.step.units_to_download, [])
+
     def test_populates_units_to_download(self, mock_find_units, mock_associate):
         """
         Test that if a unit does not exist in the database it is added to the
@@ -1155,7 +1208,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.assert_called_once_with((demo_1, demo_2))
 
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo], 1000)
         # the one that does not exist yet is added to the download list
         self.assertEqual(self.step.units_to_download, [demo_1])
 
@@ -1183,7 +1236,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         # being ignored and the correct available_units is being used instead.
         mock_find_units.assert_called_once_with((demo_1, demo_2, demo_3))
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo], 1000)
         # the two that do not exist yet are added to the download list
         self.assertEqual(step.units_to_download, [demo_1, demo_3])
 
@@ -1221,16 +1274,67 @@ class TestSaveUnitsStep(unittest.TestCase):
 
 
 class TestCreateManifestStep(unittest.TestCase):
+
+    @staticmethod
+    def _parent(working_dir):
+        parent = Mock()
+        parent.get_working_dir.return_value = working_dir
+        parent.get_repo.return_value = Repository('repo1')
+        return parent
+
     def test_init(self):
         step = publish_step.CreatePulpManifestStep('/foo')
 
         # make sure the description has some value
         self.assertTrue(step.description)
 
-    @patch('pulp.plugins.util.manifest_writer.make_manifest_for_dir', spec_set=True)
-    def test_process_main(self, mock_make_manifest):
-        step = publish_step.CreatePulpManifestStep('/foo/')
+    @patch('pulp.plugins.util.manifest_writer.ManifestBuilder', spec_set=True)
+    def test_process_main(self, mock_builder):
+        step = publish_step.CreatePulpManifestStep('/foo/', cache_path='/cache/foo')
 
         step.process_main()
 
-        mock_make_manifest.assert_called_once_with('/foo/')
+        mock_builder.assert_called_once_with('/foo/', cache_path='/cache/foo')
+        mock_builder.return_value.build.assert_called_once_with()
+
+    @patch('pulp.plugins.util.publish_step.misc.mkdir')
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_get_cache_path(self, mock_config, mock_mkdir):
+        """The cache is kept outside the published directory, per repository."""
+        mock_config.get.return_value = '/var/cache/pulp'
+        step = publish_step.CreatePulpManifestStep('/var/www/pub/foo')
+        step.parent = self._parent('/var/cache/pulp/worker/task1')
+
+        cache_path = step.get_cache_path()
+
+        mock_config.get.assert_called_once_with('server', 'working_directory')
+        mock_mkdir.assert_called_once_with('/var/cache/pulp/manifest_cache/repo1')
+        self.assertEqual(os.path.dirname(cache_path), '/var/cache/pulp/manifest_cache/repo1')
+        self.assertFalse(cache_path.startswith('/var/www/pub/foo'))
+
+    @patch('pulp.plugins.util.publish_step.misc.mkdir', Mock())
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_get_cache_path_in_working_dir(self, mock_config):
+        """
+        A target directory in the working directory uses the same cache for every publish,
+        although the working directory is different each time.
+        """
+        mock_config.get.return_value = '/var/cache/pulp'
+        cache_paths = []
+        for task_id in ('task1', 'task2'):
+            step = publish_step.CreatePulpManifestStep(
+                '/var/cache/pulp/worker/%s/build/foo' % task_id)
+            step.parent = self._parent('/var/cache/pulp/worker/%s' % task_id)
+            cache_paths.append(step.get_cache_path())
+
+        self.assertEqual(cache_paths[0], cache_paths[1])
+
+        step = publish_step.CreatePulpManifestStep('/var/cache/pulp/worker/task1/build/bar')
+        step.parent = self._parent('/var/cache/pulp/worker/task1')
+        self.assertNotEqual(step.get_cache_path(), cache_paths[0])
+
+    def test_get_cache_path_no_parent(self):
+        """A step that is not part of a publish does not use a cache."""
+        step = publish_step.CreatePulpManifestStep('/foo')
+
+        self.assertTrue(step.get_cache_path() is None)
@@ -0,0 +1,168 @@
+"""
+This module contains tests for the pulp.server.async.progress module.
+"""
+import unittest
+
+import mock
+
+from pulp.server.async import progress
+
+
+MODULE = 'pulp.server.async.progress'
+
+
+@mock.patch(MODULE + '.TaskStatus')
+class TestProgressWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = progress.ProgressWriter('task', interval=60)
+
+    def tearDown(self):
+        if self.writer._timer is not None:
+            self.writer._timer.cancel()
+
+    def test_first_write(self, task_status):
+        """The first report is written right away, as the whole progress report."""
+        self.writer.update('r', {'a': 1})
+
+        task_status.objects.assert_called_once_with(task_id='task')
+        task_status.objects.return_value.update_one.assert_called_once_with(
+            set__progress_report={'r': {'a': 1}})
+        self.assertEqual(self.writer.writes, 1)
+        self.assertTrue(self.writer._timer is None)
+
+    def test_coalesced(self, task_status):
+        """Reports within the interval are written together by a background timer."""
+        self.writer.update('r', {'a': 1})
+        self.writer.update('r', {'a': 2})
+        self.writer.update('r', {'a': 3})
+
+        self.assertEqual(self.writer.writes, 1)
+        self.assertEqual(self.writer.updates, 3)
+        self.assertTrue(self.writer._timer is not None)
+
+        self.writer.flush()
+
+        collection = task_status._get_collection.return_value
+        collection.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.r.a': 3}})
+        self.assertEqual(self.writer.writes, 2)
+        self.assertTrue(self.writer._timer is None)
+
+    def test_background_flush(self, task_status):
+        """The background timer writes the pending reports at the end of the interval."""
+        self.writer.interval = 0.05
+        self.writer.update('r', {'a': 1})
+        self.writer.update('r', {'a': 2})
+        timer = self.writer._timer
+
+        timer.join(5)
+
+        self.assertEqual(self.writer.writes, 2)
+        self.assertTrue(self.writer._timer is None)
+
+    def test_force(self, task_status):
+        """A forced report is written right away."""
+        self.writer.update('r', {'a': 1})
+        self.writer.update('r', {'a': 2}, force=True)
+
+        self.assertEqual(self.writer.writes, 2)
+
+    def test_unchanged(self, task_status):
+        """Nothing is written when the reports did not change."""
+        self.writer.update('r', {'a': 1})
+        self.writer.update('r', {'a': 1}, force=True)
+
+        self.assertFalse(task_status._get_collection.return_value.update_one.called)
+
+    def test_new_report(self, task_status):
+        """A report that was never written is set as a whole."""
+        self.writer.update('r', {'a': 1})
+        self.writer.update('s', [{'b': 1}], force=True)
+
+        collection = task_status._get_collection.return_value
+        collection.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.s': [{'b': 1}]}})
+
+    def test_report_copied(self, task_status):
+        """Reports are copied, so later changes to them are detected."""
+        report = {'a': [1]}
+        self.writer.update('r', report)
+        report['a'].append(2)
+        self.writer.update('r', report, force=True)
+
+        collection = task_status._get_collection.return_value
+        collection.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.r.a': [1, 2]}})
+
+    def test_close(self, task_status):
+        """Closing writes the pending reports."""
+        self.writer.update('r', {'a': 1})
+        self.writer.update('r', {'a': 2})
+
+        self.writer.close()
+
+        self.assertEqual(self.writer.writes, 2)
+
+
+class TestChangedFields(unittest.TestCase):
+
+    def test_unchanged(self):
+        self.assertEqual(progress.changed_fields({'a': [1]}, {'a': [1]}, 'p'), {})
+
+    def test_nested(self):
+        old = [{'state': 'running', 'num': 1, 'sub_steps': [{'num': 0}, {'num': 0}]}]
+        new = [{'state': 'running', 'num': 2, 'sub_steps': [{'num': 0}, {'num': 5}]}]
+
+        changes = progress.changed_fields(old, new, 'p')
+
+        self.assertEqual(changes, {'p.0.num': 2, 'p.0.sub_steps.1.num': 5})
+
+    def test_different_shape(self):
+        self.assertEqual(progress.changed_fields([1], [1, 2], 'p'), {'p': [1, 2]})
+        self.assertEqual(progress.changed_fields({'a': 1}, {'b': 1}, 'p'), {'p': {'b': 1}})
+        self.assertEqual(progress.changed_fields('a', {'b': 1}, 'p'), {'p': {'b': 1}})
+
+    def test_invalid_keys(self):
+        """Documents with keys that cannot be used in a dotted path are set as a whole."""
+        old = {'a.b': 1, 'c': 1}
+        new = {'a.b': 2, 'c': 1}
+
+        self.assertEqual(progress.changed_fields(old, new, 'p'), {'p': new})
+
+
+@mock.patch(MODULE + '.TaskStatus')
+class TestWriters(unittest.TestCase):
+
+    def tearDown(self):
+        progress._writers.clear()
+
+    def test_get_writer(self, task_status):
+        writer = progress.get_writer('task')
+
+        self.assertTrue(progress.get_writer('task') is writer)
+        self.assertFalse(progress.get_writer('other') is writer)
+
+    def test_close(self, task_status):
+        writer = progress.get_writer('task')
+        writer.update('r', {'a': 1})
+        writer.update('r', {'a': 2})
+
+        self.assertEqual(progress.write_counts(), {'task': {'updates': 2, 'writes': 1}})
+        self.assertTrue(progress.close('task') is writer)
+        self.assertEqual(writer.writes, 2)
+        self.assertEqual(progress.write_counts(), {})
+        self.assertTrue(progress.close('task') is None)
+
+    @mock.patch(MODULE + '.time.time')
+    def test_interval_elapsed(self, mock_time, task_status):
+        """A report is written right away once the interval has elapsed."""
+        mock_time.return_value = 1000
+        writer = progress.get_writer('task')
+        writer.update('r', {'a': 1})
+        mock_time.return_value = 1000 + writer.interval
+
+        writer.update('r', {'a': 2})
+
+        self.assertEqual(writer.writes, 2)
+        self.assertTrue(writer._timer is None)
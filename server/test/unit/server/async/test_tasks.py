@@ -1,8 +1,9 @@
 """
 This module contains tests for the pulp.server.async.tasks module.
 """
-from datetime import datetime
 import signal
+import threading
+import time
 import unittest
 import uuid
 
@@ -20,9 +21,9 @@ from pulp.common.constants import (CALL_CANCELED_STATE, CALL_FINISHED_STATE,
 from pulp.common.tags import action_tag, resource_tag, RESOURCE_CONSUMER_TYPE
 from pulp.devel.unit.util import compare_dict
 from pulp.server.async import app, tasks
-from pulp.server.db.model import Worker, TaskStatus
+from pulp.server.db.model import TaskStatus
 from pulp.server.db.reaper import queue_reap_expired_documents
-from pulp.server.exceptions import NoWorkers, PulpException, PulpCodedException
+from pulp.server.exceptions import PulpException, PulpCodedException
 from pulp.server.maintenance.monthly import queue_monthly_maintenance
 
 
@@ -35,14 +36,9 @@ WORKER_3 = 'worker-3'
 class TestQueueReservedTask(ResourceReservationTests):
 
     def setUp(self):
-        self.patch_a = mock.patch('pulp.server.async.tasks.get_worker_for_reservation')
-        self.mock_get_worker_for_reservation = self.patch_a.start()
-
-        self.patch_b = mock.patch('pulp.server.async.tasks._get_unreserved_worker')
-        self.mock_get_unreserved_worker = self.patch_b.start()
-
-        self.patch_c = mock.patch('pulp.server.async.tasks.time', autospec=True)
-        self.mock_time = self.patch_c.start()
+        self.patch_a = mock.patch('pulp.server.async.tasks.get_reservation_table')
+        self.mock_get_reservation_table = self.patch_a.start()
+        self.mock_get_reservation_table.return_value.reserve.return_value = 'worker1'
 
         self.patch_d = mock.patch('pulp.server.async.tasks.ReservedResource', autospec=True)
         self.mock_reserved_resource = self.patch_d.start()
@@ -58,16 +54,17 @@ class TestQueueReservedTask(ResourceReservationTests):
 
     def tearDown(self):
         self.patch_a.stop()
-        self.patch_b.stop()
-        self.patch_c.stop()
         self.patch_d.stop()
         self.patch_e.stop()
         self.patch_f.stop()
         super(TestQueueReservedTask, self).tearDown()
 
+    def test_reserves_resource(self):
+        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
+        reserve = self.mock_get_reservation_table.return_value.reserve
+        reserve.assert_called_once_with('my_resource_id', 'my_task_id')
+
     def test_creates_and_saves_reserved_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         self.mock_reserved_resource.assert_called_once_with(task_id='my_task_id',
                                                             worker_name='worker1',
@@ -75,59 +72,129 @@ class TestQueueReservedTask(ResourceReservationTests):
         self.mock_reserved_resource.return_value.save.assert_called_once_with()
 
     def test_dispatches_inner_task(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         apply_async = self.mock_celery.tasks['task_name'].apply_async
         apply_async.assert_called_once_with(1, 2, a=2, routing_key='worker1', task_id='my_task_id',
                                             exchange='C.dq')
 
     def test_dispatches__release_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         self.mock__release_resource.apply_async.assert_called_once_with(('my_task_id',),
                                                                         routing_key='worker1',
                                                                         exchange='C.dq')
 
-    def test_get_worker_for_reservation_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_get_unreserved_worker.called)
-        self.assertTrue(not self.mock_time.sleep.called)
 
-    def test_get_unreserved_worker_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.return_value = Worker(name='worker1',
-                                                              last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_time.sleep.called)
+@mock.patch('pulp.server.async.tasks.ReservedResource')
+@mock.patch('pulp.server.async.tasks.Worker')
+class TestReservationTable(unittest.TestCase):
 
-    def test_loops_and_sleeps_waiting_for_available_worker(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.side_effect = NoWorkers()
+    def _table(self, mock_worker, mock_reserved_resource, workers=(WORKER_1, WORKER_2),
+               reservations=()):
+        mock_worker.objects.return_value.only.return_value = [{'name': name} for name in workers]
+        mock_reserved_resource.objects.all.return_value = [
+            {'task_id': task_id, 'worker_name': worker_name, 'resource_id': resource_id}
+            for task_id, worker_name, resource_id in reservations]
+        return tasks.ReservationTable(resync_interval=60)
 
-        class BreakOutException(Exception):
-            pass
+    def test_load(self, mock_worker, mock_reserved_resource):
+        """Reservations on workers that can not be assigned work or are gone are ignored."""
+        table = self._table(mock_worker, mock_reserved_resource,
+                            workers=(WORKER_1, WORKER_2, RESOURCE_MANAGER_WORKER_NAME + '@h'),
+                            reservations=[('t1', WORKER_1, 'r1'), ('t2', WORKER_3, 'r2')])
 
-        def side_effect(*args):
-            def second_call(*args):
-                raise BreakOutException()
-            self.mock_time.sleep.side_effect = second_call
-            return None
+        stats = table.stats()
+        self.assertEqual((stats['workers'], stats['busy'], stats['reserved']), (2, 1, 1))
 
-        self.mock_time.sleep.side_effect = side_effect
+    def test_reserve_same_worker_for_resource(self, mock_worker, mock_reserved_resource):
+        """A reserved resource is assigned to the worker that holds it, even when busy."""
+        table = self._table(mock_worker, mock_reserved_resource,
+                            reservations=[('t1', WORKER_1, 'r1'), ('t2', WORKER_2, 'r2')])
 
-        try:
-            tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2],
-                                       {'a': 2})
-        except BreakOutException:
-            pass
-        else:
-            self.fail('_queue_reserved_task should have raised a BreakOutException')
+        self.assertEqual(table.reserve('r1', 't3'), WORKER_1)
+        self.assertEqual(table.stats()['reserved'], 3)
+        self.assertEqual(1, mock_reserved_resource.objects.all.call_count)
+
+    def test_reserve_idle_worker(self, mock_worker, mock_reserved_resource):
+        table = self._table(mock_worker, mock_reserved_resource,
+                            reservations=[('t1', WORKER_1, 'r1')])
+
+        self.assertEqual(table.reserve('r2', 't2'), WORKER_2)
+        self.assertEqual(table.stats()['busy'], 2)
+
+    def test_release(self, mock_worker, mock_reserved_resource):
+        """A released resource may be assigned to any idle worker."""
+        table = self._table(mock_worker, mock_reserved_resource, workers=(WORKER_1,))
+        table.reserve('r1', 't1')
+        table.reserve('r1', 't2')
+
+        table.release('t1')
+        self.assertEqual(table.stats()['busy'], 1)
+        table.release('t2')
+        table.release('unknown')
+
+        self.assertEqual(table.stats()['busy'], 0)
+        self.assertEqual(table.reserve('r2', 't3'), WORKER_1)
+
+    def test_reserve_waits_for_release(self, mock_worker, mock_reserved_resource):
+        """A task waits until a release makes a worker available."""
+        table = self._table(mock_worker, mock_reserved_resource, workers=(WORKER_1,),
+                            reservations=[('t1', WORKER_1, 'r1')])
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(table.reserve('r2', 't2')))
+        waiter.start()
+        while not table.waited:
+            time.sleep(0.01)
+
+        table.release('t1')
+        waiter.join(5)
+
+        self.assertEqual(result, [WORKER_1])
+        self.assertEqual(table.stats()['waited'], 1)
+        self.assertEqual(table.stats()['dispatched'], 1)
+
+    def test_reserve_reloads(self, mock_worker, mock_reserved_resource):
+        """An outdated table is reloaded before it is used."""
+        table = self._table(mock_worker, mock_reserved_resource, workers=())
+        table.resync_interval = 0
+        mock_worker.objects.return_value.only.return_value = [{'name': WORKER_1}]
+
+        self.assertEqual(table.reserve('r1', 't1'), WORKER_1)
+        self.assertEqual(2, mock_reserved_resource.objects.all.call_count)
+
+
+class TestNotifyRelease(unittest.TestCase):
+
+    @mock.patch('pulp.server.async.tasks.celery')
+    def test_publish(self, mock_celery):
+        tasks._notify_release('my_task_id')
+
+        producer = mock_celery.producer_or_acquire.return_value.__enter__.return_value
+        producer.publish.assert_called_once_with({'task_id': 'my_task_id'},
+                                                 exchange=tasks.RESERVATION_EXCHANGE,
+                                                 declare=[tasks.RESERVATION_EXCHANGE],
+                                                 serializer='json')
+
+    @mock.patch('pulp.server.async.tasks._logger')
+    @mock.patch('pulp.server.async.tasks.celery')
+    def test_publish_failure(self, mock_celery, mock_logger):
+        """Failing to send a notification is not fatal."""
+        mock_celery.producer_or_acquire.side_effect = IOError()
+
+        tasks._notify_release('my_task_id')
 
-        self.mock_time.sleep.assert_has_calls([mock.call(0.25), mock.call(0.25)])
+        self.assertEqual(1, mock_logger.warning.call_count)
+
+
+class TestReleaseListener(unittest.TestCase):
+
+    def test_on_message(self):
+        listener = tasks.ReleaseListener(mock.Mock())
+        message = mock.Mock()
+
+        listener.on_message({'task_id': 't1'}, message)
+
+        listener.table.release.assert_called_once_with('t1')
+        message.ack.assert_called_once_with()
 
 
 class TestDeleteWorker(ResourceReservationTests):
@@ -229,6 +296,9 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_d = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_d.start()
 
+        self.patch_e = mock.patch('pulp.server.async.tasks._notify_release', autospec=True)
+        self.mock_notify_release = self.patch_e.start()
+
         super(TestReleaseResource, self).setUp()
 
     def tearDown(self):
@@ -236,6 +306,7 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_b.stop()
         self.patch_c.stop()
         self.patch_d.stop()
+        self.patch_e.stop()
         super(TestReleaseResource, self).tearDown()
 
     def test_deletes_reserved_resource(self):
@@ -244,6 +315,10 @@ class TestReleaseResource(unittest.TestCase):
         self.mock_reserved_resource.objects.assert_called_once_with(task_id=mock_task_id)
         self.mock_reserved_resource.objects.return_value.delete.assert_called_once_with()
 
+    def test_notifies_release(self):
+        tasks._release_resource('my_task_id')
+        self.mock_notify_release.assert_called_once_with('my_task_id')
+
     def test_finds_running_task_by_uuid(self):
         mock_task_id = mock.Mock()
         tasks._release_resource(mock_task_id)
@@ -950,86 +1025,7 @@ class TestScheduledTasks(unittest.TestCase):
         mock_monthly_apply_async.assert_called_once_with(tags=[action_tag('monthly')])
 
 
-class TestGetWorkerForReservation(ResourceReservationTests):
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_existing_reservation_correctly_found(self, mock_reserved_resource,
-                                                  mock_worker_objects):
-        get_objects = mock_reserved_resource.objects
-        tasks.get_worker_for_reservation('resource1')
-        get_objects.assert_called_once_with(resource_id='resource1')
-        get_objects.return_value.first.assert_called_once_with()
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_correct_worker_returned(self, mock_reserved_resource, mock_worker_objects):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = {'worker_name': 'worker1'}
-        mock_worker_objects.return_value.first.return_value = find_one.return_value
-        result = tasks.get_worker_for_reservation('resource1')
-        self.assertTrue(result is find_one.return_value)
-
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_if_no_reservations(self, mock_reserved_resource):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = False
-        try:
-            tasks.get_worker_for_reservation('resource1')
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-
-class TestGetUnreservedWorker(ResourceReservationTests):
-
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_reserved_resources_queried_correctly(self, mock_reserved_resource):
-        find = mock_reserved_resource.objects.all
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-        find.assert_called_once_with()
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_worker_returned_when_one_worker_is_not_reserved(self, mock_reserved_resource,
-                                                             mock_worker_objects):
-        mock_worker_objects.return_value = [{'name': 'a'}, {'name': 'b'}]
-        mock_reserved_resource.objects.all.return_value = [{'worker_name': 'a'}]
-        result = tasks._get_unreserved_worker()
-        self.assertEqual(result, {'name': 'b'})
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_all_workers_reserved(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = [{'name': 'a'}, {'name': 'b'}]
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_there_are_no_workers(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = []
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
+class TestIsWorker(unittest.TestCase):
 
     def test_is_worker(self):
         self.assertTrue(tasks._is_worker("a_worker@some.hostname"))
@@ -417,6 +417,7 @@ class TestContentSource(TestCase):
 
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertEqual(conduit.flush.call_count, len(urls))
 
         n = 0
         added = 10
@@ -455,6 +456,7 @@ class TestContentSource(TestCase):
 
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertEqual(conduit.flush.call_count, len(urls))
 
         n = 0
         for _url in source.urls:
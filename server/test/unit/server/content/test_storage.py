@@ -1,11 +1,14 @@
 import os
+import shutil
+import tempfile
 
-from errno import EEXIST, EPERM
+from errno import EACCES, EEXIST, EPERM, EXDEV
 from unittest import TestCase
 
 from mock import Mock, patch
 
 from pulp.plugins.util import verification
+from pulp.server.content import storage as storage_module
 from pulp.server.content.storage import mkdir, ContentStorage, FileStorage, SharedStorage
 
 
@@ -181,11 +184,104 @@ class TestFileStorage(TestCase):
         shutil.copy.assert_called_once_with(path_in, temp_destination)
         rename.assert_called_once_with(temp_destination, destination)
 
+    @patch('os.rename')
+    @patch('os.close')
+    @patch('pulp.server.content.storage.tempfile')
+    @patch('pulp.server.content.storage.mkdir')
+    def test_put_returns_strategy(self, _mkdir, tempfile, close, rename):
+        unit = Mock(id='123', storage_path='/tmp/storage')
+        tempfile.mkstemp.return_value = ('fd', '/some/file/path')
+        storage = FileStorage()
+        storage._transfer = Mock(return_value=storage_module.IMPORT_RENAME)
+
+        strategy = storage.put(unit, '/tmp/test', disposable=True)
+
+        self.assertEqual(strategy, storage_module.IMPORT_RENAME)
+        storage._transfer.assert_called_once_with('/tmp/test', '/some/file/path', True)
+
     def test_get(self):
         storage = FileStorage()
         storage.get(None)  # just for coverage
 
 
+class TestTransfer(TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'source')
+        with open(self.path, 'w') as f:
+            f.write('content')
+        self.destination = os.path.join(self.working_dir, 'destination')
+        open(self.destination, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def assert_transferred(self):
+        with open(self.destination) as f:
+            self.assertEqual(f.read(), 'content')
+
+    def test_rename_disposable(self):
+        strategy = FileStorage._transfer(self.path, self.destination, True)
+
+        self.assertEqual(strategy, storage_module.IMPORT_RENAME)
+        self.assert_transferred()
+        self.assertFalse(os.path.exists(self.path))
+
+    @patch('os.rename', Mock(side_effect=OSError(EACCES, 'permission denied')))
+    def test_hardlink_disposable(self):
+        strategy = FileStorage._transfer(self.path, self.destination, True)
+
+        self.assertEqual(strategy, storage_module.IMPORT_HARDLINK)
+        self.assert_transferred()
+        self.assertTrue(os.path.samefile(self.path, self.destination))
+
+    @patch('pulp.server.content.storage._reflink', Mock(side_effect=IOError()))
+    def test_not_disposable_copied(self):
+        """A file that is still needed is never renamed or hardlinked into storage."""
+        strategy = FileStorage._transfer(self.path, self.destination, False)
+
+        self.assertEqual(strategy, storage_module.IMPORT_COPY)
+        self.assert_transferred()
+        self.assertFalse(os.path.samefile(self.path, self.destination))
+
+    @patch('pulp.server.content.storage._reflink')
+    def test_reflink(self, _reflink):
+        strategy = FileStorage._transfer(self.path, self.destination, False)
+
+        self.assertEqual(strategy, storage_module.IMPORT_REFLINK)
+        _reflink.assert_called_once_with(self.path, self.destination)
+
+    @patch('os.link', Mock(side_effect=OSError(EXDEV, 'cross-device')))
+    @patch('os.rename', Mock(side_effect=OSError(EXDEV, 'cross-device')))
+    @patch('pulp.server.content.storage._reflink', Mock(side_effect=IOError()))
+    def test_copy(self):
+        strategy = FileStorage._transfer(self.path, self.destination, True)
+
+        self.assertEqual(strategy, storage_module.IMPORT_COPY)
+        self.assert_transferred()
+        self.assertTrue(os.path.exists(self.path))
+
+    @patch('pulp.server.content.storage._reflink', Mock(side_effect=IOError()))
+    def test_symlink_copied(self):
+        """A symlink is neither moved nor linked into storage."""
+        link = os.path.join(self.working_dir, 'link')
+        os.symlink(self.path, link)
+
+        strategy = FileStorage._transfer(link, self.destination, True)
+
+        self.assertEqual(strategy, storage_module.IMPORT_COPY)
+        self.assertFalse(os.path.islink(self.destination))
+        self.assert_transferred()
+
+    @patch('pulp.server.content.storage.fcntl')
+    def test_reflink_function(self, fcntl):
+        storage_module._reflink(self.path, self.destination)
+
+        self.assertEqual(fcntl.ioctl.call_count, 1)
+        self.assertEqual(fcntl.ioctl.call_args[0][1], storage_module.FICLONE)
+
+
 class TestSharedStorage(TestCase):
 
     @patch('pulp.server.content.storage.sha256')
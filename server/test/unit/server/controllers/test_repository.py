@@ -5,6 +5,7 @@ from bson.objectid import InvalidId
 from mock import call, Mock, MagicMock, patch
 import mock
 import mongoengine
+from pymongo.errors import BulkWriteError
 
 from pulp.common import dateutils, error_codes
 from pulp.common.compat import unittest
@@ -29,6 +30,12 @@ class DemoModel(model.ContentUnit):
     _content_type_id = mongoengine.StringField(default='demo_model')
 
 
+class DemoFileModel(model.FileContentUnit):
+    key_field = mongoengine.StringField()
+    unit_key_fields = ['key_field']
+    _content_type_id = mongoengine.StringField(default='demo_file_model')
+
+
 @mock.patch('pulp.server.db.model.RepositoryContentUnit.objects')
 class TestGetAssociatedUnitIDs(unittest.TestCase):
     def setUp(self):
@@ -101,6 +108,37 @@ class TestGetUnitModelQuerySets(unittest.TestCase):
         mock_get_ids.assert_called_once_with('repo1', 'demo_model', q)
 
 
+class AssociationQuerySet(object):
+    """
+    A minimal stand-in for a RepositoryContentUnit query set ordered by id.
+    """
+
+    def __init__(self, associations):
+        self.associations = associations
+        self.skips = []
+
+    def order_by(self, *fields):
+        return self
+
+    def only(self, *fields):
+        return self
+
+    def filter(self, id__gt):
+        return AssociationQuerySet([a for a in self.associations if a.id > id__gt])
+
+    def skip(self, count):
+        self.skips.append(count)
+        return AssociationQuerySet(self.associations[count:])
+
+    def limit(self, count):
+        return self.associations[:count]
+
+
+def association(index):
+    return model.RepositoryContentUnit(id=index, repo_id='foo', unit_type_id='demo_model',
+                                       unit_id='bar_%i' % index)
+
+
 @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
 class FindRepoContentUnitsTest(unittest.TestCase):
 
@@ -122,10 +160,10 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         """
         repo = MagicMock(repo_id='foo')
         test_unit = DemoModel(id='bar', key_field='baz')
-        test_rcu = model.RepositoryContentUnit(repo_id='foo',
+        test_rcu = model.RepositoryContentUnit(id=1, repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        mock_rcu_objects.return_value = AssociationQuerySet([test_rcu])
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -149,10 +187,10 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         """
         repo = MagicMock(repo_id='foo')
         test_unit = DemoModel(id='bar', key_field='baz')
-        test_rcu = model.RepositoryContentUnit(repo_id='foo',
+        test_rcu = model.RepositoryContentUnit(id=1, repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        mock_rcu_objects.return_value = AssociationQuerySet([test_rcu])
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -174,18 +212,10 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         Test that limits are applied properly to the results
         """
         repo = MagicMock(repo_id='foo')
-        rcu_list = []
-        unit_list = []
-        for i in range(10):
-            unit_id = 'bar_%i' % i
-            unit_key = 'key_%i' % i
-            rcu = model.RepositoryContentUnit(repo_id='foo',
-                                              unit_type_id='demo_model',
-                                              unit_id=unit_id)
-            rcu_list.append(rcu)
-            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
-
-        mock_rcu_objects.return_value = rcu_list
+        rcu_list = [association(i) for i in range(10)]
+        unit_list = [DemoModel(id='bar_%i' % i, key_field='key_%i' % i) for i in range(10)]
+
+        mock_rcu_objects.return_value = AssociationQuerySet(rcu_list)
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
@@ -202,18 +232,10 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         Test that the skip parameter is applied properly
         """
         repo = MagicMock(repo_id='foo')
-        rcu_list = []
-        unit_list = []
-        for i in range(10):
-            unit_id = 'bar_%i' % i
-            unit_key = 'key_%i' % i
-            rcu = model.RepositoryContentUnit(repo_id='foo',
-                                              unit_type_id='demo_model',
-                                              unit_id=unit_id)
-            rcu_list.append(rcu)
-            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
-
-        mock_rcu_objects.return_value = rcu_list
+        rcu_list = [association(i) for i in range(10)]
+        unit_list = [DemoModel(id='bar_%i' % i, key_field='key_%i' % i) for i in range(10)]
+
+        mock_rcu_objects.return_value = AssociationQuerySet(rcu_list)
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
@@ -222,6 +244,48 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_5')
         self.assertEquals(result[4].unit_id, 'bar_9')
+        # without a units query, the associations are skipped by the database
+        self.assertEquals(mock_rcu_objects.return_value.skips, [5])
+
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_skip_units_q(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
+        """
+        Test that skip counts matching units when the units are filtered
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list = [association(i) for i in range(10)]
+        mock_rcu_objects.return_value = AssociationQuerySet(rcu_list)
+        mock_get_model.return_value = DemoModel
+        # only the units with an even index match the units query
+        mock_demo_objects.return_value = [DemoModel(id='bar_%i' % i) for i in range(0, 10, 2)]
+
+        result = list(repo_controller.find_repo_content_units(
+            repo, units_q=mongoengine.Q(key_field='baz'), limit=2, skip=1))
+
+        self.assertEquals([r.unit_id for r in result], ['bar_2', 'bar_4'])
+        self.assertEquals(mock_rcu_objects.return_value.skips, [])
+
+    @patch(MODULE + 'FIND_PAGE_SIZE', 3)
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_pages(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
+        """
+        Test that associations are read in pages, loading the units of each page at once
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list = [association(i) for i in range(7)]
+        mock_rcu_objects.return_value = AssociationQuerySet(rcu_list)
+        mock_get_model.return_value = DemoModel
+        mock_demo_objects.side_effect = lambda q_obj, __raw__: [
+            DemoModel(id=unit_id) for unit_id in __raw__['_id']['$in']]
+
+        result = list(repo_controller.find_repo_content_units(repo, yield_content_unit=True))
+
+        self.assertEquals([unit.id for unit in result], ['bar_%i' % i for i in range(7)])
+        self.assertEquals([c[1]['__raw__']['_id']['$in'] for c in mock_demo_objects.call_args_list],
+                          [['bar_0', 'bar_1', 'bar_2'], ['bar_3', 'bar_4', 'bar_5'], ['bar_6']])
+        mock_rcu_objects.assert_called_once_with(q_obj=None, repo_id='foo')
 
 
 class FindUnitsNotDownloadedTests(unittest.TestCase):
@@ -360,6 +424,55 @@ class AssociateSingleUnitTests(unittest.TestCase):
             upsert=True)
 
 
+@patch('pulp.server.controllers.repository.model.RepositoryContentUnit._get_collection')
+@patch('pulp.server.controllers.repository.dateutils.format_iso8601_utc_timestamp')
+class AssociateUnitsTests(unittest.TestCase):
+
+    def test_bulk_upserts(self, mock_get_timestamp, mock_get_collection):
+        mock_get_timestamp.return_value = 'foo_tstamp'
+        bulk_write = mock_get_collection.return_value.bulk_write
+        bulk_write.return_value = MagicMock(upserted_count=1, matched_count=1)
+        units = [DemoModel(id='bar', key_field='baz'), DemoModel(id='baz', key_field='baz')]
+        repo = MagicMock(repo_id='foo')
+
+        result = repo_controller.associate_units(repo, units)
+
+        self.assertEqual(result, (1, 1))
+        requests = bulk_write.call_args[0][0]
+        self.assertEqual(bulk_write.call_args[1], {'ordered': False})
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[0]._filter, {'repo_id': 'foo', 'unit_id': 'bar',
+                                               'unit_type_id': DemoModel._content_type_id.default})
+        self.assertEqual(requests[0]._doc, {'$setOnInsert': {'created': 'foo_tstamp'},
+                                            '$set': {'updated': 'foo_tstamp'}})
+        self.assertTrue(requests[0]._upsert)
+
+    def test_batches(self, mock_get_timestamp, mock_get_collection):
+        bulk_write = mock_get_collection.return_value.bulk_write
+        bulk_write.return_value = MagicMock(upserted_count=2, matched_count=0)
+        pairs = [('type_1', 'a'), ('type_1', 'b'), ('type_2', 'c')]
+
+        result = repo_controller.associate_units_by_id('foo', pairs, batch_size=2)
+
+        self.assertEqual(bulk_write.call_count, 2)
+        self.assertEqual(result, (4, 0))
+
+    def test_duplicate_key_race(self, mock_get_timestamp, mock_get_collection):
+        details = {'writeErrors': [{'code': 11000}], 'nUpserted': 1, 'nMatched': 0}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        result = repo_controller.associate_units_by_id('foo', [('t', 'a'), ('t', 'b')])
+
+        self.assertEqual(result, (1, 1))
+
+    def test_other_write_error(self, mock_get_timestamp, mock_get_collection):
+        details = {'writeErrors': [{'code': 2}], 'nUpserted': 0, 'nMatched': 0}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        self.assertRaises(BulkWriteError, repo_controller.associate_units_by_id, 'foo',
+                          [('t', 'a')])
+
+
 class TestDisassociateUnits(unittest.TestCase):
 
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
@@ -1672,23 +1785,41 @@ class TestDownloadRepo(unittest.TestCase):
 
     @patch(MODULE + 'LazyUnitDownloadStep')
     @patch(MODULE + '_create_download_requests')
-    @patch(MODULE + 'find_units_not_downloaded')
-    def test_download_repo_no_verify(self, mock_missing_units, mock_create_requests, mock_step):
-        """Assert the download step is initialized and called with missing units."""
+    @patch(MODULE + 'find_repo_content_units')
+    @patch(MODULE + 'model.Repository')
+    @patch(MODULE + 'get_repo_unit_models')
+    def test_download_repo_no_verify(self, mock_get_models, mock_repo_model, mock_find_units,
+                                     mock_create_requests, mock_step):
+        """Assert the download step is initialized and called with missing file units."""
+        mock_get_models.return_value = [DemoFileModel, DemoModel]
         repo_controller.download_repo('fake-id')
-        mock_missing_units.assert_called_once_with('fake-id')
-        mock_create_requests.assert_called_once_with(mock_missing_units.return_value)
+
+        mock_get_models.assert_called_once_with('fake-id')
+        mock_repo_model.objects.get_repo_or_missing_resource.assert_called_once_with('fake-id')
+        kwargs = mock_find_units.call_args[1]
+        self.assertEqual(kwargs['repo_content_unit_q'].query,
+                         {'unit_type_id__in': ['demo_file_model']})
+        self.assertEqual(kwargs['units_q'].query, {'downloaded': False})
+        self.assertTrue(kwargs['yield_content_unit'])
+        mock_create_requests.assert_called_once_with(mock_find_units.return_value)
         mock_step.return_value.start.assert_called_once_with()
 
     @patch(MODULE + 'LazyUnitDownloadStep')
     @patch(MODULE + '_create_download_requests')
-    @patch(MODULE + 'get_mongoengine_unit_querysets')
-    def test_download_repo_verify(self, mock_units_qs, mock_create_requests, mock_step):
+    @patch(MODULE + 'find_repo_content_units')
+    @patch(MODULE + 'model.Repository')
+    @patch(MODULE + 'get_repo_unit_models')
+    def test_download_repo_verify(self, mock_get_models, mock_repo_model, mock_find_units,
+                                  mock_create_requests, mock_step):
         """Assert the download step is initialized and called with all units."""
-        mock_units_qs.return_value = [['some'], ['lists']]
+        mock_get_models.return_value = [DemoFileModel, DemoModel]
         repo_controller.download_repo('fake-id', verify_all_units=True)
-        mock_units_qs.assert_called_once_with('fake-id')
-        self.assertEqual(list(mock_create_requests.call_args[0][0]), ['some', 'lists'])
+
+        kwargs = mock_find_units.call_args[1]
+        self.assertEqual(kwargs['repo_content_unit_q'].query,
+                         {'unit_type_id__in': ['demo_file_model', 'demo_model']})
+        self.assertTrue(kwargs['units_q'] is None)
+        mock_create_requests.assert_called_once_with(mock_find_units.return_value)
         mock_step.return_value.start.assert_called_once_with()
 
 
@@ -1698,16 +1829,43 @@ class TestGetDeferredContentUnits(unittest.TestCase):
     @patch(MODULE + 'model.DeferredDownload')
     def test_get_deferred_content_units(self, mock_qs, mock_get_model):
         # Setup
-        mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
+        mock_qs.objects.filter.return_value.only.return_value.order_by.return_value.limit\
+            .return_value = [Mock(unit_type_id='abc', unit_id='123'),
+                             Mock(unit_type_id='abc', unit_id='456')]
+        mock_unit = Mock(id='123')
+        mock_get_model.return_value.objects.filter.return_value = [mock_unit]
 
         # Test
         result = list(repo_controller._get_deferred_content_units())
-        self.assertEqual(1, len(result))
+        self.assertEqual([mock_unit], result)
+        mock_qs.objects.filter.return_value.only.assert_called_once_with('unit_id',
+                                                                         'unit_type_id')
         mock_get_model.assert_called_once_with('abc')
         unit_filter = mock_get_model.return_value.objects.filter
-        unit_filter.assert_called_once_with(id='123')
-        unit_filter.return_value.get.assert_called_once_with()
+        unit_filter.assert_called_once_with(id__in=['123', '456'])
+
+    @patch(MODULE + 'plugin_api.get_unit_model_by_id')
+    @patch(MODULE + 'model.DeferredDownload')
+    def test_get_deferred_content_units_batches(self, mock_qs, mock_get_model):
+        """Units are loaded with one query per type for each batch of entries."""
+        deferred_qs = mock_qs.objects.filter.return_value.only.return_value.order_by.return_value
+        deferred_qs.limit.return_value = [Mock(unit_type_id='abc', unit_id='1', id=1),
+                                          Mock(unit_type_id='def', unit_id='2', id=2)]
+        deferred_qs.filter.return_value.limit.return_value = [
+            Mock(unit_type_id='abc', unit_id='3', id=3)]
+        mock_get_model.return_value.objects.filter.return_value = []
+
+        list(repo_controller._get_deferred_content_units(batch_size=2))
+
+        mock_qs.objects.filter.return_value.only.return_value.order_by.assert_called_once_with(
+            'id')
+        # every batch after the first is read with a new query that starts after the last entry
+        deferred_qs.filter.assert_called_once_with(id__gt=2)
+        deferred_qs.limit.assert_called_once_with(2)
+        deferred_qs.filter.return_value.limit.assert_called_once_with(2)
+        unit_filter = mock_get_model.return_value.objects.filter
+        self.assertEqual(3, unit_filter.call_count)
+        unit_filter.assert_has_calls([call(id__in=['3'])])
 
     @patch(MODULE + '_logger.error')
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
@@ -1715,7 +1873,8 @@ class TestGetDeferredContentUnits(unittest.TestCase):
     def test_get_deferred_content_units_no_model(self, mock_qs, mock_get_model, mock_log):
         # Setup
         mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
+        mock_qs.objects.filter.return_value.only.return_value.order_by.return_value.limit\
+            .return_value = [mock_unit]
         mock_get_model.return_value = None
 
         # Test
@@ -1730,9 +1889,9 @@ class TestGetDeferredContentUnits(unittest.TestCase):
     def test_get_deferred_content_units_no_unit(self, mock_qs, mock_get_model, mock_log):
         # Setup
         mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
-        unit_qs = mock_get_model.return_value.objects.filter.return_value
-        unit_qs.get.side_effect = mongoengine.DoesNotExist()
+        mock_qs.objects.filter.return_value.only.return_value.order_by.return_value.limit\
+            .return_value = [mock_unit]
+        mock_get_model.return_value.objects.filter.return_value = []
 
         # Test
         result = list(repo_controller._get_deferred_content_units())
@@ -1752,8 +1911,9 @@ class TestCreateDownloadRequests(unittest.TestCase):
         # Setup
         content_units = [Mock(id='123', type_id='abc', list_files=lambda: ['/file/path'])]
         filtered_qs = mock_catalog.objects.filter.return_value
-        catalog_entry = filtered_qs.order_by.return_value.first.return_value
-        catalog_entry.path = '/storage/123/path'
+        catalog_entry = Mock(unit_id='123', unit_type_id='abc', path='/file/path')
+        newer_entry = Mock(unit_id='123', unit_type_id='abc', path='/file/path')
+        filtered_qs.order_by.return_value = [catalog_entry, newer_entry]
         expected_data_dict = {
             repo_controller.TYPE_ID: 'abc',
             repo_controller.UNIT_ID: '123',
@@ -1766,21 +1926,40 @@ class TestCreateDownloadRequests(unittest.TestCase):
         }
 
         # Test
-        requests = repo_controller._create_download_requests(content_units)
+        requests = list(repo_controller._create_download_requests(content_units))
         expected_data_dict[repo_controller.REQUEST] = requests[0]
         mock_catalog.objects.filter.assert_called_once_with(
-            unit_id='123',
-            unit_type_id='abc',
-            path='/file/path'
+            path__in=['/file/path'],
+            unit_id__in=['123'],
         )
         filtered_qs.order_by.assert_called_once_with('revision')
-        filtered_qs.order_by.return_value.first.assert_called_once_with()
         mock_mkdir.assert_called_once_with('/working/123')
         self.assertEqual(1, len(requests))
         self.assertEqual(mock_get_url.return_value, requests[0].url)
         self.assertEqual('/working/123/path', requests[0].destination)
         self.assertEqual(expected_data_dict, requests[0].data)
 
+    @patch(MODULE + 'Key.load', Mock())
+    @patch(MODULE + 'common_utils.get_working_directory', Mock(return_value='/working/'))
+    @patch(MODULE + 'mkdir', Mock())
+    @patch(MODULE + '_get_streamer_url', Mock())
+    @patch(MODULE + 'model.LazyCatalogEntry')
+    def test_create_download_requests_batches(self, mock_catalog):
+        """Catalog entries are loaded once per batch, and units without entries are skipped."""
+        content_units = [Mock(id=str(i), type_id='abc', list_files=lambda i=i: ['/p/%d' % i])
+                         for i in range(3)]
+        mock_catalog.objects.filter.return_value.order_by.side_effect = [
+            [Mock(unit_id='0', unit_type_id='abc', path='/p/0')],
+            [Mock(unit_id='2', unit_type_id='abc', path='/p/2')],
+        ]
+
+        requests = repo_controller._create_download_requests(content_units, batch_size=2)
+
+        self.assertEqual(0, mock_catalog.objects.filter.call_count)
+        destinations = [request.destination for request in requests]
+        self.assertEqual(['/working/0/0', '/working/2/2'], destinations)
+        self.assertEqual(2, mock_catalog.objects.filter.call_count)
+
 
 class TestGetStreamerUrl(unittest.TestCase):
 
@@ -1871,8 +2050,30 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
     def test_start(self):
         """Assert calls to `_process_block` result in calls to the downloader."""
         self.step.downloader = Mock()
+        self.step.downloader.download.side_effect = list
         self.step.start()
-        self.step.downloader.download.assert_called_once_with(self.step.download_requests)
+        self.assertEqual(1, self.step.downloader.download.call_count)
+        self.assertEqual(1, self.step.total_units)
+        self.assertTrue(self.step.generation_complete)
+
+    @patch(MODULE + 'model.TaskStatus')
+    def test_report_streaming(self, mock_task_status):
+        """The step is not complete until all its requests have been generated."""
+        self.step.task_id = 'task'
+        requests = self.step._generate_requests()
+        next(requests)
+        self.step.progress_successes = 1
+
+        self.step.report()
+        self.assertEqual(self.step.state, 'NOT_STARTED')
+
+        self.assertRaises(StopIteration, next, requests)
+        self.step.report()
+        self.assertEqual(self.step.state, 'FINISHED')
+        report = mock_task_status.objects.filter.return_value.update_one.call_args[1]
+        progress = report['set__progress_report']['test_step'][0]
+        self.assertEqual(0, progress['queue_depth'])
+        self.assertEqual(1, progress['items_total'])
 
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
     @patch(MODULE + 'model.DeferredDownload')
@@ -1913,7 +2114,7 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
 
         # Test
         self.step.download_succeeded(self.report)
-        unit.import_content.assert_called_once_with(self.report.destination)
+        unit.import_content.assert_called_once_with(self.report.destination, disposable=True)
         self.assertEqual(1, self.step.progress_successes)
         self.assertEqual(0, self.step.progress_failures)
         self.assertEqual(
@@ -1938,7 +2139,8 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         self.assertEqual(0, unit.set_storage_path.call_count)
         unit.import_content.assert_called_once_with(
             self.report.destination,
-            location='a/filename'
+            location='a/filename',
+            disposable=True
         )
         self.assertEqual(1, self.step.progress_successes)
         self.assertEqual(0, self.step.progress_failures)
@@ -1961,7 +2163,8 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         self.assertEqual(0, unit.set_storage_path.call_count)
         unit.import_content.assert_called_once_with(
             self.report.destination,
-            location='a/filename'
+            location='a/filename',
+            disposable=True
         )
         self.assertEqual(1, self.step.progress_successes)
         self.assertEqual(0, self.step.progress_failures)
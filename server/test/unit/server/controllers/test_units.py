@@ -40,7 +40,7 @@ class FindUnitsTests(unittest.TestCase):
         # turn into list so the generator will be evaluated
         list(units_controller.find_units(units_iterable))
 
-        mock_paginate.assert_called_once_with(units_iterable, 50)
+        mock_paginate.assert_called_once_with(units_iterable, 1000)
 
     def test_query(self):
         """
@@ -52,9 +52,9 @@ class FindUnitsTests(unittest.TestCase):
 
         # turn into list so the generator will be evaluated
         list(units_controller.find_units(units_iterable))
-        query_dict = DemoModel.objects.call_args[0][0].to_query(DemoModel)
-        expected_result = {'$or': [{'key_field': u'a'}, {'key_field': u'B'}]}
-        self.assertDictEqual(query_dict, expected_result)
+        digests = DemoModel.objects.call_args[1]['_unit_key_digest__in']
+        self.assertEqual(sorted(digests),
+                         sorted([model_1.unit_key_as_digest(), model_2.unit_key_as_digest()]))
 
     def test_results(self):
         """
@@ -64,12 +64,27 @@ class FindUnitsTests(unittest.TestCase):
         model_2 = DemoModel(key_field='B')
         units_iterable = (model_1, model_2)
         model_2_defined = DemoModel(key_field='B', id='foo')
+        model_2_defined._unit_key_digest = model_2.unit_key_as_digest()
         DemoModel.objects.return_value = [model_2_defined]
 
         # turn into list so the generator will be evaluated
         result = list(units_controller.find_units(units_iterable))
         self.assertEqual(result, [model_2_defined])
 
+    def test_results_digest_collision(self):
+        """
+        Test that units sharing the digest of a requested unit key but not its fields are dropped
+        """
+        model_1 = DemoModel(key_field='a')
+        model_1_defined = DemoModel(key_field='a', id='foo')
+        colliding = DemoModel(key_field='b', id='bar')
+        colliding._unit_key_digest = model_1_defined._unit_key_digest = model_1.unit_key_as_digest()
+        DemoModel.objects.return_value = [colliding, model_1_defined]
+
+        result = list(units_controller.find_units([model_1]))
+
+        self.assertEqual(result, [model_1_defined])
+
 
 @patch('pulp.plugins.loader.api.get_unit_model_by_id', spec_set=True)
 @patch('pulp.plugins.types.database.type_definition', spec_set=True)
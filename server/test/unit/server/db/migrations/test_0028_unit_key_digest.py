@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from pulp.server.db.migrate.models import MigrationModule
+
+
+MIGRATION = 'pulp.server.db.migrations.0028_unit_key_digest'
+
+
+class TestMigration(TestCase):
+    """
+    Test the migration.
+    """
+
+    @patch('.'.join((MIGRATION, 'PluginManager')))
+    def test_migrate(self, mock_plugin_manager):
+        """
+        Test that the units of every content type are migrated.
+        """
+        model_1, model_2 = Mock(), Mock()
+        mock_plugin_manager.return_value.unit_models = {'a': model_1, 'b': model_2}
+        module = MigrationModule(MIGRATION)._module
+
+        with patch.object(module, 'migrate_units') as mock_migrate_units:
+            module.migrate()
+
+        self.assertEqual(sorted(call[0][0] for call in mock_migrate_units.call_args_list),
+                         sorted([model_1, model_2]))
+
+    def test_migrate_units(self):
+        """
+        Test that the digest is stored on units without one, in batches.
+        """
+        module = MigrationModule(MIGRATION)._module
+        model_class = Mock(unit_key_fields=('name', 'version'))
+        units = [Mock(id='u%d' % i) for i in range(3)]
+        for i, unit in enumerate(units):
+            unit.unit_key_as_digest.return_value = 'digest-%d' % i
+        query_set = model_class.objects.return_value.only.return_value.no_cache.return_value
+        query_set.__iter__ = Mock(return_value=iter(units))
+        collection = model_class._get_collection.return_value
+
+        with patch.object(module, 'BATCH_SIZE', 2):
+            module.migrate_units(model_class)
+
+        model_class.objects.assert_called_once_with(
+            __raw__={'_unit_key_digest': {'$exists': False}})
+        model_class.objects.return_value.only.assert_called_once_with('name', 'version')
+        self.assertEqual(collection.bulk_write.call_count, 2)
+        requests = collection.bulk_write.call_args_list[0][0][0]
+        self.assertEqual(requests[0]._filter, {'_id': 'u0'})
+        self.assertEqual(requests[0]._doc, {'$set': {'_unit_key_digest': 'digest-0'}})
+        self.assertEqual(len(collection.bulk_write.call_args_list[1][0][0]), 1)
@@ -148,6 +148,33 @@ class TestRepoProfileApplicability(PulpServerTests):
         self.assertEqual(applicability._id, document['_id'])
 
 
+class TestApplicabilityReport(unittest.TestCase):
+    """
+    Test the ApplicabilityReport class.
+    """
+    def test___init__(self):
+        report = consumer.ApplicabilityReport('key', 1000)
+
+        self.assertEqual(report.report_key, 'key')
+        self.assertEqual(report.consumer_ids, [])
+        self.assertEqual(report.dirty_consumer_ids, [])
+        self.assertEqual(report.version, 0)
+        self.assertEqual(report.last_used, 1000)
+        self.assertFalse('id' in report)
+
+    @mock.patch('pulp.server.db.model.consumer.ApplicabilityReport.get_collection')
+    def test_consumers_changed(self, get_collection):
+        """
+        Test that the consumers are marked dirty in the reports that include them.
+        """
+        consumer.ApplicabilityReport.consumers_changed(['c1', 'c2'])
+
+        get_collection.return_value.update_many.assert_called_once_with(
+            {'consumer_ids': {'$in': ['c1', 'c2']}},
+            {'$addToSet': {'dirty_consumer_ids': {'$each': ['c1', 'c2']}},
+             '$inc': {'version': 1}})
+
+
 class TestUnitProfile(unittest.TestCase):
     """
     Test the UnitProfile class.
@@ -164,6 +191,7 @@ class TestUnitProfile(unittest.TestCase):
         self.assertEqual(profile.content_type, 'content_type')
         self.assertEqual(profile.profile, 'profile')
         self.assertEqual(profile.profile_hash, profile.calculate_hash(profile.profile))
+        self.assertEqual(profile.upload_hash, None)
 
         # The superclass __init__ should have been called
         __init__.assert_called_once_with(profile)
@@ -184,6 +212,16 @@ class TestUnitProfile(unittest.TestCase):
         # The superclass __init__ should have been called
         __init__.assert_called_once_with(profile)
 
+    def test___init___with_upload_hash(self):
+        """
+        Test the constructor, passing the optional upload_hash
+        """
+        profile = consumer.UnitProfile('consumer_id', 'content_type', 'profile',
+                                       upload_hash='upload_hash')
+
+        self.assertEqual(profile.profile_hash, profile.calculate_hash(profile.profile))
+        self.assertEqual(profile.upload_hash, 'upload_hash')
+
     def test_calculate_hash_different_profiles(self):
         """
         Test that two different profiles have different hashes.
@@ -59,6 +59,14 @@ class TestTaskStatus(unittest.TestCase):
         """
         TaskStatus.objects().delete()
 
+    def test_meta_indexes(self):
+        """
+        Test that the indexes used to page through tasks end with their ID.
+        """
+        indexes = TaskStatus._meta['indexes']
+        self.assertTrue({'fields': ['state', 'id']} in indexes)
+        self.assertTrue({'fields': ['tags', 'id']} in indexes)
+
     def test___init__(self):
         """
         Test the __init__() method.
@@ -109,6 +109,7 @@ class TestContentUnit(unittest.TestCase):
         self.assertTrue(model.ContentUnit._last_updated.required)
         self.assertTrue(isinstance(model.ContentUnit._storage_path, StringField))
         self.assertTrue(isinstance(model.ContentUnit.pulp_user_metadata, DictField))
+        self.assertTrue(isinstance(model.ContentUnit._unit_key_digest, StringField))
 
     def test_unit_key_as_digest(self):
         unit = ContentUnitHelper()
@@ -130,6 +131,38 @@ class TestContentUnit(unittest.TestCase):
                 _hash.update(value)
         self.assertEqual(digest, _hash.hexdigest())
 
+    def test_digest_unit_key(self):
+        """The digest of a unit key does not depend on the types of its values."""
+        unit = ContentUnitHelper(apple='red', pear='yellow', age=21)
+
+        digest = model.ContentUnit.digest_unit_key({'apple': u'red', 'pear': 'yellow',
+                                                    'age': '21'})
+
+        self.assertEqual(digest, unit.unit_key_as_digest())
+
+    def test_digest_unit_key_unicode(self):
+        unit_key = {'apple': u'\xe9t\xe9'}
+
+        digest = model.ContentUnit.digest_unit_key(unit_key)
+
+        self.assertEqual(digest, model.ContentUnit.digest_unit_key({'apple': '\xc3\xa9t\xc3\xa9'}))
+
+    def test_unit_keys_equal(self):
+        unit_key = {'apple': u'\xe9t\xe9', 'age': 21}
+        other_unit_key = {'apple': '\xc3\xa9t\xc3\xa9', 'age': 21}
+        self.assertTrue(model.ContentUnit.unit_keys_equal(unit_key, other_unit_key))
+
+    def test_unit_keys_equal_digest_collision(self):
+        """Unit keys with the same digest are told apart by their values and types."""
+        unit_key = {'name': 'a', 'version': 'versionb'}
+        other_unit_key = {'name': 'aversion', 'version': 'b'}
+        self.assertEqual(model.ContentUnit.digest_unit_key(unit_key),
+                         model.ContentUnit.digest_unit_key(other_unit_key))
+
+        self.assertFalse(model.ContentUnit.unit_keys_equal(unit_key, other_unit_key))
+        self.assertFalse(model.ContentUnit.unit_keys_equal({'age': 1}, {'age': '1'}))
+        self.assertFalse(model.ContentUnit.unit_keys_equal({'age': 1}, {'size': 1}))
+
     def test__hash__(self):
         unit = ContentUnitHelper()
         unit.apple = 'red'
@@ -158,6 +191,9 @@ class TestContentUnit(unittest.TestCase):
     def test_meta_abstract(self):
         self.assertEquals(model.ContentUnit._meta['abstract'], True)
 
+    def test_meta_indexes(self):
+        self.assertTrue('_unit_key_digest' in model.ContentUnit._meta['indexes'])
+
     @patch('pulp.server.db.model.signals')
     def test_attach_signals(self, mock_signals):
         ContentUnitHelper.attach_signals()
@@ -180,6 +216,7 @@ class TestContentUnit(unittest.TestCase):
 
         # make sure the last updated time has been updated
         self.assertEquals(helper._last_updated, 'foo')
+        self.assertEquals(helper._unit_key_digest, helper.unit_key_as_digest())
 
     @patch('pulp.server.db.model.Repository.objects')
     @patch('pulp.server.db.model.RepositoryContentUnit.objects')
@@ -470,13 +507,14 @@ class TestFileContentUnit(unittest.TestCase):
         # test
         unit = TestFileContentUnit.TestUnit()
         unit._last_updated = 1234
-        unit.import_content(path)
+        strategy = unit.import_content(path)
 
         # validation
         file_storage.assert_called_once_with()
         storage.__enter__.assert_called_once_with()
         storage.__exit__.assert_called_once_with(None, None, None)
-        storage.put.assert_called_once_with(unit, path, None)
+        storage.put.assert_called_once_with(unit, path, None, disposable=False)
+        self.assertEqual(strategy, storage.put.return_value)
 
     @patch('os.path.isfile')
     @patch('pulp.server.db.model.FileStorage')
@@ -492,13 +530,13 @@ class TestFileContentUnit(unittest.TestCase):
         # test
         unit = TestFileContentUnit.TestUnit()
         unit._last_updated = 1234
-        unit.import_content(path, location)
+        unit.import_content(path, location, disposable=True)
 
         # validation
         file_storage.assert_called_once_with()
         storage.__enter__.assert_called_once_with()
         storage.__exit__.assert_called_once_with(None, None, None)
-        storage.put.assert_called_once_with(unit, path, location)
+        storage.put.assert_called_once_with(unit, path, location, disposable=True)
 
     def test_import_content_unit_not_saved(self):
         try:
@@ -639,6 +677,7 @@ class TestRepositoryContentUnit(unittest.TestCase):
         self.assertDictEqual(indexes[0], {'fields': ['repo_id', 'unit_type_id', 'unit_id'],
                                           'unique': True})
         self.assertDictEqual(indexes[1], {'fields': ['unit_id']})
+        self.assertDictEqual(indexes[2], {'fields': ['repo_id', 'id']})
 
 
 class TestReservedResource(unittest.TestCase):
@@ -0,0 +1,158 @@
+import Queue
+import unittest
+
+import mock
+
+from pulp.server.event import delivery
+
+
+MODULE_PATH = 'pulp.server.event.delivery.'
+
+
+class TestDeliveryPool(unittest.TestCase):
+
+    def setUp(self):
+        self.send = mock.Mock()
+        self.pool = delivery.DeliveryPool('test', self.send, 'http_workers')
+
+    @mock.patch(MODULE_PATH + 'threading.Thread')
+    def test_submit_starts_workers(self, mock_thread):
+        message = delivery.Message(['a'], None)
+
+        self.assertTrue(self.pool.submit(message))
+        self.assertTrue(self.pool.submit(message))
+
+        # the default number of http workers
+        self.assertEqual(4, mock_thread.call_count)
+        self.assertEqual(2, self.pool._queue.qsize())
+
+    @mock.patch(MODULE_PATH + 'os.getpid')
+    @mock.patch(MODULE_PATH + 'threading.Thread')
+    def test_submit_forked(self, mock_thread, mock_getpid):
+        """Workers are started again in a forked process."""
+        mock_getpid.return_value = 1
+        self.pool.submit(delivery.Message(['a'], None))
+        mock_getpid.return_value = 2
+
+        self.pool.submit(delivery.Message(['a'], None))
+
+        self.assertEqual(8, mock_thread.call_count)
+        self.assertEqual(1, self.pool._queue.qsize())
+
+    @mock.patch(MODULE_PATH + 'threading.Thread')
+    def test_submit_full(self, mock_thread):
+        self.pool._start()
+        self.pool._queue = Queue.Queue(1)
+
+        self.assertTrue(self.pool.submit(delivery.Message(['a'], None)))
+        self.assertFalse(self.pool.submit(delivery.Message(['b'], None)))
+
+    @mock.patch(MODULE_PATH + 'EventOutboxEntry')
+    def test_deliver(self, mock_entry):
+        self.pool.deliver(delivery.Message(['a', 'b'], 'entry'))
+
+        self.send.assert_called_once_with('a', 'b')
+        mock_entry.get_collection.return_value.remove.assert_called_once_with({'_id': 'entry'})
+
+    @mock.patch(MODULE_PATH + 'time.sleep')
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_deliver_retry(self, mock_logger, mock_sleep):
+        """Failed deliveries are retried with an exponential backoff."""
+        self.send.side_effect = [delivery.DeliveryFailed(), delivery.DeliveryFailed(), None]
+
+        self.pool.deliver(delivery.Message(['a'], None))
+
+        self.assertEqual(3, self.send.call_count)
+        self.assertEqual([mock.call(2.0), mock.call(4.0)], mock_sleep.call_args_list)
+        self.assertEqual(2, mock_logger.warning.call_count)
+        self.assertFalse(mock_logger.error.called)
+
+    @mock.patch(MODULE_PATH + 'EventOutboxEntry')
+    @mock.patch(MODULE_PATH + 'time.sleep')
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_deliver_give_up(self, mock_logger, mock_sleep, mock_entry):
+        self.send.side_effect = delivery.DeliveryFailed()
+
+        self.pool.deliver(delivery.Message(['a'], 'entry'))
+
+        # the default number of attempts
+        self.assertEqual(5, self.send.call_count)
+        self.assertEqual(1, mock_logger.error.call_count)
+        mock_entry.get_collection.return_value.remove.assert_called_once_with({'_id': 'entry'})
+
+    def test_deliver_unexpected_error(self):
+        """Unexpected errors are not retried."""
+        self.send.side_effect = ValueError()
+
+        self.assertRaises(ValueError, self.pool.deliver, delivery.Message(['a'], None))
+        self.assertEqual(1, self.send.call_count)
+
+
+@mock.patch(MODULE_PATH + 'EventOutboxEntry')
+@mock.patch(MODULE_PATH + 'config')
+class TestSubmit(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = mock.Mock()
+        self.pool.submit.return_value = True
+        delivery._pools['test'] = self.pool
+
+    def tearDown(self):
+        del delivery._pools['test']
+
+    def test_submit(self, mock_config, mock_entry):
+        mock_config.getboolean.return_value = False
+
+        delivery.submit('test', 'a', 'b')
+
+        self.pool.submit.assert_called_once_with(delivery.Message(('a', 'b'), None))
+        self.assertFalse(mock_entry.called)
+
+    @mock.patch(MODULE_PATH + '_poll_outbox')
+    def test_submit_outbox(self, mock_poll, mock_config, mock_entry):
+        mock_config.getboolean.return_value = True
+        collection = mock_entry.get_collection.return_value
+
+        delivery.submit('test', 'a', 'b')
+
+        mock_poll.assert_called_once_with()
+        self.assertEqual(['a', 'b'], mock_entry.call_args[0][1])
+        collection.save.assert_called_once_with(mock_entry.return_value)
+        self.pool.submit.assert_called_once_with(
+            delivery.Message(('a', 'b'), collection.save.return_value))
+
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_submit_full(self, mock_logger, mock_config, mock_entry):
+        mock_config.getboolean.return_value = False
+        self.pool.submit.return_value = False
+
+        delivery.submit('test', 'a')
+
+        self.assertEqual(1, mock_logger.error.call_count)
+
+    def test_redeliver(self, mock_config, mock_entry):
+        collection = mock_entry.get_collection.return_value
+        collection.find_one_and_update.side_effect = [
+            {'_id': 1, 'notifier_type_id': 'test', 'args': ['a']},
+            {'_id': 2, 'notifier_type_id': 'unknown', 'args': ['b']},
+            None]
+
+        delivery.redeliver()
+
+        self.pool.submit.assert_called_once_with(delivery.Message(['a'], 1))
+        collection.remove.assert_called_once_with({'_id': 2})
+        self.assertEqual(3, collection.find_one_and_update.call_count)
+
+    @mock.patch(MODULE_PATH + 'redeliver')
+    @mock.patch(MODULE_PATH + 'time.time')
+    def test_poll_outbox(self, mock_time, mock_redeliver, mock_config, mock_entry):
+        """The outbox is checked at most once per poll interval."""
+        delivery._next_outbox_poll[0] = 0
+        mock_time.return_value = 1000
+
+        delivery._poll_outbox()
+        delivery._poll_outbox()
+        mock_time.return_value = 1000 + delivery.OUTBOX_POLL_INTERVAL
+        delivery._poll_outbox()
+
+        self.assertEqual(2, mock_redeliver.call_count)
@@ -1,4 +1,3 @@
-import dummy_threading
 import smtplib
 import unittest
 try:
@@ -13,11 +12,20 @@ import mock
 
 from pulp.server.compat import json
 from pulp.server.config import config
-from pulp.server.event import data, mail
+from pulp.server.event import data, delivery, mail
 from pulp.server.managers import factory
+from pulp.server.managers.event.fire import listener_cache
+
+
+def _submit(notifier_type_id, *args):
+    # deliver synchronously instead of in the worker threads
+    mail._send_email(*args)
 
 
 class TestSendEmail(unittest.TestCase):
+    def setUp(self):
+        mail._local.connection = None
+
     @mock.patch('smtplib.SMTP')
     def test_basic(self, mock_smtp):
         # send a message
@@ -43,9 +51,37 @@ class TestSendEmail(unittest.TestCase):
     @mock.patch('logging.Logger.error')
     def test_connect_failure(self, mock_error, mock_smtp):
         mock_smtp.side_effect = smtplib.SMTPConnectError(123, 'aww crap')
-        mail._send_email('hello', 'stuff', 'someone@some.domain')
+        self.assertRaises(delivery.DeliveryFailed, mail._send_email, 'hello', 'stuff',
+                          'someone@some.domain')
         self.assertTrue(mock_error.called)
 
+    @mock.patch('smtplib.SMTP')
+    def test_connection_reused(self, mock_smtp):
+        mail._send_email('hello', 'stuff', 'someone@some.domain')
+        mail._send_email('hello', 'stuff', 'other@some.domain')
+
+        self.assertEqual(mock_smtp.call_count, 1)
+        self.assertEqual(mock_smtp.return_value.sendmail.call_count, 2)
+
+    @mock.patch('smtplib.SMTP')
+    def test_idle_connection_closed(self, mock_smtp):
+        """A connection closed by the server while idle is replaced."""
+        mail._send_email('hello', 'stuff', 'someone@some.domain')
+        mock_smtp.return_value.sendmail.side_effect = [smtplib.SMTPServerDisconnected(), None]
+
+        mail._send_email('hello', 'stuff', 'someone@some.domain')
+
+        self.assertEqual(mock_smtp.call_count, 2)
+        self.assertEqual(mock_smtp.return_value.sendmail.call_count, 3)
+
+    @mock.patch('smtplib.SMTP')
+    def test_new_connection_closed(self, mock_smtp):
+        mock_smtp.return_value.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+
+        self.assertRaises(delivery.DeliveryFailed, mail._send_email, 'hello', 'stuff',
+                          'someone@some.domain')
+        self.assertEqual(mock_smtp.call_count, 1)
+
     @mock.patch('smtplib.SMTP')
     @mock.patch('logging.Logger.error')
     def test_send_failure(self, mock_error, mock_smtp):
@@ -64,25 +100,27 @@ class TestHandleEvent(unittest.TestCase):
         self.event = mock.MagicMock()
         self.event.payload = 'stuff'
         self.event.data.return_value = self.event.payload
+        mail._local.connection = None
 
-    # don't actually spawn a thread
-    @mock.patch('threading.Thread', new=dummy_threading.Thread)
+    # don't actually deliver in a thread
+    @mock.patch('pulp.server.event.mail.delivery.submit', new=_submit)
     @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=False)
     @mock.patch('smtplib.SMTP')
     def test_email_disabled(self, mock_smtp, mock_getbool):
         mail.handle_event(self.notifier_config, self.event)
         self.assertFalse(mock_smtp.called)
 
-    # don't actually spawn a thread
-    @mock.patch('threading.Thread', new=dummy_threading.Thread)
+    # don't actually deliver in a thread
+    @mock.patch('pulp.server.event.mail.delivery.submit', new=_submit)
     @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
     @mock.patch('smtplib.SMTP')
     def test_email_enabled(self, mock_smtp, mock_getbool):
         mail.handle_event(self.notifier_config, self.event)
 
         # verify
-        self.assertEqual(mock_smtp.call_count, 2)
+        self.assertEqual(mock_smtp.call_count, 1)
         mock_sendmail = mock_smtp.return_value.sendmail
+        self.assertEqual(mock_sendmail.call_count, 2)
         self.assertEqual(mock_sendmail.call_args[0][0],
                          config.get('email', 'from'))
         self.assertTrue(mock_sendmail.call_args[0][1] in self.notifier_config['addresses'])
@@ -96,7 +134,7 @@ class TestHandleEvent(unittest.TestCase):
 
     @mock.patch('pulp.server.event.data.task_serializer')
     # tests bz 1099945
-    @mock.patch('threading.Thread', new=dummy_threading.Thread)
+    @mock.patch('pulp.server.event.mail.delivery.submit', new=_submit)
     @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
     @mock.patch('smtplib.SMTP')
     def test_email_serialize_objid(self, mock_smtp, mock_getbool, mock_task_ser):
@@ -119,11 +157,13 @@ class TestSystem(unittest.TestCase):
             'event_types': data.TYPE_REPO_SYNC_FINISHED,
             'notifier_config': self.notifier_config,
         }
+        listener_cache.invalidate()
+        mail._local.connection = None
 
     @mock.patch('pulp.server.event.data.task_serializer')
-    # don't actually spawn a thread
-    @mock.patch('threading.Thread', new=dummy_threading.Thread)
-    # mock qpid, because it freaks out over dummy_threading
+    # don't actually deliver in a thread
+    @mock.patch('pulp.server.event.mail.delivery.submit', new=_submit)
+    # mock qpid
     @mock.patch('pulp.server.managers.event.remote.TopicPublishManager')
     # don't actually send any email
     @mock.patch('smtplib.SMTP')
@@ -2,7 +2,9 @@ import unittest
 
 import mock
 
-from pulp.server.event import http
+from requests import ConnectionError
+
+from pulp.server.event import delivery, http
 from pulp.server.event.data import Event
 
 MODULE_PATH = 'pulp.server.event.http.'
@@ -10,10 +12,13 @@ MODULE_PATH = 'pulp.server.event.http.'
 
 class TestHTTPNotifierTests(unittest.TestCase):
 
+    def setUp(self):
+        http._local.session = None
+
     @mock.patch(MODULE_PATH + 'json')
     @mock.patch(MODULE_PATH + 'json_util')
-    @mock.patch(MODULE_PATH + 'threading.Thread')
-    def test_handle_event(self, mock_thread, mock_jutil, mock_json):
+    @mock.patch(MODULE_PATH + 'delivery.submit')
+    def test_handle_event(self, mock_submit, mock_jutil, mock_json):
         # Setup
         notifier_config = {'key': 'value'}
         mock_event = mock.Mock(spec=Event)
@@ -22,13 +27,19 @@ class TestHTTPNotifierTests(unittest.TestCase):
         # Test
         http.handle_event(notifier_config, mock_event)
         mock_json.dumps.assert_called_once_with(event_data, default=mock_jutil.default)
-        mock_thread.assert_called_once_with(
-            target=http._send_post,
-            args=[notifier_config, mock_json.dumps.return_value]
-        )
+        mock_submit.assert_called_once_with(http.TYPE_ID, notifier_config,
+                                            mock_json.dumps.return_value)
 
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_no_auth(self, mock_post):
+    @mock.patch(MODULE_PATH + 'Session')
+    def test_get_session(self, mock_session):
+        """Assert the session of a thread is reused."""
+        self.assertTrue(http._get_session() is mock_session.return_value)
+        self.assertTrue(http._get_session() is mock_session.return_value)
+        self.assertEqual(1, mock_session.call_count)
+
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_no_auth(self, mock_get_session):
+        mock_post = mock_get_session.return_value.post
         notifier_config = {'url': 'https://localhost/api/'}
         data = {'head': 'feet'}
 
@@ -37,12 +48,14 @@ class TestHTTPNotifierTests(unittest.TestCase):
             'https://localhost/api/',
             data=data,
             headers={'Content-Type': 'application/json'},
+            timeout=http.HTTP_TIMEOUT,
             auth=None,
         )
 
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_auth(self, mock_post, mock_basic_auth):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_auth(self, mock_get_session, mock_basic_auth):
+        mock_post = mock_get_session.return_value.post
         notifier_config = {
             'url': 'https://localhost/api/',
             'username': 'jcline',
@@ -55,14 +68,16 @@ class TestHTTPNotifierTests(unittest.TestCase):
             'https://localhost/api/',
             data=data,
             headers={'Content-Type': 'application/json'},
+            timeout=http.HTTP_TIMEOUT,
             auth=mock_basic_auth.return_value,
         )
         mock_basic_auth.assert_called_once_with('jcline', 'hunter2')
 
     @mock.patch(MODULE_PATH + '_logger')
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_no_url(self, mock_post, mock_basic_auth, mock_log):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_no_url(self, mock_get_session, mock_basic_auth, mock_log):
+        mock_post = mock_get_session.return_value.post
         """Assert attempting to post to no url fails."""
         expected_log = 'HTTP notifier configured without a URL; cannot fire event'
         http._send_post({}, {})
@@ -71,8 +86,9 @@ class TestHTTPNotifierTests(unittest.TestCase):
 
     @mock.patch(MODULE_PATH + '_logger')
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_bad_response(self, mock_post, mock_basic_auth, mock_log):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_bad_response(self, mock_get_session, mock_basic_auth, mock_log):
+        mock_post = mock_get_session.return_value.post
         """Assert non-200 posts get logged."""
         expected_log = 'Received HTTP 404 from HTTP notifier to https://localhost/api/.'
         notifier_config = {
@@ -88,6 +104,25 @@ class TestHTTPNotifierTests(unittest.TestCase):
             'https://localhost/api/',
             data=data,
             headers={'Content-Type': 'application/json'},
+            timeout=http.HTTP_TIMEOUT,
             auth=mock_basic_auth.return_value,
         )
         mock_log.error.assert_called_once_with(expected_log)
+
+    @mock.patch(MODULE_PATH + '_logger')
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_server_error(self, mock_get_session, mock_log):
+        """Assert server errors are retried."""
+        mock_get_session.return_value.post.return_value.status_code = 503
+
+        self.assertRaises(delivery.DeliveryFailed, http._send_post,
+                          {'url': 'https://localhost/api/'}, {})
+        self.assertEqual(1, mock_log.error.call_count)
+
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_connection_error(self, mock_get_session):
+        """Assert connection errors are retried."""
+        mock_get_session.return_value.post.side_effect = ConnectionError()
+
+        self.assertRaises(delivery.DeliveryFailed, http._send_post,
+                          {'url': 'https://localhost/api/'}, {})
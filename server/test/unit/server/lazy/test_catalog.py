@@ -0,0 +1,115 @@
+from unittest import TestCase
+
+from mock import call, patch, Mock
+
+from pulp.server.lazy.catalog import LazyCatalogWriter
+
+
+MODULE = 'pulp.server.lazy.catalog'
+
+
+def entry(path, importer_id='importer'):
+    return Mock(importer_id=importer_id, path=path, revision=0)
+
+
+@patch(MODULE + '.model')
+class TestLazyCatalogWriter(TestCase):
+
+    def test_add_buffers(self, model):
+        writer = LazyCatalogWriter('importer')
+        added = entry('/a')
+
+        writer.add(added)
+
+        added.validate.assert_called_once_with()
+        collection = model.LazyCatalogEntry._get_collection.return_value
+        self.assertFalse(collection.insert_many.called)
+        self.assertEqual(writer.added_count, 0)
+
+    def test_add_wrong_importer(self, model):
+        writer = LazyCatalogWriter('importer')
+        self.assertRaises(ValueError, writer.add, entry('/a', 'other'))
+
+    def test_add_flushes_batch(self, model):
+        writer = LazyCatalogWriter('importer', batch_size=2)
+        writer.flush = Mock()
+
+        writer.add(entry('/a'))
+        writer.add(entry('/b'))
+
+        writer.flush.assert_called_once_with()
+
+    def test_replace(self, model):
+        model.LazyCatalogEntry.objects.return_value.only.return_value = [
+            Mock(id=1, path='/a', revision=1), Mock(id=2, path='/a', revision=3)]
+        writer = LazyCatalogWriter('importer')
+        first, second = entry('/a'), entry('/b')
+        writer.add(first)
+        writer.add(second)
+
+        writer.flush()
+
+        self.assertEqual(model.LazyCatalogEntry.objects.call_args_list, [
+            call(importer_id='importer', path__in=['/a', '/b']),
+            call(id__in=[1, 2])])
+        self.assertEqual(first.revision, 4)
+        self.assertEqual(second.revision, 1)
+        collection = model.LazyCatalogEntry._get_collection.return_value
+        collection.insert_many.assert_called_once_with(
+            [first.to_mongo.return_value, second.to_mongo.return_value], ordered=False)
+        self.assertEqual(writer.added_count, 2)
+
+    def test_replace_same_path(self, model):
+        """A later entry for a path replaces a buffered one."""
+        model.LazyCatalogEntry.objects.return_value.only.return_value = []
+        writer = LazyCatalogWriter('importer')
+        first, second = entry('/a'), entry('/a')
+        writer.add(first)
+        writer.add(second)
+
+        writer.flush()
+
+        collection = model.LazyCatalogEntry._get_collection.return_value
+        collection.insert_many.assert_called_once_with([second.to_mongo.return_value],
+                                                       ordered=False)
+
+    def test_revision_swap(self, model):
+        latest = model.LazyCatalogEntry.objects.return_value.only.return_value.order_by
+        latest.return_value.first.return_value = Mock(revision=4)
+        added = entry('/a')
+
+        with LazyCatalogWriter('importer', revision_swap=True) as writer:
+            writer.add(added)
+
+        self.assertEqual(writer.revision, 5)
+        self.assertEqual(added.revision, 5)
+        collection = model.LazyCatalogEntry._get_collection.return_value
+        self.assertEqual(1, collection.bulk_write.call_count)
+        model.LazyCatalogEntry.objects.assert_called_with(importer_id='importer',
+                                                          revision__lt=5)
+        model.LazyCatalogEntry.objects.return_value.delete.assert_called_once_with()
+
+    def test_revision_swap_first_revision(self, model):
+        latest = model.LazyCatalogEntry.objects.return_value.only.return_value.order_by
+        latest.return_value.first.return_value = None
+
+        writer = LazyCatalogWriter('importer', revision_swap=True)
+
+        self.assertEqual(writer.revision, 1)
+
+    def test_revision_swap_aborted(self, model):
+        """The new revision is discarded if writing it fails."""
+        latest = model.LazyCatalogEntry.objects.return_value.only.return_value.order_by
+        latest.return_value.first.return_value = Mock(revision=4)
+
+        try:
+            with LazyCatalogWriter('importer', revision_swap=True) as writer:
+                writer.add(entry('/a'))
+                raise ValueError()
+        except ValueError:
+            pass
+
+        collection = model.LazyCatalogEntry._get_collection.return_value
+        self.assertFalse(collection.bulk_write.called)
+        model.LazyCatalogEntry.objects.assert_called_with(importer_id='importer', revision=5)
+        model.LazyCatalogEntry.objects.return_value.delete.assert_called_once_with()
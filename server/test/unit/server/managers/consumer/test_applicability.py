@@ -1,17 +1,21 @@
+import unittest
+
 import mock
 
 from .... import base
 from pulp.devel import mock_plugins
 from pulp.plugins.loader import api as plugins
+from pulp.plugins.profiler import Profiler
 from pulp.server.controllers import distributor as dist_controller
 from pulp.server.db import model
-from pulp.server.db.model.consumer import (Bind, Consumer, RepoProfileApplicability,
-                                           UnitProfile)
+from pulp.server.db.model.consumer import (ApplicabilityReport, ApplicabilityReportEntry, Bind,
+                                           Consumer, RepoProfileApplicability, UnitProfile)
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.db.model import Repository
 from pulp.server.managers import factory as factory
+from pulp.server.managers.consumer import applicability as applicability_module
 from pulp.server.managers.consumer.applicability import (
-    _add_consumers_to_applicability_map, _add_profiles_to_consumer_map_and_get_hashes,
+    _add_profiles_to_consumer_map_and_get_hashes,
     _add_repo_ids_to_consumer_map, _format_report, _get_applicability_map,
     _get_consumer_applicability_map, DoesNotExist, MultipleObjectsReturned,
     retrieve_consumer_applicability, ApplicabilityRegenerationManager)
@@ -288,7 +292,8 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         applicability_manager.batch_regenerate_applicability('mock_repo', profile_hashes)
         expected_params = {'profile_hash': {'$in': ['mock-hash-1', 'mock-hash-2']},
                            'repo_id': 'mock_repo'}
-        mock_repo_profile_app_get_collection.return_value.find.assert_called_with(expected_params)
+        mock_repo_profile_app_get_collection.return_value.find.assert_called_with(
+            expected_params, projection=['profile_hash', 'profile'])
 
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     def test_get_existing_repo_content_types_no_repo(self, mock_repo_qs):
@@ -430,6 +435,7 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(applicability_list[0]['profile'], self.PROFILE1)
         self.assertEqual(applicability_list[0]['applicability'], expected_applicability)
 
+    @mock.patch('pulp.server.managers.consumer.applicability.REGENERATION_BATCH_SIZE', 2)
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
     def test_linear_regen_applicability_for_repos_batch_size(self, mock_get_collection,
@@ -440,11 +446,91 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         repo_criteria = {'filters': None, 'sort': None, 'limit': None,
                          'skip': None, 'fields': None}
         mock_objects.find_by_criteria.return_value = [Repository(repo_id='fake-repo')]
+        mock_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1'}, {'profile_hash': 'hash-2'}, {'profile_hash': 'hash-3'}]
+
+        with mock.patch.object(ApplicabilityRegenerationManager,
+                               '_regenerate_applicability_batch') as mock_batch:
+            applicability_manager.regenerate_applicability_for_repos(repo_criteria)
+
+        # validate that only the profile hashes are loaded, and regenerated in batches
+        mock_get_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'fake-repo'}, projection=['profile_hash'])
+        self.assertEqual([c[0][1] for c in mock_batch.call_args_list],
+                         [['hash-1', 'hash-2'], ['hash-3']])
+
 
-        applicability_manager.regenerate_applicability_for_repos(repo_criteria)
+@mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+@mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+@mock.patch.object(ApplicabilityRegenerationManager, '_profiler')
+class TestRegenerateApplicabilityBatch(unittest.TestCase):
 
-        # validate that batch size of 5 is used
-        mock_get_collection.return_value.find.return_value.batch_size.assert_called_with(5)
+    def setUp(self):
+        self.profiler = Profiler()
+        self.profiler.metadata = mock.Mock(return_value={'types': ['rpm']})
+        self.profiler.calculate_applicable_units = mock.Mock(
+            side_effect=lambda p, r, c, x: {'rpm': [p]})
+
+    def _regenerate(self, mock_profiler, mock_rpa_collection, mock_profile_collection,
+                    repo_content_types=('rpm',)):
+        mock_profiler.return_value = (self.profiler, {})
+        mock_rpa_collection.return_value.find.return_value = [
+            {'_id': 1, 'profile_hash': 'hash-1', 'profile': 'p1'},
+            {'_id': 2, 'profile_hash': 'hash-2', 'profile': 'p2'},
+            {'_id': 3, 'profile_hash': 'hash-3', 'profile': 'p3'}]
+        # hash-1 is shared by two unit profiles, and hash-3 no longer has a unit profile
+        mock_profile_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1', 'content_type': 'rpm'},
+            {'profile_hash': 'hash-1', 'content_type': 'rpm'},
+            {'profile_hash': 'hash-2', 'content_type': 'rpm'}]
+        ApplicabilityRegenerationManager._regenerate_applicability_batch(
+            'repo', ['hash-1', 'hash-2', 'hash-3'], list(repo_content_types), mock.Mock())
+        return mock_rpa_collection.return_value
+
+    def test_queries(self, mock_profiler, mock_rpa_collection, mock_profile_collection):
+        self._regenerate(mock_profiler, mock_rpa_collection, mock_profile_collection)
+
+        mock_rpa_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'repo', 'profile_hash': {'$in': ['hash-1', 'hash-2', 'hash-3']}},
+            projection=['profile_hash', 'profile'])
+        query = mock_profile_collection.return_value.find.call_args[0][0]
+        self.assertEqual(sorted(query['profile_hash']['$in']), ['hash-1', 'hash-2', 'hash-3'])
+        mock_profiler.assert_called_once_with('rpm')
+
+    def test_bulk_write(self, mock_profiler, mock_rpa_collection, mock_profile_collection):
+        """Each regenerated applicability is updated with a single bulk write."""
+        collection = self._regenerate(mock_profiler, mock_rpa_collection, mock_profile_collection)
+
+        self.assertEqual(2, self.profiler.calculate_applicable_units.call_count)
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual(sorted((r._filter, r._doc) for r in requests),
+                         [({'_id': 1}, {'$set': {'applicability': {'rpm': ['p1']}}}),
+                          ({'_id': 2}, {'$set': {'applicability': {'rpm': ['p2']}}})])
+
+    def test_batch_api(self, mock_profiler, mock_rpa_collection, mock_profile_collection):
+        """Profilers implementing the batch API are called once with all the profiles."""
+        self.profiler.calculate_applicable_units_batch = mock.Mock(
+            return_value={'hash-1': {'rpm': []}})
+
+        collection = self._regenerate(mock_profiler, mock_rpa_collection, mock_profile_collection)
+
+        self.profiler.calculate_applicable_units_batch.assert_called_once_with(
+            {'hash-1': 'p1', 'hash-2': 'p2'}, 'repo', mock.ANY, mock.ANY)
+        self.assertEqual(1, len(collection.bulk_write.call_args[0][0]))
+
+    def test_types_not_in_repo(self, mock_profiler, mock_rpa_collection, mock_profile_collection):
+        collection = self._regenerate(mock_profiler, mock_rpa_collection, mock_profile_collection,
+                                      repo_content_types=('erratum',))
+
+        self.assertFalse(self.profiler.calculate_applicable_units.called)
+        self.assertFalse(collection.bulk_write.called)
+
+    def test_not_implemented(self, mock_profiler, mock_rpa_collection, mock_profile_collection):
+        self.profiler.calculate_applicable_units.side_effect = NotImplementedError()
+
+        collection = self._regenerate(mock_profiler, mock_rpa_collection, mock_profile_collection)
+
+        self.assertFalse(collection.bulk_write.called)
 
 
 class TestRepoProfileApplicabilityManager(base.PulpServerTests):
@@ -713,6 +799,8 @@ class TestRetrieveConsumerApplicability(base.PulpServerTests,
         UnitProfile.get_collection().remove()
         RepoProfileApplicability.get_collection().drop()
         Bind.get_collection().drop()
+        ApplicabilityReport.get_collection().drop()
+        ApplicabilityReportEntry.get_collection().drop()
 
     def test_consumers_with_same_applicability(self, m_validate_consumer_repo, *unused_mocks):
         """
@@ -1187,54 +1275,6 @@ class TestRetrieveConsumerApplicability(base.PulpServerTests,
         self.assert_equal_ignoring_list_order(applicability, expected_applicability)
 
 
-class TestAddConsumersToApplicabilityMap(base.PulpServerTests,
-                                         base.RecursiveUnorderedListComparisonMixin):
-    """
-    Test the _add_consumer_to_applicability_map() function.
-    """
-    def test__add_consumers_to_applicability_map(self):
-        """
-        Test the _add_consumers_to_applicability_map() function.
-        """
-        consumer_map = {
-            'consumer_1': {'profiles': [{'profile_hash': 'hash_1'},
-                                        {'profile_hash': 'hash_2'}],
-                           'repo_ids': ['repo_1']},
-            'consumer_2': {'profiles': [{'profile_hash': 'hash_2'},
-                                        {'profile_hash': 'hash_3'}],
-                           'repo_ids': ['repo_1', 'repo_2']},
-            'consumer_3': {'profiles': [{'profile_hash': 'hash_1'},
-                                        {'profile_hash': 'hash_4'}],
-                           'repo_ids': ['repo_3']},
-        }
-        # The applicability_map should be altered by _add_consumers_to_applicability_map()
-        # by having the consumers in the consumer_map added to the correct applicability
-        # spots. The applicability_map doesn't have data for every combo of profile and
-        # repo, so that we can make sure the function is able to handle that case
-        # gracefully.
-        applicability_map = {
-            ('hash_1', 'repo_1'): {'consumers': [], 'applicability': ['a_1']},
-            ('hash_2', 'repo_1'): {'consumers': [], 'applicability': ['a_2']},
-            ('hash_2', 'repo_2'): {'consumers': [], 'applicability': ['a_3']},
-            # This one should not match any consumers
-            ('hash_5', 'repo_3'): {'consumers': [], 'applicability': ['a_4']},
-        }
-
-        _add_consumers_to_applicability_map(consumer_map, applicability_map)
-
-        expected_applicability_map = {
-            ('hash_1', 'repo_1'): {'consumers': ['consumer_1'],
-                                   'applicability': ['a_1']},
-            ('hash_2', 'repo_1'): {'consumers': ['consumer_1', 'consumer_2'],
-                                   'applicability': ['a_2']},
-            ('hash_2', 'repo_2'): {'consumers': ['consumer_2'],
-                                   'applicability': ['a_3']},
-            ('hash_5', 'repo_3'): {'consumers': [], 'applicability': ['a_4']},
-        }
-        self.assert_equal_ignoring_list_order(applicability_map,
-                                              expected_applicability_map)
-
-
 class TestAddProfilesToConsumerMapAndGetHashes(
         base.PulpServerTests, base.RecursiveUnorderedListComparisonMixin):
     """
@@ -1501,3 +1541,194 @@ class TestGetConsumerApplicabilityMap(base.PulpServerTests,
             frozenset(['c_1', 'c_2']): {'type_1': ['a_1', 'a_3'], 'type_2': ['a_4']},
             frozenset(['c_2', 'c_3']): {'type_1': ['a_2']}}
         self.assert_equal_ignoring_list_order(c_a_map, expected_c_a_map)
+
+
+@mock.patch('pulp.server.db.model.consumer.ApplicabilityReportEntry.get_collection')
+@mock.patch('pulp.server.db.model.consumer.ApplicabilityReport.get_collection')
+class TestRefreshReport(unittest.TestCase):
+    """
+    Test the _refresh_report() function.
+    """
+    def _refresh(self, mock_report_collection, previous_ids, dirty_ids, consumer_ids,
+                 exists=True):
+        collection = mock_report_collection.return_value
+        collection.find.return_value = []
+        collection.find_one.return_value = {'_id': 'report'} if exists else None
+        collection.find_one_and_update.return_value = {
+            '_id': 'report', 'consumer_ids': previous_ids, 'dirty_consumer_ids': dirty_ids,
+            'version': 3}
+        with mock.patch.object(applicability_module, '_update_report_entries') as mock_update:
+            report_id = applicability_module._refresh_report('key', consumer_ids)
+        self.assertEqual(report_id, 'report')
+        return mock_update
+
+    def test_changed_consumers(self, mock_report_collection, mock_entry_collection):
+        """Only consumers that were added, removed or marked dirty are refreshed."""
+        collection = mock_report_collection.return_value
+
+        mock_update = self._refresh(mock_report_collection, ['c1', 'c2', 'c3'], ['c2', 'c4'],
+                                    ['c2', 'c3', 'c5'])
+
+        mock_update.assert_called_once_with('report', set(['c1', 'c2', 'c4']),
+                                            set(['c2', 'c5']))
+        self.assertFalse(collection.insert.called)
+        self.assertEqual(collection.find_one_and_update.call_args[0][1].keys(), ['$set'])
+        # the new consumers are added, and marked dirty, before the entries are refreshed
+        added, done = collection.update_one.call_args_list
+        self.assertEqual(added[0][1], {'$addToSet': {'consumer_ids': {'$each': ['c5']},
+                                                     'dirty_consumer_ids': {'$each': ['c5']}}})
+        # the refreshed consumers are no longer dirty unless the report changed meanwhile
+        self.assertEqual(done[0][0], {'_id': 'report', 'version': 3})
+        self.assertEqual(done[0][1]['$set'], {'consumer_ids': ['c2', 'c3', 'c5']})
+        self.assertEqual(set(done[0][1]['$pullAll']['dirty_consumer_ids']),
+                         set(['c2', 'c4', 'c5']))
+
+    def test_report_written_after_entries(self, mock_report_collection, mock_entry_collection):
+        """A concurrent query sees the consumers dirty until their entries are written."""
+        collection = mock_report_collection.return_value
+        collection.find.return_value = []
+        collection.find_one_and_update.return_value = {
+            '_id': 'report', 'consumer_ids': ['c1'], 'dirty_consumer_ids': ['c1'], 'version': 3}
+        calls = []
+        collection.update_one.side_effect = lambda spec, update: calls.append('report')
+
+        with mock.patch.object(applicability_module, '_update_report_entries') as mock_update:
+            mock_update.side_effect = lambda *args: calls.append('entries')
+            applicability_module._refresh_report('key', ['c1'])
+
+        self.assertEqual(calls, ['entries', 'report'])
+
+    def test_new_report(self, mock_report_collection, mock_entry_collection):
+        collection = mock_report_collection.return_value
+
+        mock_update = self._refresh(mock_report_collection, [], [], ['c1'], exists=False)
+
+        report = collection.insert.call_args[0][0]
+        self.assertEqual(report['report_key'], 'key')
+        mock_update.assert_called_once_with('report', set(), set(['c1']))
+
+    @mock.patch.object(applicability_module.time, 'time', mock.Mock(return_value=1000))
+    def test_removes_unused(self, mock_report_collection, mock_entry_collection):
+        collection = mock_report_collection.return_value
+        collection.find.return_value = [{'_id': 'old'}]
+
+        with mock.patch.object(applicability_module, '_update_report_entries'):
+            applicability_module._refresh_report('key', [])
+
+        collection.find.assert_called_once_with(
+            {'last_used': {'$lt': 1000 - applicability_module.REPORT_TTL}}, projection=['_id'])
+        mock_entry_collection.return_value.remove.assert_called_once_with(
+            {'report_id': {'$in': ['old']}})
+        collection.remove.assert_called_once_with({'_id': {'$in': ['old']}})
+
+    def test_failure_removes_report(self, mock_report_collection, mock_entry_collection):
+        """A report that could not be refreshed is removed."""
+        collection = mock_report_collection.return_value
+        collection.find.return_value = []
+        collection.find_one_and_update.return_value = {
+            '_id': 'report', 'consumer_ids': [], 'dirty_consumer_ids': []}
+
+        with mock.patch.object(applicability_module, '_update_report_entries') as mock_update:
+            mock_update.side_effect = ValueError()
+            self.assertRaises(ValueError, applicability_module._refresh_report, 'key', ['c1'])
+
+        collection.remove.assert_called_once_with({'_id': {'$in': ['report']}})
+
+
+@mock.patch('pulp.server.db.model.consumer.Bind.get_collection')
+@mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+@mock.patch('pulp.server.db.model.consumer.ApplicabilityReportEntry.get_collection')
+class TestUpdateReportEntries(unittest.TestCase):
+    """
+    Test the _update_report_entries() function.
+    """
+    def test_removed(self, mock_entry_collection, mock_profile_collection, mock_bind_collection):
+        applicability_module._update_report_entries('report', set(['c1']), set())
+
+        collection = mock_entry_collection.return_value
+        collection.update_many.assert_called_once_with(
+            {'report_id': 'report', 'consumer_ids': {'$in': ['c1']}},
+            {'$pullAll': {'consumer_ids': ['c1']}})
+        collection.remove.assert_called_once_with(
+            {'report_id': 'report', 'consumer_ids': {'$size': 0}})
+        self.assertFalse(mock_profile_collection.called)
+        self.assertFalse(collection.bulk_write.called)
+
+    def test_added(self, mock_entry_collection, mock_profile_collection, mock_bind_collection):
+        """Consumers are added to the entries of each of their profiles and bound repos."""
+        mock_profile_collection.return_value.find.return_value = [
+            {'consumer_id': 'c1', 'profile_hash': 'h1'},
+            {'consumer_id': 'c2', 'profile_hash': 'h1'},
+            {'consumer_id': 'c2', 'profile_hash': 'h2'}]
+        mock_bind_collection.return_value.find.return_value = [
+            {'consumer_id': 'c1', 'repo_id': 'r1'},
+            {'consumer_id': 'c2', 'repo_id': 'r1'},
+            {'consumer_id': 'c2', 'repo_id': 'r2'}]
+
+        applicability_module._update_report_entries('report', set(), set(['c1', 'c2']))
+
+        collection = mock_entry_collection.return_value
+        self.assertFalse(collection.update_many.called)
+        requests = collection.bulk_write.call_args[0][0]
+        entries = sorted((r._filter['profile_hash'], r._filter['repo_id'],
+                          sorted(r._doc['$addToSet']['consumer_ids']['$each']))
+                         for r in requests)
+        self.assertEqual(entries, [('h1', 'r1', ['c1', 'c2']), ('h1', 'r2', ['c2']),
+                                   ('h2', 'r1', ['c2']), ('h2', 'r2', ['c2'])])
+        self.assertTrue(all(r._filter['report_id'] == 'report' and r._upsert for r in requests))
+
+
+@mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+@mock.patch('pulp.server.db.model.consumer.ApplicabilityReportEntry.get_collection')
+class TestGetReportApplicabilityMap(unittest.TestCase):
+    """
+    Test the _get_report_applicability_map() function.
+    """
+    def test_get_report_applicability_map(self, mock_entry_collection, mock_rpa_collection):
+        mock_entry_collection.return_value.find.return_value = [
+            {'profile_hash': 'h1', 'repo_id': 'r1', 'consumer_ids': ['c1', 'c2']},
+            {'profile_hash': 'h2', 'repo_id': 'r1', 'consumer_ids': ['c3']}]
+        # The consumers with the profile h1 are not bound to r2
+        mock_rpa_collection.return_value.find.return_value = [
+            {'profile_hash': 'h1', 'repo_id': 'r1', 'applicability': {'rpm': ['u1']}},
+            {'profile_hash': 'h1', 'repo_id': 'r2', 'applicability': {'rpm': ['u2']}},
+            {'profile_hash': 'h2', 'repo_id': 'r1', 'applicability': {'erratum': ['e1']}}]
+
+        applicability_map = applicability_module._get_report_applicability_map('report', ['rpm'])
+
+        self.assertEqual(applicability_map, {
+            ('h1', 'r1'): {'applicability': {'rpm': ['u1']}, 'consumers': ['c1', 'c2']}})
+        query = mock_rpa_collection.return_value.find.call_args[0][0]
+        self.assertEqual(sorted(query['profile_hash']['$in']), ['h1', 'h2'])
+
+
+class TestIterConsumerApplicability(unittest.TestCase):
+    """
+    Test the iter_consumer_applicability() function.
+    """
+    @mock.patch.object(applicability_module, '_get_report_applicability_map')
+    @mock.patch.object(applicability_module, '_refresh_report')
+    @mock.patch.object(applicability_module.ConsumerQueryManager, 'find_by_criteria')
+    def test_iter_consumer_applicability(self, mock_find, mock_refresh, mock_get_map):
+        mock_find.return_value = [{'id': 'c1'}, {'id': 'c2'}]
+        mock_get_map.return_value = {
+            ('h1', 'r1'): {'applicability': {'rpm': ['u1']}, 'consumers': ['c1', 'c2']}}
+        criteria = Criteria(filters={'id': {'$in': ['c1', 'c2']}})
+
+        report = applicability_module.iter_consumer_applicability(criteria, ['rpm'])
+
+        self.assertEqual(criteria['fields'], ['id'])
+        mock_refresh.assert_called_once_with(applicability_module._report_key(criteria),
+                                             ['c1', 'c2'])
+        mock_get_map.assert_called_once_with(mock_refresh.return_value, ['rpm'])
+        report = list(report)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(sorted(report[0]['consumers']), ['c1', 'c2'])
+        self.assertEqual(report[0]['applicability'], {'rpm': ['u1']})
+
+    def test_report_key(self):
+        """Equal criteria share the same report."""
+        key = applicability_module._report_key(Criteria(filters={'a': 1, 'b': 2}))
+
+        self.assertEqual(key, applicability_module._report_key(Criteria(filters={'b': 2, 'a': 1})))
+        self.assertNotEqual(key, applicability_module._report_key(Criteria(filters={'a': 1})))
@@ -92,6 +92,17 @@ class BindManagerTests(base.PulpServerTests):
         self.assertEqual(history['originator'], 'SYSTEM')
         self.assertEqual(history['details'], self.DETAILS)
 
+    @patch('pulp.server.managers.consumer.bind.ApplicabilityReport.consumers_changed')
+    def test_bind_changes_applicability_reports(self, mock_consumers_changed, mock_repo_qs):
+        self.populate()
+        manager = factory.consumer_bind_manager()
+        manager.bind(self.CONSUMER_ID, self.REPO_ID, self.DISTRIBUTOR_ID,
+                     self.NOTIFY_AGENT, self.BINDING_CONFIG)
+        manager.unbind(self.CONSUMER_ID, self.REPO_ID, self.DISTRIBUTOR_ID)
+        # Verify
+        self.assertEqual(mock_consumers_changed.call_count, 2)
+        mock_consumers_changed.assert_called_with([self.CONSUMER_ID])
+
     def test_bind_non_bool_notify(self, mock_repo_qs):
         # Setup
         self.populate()
@@ -1,3 +1,5 @@
+import unittest
+
 import mock
 import pymongo
 
@@ -5,7 +7,7 @@ from .... import base
 from pulp.devel import mock_plugins
 from pulp.plugins.profiler import Profiler
 from pulp.server.db.model.consumer import Consumer, ConsumerHistoryEvent, UnitProfile
-from pulp.server.exceptions import MissingResource
+from pulp.server.exceptions import InvalidValue, MissingResource, MissingValue
 from pulp.server.managers import factory
 from pulp.server.managers.consumer.cud import ConsumerManager
 from pulp.server.managers.consumer.profile import ProfileManager
@@ -53,6 +55,18 @@ class ProfileManagerTests(base.PulpServerTests):
         expected_hash = UnitProfile.calculate_hash(self.PROFILE_1)
         self.assertEqual(profiles[0]['profile_hash'], expected_hash)
 
+    @mock.patch('pulp.server.managers.consumer.profile.ApplicabilityReport.consumers_changed')
+    def test_create_changes_applicability_reports(self, mock_consumers_changed):
+        # Setup
+        self.populate()
+        # Test
+        manager = factory.consumer_profile_manager()
+        manager.create(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        manager.delete(self.CONSUMER_ID, self.TYPE_1)
+        # Verify
+        self.assertEqual(mock_consumers_changed.call_args_list,
+                         [mock.call([self.CONSUMER_ID]), mock.call([self.CONSUMER_ID])])
+
     def test_get_profiles(self):
         # Setup
         self.populate()
@@ -128,6 +142,72 @@ class ProfileManagerTests(base.PulpServerTests):
         expected_hash = UnitProfile.calculate_hash(self.PROFILE_2)
         self.assertEqual(profiles[0]['profile_hash'], expected_hash)
 
+    def test_update_stores_upload_hash(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        # Test
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Verify
+        profile = manager.get_profile(self.CONSUMER_ID, self.TYPE_1)
+        self.assertEqual(profile['upload_hash'], UnitProfile.calculate_hash(self.PROFILE_1))
+        self.assertTrue(manager.is_current(self.CONSUMER_ID, self.TYPE_1,
+                                           UnitProfile.calculate_hash(self.PROFILE_1)))
+        self.assertFalse(manager.is_current(self.CONSUMER_ID, self.TYPE_1,
+                                            UnitProfile.calculate_hash(self.PROFILE_2)))
+        self.assertFalse(manager.is_current(self.CONSUMER_ID, self.TYPE_2,
+                                            UnitProfile.calculate_hash(self.PROFILE_1)))
+
+    @mock.patch('pulp.server.managers.consumer.profile.ApplicabilityReport.consumers_changed')
+    def test_update_unchanged(self, mock_consumers_changed):
+        """
+        Test that uploading the same profile again does not change anything.
+        """
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Test
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Verify
+        self.assertEqual(mock_consumers_changed.call_count, 1)
+        collection = ConsumerHistoryEvent.get_collection()
+        history = collection.find({'consumer_id': self.CONSUMER_ID,
+                                   'type': 'unit_profile_changed'})
+        self.assertEqual(history.count(), 1)
+
+    def test_merge(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        previous = [self.PROFILE_1, self.PROFILE_3]
+        current = [self.PROFILE_3, self.PROFILE_2]
+        manager.update(self.CONSUMER_ID, self.TYPE_1, previous)
+        # Test
+        delta = {'added': [self.PROFILE_2], 'removed': [self.PROFILE_1]}
+        manager.merge(self.CONSUMER_ID, self.TYPE_1, delta, UnitProfile.calculate_hash(previous),
+                      UnitProfile.calculate_hash(current))
+        # Verify
+        profile = manager.get_profile(self.CONSUMER_ID, self.TYPE_1)
+        self.assertEqual(profile['profile'], current)
+        self.assertEqual(profile['profile_hash'], UnitProfile.calculate_hash(current))
+        self.assertEqual(profile['upload_hash'], UnitProfile.calculate_hash(current))
+
+    def test_merge_stale_base(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, [self.PROFILE_1])
+        # Test
+        delta = {'added': [self.PROFILE_2]}
+        merged = manager.merge(self.CONSUMER_ID, self.TYPE_1, delta,
+                               UnitProfile.calculate_hash([self.PROFILE_3]),
+                               UnitProfile.calculate_hash([self.PROFILE_3, self.PROFILE_2]))
+        # Verify
+        self.assertTrue(merged is None)
+        profile = manager.get_profile(self.CONSUMER_ID, self.TYPE_1)
+        self.assertEqual(profile['profile'], [self.PROFILE_1])
+
     def test_update_with_consumer_history(self):
         # Setup
         self.populate()
@@ -296,3 +376,86 @@ class ProfileManagerTests(base.PulpServerTests):
         cursor = collection.find({'consumer_id': self.CONSUMER_ID})
         profiles = list(cursor)
         self.assertEquals(len(profiles), 0)
+
+
+class TestMerge(unittest.TestCase):
+    """
+    Test the ProfileManager.merge() method.
+    """
+
+    def setUp(self):
+        self.existing = {'profile': [{'name': 'zsh'}], 'upload_hash': 'base'}
+
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager._save')
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager.get_profile')
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge(self, mock_factory, mock_get_profile, mock_save):
+        mock_get_profile.return_value = self.existing
+        delta = {'added': [{'name': 'vim'}], 'removed': [{'name': 'zsh'}]}
+        upload_hash = UnitProfile.calculate_hash([{'name': 'vim'}])
+
+        result = ProfileManager.merge('consumer', 'rpm', delta, 'base', upload_hash)
+
+        consumer = mock_factory.consumer_manager.return_value.get_consumer.return_value
+        mock_save.assert_called_once_with(consumer, 'consumer', 'rpm', [{'name': 'vim'}],
+                                          upload_hash, self.existing)
+        self.assertTrue(result is mock_save.return_value)
+
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager._save')
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager.get_profile')
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge_hash_mismatch(self, mock_factory, mock_get_profile, mock_save):
+        """The consumer uploads the whole profile when its packages are in another order."""
+        mock_get_profile.return_value = self.existing
+        delta = {'added': [{'name': 'vim'}]}
+        upload_hash = UnitProfile.calculate_hash([{'name': 'vim'}, {'name': 'zsh'}])
+
+        result = ProfileManager.merge('consumer', 'rpm', delta, 'base', upload_hash)
+
+        self.assertTrue(result is None)
+        self.assertFalse(mock_save.called)
+
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager._save')
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager.get_profile')
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge_stale_base(self, mock_factory, mock_get_profile, mock_save):
+        mock_get_profile.return_value = self.existing
+
+        result = ProfileManager.merge('consumer', 'rpm', {'added': []}, 'other', 'new')
+
+        self.assertTrue(result is None)
+        self.assertFalse(mock_save.called)
+
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager._save')
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager.get_profile')
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge_no_profile(self, mock_factory, mock_get_profile, mock_save):
+        mock_get_profile.side_effect = MissingResource()
+
+        result = ProfileManager.merge('consumer', 'rpm', {'added': []}, 'base', 'new')
+
+        self.assertTrue(result is None)
+        self.assertFalse(mock_save.called)
+
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager.get_profile')
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge_invalid_delta(self, mock_factory, mock_get_profile):
+        mock_get_profile.return_value = self.existing
+
+        for delta in ([], {'changed': []}, {'added': {}}):
+            self.assertRaises(InvalidValue, ProfileManager.merge, 'consumer', 'rpm', delta,
+                              'base', 'new')
+
+    @mock.patch('pulp.server.managers.consumer.profile.ProfileManager.get_profile')
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge_not_a_list(self, mock_factory, mock_get_profile):
+        self.existing['profile'] = {'name': 'zsh'}
+        mock_get_profile.return_value = self.existing
+
+        self.assertRaises(InvalidValue, ProfileManager.merge, 'consumer', 'rpm', {'added': []},
+                          'base', 'new')
+
+    @mock.patch('pulp.server.managers.consumer.profile.factory')
+    def test_merge_missing_hash(self, mock_factory):
+        self.assertRaises(MissingValue, ProfileManager.merge, 'consumer', 'rpm', {'added': []},
+                          'base', None)
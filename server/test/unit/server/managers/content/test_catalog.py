@@ -62,6 +62,25 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_add_entries(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, unit_key, url) for unit_key, url in units]
+        added = manager.add_entries(SOURCE_ID, EXPIRATION, entries)
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(added, len(units))
+        self.assertEqual(len(units), collection.find().count())
+        for unit_key, url in units:
+            locator = ContentCatalog.get_locator(TYPE_ID, unit_key)
+            entry = collection.find_one({'locator': locator})
+            self.assertEqual(entry['source_id'], SOURCE_ID)
+            self.assertEqual(entry['unit_key'], unit_key)
+            self.assertEqual(entry['url'], url)
+
+    def test_add_entries_empty(self):
+        manager = ContentCatalogManager()
+        self.assertEqual(manager.add_entries(SOURCE_ID, EXPIRATION, []), 0)
+
     def test_delete(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
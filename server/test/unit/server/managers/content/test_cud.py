@@ -1,5 +1,10 @@
+import unittest
+
+import mock
+
 from .... import base
 from pulp.plugins.types import database, model
+from pulp.server.db.model import ContentUnit
 from pulp.server.managers.content.cud import ContentManager
 from pulp.server.managers.content.query import ContentQueryManager
 
@@ -35,6 +40,11 @@ class PulpContentTests(base.PulpServerTests):
 
     def setUp(self):
         super(PulpContentTests, self).setUp()
+        # the test types are only defined in the types database
+        patcher = mock.patch('pulp.server.managers.content.cud.plugin_api.get_unit_model_by_id',
+                             return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         database.update_database([TYPE_1_DEF, TYPE_2_DEF])
         self.cud_manager = ContentManager()
         self.query_manager = ContentQueryManager()
@@ -89,3 +99,53 @@ class PulpContentCUDTests(PulpContentTests):
                                                          [child_id])
         parent = self.query_manager.get_content_unit_by_id(TYPE_2_DEF.id, parent_id)
         self.assertEqual(len(parent['_%s_references' % TYPE_1_DEF.id]), 0)
+
+
+@mock.patch('pulp.server.managers.content.cud.content_types_db.type_units_collection')
+@mock.patch('pulp.server.managers.content.cud.plugin_api.get_unit_model_by_id')
+class TestUnitKeyDigest(unittest.TestCase):
+    """
+    Units of types with a model are saved with the digest of their unit key, which is how they
+    are looked up by unit key.
+    """
+
+    def setUp(self):
+        self.cud_manager = ContentManager()
+        self.digest = ContentUnit.digest_unit_key({'key-2a': 'A', 'key-2b': 'B'})
+
+    def test_add_content_unit(self, mock_get_model, mock_collection):
+        mock_get_model.return_value.unit_key_fields = ('key-2a', 'key-2b')
+
+        self.cud_manager.add_content_unit('type-2', 'unit', {'key-2a': 'A', 'key-2b': 'B',
+                                                             'other': 'C'})
+
+        unit_doc = mock_collection.return_value.insert.call_args[0][0]
+        self.assertEqual(unit_doc['_unit_key_digest'], self.digest)
+
+    def test_add_content_unit_no_model(self, mock_get_model, mock_collection):
+        mock_get_model.return_value = None
+
+        self.cud_manager.add_content_unit('type-2', 'unit', {'key-2a': 'A', 'key-2b': 'B'})
+
+        unit_doc = mock_collection.return_value.insert.call_args[0][0]
+        self.assertFalse('_unit_key_digest' in unit_doc)
+
+    def test_update_content_unit(self, mock_get_model, mock_collection):
+        mock_get_model.return_value.unit_key_fields = ('key-2a', 'key-2b')
+        collection = mock_collection.return_value
+        collection.find_one.return_value = {'_id': 'unit', 'key-2a': 'A', 'key-2b': 'Z'}
+
+        self.cud_manager.update_content_unit('type-2', 'unit', {'key-2b': 'B'})
+
+        delta = collection.update.call_args[0][1]['$set']
+        self.assertEqual(delta['_unit_key_digest'], self.digest)
+        self.assertEqual(delta['key-2b'], 'B')
+
+    def test_update_content_unit_not_unit_key(self, mock_get_model, mock_collection):
+        mock_get_model.return_value.unit_key_fields = ('key-2a', 'key-2b')
+        collection = mock_collection.return_value
+
+        self.cud_manager.update_content_unit('type-2', 'unit', {'other': 'C'})
+
+        self.assertFalse(collection.find_one.called)
+        self.assertFalse('_unit_key_digest' in collection.update.call_args[0][1]['$set'])
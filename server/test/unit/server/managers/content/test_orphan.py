@@ -95,6 +95,11 @@ class OrphanManagerTests(base.PulpServerTests):
 
     def setUp(self):
         super(OrphanManagerTests, self).setUp()
+        # the test types are only defined in the types database
+        patcher = patch('pulp.server.managers.content.cud.plugin_api.get_unit_model_by_id',
+                        return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         content_type_db.update_database([PHONY_TYPE_1, PHONY_TYPE_2])
         self.content_root = tempfile.mkdtemp(prefix='content_orphan_manager_unittests-')
         self.orphan_manager = OrphanManager()
@@ -273,7 +278,7 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         self.assertEqual(len(orphans), 0)
         self.assertEqual(self.number_of_files_in_content_root(), 0)
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id=unit['_id'],
+            unit_id__in=[unit['_id']],
             unit_type_id=unit['_content_type_id']
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
@@ -309,6 +314,59 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         mock_get_model.return_value.objects.assert_called_once_with(id__in=('orphan2',))
 
 
+@patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+class TestGenerateOrphanPages(TestCase):
+
+    def _units_collection(self, *pages):
+        collection = Mock()
+        cursor = collection.find.return_value.sort.return_value
+        cursor.limit.side_effect = [iter(page) for page in pages]
+        return collection
+
+    def test_set_difference(self, m_get_rcu_collection):
+        collection = self._units_collection([{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}])
+        m_get_rcu_collection.return_value.distinct.return_value = ['b']
+
+        pages = list(OrphanManager.generate_orphan_pages(collection, page_size=10))
+
+        self.assertEqual(pages, [[{'_id': 'a'}, {'_id': 'c'}]])
+        collection.find.assert_called_once_with({}, projection=['_id'])
+        m_get_rcu_collection.return_value.distinct.assert_called_once_with(
+            'unit_id', {'unit_id': {'$in': ['a', 'b', 'c']}})
+
+    def test_pages_by_id_range(self, m_get_rcu_collection):
+        collection = self._units_collection([{'_id': 'a'}, {'_id': 'b'}], [{'_id': 'c'}])
+        m_get_rcu_collection.return_value.distinct.side_effect = [['a', 'b'], []]
+
+        pages = list(OrphanManager.generate_orphan_pages(collection, fields=['_id', 'name'],
+                                                         page_size=2))
+
+        self.assertEqual(pages, [[{'_id': 'c'}]])
+        self.assertEqual(collection.find.call_args_list,
+                         [call({}, projection=['_id', 'name']),
+                          call({'_id': {'$gt': 'b'}}, projection=['_id', 'name'])])
+
+    def test_restricted_to_ids(self, m_get_rcu_collection):
+        collection = Mock()
+        collection.find.return_value.sort.return_value = iter([{'_id': 'a'}, {'_id': 'b'}])
+        m_get_rcu_collection.return_value.distinct.return_value = []
+
+        pages = list(OrphanManager.generate_orphan_pages(collection,
+                                                         content_unit_ids=['b', 'a', 'a']))
+
+        self.assertEqual(pages, [[{'_id': 'a'}, {'_id': 'b'}]])
+        collection.find.assert_called_once_with({'_id': {'$in': ['a', 'b']}},
+                                                projection=['_id'])
+
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_count_by_type(self, m_type_units_collection, m_get_rcu_collection):
+        m_type_units_collection.return_value = self._units_collection(
+            [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}])
+        m_get_rcu_collection.return_value.distinct.return_value = ['a']
+
+        self.assertEqual(OrphanManager().orphans_count_by_type('foo_type'), 2)
+
+
 class TestDelete(TestCase):
 
     @patch('shutil.rmtree')
@@ -6,6 +6,7 @@ import unittest
 import mock
 
 from pulp.server.db.connection import PulpCollection
+from pulp.server.db.model import ContentUnit
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.managers.content.query import ContentQueryManager
 from test_cud import PulpContentTests, TYPE_1_DEF, TYPE_1_UNITS, TYPE_2_DEF, TYPE_2_UNITS
@@ -148,3 +149,64 @@ class TestGetContentUnitIDs(unittest.TestCase):
         list(ret)
         expected_spec = {'$or': ({'a': 'foo'}, {'a': 'bar'})}
         mock_find.assert_called_once_with(expected_spec, projection=['_id'])
+
+
+@mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
+@mock.patch('pulp.server.managers.content.query.plugin_api.get_unit_model_by_id')
+@mock.patch('pulp.plugins.types.database.type_units_collection')
+class TestGetMultipleUnitsByKeysDicts(unittest.TestCase):
+
+    def setUp(self):
+        super(TestGetMultipleUnitsByKeysDicts, self).setUp()
+        self.manager = ContentQueryManager()
+
+    def test_model_digest(self, mock_type_collection, mock_get_model, mock_type_unit_key):
+        """Units of types with a model are matched on the digest of their unit key."""
+        mock_type_unit_key.return_value = ('a',)
+        digest = ContentUnit.digest_unit_key({'a': 'foo'})
+        unit = {'_id': 'abc', 'a': u'foo', '_unit_key_digest': digest}
+        mock_find = mock_type_collection.return_value.find
+        mock_find.return_value = [unit]
+
+        ret = self.manager.get_multiple_units_by_keys_dicts('fake_type', [{'a': 'foo'},
+                                                                          {'a': 'bar'}])
+
+        self.assertEqual(list(ret), [unit])
+        digests = [digest, ContentUnit.digest_unit_key({'a': 'bar'})]
+        mock_find.assert_called_once_with({'_unit_key_digest': {'$in': digests}},
+                                          projection=None)
+
+    def test_model_digest_collision(self, mock_type_collection, mock_get_model,
+                                    mock_type_unit_key):
+        """Units only sharing the digest of a requested unit key are dropped."""
+        mock_type_unit_key.return_value = ('name', 'version')
+        keys_dict = {'name': 'a', 'version': 'versionb'}
+        digest = ContentUnit.digest_unit_key(keys_dict)
+        mock_find = mock_type_collection.return_value.find
+        mock_find.return_value = [
+            {'_id': 'abc', 'name': 'aversion', 'version': 'b', '_unit_key_digest': digest},
+            {'_id': 'def', 'name': 'a', 'version': 'versionb', '_unit_key_digest': digest}]
+
+        ret = self.manager.get_multiple_units_by_keys_dicts('fake_type', [keys_dict], ['_id'])
+
+        self.assertEqual(list(ret), [{'_id': 'def'}])
+        projection = mock_find.call_args[1]['projection']
+        self.assertEqual(sorted(projection), ['_id', '_unit_key_digest', 'name', 'version'])
+
+    def test_no_model(self, mock_type_collection, mock_get_model, mock_type_unit_key):
+        """Units of types without a model are matched on their unit key."""
+        mock_type_unit_key.return_value = ('a',)
+        mock_get_model.return_value = None
+        mock_find = mock_type_collection.return_value.find
+        mock_find.return_value = []
+
+        list(self.manager.get_multiple_units_by_keys_dicts('fake_type', [{'a': 'foo'}], ['a']))
+
+        mock_find.assert_called_once_with({'$or': ({'a': 'foo'},)}, projection=['a'])
+
+    def test_invalid_keys(self, mock_type_collection, mock_get_model, mock_type_unit_key):
+        mock_type_unit_key.return_value = ('a',)
+
+        ret = self.manager.get_multiple_units_by_keys_dicts('fake_type', [{'b': 'foo'}])
+
+        self.assertRaises(ValueError, list, ret)
@@ -87,6 +87,18 @@ class ContentUploadManagerTests(base.PulpServerTests):
 
         self.assertEqual(expected_size, found_size)
 
+    def test_save_data_out_of_order(self):
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload()
+
+        for offset, w in ((7, 'hij'), (0, 'abc'), (3, 'defg')):
+            self.upload_manager.save_data(upload_id, offset, w)
+
+        # Verify
+        written = self.upload_manager.read_upload(upload_id)
+        self.assertEqual(written, 'abcdefghij')
+
     def test_save_no_init(self):
 
         # Test
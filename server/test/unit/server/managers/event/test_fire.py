@@ -1,9 +1,12 @@
+import unittest
+
 import mock
 
 from .... import base
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import data as event_data, notifiers
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.event.fire import ListenerCache, listener_cache
 
 
 class EventFireManagerTests(base.PulpServerTests):
@@ -13,6 +16,7 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.manager = manager_factory.event_fire_manager()
         self.event_manager = manager_factory.event_listener_manager()
+        listener_cache.invalidate()
 
     def tearDown(self):
         super(EventFireManagerTests, self).tearDown()
@@ -141,3 +145,48 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.assertEqual(event.event_type, event_data.TYPE_REPO_SYNC_FINISHED)
         self.assertEqual(event.payload, result)
+
+
+@mock.patch('pulp.server.managers.event.fire.time.time')
+@mock.patch('pulp.server.managers.event.fire.EventListener')
+class TestListenerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ListenerCache()
+        self.listeners = [
+            {'notifier_type_id': 'http', 'event_types': [event_data.TYPE_REPO_SYNC_STARTED]},
+            {'notifier_type_id': 'email', 'event_types': ['*']},
+            {'notifier_type_id': 'http', 'event_types': [event_data.TYPE_REPO_SYNC_FINISHED]},
+        ]
+
+    def test_get(self, mock_listener, mock_time):
+        mock_listener.get_collection.return_value.find.return_value = self.listeners
+        mock_time.return_value = 1000
+
+        listeners = self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(self.listeners[:2], listeners)
+
+    def test_get_cached(self, mock_listener, mock_time):
+        """The listeners are only loaded again once the cache expires."""
+        mock_listener.get_collection.return_value.find.return_value = self.listeners
+        mock_time.return_value = 1000
+
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        self.cache.get(event_data.TYPE_REPO_SYNC_FINISHED)
+        self.assertEqual(1, mock_listener.get_collection.return_value.find.call_count)
+
+        # the default ttl
+        mock_time.return_value = 1030
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        self.assertEqual(2, mock_listener.get_collection.return_value.find.call_count)
+
+    def test_invalidate(self, mock_listener, mock_time):
+        mock_listener.get_collection.return_value.find.return_value = self.listeners
+        mock_time.return_value = 1000
+
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        self.cache.invalidate()
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(2, mock_listener.get_collection.return_value.find.call_count)
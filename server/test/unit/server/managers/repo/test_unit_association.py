@@ -136,8 +136,10 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertEqual(1, len(repo_units))
         self.assertEqual('unit-1', repo_units[0]['unit_id'])
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.managers.repo.unit_association.'
+                'repo_controller.update_last_unit_added')
+    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller.update_unit_count')
+    def test_associate_all(self, mock_update_count, mock_update_last, mock_repo):
         """
         Tests making multiple associations in a single call.
         """
@@ -306,8 +308,11 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
     @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
     def test_associate_all_by_ids_calls_update_unit_count(self, mock_ctrl, mock_repo):
         IDS = ('foo', 'bar', 'baz')
+        mock_ctrl.associate_units_by_id.return_value = (len(IDS), 0)
         self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
         mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', len(IDS))
+        self.assertEqual(list(mock_ctrl.associate_units_by_id.call_args[0][1]),
+                         [('type-1', 'foo'), ('type-1', 'bar'), ('type-1', 'baz')])
 
     @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
     def test_associate_all_by_id_calls_update_last_unit_added(self, mock_ctrl, mock_repo_qs):
@@ -321,6 +326,7 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         get counted once.
         """
         IDS = ('foo', 'bar', 'foo')
+        mock_ctrl.associate_units_by_id.return_value = (2, 1)
 
         self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
         mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', 2)
@@ -83,6 +83,11 @@ class UnitAssociationQueryTests(base.PulpServerTests):
 
     def setUp(self):
         super(UnitAssociationQueryTests, self).setUp()
+        # the test types are only defined in the types database
+        patcher = mock.patch('pulp.server.managers.content.cud.plugin_api.get_unit_model_by_id',
+                             return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         database.update_database(_QUERY_TYPES)
         self.manager = association_query_manager.RepoUnitAssociationQueryManager()
         self.association_manager = association_manager.RepoUnitAssociationManager()
@@ -1042,6 +1042,51 @@ class TestConsumerProfilesView(unittest.TestCase):
         mock_redirect.assert_called_once_with(mock_resp.return_value, expected_cont['_href'])
         self.assertTrue(response is mock_redirect.return_value)
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.consumers.generate_json_response')
+    @mock.patch('pulp.server.webservices.views.consumers.factory')
+    def test_create_consumer_profile_hash(self, mock_factory, mock_resp):
+        """
+        Test checking whether a consumer profile needs to be uploaded
+        """
+        mock_manager = mock_factory.consumer_profile_manager.return_value
+        mock_manager.is_current.return_value = True
+
+        request = mock.MagicMock()
+        request.body = json.dumps({'content_type': 'rpm', 'profile_hash': 'abc'})
+        consumer_profiles = ConsumerProfilesView()
+        response = consumer_profiles.post(request, 'test-consumer')
+
+        mock_factory.consumer_manager.return_value.get_consumer.assert_called_once_with(
+            'test-consumer')
+        mock_manager.is_current.assert_called_once_with('test-consumer', 'rpm', 'abc')
+        self.assertFalse(mock_manager.create.called)
+        mock_resp.assert_called_once_with({'current': True})
+        self.assertTrue(response is mock_resp.return_value)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.consumers.generate_json_response')
+    @mock.patch('pulp.server.webservices.views.consumers.factory.consumer_profile_manager')
+    def test_create_consumer_profile_delta(self, mock_profile, mock_resp):
+        """
+        Test updating a consumer profile with a delta
+        """
+        mock_profile.return_value.merge.return_value = None
+        delta = {'added': [{'name': 'zsh'}], 'removed': []}
+
+        request = mock.MagicMock()
+        request.body = json.dumps({'content_type': 'rpm', 'profile_hash': 'abc',
+                                   'base_hash': 'xyz', 'delta': delta})
+        consumer_profiles = ConsumerProfilesView()
+        response = consumer_profiles.post(request, 'test-consumer')
+
+        mock_profile.return_value.merge.assert_called_once_with('test-consumer', 'rpm', delta,
+                                                                'xyz', 'abc')
+        mock_resp.assert_called_once_with({'current': False})
+        self.assertTrue(response is mock_resp.return_value)
+
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_CREATE())
     @mock.patch('pulp.server.webservices.views.consumers.factory.consumer_profile_manager')
@@ -1173,8 +1218,8 @@ class TestConsumerQueryContentApplicabilityView(unittest.TestCase):
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
     @mock.patch(
-        'pulp.server.webservices.views.consumers.generate_json_response_with_pulp_encoder')
-    @mock.patch('pulp.server.webservices.views.consumers.retrieve_consumer_applicability')
+        'pulp.server.webservices.views.consumers.generate_json_stream_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.consumers.iter_consumer_applicability')
     @mock.patch('pulp.server.webservices.views.consumers.ConsumerContentApplicabilityView')
     def test_query_consumer_content_applic(self, mock_criteria_types, mock_applic, mock_resp):
         """
@@ -3,6 +3,7 @@ This module contains tests for the pulp.server.webservices.views.tasks module.
 """
 import mock
 
+from bson.objectid import ObjectId
 from mongoengine.queryset import DoesNotExist
 
 from .base import assert_auth_DELETE, assert_auth_READ
@@ -11,8 +12,8 @@ from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db import model
 from pulp.server.exceptions import MissingResource
 from pulp.server.webservices.views import util
-from pulp.server.webservices.views.tasks import (TaskCollectionView, TaskResourceView,
-                                                 TaskSearchView, task_serializer)
+from pulp.server.webservices.views.tasks import (MAX_PAGE_SIZE, TaskCollectionView,
+                                                 TaskResourceView, TaskSearchView, task_serializer)
 
 
 @mock.patch('pulp.server.webservices.views.tasks.serial_dispatch')
@@ -36,6 +37,19 @@ def test_task_serializer(mock_seralization):
                              "Task: {}, \nExpected Task: {}".format(serialized_task, expected_task))
 
 
+def _mock_request(params):
+    """
+    Return a mock request with the given GET parameters.
+
+    :param params: parameter name -> list of values
+    :type  params: dict
+    """
+    mock_request = mock.MagicMock()
+    mock_request.GET.getlist.side_effect = lambda key: params.get(key, [])
+    mock_request.GET.get.side_effect = lambda key, default=None: params.get(key, [default])[-1]
+    return mock_request
+
+
 class TestTaskSearchView(unittest.TestCase):
     """
     Test the TaskSearchView class.
@@ -65,8 +79,7 @@ class TestTaskCollection(unittest.TestCase):
         Test get task_collection with tags.
         """
 
-        mock_request = mock.MagicMock()
-        mock_request.GET.getlist.return_value = ['mock_tag_1', 'mock_tag_2']
+        mock_request = _mock_request({'tag': ['mock_tag_1', 'mock_tag_2']})
         mock_task_status.objects.return_value = ['mock_1', 'mock_2']
         mock_task_serializer.side_effect = lambda x: x
 
@@ -89,8 +102,7 @@ class TestTaskCollection(unittest.TestCase):
         Test get task_collection with no tags.
         """
 
-        mock_request = mock.MagicMock()
-        mock_request.GET.getlist.return_value = []
+        mock_request = _mock_request({})
         mock_task_status.objects.return_value = ['mock_1', 'mock_2']
         mock_task_serializer.side_effect = lambda x: x
 
@@ -102,6 +114,112 @@ class TestTaskCollection(unittest.TestCase):
         mock_task_serializer.assert_has_calls([mock.call('mock_1'), mock.call('mock_2')])
         self.assertTrue(response is mock_resp.return_value)
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_filters(self, mock_resp, mock_task_status,
+                                         mock_task_serializer):
+        """
+        Test get task_collection filtered by state and start time.
+        """
+        mock_request = _mock_request({'state': ['running', 'waiting'],
+                                      'started_after': ['2016-01-01T10:00:00+02:00'],
+                                      'started_before': ['2016-01-02T00:00:00']})
+        mock_task_status.objects.return_value = ['mock_1']
+        mock_task_serializer.side_effect = lambda x: x
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.assert_called_once_with(
+            group_id=None, state__in=['running', 'waiting'],
+            start_time__gte='2016-01-01T08:00:00Z', start_time__lt='2016-01-02T00:00:00Z')
+        mock_resp.assert_called_once_with(['mock_1'])
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_grouped(self, mock_resp, mock_task_status,
+                                         mock_task_serializer):
+        """
+        Test get task_collection including the tasks that belong to a task group.
+        """
+        mock_request = _mock_request({'grouped': ['true']})
+        mock_task_status.objects.return_value = ['mock_1']
+        mock_task_serializer.side_effect = lambda x: x
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.assert_called_once_with()
+        mock_resp.assert_called_once_with(['mock_1'])
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_page(self, mock_resp, mock_task_status, mock_task_serializer):
+        """
+        Test that a page of tasks is returned with a cursor to the next page, without the detail
+        fields.
+        """
+        mock_request = _mock_request({'limit': ['2'], 'after': ['56e1c5a6e779897c4ed2e4b2']})
+        queryset = mock_task_status.objects.return_value.exclude.return_value
+        queryset.order_by.return_value.limit.return_value = ['1', '2', '3']
+        mock_task_serializer.side_effect = lambda x: {'id': x, 'progress_report': {},
+                                                      'result': None}
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.assert_called_once_with(
+            group_id=None, id__gt=ObjectId('56e1c5a6e779897c4ed2e4b2'))
+        mock_task_status.objects.return_value.exclude.assert_called_once_with(
+            'progress_report', 'result')
+        queryset.order_by.assert_called_once_with('id')
+        queryset.order_by.return_value.limit.assert_called_once_with(3)
+        mock_resp.assert_called_once_with({'tasks': [{'id': '1'}, {'id': '2'}], 'next': '2'})
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_last_page(self, mock_resp, mock_task_status,
+                                           mock_task_serializer):
+        """
+        Test that the last page of tasks has no cursor, and includes the requested detail fields.
+        """
+        mock_request = _mock_request({'limit': ['5000'], 'include': ['progress_report']})
+        queryset = mock_task_status.objects.return_value.exclude.return_value
+        queryset.order_by.return_value.limit.return_value = ['1']
+        mock_task_serializer.side_effect = lambda x: {'id': x, 'progress_report': {},
+                                                      'result': None}
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.return_value.exclude.assert_called_once_with('result')
+        queryset.order_by.return_value.limit.assert_called_once_with(MAX_PAGE_SIZE + 1)
+        mock_resp.assert_called_once_with({'tasks': [{'id': '1', 'progress_report': {}}],
+                                           'next': None})
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    def test_get_task_collection_invalid(self, mock_task_status):
+        """
+        Test that invalid parameters are rejected.
+        """
+        for params in ({'state': ['sleeping']}, {'started_after': ['yesterday']},
+                       {'limit': ['ten']}, {'limit': ['0']},
+                       {'limit': ['10'], 'after': ['not-an-id']},
+                       {'limit': ['10'], 'include': ['error']}):
+            self.assertRaises(pulp_exceptions.InvalidValue, TaskCollectionView().get,
+                              _mock_request(params))
+        self.assertFalse(mock_task_status.objects.called)
+
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_DELETE())
     @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
@@ -2,7 +2,7 @@ import httplib
 import json
 import mock
 
-from django.http import HttpResponse, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
 
 from pulp.common.compat import unittest
 from pulp.server.exceptions import InputEncodingError, PulpCodedValidationException
@@ -58,6 +58,37 @@ class TestResponseGenerators(unittest.TestCase):
         util.generate_json_response_with_pulp_encoder(test_content)
         mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
 
+    def test_generate_json_stream_response(self):
+        """
+        Make sure that the items are streamed as a JSON array.
+        """
+        test_content = [{'foo': 'bar'}, {'foo': 'baz'}]
+        response = util.generate_json_stream_response(iter(test_content))
+        self.assertTrue(isinstance(response, StreamingHttpResponse))
+        self.assertEqual(response.status_code, httplib.OK)
+        self.assertEqual(response._headers.get('content-type'),
+                         ('Content-Type', 'application/json; charset=utf-8'))
+        response_content = json.loads(''.join(response.streaming_content))
+        self.assertEqual(response_content, test_content)
+
+    def test_generate_json_stream_response_empty(self):
+        """
+        Make sure that no items are streamed as an empty JSON array.
+        """
+        response = util.generate_json_stream_response(iter([]))
+        self.assertEqual(json.loads(''.join(response.streaming_content)), [])
+
+    @mock.patch('pulp.server.webservices.views.util.json')
+    def test_generate_json_stream_response_with_pulp_encoder(self, mock_json):
+        """
+        Ensure that the shortcut function uses the specified encoder.
+        """
+        mock_json.dumps.return_value = ''
+        test_content = {'foo': 'bar'}
+        response = util.generate_json_stream_response_with_pulp_encoder([test_content])
+        list(response.streaming_content)
+        mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
+
     @mock.patch('pulp.server.webservices.views.util.iri_to_uri')
     def test_generate_redirect_response(self, mock_iri_to_uri):
         """
@@ -0,0 +1,379 @@
+"""
+Local caching of content served by the streamer.
+
+Concurrent requests for the same catalog path are coalesced: the first request downloads
+the content once and writes it to a spool file, and every other request streams from that
+file as it grows. Completed downloads are kept on disk in a size-bounded LRU cache so
+repeat requests are served without contacting the upstream server.
+
+The importers and unit keys needed to start a download are also cached for a short time,
+so a request does not have to load them from the database again.
+"""
+
+from collections import namedtuple, OrderedDict
+from gettext import gettext as _
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from pulp.plugins.loader import api as plugins_api
+from pulp.plugins.loader.exceptions import PluginNotFound
+from pulp.server.controllers import repository as repo_controller
+from pulp.server.db import model
+
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks read from spooled and cached files
+READ_CHUNK_SIZE = 65536
+
+# Maximum number of unit keys held by an ImporterCache
+UNIT_KEY_CACHE_SIZE = 10000
+
+# A completed download held in the cache
+CacheEntry = namedtuple('CacheEntry', ('path', 'headers', 'size'))
+
+
+class Spool(object):
+    """
+    A file that a single download is written to while any number of readers stream it.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path of the spool file to create.
+        :type  path: str
+        """
+        self.path = path
+        self.headers = {}
+        self.size = 0
+        self.streaming = False
+        self.complete = False
+        self.succeeded = False
+        self._condition = threading.Condition()
+        self._file = open(path, 'wb')
+
+    def set_headers(self, headers):
+        """
+        Record the response headers sent to the client that started the download.
+
+        The headers are reported before the upstream response code is checked, so readers
+        only start streaming once content is written, or the download succeeded.
+
+        :param headers: The response headers.
+        :type  headers: dict
+        """
+        with self._condition:
+            self.headers = dict(headers)
+
+    def write(self, data):
+        """
+        Append data to the spool and wake up any waiting readers.
+
+        :param data: The data to write.
+        :type  data: str
+        """
+        self._file.write(data)
+        self._file.flush()
+        with self._condition:
+            self.size += len(data)
+            self.streaming = True
+            self._condition.notify_all()
+
+    def finish(self):
+        """
+        Close the spool file. Readers stop once they have read everything written.
+        """
+        self._file.close()
+        with self._condition:
+            self.complete = True
+            self._condition.notify_all()
+
+    def wait_for_headers(self):
+        """
+        Block until the download either starts sending content or fails.
+
+        :return: True if the content can be streamed from the spool, False if the download
+                 failed before any content was sent.
+        :rtype:  bool
+        """
+        with self._condition:
+            while not (self.streaming or self.complete):
+                self._condition.wait()
+            return self.succeeded or not self.complete
+
+    def read(self, fp):
+        """
+        Generate the content of the spool, blocking as needed until the download completes.
+
+        :param fp: A file opened for reading on the spool path.
+        :type  fp: file
+
+        :return: A generator of data chunks.
+        :rtype:  generator
+        """
+        offset = 0
+        while True:
+            with self._condition:
+                while offset >= self.size and not self.complete:
+                    self._condition.wait()
+                available = self.size - offset
+            if available <= 0:
+                return
+            data = fp.read(min(available, READ_CHUNK_SIZE))
+            offset += len(data)
+            yield data
+
+
+class StreamerCache(object):
+    """
+    Tracks in-flight downloads by catalog path and keeps completed downloads in a
+    size-bounded LRU cache on disk.
+
+    The cache index is held in memory, so any files left in the cache directory by a
+    previous run are removed when the cache is created.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        """
+        :param cache_dir: Directory used for spool and cache files.
+        :type  cache_dir: str
+        :param max_size:  Maximum number of bytes kept in the cache; 0 disables caching of
+                          completed downloads, but concurrent requests are still coalesced.
+        :type  max_size:  int
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._entries = OrderedDict()
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def checkout(self, path):
+        """
+        Find the content for a catalog path.
+
+        The returned tuple is one of:
+
+          * (CacheEntry, file) when the content is cached.
+          * (Spool, file) when another request is downloading the content.
+          * (Spool, None) when the caller must download the content, writing it to the
+            returned spool, and then call `checkin`.
+
+        Any returned file is open for reading and must be closed by the caller.
+
+        :param path: The catalog path being requested.
+        :type  path: str
+
+        :return: A tuple of the content source and an open file, or None.
+        :rtype:  tuple
+        """
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._entries[path] = entry
+                self.hits += 1
+                return entry, open(entry.path, 'rb')
+            spool = self._in_flight.get(path)
+            if spool is not None:
+                self.coalesced += 1
+                return spool, open(spool.path, 'rb')
+            self.misses += 1
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            spool = Spool(os.path.join(self.cache_dir, str(uuid.uuid4())))
+            self._in_flight[path] = spool
+            return spool, None
+
+    def lookup(self, path):
+        """
+        Find the cache entry or in-flight spool for a catalog path without opening it
+        or counting it as a hit.
+
+        :param path: The catalog path being requested.
+        :type  path: str
+
+        :return: The cache entry or spool, or None if the path is not cached or being
+                 downloaded.
+        :rtype:  CacheEntry or Spool
+        """
+        with self._lock:
+            return self._entries.get(path) or self._in_flight.get(path)
+
+    def checkin(self, path, spool):
+        """
+        Finish the download of a catalog path. The spool is added to the cache if the
+        download succeeded and it fits, otherwise it is removed.
+
+        :param path:  The catalog path that was downloaded.
+        :type  path:  str
+        :param spool: The spool returned by `checkout`.
+        :type  spool: Spool
+        """
+        spool.finish()
+        with self._lock:
+            self._in_flight.pop(path, None)
+            if spool.succeeded and self.max_size and spool.size <= self.max_size:
+                self._discard(path)
+                self._entries[path] = CacheEntry(spool.path, spool.headers, spool.size)
+                self.size += spool.size
+                while self.size > self.max_size:
+                    self._discard(next(iter(self._entries)))
+            else:
+                self._unlink(spool.path)
+        logger.debug(_('Streamer cache: {hits} hits, {misses} misses, {coalesced} coalesced, '
+                       '{size} bytes cached.').format(**self.stats()))
+
+    def stats(self):
+        """
+        :return: The cache counters and the number of bytes currently cached.
+        :rtype:  dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                'size': self.size}
+
+    def _discard(self, path):
+        """
+        Remove a catalog path from the cache. The caller must hold the lock.
+
+        :param path: The catalog path to remove.
+        :type  path: str
+        """
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry.size
+            self._unlink(entry.path)
+
+    @staticmethod
+    def _unlink(path):
+        """
+        Remove a file. Readers holding the file open can continue to read it.
+
+        :param path: The absolute path of the file to remove.
+        :type  path: str
+        """
+        try:
+            os.unlink(path)
+        except OSError, e:
+            logger.warning(_('Could not remove {path}: {error}').format(path=path, error=e))
+
+
+class ImporterCache(object):
+    """
+    Caches, for a limited time, the importer plugin and database importer needed to build a
+    downloader, keyed by importer id, and unit keys, keyed by unit id.
+
+    When a cached importer expires, it is only reloaded if the `last_updated` timestamp of
+    its database document changed in the meantime.
+    """
+
+    def __init__(self, ttl, max_unit_keys=UNIT_KEY_CACHE_SIZE):
+        """
+        :param ttl:           Number of seconds an entry is used before it is checked again.
+        :type  ttl:           int
+        :param max_unit_keys: Maximum number of unit keys to hold.
+        :type  max_unit_keys: int
+        """
+        self.ttl = ttl
+        self.max_unit_keys = max_unit_keys
+        self._lock = threading.Lock()
+        self._importers = {}
+        self._unit_keys = OrderedDict()
+
+    def get_importer(self, importer_id):
+        """
+        Get the importer plugin and the database importer, with the full plugin and
+        repository configuration flattened onto its `config` attribute.
+
+        :param importer_id: The document ID of the importer.
+        :type  importer_id: str
+
+        :return: A tuple of (pulp.plugins.importer.Importer, pulp.server.db.model.Importer)
+        :rtype:  tuple
+
+        :raise pulp.plugins.loader.exceptions.PluginNotFound: not found.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._importers.get(importer_id)
+        if cached is not None:
+            expires, plugin_importer, db_importer = cached
+            if now < expires:
+                return plugin_importer, db_importer
+            if self._last_updated(importer_id) == db_importer.last_updated:
+                with self._lock:
+                    self._importers[importer_id] = (now + self.ttl, plugin_importer, db_importer)
+                return plugin_importer, db_importer
+
+        plugin_importer, config, db_importer = repo_controller.get_importer_by_id(importer_id)
+        # The database importer only contains the repository configuration, while ``config``
+        # contains the repository configuration _and_ the plugin-wide configuration.
+        db_importer.config = config.flatten()
+        with self._lock:
+            self._importers[importer_id] = (now + self.ttl, plugin_importer, db_importer)
+        return plugin_importer, db_importer
+
+    def get_unit_key(self, unit_type_id, unit_id):
+        """
+        Get the unit key of a content unit.
+
+        :param unit_type_id: The content type of the unit.
+        :type  unit_type_id: str
+        :param unit_id:      The ID of the unit.
+        :type  unit_id:      str
+
+        :return: The unit key.
+        :rtype:  dict
+
+        :raise mongoengine.DoesNotExist: the unit is not in the database.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._unit_keys.pop(unit_id, None)
+            if cached is not None and now < cached[0]:
+                self._unit_keys[unit_id] = cached
+                return cached[1]
+
+        unit_model = plugins_api.get_unit_model_by_id(unit_type_id)
+        qs = unit_model.objects.filter(id=unit_id).only(*unit_model.unit_key_fields)
+        unit_key = qs.get().unit_key
+        with self._lock:
+            self._unit_keys[unit_id] = (now + self.ttl, unit_key)
+            while len(self._unit_keys) > self.max_unit_keys:
+                self._unit_keys.popitem(last=False)
+        return unit_key
+
+    def warm(self, repo_ids):
+        """
+        Load the importers of the given repositories into the cache.
+
+        :param repo_ids: IDs of the repositories whose importers should be loaded.
+        :type  repo_ids: list of str
+        """
+        for importer in model.Importer.objects(repo_id__in=repo_ids).only('id', 'repo_id'):
+            try:
+                self.get_importer(str(importer.id))
+            except PluginNotFound:
+                logger.warning(_('The importer for repository {repo} references a plugin '
+                                 'which is not valid.').format(repo=importer.repo_id))
+
+    @staticmethod
+    def _last_updated(importer_id):
+        """
+        :param importer_id: The document ID of the importer.
+        :type  importer_id: str
+
+        :return: The time the importer was last updated, or None if it no longer exists.
+        :rtype:  datetime.datetime
+        """
+        importer = model.Importer.objects(id=importer_id).only('last_updated').first()
+        if importer is not None:
+            return importer.last_updated
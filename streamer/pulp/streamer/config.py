@@ -9,6 +9,11 @@ DEFAULT_VALUES = {
         'port': '8751',
         'interfaces': 'localhost',
         'cache_timeout': '86400',
+        'cache_dir': '/var/cache/pulp/streamer',
+        'cache_size': '1024',
+        'importer_cache_ttl': '60',
+        'high_water_mark': '1024',
+        'warm_repositories': '',
     },
 }
 
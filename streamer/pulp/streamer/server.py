@@ -1,23 +1,26 @@
 from gettext import gettext as _
-from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR, SERVICE_UNAVAILABLE
+from httplib import (NOT_FOUND, INTERNAL_SERVER_ERROR, PARTIAL_CONTENT,
+                     REQUESTED_RANGE_NOT_SATISFIABLE, SERVICE_UNAVAILABLE)
 from urlparse import urlparse
 import logging
+import threading
 
 from mongoengine import DoesNotExist, NotUniqueError
 from nectar import listener as nectar_listener
 import requests
-from twisted.internet import reactor
+from twisted.internet import interfaces, reactor
 from twisted.web import resource
 from twisted.web.server import NOT_DONE_YET
+from zope.interface import implementer
 
-from pulp.plugins.loader import api as plugins_api
 from pulp.server.constants import PULP_STREAM_REQUEST_HEADER
 from pulp.server.content.sources import container as content_container
 from pulp.server.content.sources import model as content_models
 from pulp.server.db import model
-from pulp.server.controllers import repository as repo_controller
 from pulp.plugins.loader.exceptions import PluginNotFound
 from pulp.streamer import adapters as pulp_adapters
+from pulp.streamer.cache import (READ_CHUNK_SIZE, CacheEntry, ImporterCache, Spool,
+                                 StreamerCache)
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +42,70 @@ HOP_BY_HOP_HEADERS = [
     'upgrade',
 ]
 
+# The default number of bytes a Responder lets the reactor buffer for a client
+HIGH_WATER_MARK = 1024 * 1024
+
+
+class UnsatisfiableRange(Exception):
+    """
+    Raised when none of the bytes requested by a Range header exist in the content.
+    """
+    pass
+
+
+def parse_range(header, size):
+    """
+    Parse the value of a Range request header. Only a single byte range is supported;
+    anything else is ignored, as permitted by RFC 7233, and the full content is served.
+
+    :param header: The value of the Range header.
+    :type  header: str
+    :param size:   The size of the content in bytes.
+    :type  size:   int
+
+    :return: The first and last byte positions requested, inclusive, or None if the
+             header should be ignored.
+    :rtype:  tuple
+
+    :raise UnsatisfiableRange: the range starts after the end of the content.
+    """
+    unit, _sep, byte_range = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in byte_range:
+        return None
+    first, sep, last = byte_range.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix_length = int(last)
+            if suffix_length <= 0 or size == 0:
+                raise UnsatisfiableRange()
+            return max(size - suffix_length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if last and start > end:
+        return None
+    if start >= size:
+        raise UnsatisfiableRange()
+    return start, min(end, size - 1)
+
+
+def cache_control_header(streamer_config):
+    """
+    Build the cache-control header sent with content, using the max-age from the
+    streamer configuration.
+
+    :param streamer_config: The configuration for this streamer instance.
+    :type  streamer_config: ConfigParser.SafeConfigParser
+
+    :return: The value of the cache-control header.
+    :rtype:  str
+    """
+    max_age = {'max_age': streamer_config.get('streamer', 'cache_timeout')}
+    return 'public, s-maxage=%(max_age)s, max-age=%(max_age)s' % max_age
+
 
 class StreamerListener(nectar_listener.DownloadEventListener):
     """
@@ -48,7 +115,7 @@ class StreamerListener(nectar_listener.DownloadEventListener):
     streamer configuration file.
     """
 
-    def __init__(self, request, streamer_config, catalog_entry, pulp_request=False):
+    def __init__(self, request, streamer_config, catalog_entry, pulp_request=False, spool=None):
         """
         Initialize a StreamerNectarListener.
 
@@ -60,12 +127,15 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         :type  catalog_entry:   pulp.server.db.model.LazyCatalogEntry
         :param pulp_request:    True if this request originated from Pulp.
         :type  pulp_request:    bool
+        :param spool:           The spool the download is written to, if any.
+        :type  spool:           pulp.streamer.cache.Spool
         """
         super(StreamerListener, self).__init__()
         self.request = request
         self.streamer_config = streamer_config
         self.catalog_entry = catalog_entry
         self.pulp_request = pulp_request
+        self.spool = spool
 
     def download_headers(self, report):
         """
@@ -77,14 +147,19 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         :param report: The download report for this request.
         :type  report: nectar.report.DownloadReport
         """
+        headers = {}
         for header_key, header_value in report.headers.items():
             if header_key.lower() not in HOP_BY_HOP_HEADERS:
+                headers[header_key] = header_value
                 self.request.setHeader(header_key, header_value)
 
-        max_age = {'max_age': self.streamer_config.get('streamer', 'cache_timeout')}
-        cache_header = 'public, s-maxage=%(max_age)s, max-age=%(max_age)s' % max_age
+        cache_header = cache_control_header(self.streamer_config)
+        headers['Cache-Control'] = cache_header
         self.request.setHeader('Cache-Control', cache_header)
 
+        if self.spool is not None:
+            self.spool.set_headers(headers)
+
     def download_failed(self, report):
         """
         Perform cleanup on failed downloads. Specifically, Nectar does not download
@@ -113,6 +188,8 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         :param report: The download report for this request.
         :type  report: nectar.report.DownloadReport
         """
+        if self.spool is not None:
+            self.spool.succeeded = True
         if not self.pulp_request:
             try:
                 download = model.DeferredDownload(
@@ -143,6 +220,14 @@ class Streamer(resource.Resource):
         """
         resource.Resource.__init__(self)
         self.config = config
+        cache_size = config.getint('streamer', 'cache_size') * 1024 * 1024
+        self.cache = StreamerCache(config.get('streamer', 'cache_dir'), cache_size)
+        self.high_water_mark = config.getint('streamer', 'high_water_mark') * 1024
+        self.importer_cache = ImporterCache(config.getint('streamer', 'importer_cache_ttl'))
+        warm_repositories = config.get('streamer', 'warm_repositories')
+        if warm_repositories:
+            repo_ids = [repo_id.strip() for repo_id in warm_repositories.split(',')]
+            self.importer_cache.warm([repo_id for repo_id in repo_ids if repo_id])
         # Used to pool TCP connections for upstream requests. Once requests #2863 is
         # fixed and available, remove the PulpHTTPAdapter. This is a short-term work-around
         # to avoid carrying the package.
@@ -169,34 +254,165 @@ class Streamer(resource.Resource):
         reactor.callInThread(self._handle_get, request)
         return NOT_DONE_YET
 
-    def _handle_get(self, request):
+    def render_HEAD(self, request):
+        """
+        Handle HEAD requests to this web resource.
+
+        The headers are answered from the local cache when the content is cached or
+        being downloaded; otherwise the unit catalog is only checked for the path. A
+        download is never started.
+
+        :param request: the request to process.
+        :type  request: twisted.web.server.Request
+        """
+        reactor.callInThread(self._handle_head, request)
+        return NOT_DONE_YET
+
+    def _handle_head(self, request):
         """
-        Download the requested content using the content unit catalog and dispatch
-        a celery task that causes Pulp to download the newly cached unit.
+        Answer a HEAD request without downloading the content.
 
         :param request: The content request.
         :type  request: twisted.web.server.Request
         """
         catalog_path = urlparse(request.uri).path
-        with Responder(request) as responder:
+        with Responder(request):
+            source = self.cache.lookup(catalog_path)
+            if source is not None and source.headers:
+                for header_key, header_value in source.headers.items():
+                    request.setHeader(header_key, header_value)
+                if isinstance(source, CacheEntry):
+                    request.setHeader('Content-Length', str(source.size))
+                    request.setHeader('Accept-Ranges', 'bytes')
+                return
             try:
                 catalog_entry = model.LazyCatalogEntry.objects(
-                    path=catalog_path).order_by('importer_id').first()
-                if not catalog_entry:
-                    raise DoesNotExist()
-                self._download(catalog_entry, request, responder)
-            except DoesNotExist:
-                logger.error(_('Failed to find a catalog entry with path'
-                               ' "{rel}".'.format(rel=catalog_path)))
-                request.setResponseCode(NOT_FOUND)
-            except PluginNotFound:
-                msg = _('Catalog entry for {rel} references a plugin id'
-                        ' which is not valid.')
-                logger.error(msg.format(rel=catalog_path))
-                request.setResponseCode(INTERNAL_SERVER_ERROR)
+                    path=catalog_path).only('path').first()
             except Exception:
                 logger.exception(_('An unexpected error occurred while handling the request.'))
                 request.setResponseCode(INTERNAL_SERVER_ERROR)
+                return
+            if catalog_entry is None:
+                request.setResponseCode(NOT_FOUND)
+                request.setHeader('Content-Length', '0')
+            else:
+                request.setHeader('Cache-Control', cache_control_header(self.config))
+
+    def _handle_get(self, request):
+        """
+        Serve the requested content from the local cache or from a download already
+        in progress for another request. Otherwise, download the requested content using
+        the content unit catalog and dispatch a celery task that causes Pulp to download
+        the newly cached unit.
+
+        Byte ranges are only served from the local cache or from a download in progress.
+        When neither has the content, the whole file is sent so that it gets cached and
+        a resumed request can then be satisfied locally.
+
+        :param request: The content request.
+        :type  request: twisted.web.server.Request
+        """
+        catalog_path = urlparse(request.uri).path
+        with Responder(request, high_water_mark=self.high_water_mark) as responder:
+            source, cached_file = self.cache.checkout(catalog_path)
+            if cached_file is not None:
+                with cached_file:
+                    if self._stream_local(source, cached_file, request, responder):
+                        return
+                # The download this request joined failed before sending any content,
+                # so make an attempt of our own that does not go through the cache.
+                self._fetch(catalog_path, request, responder)
+                return
+            # This request downloads the content for everyone, so spool what it sends.
+            responder.spool = source
+            try:
+                self._fetch(catalog_path, request, responder)
+            finally:
+                self.cache.checkin(catalog_path, source)
+
+    def _stream_local(self, source, cached_file, request, responder):
+        """
+        Stream content that is cached or being downloaded by another request.
+
+        :param source:      The cache entry or in-flight spool the content comes from.
+        :type  source:      pulp.streamer.cache.CacheEntry or pulp.streamer.cache.Spool
+        :param cached_file: The content file, open for reading.
+        :type  cached_file: file
+        :param request:     The client content request.
+        :type  request:     twisted.web.server.Request
+        :param responder:   The file-like object the content is written to.
+        :type  responder:   Responder
+
+        :return: True if the content was streamed, False if the download being joined
+                 failed before sending any content.
+        :rtype:  bool
+        """
+        if isinstance(source, Spool):
+            if not source.wait_for_headers():
+                return False
+            chunks = source.read(cached_file)
+            size = None
+            for header_key, header_value in source.headers.items():
+                if header_key.lower() == 'content-length':
+                    size = int(header_value)
+        else:
+            chunks = iter(lambda: cached_file.read(READ_CHUNK_SIZE), '')
+            size = source.size
+
+        byte_range = None
+        range_header = request.getHeader('range')
+        if range_header and size is not None:
+            try:
+                byte_range = parse_range(range_header, size)
+            except UnsatisfiableRange:
+                request.setResponseCode(REQUESTED_RANGE_NOT_SATISFIABLE)
+                request.setHeader('Content-Range', 'bytes */%d' % size)
+                request.setHeader('Content-Length', '0')
+                return True
+
+        for header_key, header_value in source.headers.items():
+            request.setHeader(header_key, header_value)
+        if size is not None:
+            request.setHeader('Accept-Ranges', 'bytes')
+        if byte_range is not None:
+            start, end = byte_range
+            request.setResponseCode(PARTIAL_CONTENT)
+            request.setHeader('Content-Range', 'bytes %d-%d/%d' % (start, end, size))
+            request.setHeader('Content-Length', str(end - start + 1))
+            chunks = _slice_chunks(chunks, start, end)
+        for data in chunks:
+            responder.write(data)
+        return True
+
+    def _fetch(self, catalog_path, request, responder):
+        """
+        Look up the catalog entry for a path and download its content.
+
+        :param catalog_path: The catalog path being requested.
+        :type  catalog_path: str
+        :param request:      The client content request.
+        :type  request:      twisted.web.server.Request
+        :param responder:    The file-like object the content is written to.
+        :type  responder:    Responder
+        """
+        try:
+            catalog_entry = model.LazyCatalogEntry.objects(
+                path=catalog_path).order_by('importer_id').first()
+            if not catalog_entry:
+                raise DoesNotExist()
+            self._download(catalog_entry, request, responder)
+        except DoesNotExist:
+            logger.error(_('Failed to find a catalog entry with path'
+                           ' "{rel}".'.format(rel=catalog_path)))
+            request.setResponseCode(NOT_FOUND)
+        except PluginNotFound:
+            msg = _('Catalog entry for {rel} references a plugin id'
+                    ' which is not valid.')
+            logger.error(msg.format(rel=catalog_path))
+            request.setResponseCode(INTERNAL_SERVER_ERROR)
+        except Exception:
+            logger.exception(_('An unexpected error occurred while handling the request.'))
+            request.setResponseCode(INTERNAL_SERVER_ERROR)
 
     def _download(self, catalog_entry, request, responder):
         """
@@ -211,32 +427,26 @@ class Streamer(resource.Resource):
         :param responder:       The file-like object that nectar should write to.
         :type  responder:       Responder
         """
-        # Configure the primary downloader for alternate content sources
-        plugin_importer, config, db_importer = repo_controller.get_importer_by_id(
+        # Configure the primary downloader for alternate content sources. The importer
+        # cache takes care of flattening the repository and plugin-wide configuration
+        # onto the db_importer.
+        plugin_importer, db_importer = self.importer_cache.get_importer(
             catalog_entry.importer_id)
-        # There is an unfortunate mess of configuration classes and attributes, and
-        # multiple "models" floating around. The MongoEngine class that corresponds
-        # to the database entry only contains the repository config. The ``config``
-        # variable above contains the repository configuration _and_ the plugin-wide
-        # configuration, so here we override the db_importer.config because it doesn't
-        # have the whole config. In the future the importer object should seemlessly
-        # load and apply the plugin-wide configuration.
-        db_importer.config = config.flatten()
         primary_downloader = plugin_importer.get_downloader_for_db_importer(
             db_importer, catalog_entry.url, working_dir='/tmp')
         pulp_request = request.getHeader(PULP_STREAM_REQUEST_HEADER)
-        listener = StreamerListener(request, self.config, catalog_entry, pulp_request)
+        listener = StreamerListener(request, self.config, catalog_entry, pulp_request,
+                                    responder.spool)
         primary_downloader.session = self.session
         primary_downloader.event_listener = listener
 
         # Build the alternate content source download request
-        unit_model = plugins_api.get_unit_model_by_id(catalog_entry.unit_type_id)
-        qs = unit_model.objects.filter(id=catalog_entry.unit_id).only(*unit_model.unit_key_fields)
         try:
-            unit = qs.get()
+            unit_key = self.importer_cache.get_unit_key(catalog_entry.unit_type_id,
+                                                        catalog_entry.unit_id)
             download_request = content_models.Request(
                 catalog_entry.unit_type_id,
-                unit.unit_key,
+                unit_key,
                 catalog_entry.url,
                 responder,
             )
@@ -254,20 +464,66 @@ class Streamer(resource.Resource):
             primary_downloader.config.finalize()
 
 
+def _slice_chunks(chunks, start, end):
+    """
+    Limit a stream of data chunks to a byte range.
+
+    :param chunks: The data chunks of the content, from its first byte.
+    :type  chunks: iterable of str
+    :param start:  The first byte position to generate.
+    :type  start:  int
+    :param end:    The last byte position to generate, inclusive.
+    :type  end:    int
+
+    :return: A generator of data chunks.
+    :rtype:  generator
+    """
+    offset = 0
+    for data in chunks:
+        chunk_end = offset + len(data)
+        if chunk_end > start:
+            yield data[max(start - offset, 0):end - offset + 1]
+        offset = chunk_end
+        if offset > end:
+            return
+
+
+@implementer(interfaces.IPushProducer)
 class Responder(object):
     """
     This class provides an object that can be provided to Nectar instead of a
     file which forwards all write calls to the Twisted Request.
+
+    The Responder is registered as the producer for the request, so sending data blocks
+    while Twisted has asked it to pause, or while more than the high water mark of data
+    is waiting to be written by the reactor. This keeps a slow client from making the
+    streamer buffer the whole file in memory.
+
+    When the Responder has a spool, writes only append to the spool and the client is
+    sent the spooled data by a thread of its own, so a slow client does not hold up the
+    download that other requests stream from the same spool.
     """
 
-    def __init__(self, request):
+    def __init__(self, request, spool=None, high_water_mark=HIGH_WATER_MARK):
         """
         Initialize a new Responder.
 
-        :param request: the request to forward the written data to.
-        :type  request: twisted.web.server.Request
+        :param request:         the request to forward the written data to.
+        :type  request:         twisted.web.server.Request
+        :param spool:           a spool that also receives the written data, if any.
+        :type  spool:           pulp.streamer.cache.Spool
+        :param high_water_mark: the number of bytes that may be waiting to be written
+                                to the request before writes block.
+        :type  high_water_mark: int
         """
         self.request = request
+        self.spool = spool
+        self.high_water_mark = high_water_mark
+        self.buffered = 0
+        self.paused = False
+        self.stopped = False
+        self._condition = threading.Condition()
+        self._delivery = None
 
     def __enter__(self):
         """
@@ -276,6 +532,7 @@ class Responder(object):
         :return: The instance of the class.
         :rtype:  Responder
         """
+        reactor.callFromThread(self.request.registerProducer, self, True)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -296,7 +553,12 @@ class Responder(object):
     def close(self):
         """
         Forward the call to close the 'file' to the request.finish method.
+
+        When the Responder has a spool, the spool must be finished first: the client is
+        sent everything that was spooled before the request is finished.
         """
+        if self._delivery is not None:
+            self._delivery.join()
         reactor.callFromThread(self.finish_wrapper)
 
     def finish_wrapper(self):
@@ -306,21 +568,101 @@ class Responder(object):
 
         If finish is called after the client disconnects, a RuntimeError is
         raised and Twisted logs the stack trace. Clients disconnecting before
-        Twisted gets around to calling ``finish`` is not uncommon. Ultimately
-        there should be a handler that stops streaming if the client disconnects,
-        but that is tricky with the current implementation's use of threads.
+        Twisted gets around to calling ``finish`` is not uncommon.
         """
         try:
+            self.request.unregisterProducer()
             self.request.finish()
         except RuntimeError as e:
             logger.debug(str(e))
 
     def write(self, data):
+        """
+        Forward the data to the client.
+
+        When the Responder has a spool, the data is appended to the spool without waiting
+        for the client, and the first write starts the thread that delivers the spool to
+        the client. Otherwise, the data is sent to the client directly.
+
+        :param data: A string to write to the response.
+        :type  data: str
+        """
+        if self.spool is None:
+            self._send(data)
+            return
+        self.spool.write(data)
+        if self._delivery is None:
+            self._delivery = threading.Thread(target=self._deliver, args=(self.spool,))
+            self._delivery.daemon = True
+            self._delivery.start()
+
+    def _deliver(self, spool):
+        """
+        Send the content of a spool to the client as it is written, until the spool is
+        finished or the client disconnects.
+
+        :param spool: The spool the content is written to.
+        :type  spool: pulp.streamer.cache.Spool
+        """
+        with open(spool.path, 'rb') as fp:
+            for data in spool.read(fp):
+                if self.stopped:
+                    return
+                self._send(data)
+
+    def _send(self, data):
         """
         Forward the data to the request.write method, which writes data to
         the transport (if not responding to a HEAD request).
 
+        This blocks while the transport is paused or the high water mark is reached.
+        Once the client disconnects, data is no longer sent.
+
+        :param data: A string to write to the response.
+        :type  data: str
+        """
+        with self._condition:
+            while not self.stopped and (
+                    self.paused or self.buffered and self.buffered >= self.high_water_mark):
+                self._condition.wait()
+            if self.stopped:
+                return
+            self.buffered += len(data)
+        reactor.callFromThread(self._write, data)
+
+    def _write(self, data):
+        """
+        Write data to the request. This must be called in the reactor thread.
+
         :param data: A string to write to the response.
         :type  data: str
         """
-        reactor.callFromThread(self.request.write, data)
+        try:
+            self.request.write(data)
+        finally:
+            with self._condition:
+                self.buffered -= len(data)
+                self._condition.notify_all()
+
+    def pauseProducing(self):
+        """
+        Called by Twisted when the transport's write buffer is full.
+        """
+        with self._condition:
+            self.paused = True
+
+    def resumeProducing(self):
+        """
+        Called by Twisted when the transport's write buffer has drained.
+        """
+        with self._condition:
+            self.paused = False
+            self._condition.notify_all()
+
+    def stopProducing(self):
+        """
+        Called by Twisted when the client connection is lost.
+        """
+        with self._condition:
+            self.stopped = True
+            self._condition.notify_all()
@@ -0,0 +1,295 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from mock import Mock, patch
+
+from pulp.common.compat import unittest
+from pulp.plugins.loader.exceptions import PluginNotFound
+from pulp.streamer.cache import CacheEntry, ImporterCache, Spool, StreamerCache
+
+
+MODULE_PREFIX = 'pulp.streamer.cache.'
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.spool = Spool(os.path.join(self.working_dir, 'spool'))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_read_complete(self):
+        """All data written before the spool is finished is read back."""
+        self.spool.write('abc')
+        self.spool.write('def')
+        self.spool.finish()
+
+        with open(self.spool.path, 'rb') as fp:
+            self.assertEqual(''.join(self.spool.read(fp)), 'abcdef')
+
+    def test_read_while_writing(self):
+        """A reader follows the spool as it grows until it is finished."""
+        fp = open(self.spool.path, 'rb')
+        result = []
+        reader = threading.Thread(target=lambda: result.extend(self.spool.read(fp)))
+        reader.start()
+
+        for data in ('a' * 10, 'b' * 10, 'c' * 10):
+            self.spool.write(data)
+        self.spool.finish()
+        reader.join(5)
+        fp.close()
+
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(''.join(result), 'a' * 10 + 'b' * 10 + 'c' * 10)
+
+    def test_wait_for_headers(self):
+        """Readers may stream once content is written."""
+        self.spool.set_headers({'Content-Type': 'x'})
+        self.spool.write('abc')
+        self.assertTrue(self.spool.wait_for_headers())
+        self.assertEqual(self.spool.headers, {'Content-Type': 'x'})
+
+    def test_wait_for_headers_failed_after_headers(self):
+        """Readers do not stream a download that failed after its headers were reported."""
+        self.spool.set_headers({'Content-Type': 'text/html', 'Content-Length': '512'})
+        self.assertFalse(self.spool.streaming)
+        self.spool.finish()
+        self.assertFalse(self.spool.wait_for_headers())
+
+    def test_wait_for_headers_failed(self):
+        """Readers do not stream a download that failed before sending content."""
+        self.spool.finish()
+        self.assertFalse(self.spool.wait_for_headers())
+
+    def test_wait_for_headers_succeeded(self):
+        """A successful download can be streamed even when no headers were reported."""
+        self.spool.succeeded = True
+        self.spool.finish()
+        self.assertTrue(self.spool.wait_for_headers())
+
+
+class TestStreamerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.working_dir, 'cache')
+        self.cache = StreamerCache(self.cache_dir, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _download(self, path, data, succeeded=True):
+        spool, fp = self.cache.checkout(path)
+        self.assertTrue(fp is None)
+        spool.write(data)
+        spool.succeeded = succeeded
+        self.cache.checkin(path, spool)
+        return spool
+
+    def test_init_removes_stale_files(self):
+        """Files left over from a previous run are removed."""
+        os.makedirs(self.cache_dir)
+        open(os.path.join(self.cache_dir, 'stale'), 'w').close()
+
+        StreamerCache(self.cache_dir, 10)
+
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'stale')))
+
+    def test_miss_then_hit(self):
+        """A completed download is served from the cache."""
+        spool = self._download('/a', 'abc')
+
+        entry, fp = self.cache.checkout('/a')
+        with fp:
+            self.assertEqual(fp.read(), 'abc')
+        self.assertEqual(entry, CacheEntry(spool.path, {}, 3))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'coalesced': 0,
+                                              'size': 3})
+
+    def test_lookup(self):
+        """Lookups find cached and in-flight content without counting a hit."""
+        self._download('/a', 'abc')
+        spool, fp = self.cache.checkout('/b')
+
+        self.assertEqual(self.cache.lookup('/a').size, 3)
+        self.assertTrue(self.cache.lookup('/b') is spool)
+        self.assertTrue(self.cache.lookup('/c') is None)
+        self.assertEqual(self.cache.hits, 0)
+        self.cache.checkin('/b', spool)
+
+    def test_coalesce(self):
+        """A request for a path being downloaded joins the download."""
+        spool, fp = self.cache.checkout('/a')
+
+        joined, joined_fp = self.cache.checkout('/a')
+        joined_fp.close()
+
+        self.assertTrue(joined is spool)
+        self.assertEqual(self.cache.coalesced, 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.cache.checkin('/a', spool)
+
+    def test_failed_download_not_cached(self):
+        """Failed downloads are discarded."""
+        spool = self._download('/a', 'abc', succeeded=False)
+
+        self.assertFalse(os.path.exists(spool.path))
+        new_spool, fp = self.cache.checkout('/a')
+        self.assertTrue(fp is None)
+        self.cache.checkin('/a', new_spool)
+
+    def test_too_large_not_cached(self):
+        """Downloads larger than the cache are discarded."""
+        spool = self._download('/a', 'x' * 11)
+
+        self.assertFalse(os.path.exists(spool.path))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_evicts_least_recently_used(self):
+        """The least recently used entries are evicted to keep the cache within its size."""
+        first = self._download('/a', 'aaaa')
+        second = self._download('/b', 'bbbb')
+        self.cache.checkout('/a')[1].close()
+
+        self._download('/c', 'cccc')
+
+        self.assertTrue(os.path.exists(first.path))
+        self.assertFalse(os.path.exists(second.path))
+        self.assertEqual(self.cache.size, 8)
+
+    def test_disabled(self):
+        """With a size of 0, nothing is kept but downloads are still coalesced."""
+        self.cache = StreamerCache(self.cache_dir, 0)
+        spool = self._download('/a', 'abc')
+
+        self.assertFalse(os.path.exists(spool.path))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_disabled_empty(self):
+        """With a size of 0, empty downloads are not cached either."""
+        self.cache = StreamerCache(self.cache_dir, 0)
+        spool = self._download('/a', '')
+
+        self.assertFalse(os.path.exists(spool.path))
+        new_spool, fp = self.cache.checkout('/a')
+        self.assertTrue(fp is None)
+        self.cache.checkin('/a', new_spool)
+
+    @patch(MODULE_PREFIX + 'logger')
+    @patch(MODULE_PREFIX + 'os.unlink')
+    def test_unlink_failure(self, mock_unlink, mock_logger):
+        """Failing to remove a file is logged."""
+        mock_unlink.side_effect = OSError('nope')
+        self._download('/a', 'abc', succeeded=False)
+        self.assertEqual(mock_logger.warning.call_count, 1)
+
+
+@patch(MODULE_PREFIX + 'time.time', Mock(return_value=100))
+@patch(MODULE_PREFIX + 'model')
+@patch(MODULE_PREFIX + 'repo_controller')
+class TestImporterCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ImporterCache(10)
+
+    def _set_importer(self, mock_repo_controller):
+        plugin_importer, config, db_importer = Mock(), Mock(), Mock()
+        mock_repo_controller.get_importer_by_id.return_value = (
+            plugin_importer, config, db_importer)
+        return plugin_importer, config, db_importer
+
+    def test_get_importer(self, mock_repo_controller, mock_model):
+        """The importer is loaded once and its configuration is flattened."""
+        plugin_importer, config, db_importer = self._set_importer(mock_repo_controller)
+
+        self.assertEqual(self.cache.get_importer('id'), (plugin_importer, db_importer))
+        self.assertEqual(self.cache.get_importer('id'), (plugin_importer, db_importer))
+
+        mock_repo_controller.get_importer_by_id.assert_called_once_with('id')
+        self.assertEqual(db_importer.config, config.flatten.return_value)
+        self.assertEqual(0, mock_model.Importer.objects.call_count)
+
+    def test_get_importer_expired_unchanged(self, mock_repo_controller, mock_model):
+        """An expired importer that has not been updated is reused."""
+        plugin_importer, config, db_importer = self._set_importer(mock_repo_controller)
+        self.cache.ttl = -1
+        self.cache.get_importer('id')
+        query_set = mock_model.Importer.objects.return_value.only.return_value
+        query_set.first.return_value.last_updated = db_importer.last_updated
+
+        self.assertEqual(self.cache.get_importer('id'), (plugin_importer, db_importer))
+
+        mock_repo_controller.get_importer_by_id.assert_called_once_with('id')
+        mock_model.Importer.objects.assert_called_once_with(id='id')
+        mock_model.Importer.objects.return_value.only.assert_called_once_with('last_updated')
+
+    def test_get_importer_expired_updated(self, mock_repo_controller, mock_model):
+        """An expired importer is reloaded once it has been updated."""
+        self._set_importer(mock_repo_controller)
+        self.cache.ttl = -1
+        self.cache.get_importer('id')
+
+        self.cache.get_importer('id')
+
+        self.assertEqual(2, mock_repo_controller.get_importer_by_id.call_count)
+
+    def test_get_importer_expired_deleted(self, mock_repo_controller, mock_model):
+        """An expired importer that no longer exists is not served."""
+        self._set_importer(mock_repo_controller)
+        self.cache.ttl = -1
+        self.cache.get_importer('id')
+        mock_model.Importer.objects.return_value.only.return_value.first.return_value = None
+        mock_repo_controller.get_importer_by_id.side_effect = PluginNotFound()
+
+        self.assertRaises(PluginNotFound, self.cache.get_importer, 'id')
+
+    @patch(MODULE_PREFIX + 'plugins_api')
+    def test_get_unit_key(self, mock_plugins_api, mock_repo_controller, mock_model):
+        """Unit keys are loaded once, with only the unit key fields."""
+        unit_model = mock_plugins_api.get_unit_model_by_id.return_value
+        unit_model.unit_key_fields = ('name', 'version')
+        query_set = unit_model.objects.filter.return_value.only.return_value
+
+        self.assertEqual(self.cache.get_unit_key('rpm', 'u1'), query_set.get.return_value.unit_key)
+        self.assertEqual(self.cache.get_unit_key('rpm', 'u1'), query_set.get.return_value.unit_key)
+
+        mock_plugins_api.get_unit_model_by_id.assert_called_once_with('rpm')
+        unit_model.objects.filter.assert_called_once_with(id='u1')
+        unit_model.objects.filter.return_value.only.assert_called_once_with('name', 'version')
+
+    @patch(MODULE_PREFIX + 'plugins_api')
+    def test_get_unit_key_evicts(self, mock_plugins_api, mock_repo_controller, mock_model):
+        """The least recently used unit keys are evicted."""
+        unit_model = mock_plugins_api.get_unit_model_by_id.return_value
+        unit_model.unit_key_fields = ()
+        self.cache.max_unit_keys = 2
+        self.cache.get_unit_key('rpm', 'u1')
+        self.cache.get_unit_key('rpm', 'u2')
+        self.cache.get_unit_key('rpm', 'u1')
+
+        self.cache.get_unit_key('rpm', 'u3')
+        self.cache.get_unit_key('rpm', 'u1')
+        self.cache.get_unit_key('rpm', 'u2')
+
+        self.assertEqual(4, unit_model.objects.filter.call_count)
+
+    @patch(MODULE_PREFIX + 'logger')
+    def test_warm(self, mock_logger, mock_repo_controller, mock_model):
+        """The importers of the requested repositories are loaded."""
+        self._set_importer(mock_repo_controller)
+        mock_model.Importer.objects.return_value.only.return_value = [
+            Mock(id='i1', repo_id='r1'), Mock(id='i2', repo_id='r2')]
+        mock_repo_controller.get_importer_by_id.side_effect = [
+            mock_repo_controller.get_importer_by_id.return_value, PluginNotFound()]
+
+        self.cache.warm(['r1', 'r2'])
+
+        mock_model.Importer.objects.assert_called_once_with(repo_id__in=['r1', 'r2'])
+        self.assertEqual(self.cache.get_importer('i1')[0],
+                         mock_repo_controller.get_importer_by_id.return_value[0])
+        self.assertEqual(1, mock_logger.warning.call_count)
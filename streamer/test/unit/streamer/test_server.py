@@ -1,17 +1,52 @@
-from httplib import INTERNAL_SERVER_ERROR, NOT_FOUND, SERVICE_UNAVAILABLE
-
-from mock import Mock, patch
-from mongoengine import NotUniqueError
+from httplib import (INTERNAL_SERVER_ERROR, NOT_FOUND, PARTIAL_CONTENT,
+                     REQUESTED_RANGE_NOT_SATISFIABLE, SERVICE_UNAVAILABLE)
+from io import BytesIO
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from mock import call, MagicMock, Mock, patch
+from mongoengine import DoesNotExist, NotUniqueError
 from twisted.web.server import Request
 
 from pulp.common.compat import unittest
 from pulp.plugins.loader.exceptions import PluginNotFound
 from pulp.streamer import Responder, StreamerListener, Streamer
+from pulp.streamer.cache import CacheEntry, Spool
+from pulp.streamer.server import parse_range, UnsatisfiableRange
 
 
 MODULE_PREFIX = 'pulp.streamer.server.'
 
 
+class TestParseRange(unittest.TestCase):
+
+    def test_range(self):
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+
+    def test_open_ended(self):
+        self.assertEqual(parse_range('bytes=10-', 100), (10, 99))
+
+    def test_end_past_size(self):
+        self.assertEqual(parse_range('bytes=10-1000', 100), (10, 99))
+
+    def test_suffix(self):
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-1000', 100), (0, 99))
+
+    def test_ignored(self):
+        """Ranges that are not a single valid byte range are ignored."""
+        for header in ('items=0-1', 'bytes=0-1,5-6', 'bytes=5', 'bytes=a-b', 'bytes=9-5'):
+            self.assertTrue(parse_range(header, 100) is None, header)
+
+    def test_unsatisfiable(self):
+        self.assertRaises(UnsatisfiableRange, parse_range, 'bytes=100-', 100)
+        self.assertRaises(UnsatisfiableRange, parse_range, 'bytes=-0', 100)
+        self.assertRaises(UnsatisfiableRange, parse_range, 'bytes=-5', 0)
+
+
 class TestStreamerListener(unittest.TestCase):
 
     def setUp(self):
@@ -86,6 +121,26 @@ class TestStreamerListener(unittest.TestCase):
                          self.listener.request.setHeader.call_args_list[0][0])
         self.listener.request.setResponseCode.assert_called_once_with(SERVICE_UNAVAILABLE)
 
+    def test_download_headers_spool(self):
+        """
+        The headers sent to the client are recorded on the spool.
+        """
+        self.listener.spool = Mock()
+        self.mock_report.headers = {'Content-Length': '1234', 'Connection': 'close'}
+
+        self.listener.download_headers(self.mock_report)
+        self.listener.spool.set_headers.assert_called_once_with({
+            'Content-Length': '1234',
+            'Cache-Control': 'public, s-maxage=1, max-age=1',
+        })
+
+    @patch(MODULE_PREFIX + 'model.DeferredDownload', Mock())
+    def test_download_succeeded_spool(self):
+        """Assert the spool is marked as succeeded."""
+        self.listener.spool = Mock(succeeded=False)
+        self.listener.download_succeeded(None)
+        self.assertTrue(self.listener.spool.succeeded)
+
     @patch(MODULE_PREFIX + 'model.DeferredDownload')
     def test_download_succeeded(self, mock_deferred_download):
         """Assert a deferred download entry is made."""
@@ -117,8 +172,41 @@ class TestStreamer(unittest.TestCase):
 
     def setUp(self):
         self.config = Mock()
-        self.streamer = Streamer(self.config)
+        self.config.getint.return_value = 0
+        self.config.get.return_value = ''
+        with patch(MODULE_PREFIX + 'StreamerCache'):
+            with patch(MODULE_PREFIX + 'ImporterCache'):
+                self.streamer = Streamer(self.config)
+        self.spool = Mock()
+        self.streamer.cache.checkout.return_value = (self.spool, None)
         self.request = Mock(spec=Request)
+        self.request.getHeader.return_value = None
+
+    @patch(MODULE_PREFIX + 'ImporterCache')
+    @patch(MODULE_PREFIX + 'StreamerCache')
+    def test_init_cache(self, mock_cache, mock_importer_cache):
+        """The caches are configured from the streamer configuration."""
+        self.config.reset_mock()
+        self.config.getint.return_value = 2
+
+        Streamer(self.config)
+
+        self.config.getint.assert_has_calls([call('streamer', 'cache_size'),
+                                             call('streamer', 'high_water_mark'),
+                                             call('streamer', 'importer_cache_ttl')])
+        mock_cache.assert_called_once_with(self.config.get.return_value, 2 * 1024 * 1024)
+        mock_importer_cache.assert_called_once_with(2)
+        self.assertEqual(0, mock_importer_cache.return_value.warm.call_count)
+
+    @patch(MODULE_PREFIX + 'ImporterCache')
+    @patch(MODULE_PREFIX + 'StreamerCache', Mock())
+    def test_init_warm_repositories(self, mock_importer_cache):
+        """The importers of the configured repositories are loaded at startup."""
+        self.config.get.return_value = 'repo1, repo2,'
+
+        Streamer(self.config)
+
+        mock_importer_cache.return_value.warm.assert_called_once_with(['repo1', 'repo2'])
 
     @patch(MODULE_PREFIX + 'reactor', autospec=True)
     def test_render_GET(self, mock_reactor):
@@ -154,15 +242,195 @@ class TestStreamer(unittest.TestCase):
         self.assertEqual(1, query_set.order_by('importer_id').first.call_count)
         mock_download.assert_called_once_with(mock_catalog, self.request,
                                               mock_enter.return_value)
+        self.assertTrue(mock_enter.return_value.spool is self.spool)
+        self.streamer.cache.checkin.assert_called_once_with('/a/resource', self.spool)
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    def test_handle_get_cached(self, mock_fetch):
+        """Cached content is served without downloading it."""
+        self.request.uri = '/a/resource?k=v'
+        entry = CacheEntry('/cache/file', {'Content-Type': 'x'}, 3)
+        cached_file = BytesIO('abc')
+        self.streamer.cache.checkout.return_value = (entry, cached_file)
+
+        self.streamer._handle_get(self.request)
+
+        self.assertEqual(0, mock_fetch.call_count)
+        self.assertEqual(0, self.streamer.cache.checkin.call_count)
+        self.request.setHeader.assert_has_calls([call('Content-Type', 'x'),
+                                                 call('Accept-Ranges', 'bytes')])
+        self.assertTrue(cached_file.closed)
+
+    @patch(MODULE_PREFIX + 'Responder.write')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    def test_handle_get_coalesced(self, mock_fetch, mock_write):
+        """Content being downloaded for another request is streamed from its spool."""
+        self.request.uri = '/a/resource?k=v'
+        spool = Mock(spec=Spool, headers={'Content-Type': 'x'})
+        spool.wait_for_headers.return_value = True
+        spool.read.return_value = iter(['ab', 'c'])
+        cached_file = MagicMock()
+        self.streamer.cache.checkout.return_value = (spool, cached_file)
+
+        self.streamer._handle_get(self.request)
+
+        self.assertEqual(0, mock_fetch.call_count)
+        spool.read.assert_called_once_with(cached_file)
+        self.assertEqual([call('ab'), call('c')], mock_write.call_args_list)
+        self.request.setHeader.assert_called_once_with('Content-Type', 'x')
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    def test_handle_get_coalesced_failed(self, mock_fetch):
+        """If the joined download fails before sending content, the request downloads it."""
+        self.request.uri = '/a/resource?k=v'
+        spool = Mock(spec=Spool)
+        spool.wait_for_headers.return_value = False
+        self.streamer.cache.checkout.return_value = (spool, MagicMock())
+
+        self.streamer._handle_get(self.request)
+
+        self.assertEqual(1, mock_fetch.call_count)
+        self.assertEqual(0, spool.read.call_count)
+        self.assertEqual(0, self.streamer.cache.checkin.call_count)
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    def test_handle_get_coalesced_failed_after_headers(self, mock_fetch):
+        """
+        If the joined download fails after the upstream headers were reported, the request
+        downloads the content instead of sending the upstream error's headers.
+        """
+        working_dir = tempfile.mkdtemp()
+        try:
+            spool = Spool(os.path.join(working_dir, 'spool'))
+            leader = StreamerListener(Mock(), self.config, Mock(), spool=spool)
+            self.request.uri = '/a/resource?k=v'
+            self.streamer.cache.checkout.return_value = (spool, open(spool.path, 'rb'))
+            joiner = threading.Thread(target=self.streamer._handle_get, args=(self.request,))
+            joiner.start()
+
+            leader.download_headers(Mock(headers={'Content-Length': '512'}))
+            joiner.join(0.1)
+            self.assertTrue(joiner.is_alive())
+            spool.finish()
+            joiner.join(5)
+        finally:
+            shutil.rmtree(working_dir)
+
+        self.assertFalse(joiner.is_alive())
+
+        self.assertEqual(1, mock_fetch.call_count)
+        self.assertEqual(0, self.request.setHeader.call_count)
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    def test_handle_get_cached_range(self, mock_fetch):
+        """A byte range of cached content is served with a 206."""
+        self.request.uri = '/a/resource?k=v'
+        self.request.getHeader.return_value = 'bytes=2-4'
+        entry = CacheEntry('/cache/file', {'Content-Length': '6'}, 6)
+        self.streamer.cache.checkout.return_value = (entry, BytesIO('abcdef'))
+
+        with patch(MODULE_PREFIX + 'Responder.write') as mock_write:
+            self.streamer._handle_get(self.request)
+
+        self.assertEqual(0, mock_fetch.call_count)
+        self.assertEqual(''.join(c[0][0] for c in mock_write.call_args_list), 'cde')
+        self.request.setResponseCode.assert_called_once_with(PARTIAL_CONTENT)
+        self.request.setHeader.assert_has_calls([call('Content-Range', 'bytes 2-4/6'),
+                                                 call('Content-Length', '3')])
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch', Mock())
+    def test_handle_get_cached_range_unsatisfiable(self):
+        """A byte range past the end of cached content is answered with a 416."""
+        self.request.uri = '/a/resource?k=v'
+        self.request.getHeader.return_value = 'bytes=10-'
+        entry = CacheEntry('/cache/file', {}, 6)
+        self.streamer.cache.checkout.return_value = (entry, BytesIO('abcdef'))
+
+        with patch(MODULE_PREFIX + 'Responder.write') as mock_write:
+            self.streamer._handle_get(self.request)
+
+        self.assertEqual(0, mock_write.call_count)
+        self.request.setResponseCode.assert_called_once_with(REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.request.setHeader.assert_any_call('Content-Range', 'bytes */6')
+
+    @patch(MODULE_PREFIX + 'Responder.write')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    @patch(MODULE_PREFIX + 'Streamer._fetch', Mock())
+    def test_handle_get_coalesced_range(self, mock_write):
+        """A byte range of content being downloaded is served from its spool."""
+        self.request.uri = '/a/resource?k=v'
+        self.request.getHeader.return_value = 'bytes=3-'
+        spool = Mock(spec=Spool, headers={'content-length': '6'})
+        spool.wait_for_headers.return_value = True
+        spool.read.return_value = iter(['ab', 'cd', 'ef'])
+        self.streamer.cache.checkout.return_value = (spool, MagicMock())
+
+        self.streamer._handle_get(self.request)
+
+        self.assertEqual([call('d'), call('ef')], mock_write.call_args_list)
+        self.request.setResponseCode.assert_called_once_with(PARTIAL_CONTENT)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_render_HEAD(self, mock_reactor):
+        """HEAD requests are handled in a thread."""
+        self.streamer.render_HEAD(self.request)
+        mock_reactor.callInThread.assert_called_once_with(self.streamer._handle_head,
+                                                          self.request)
+
+    @patch(MODULE_PREFIX + 'model')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_handle_head_cached(self, mock_model):
+        """HEAD requests for cached content are answered from the cache."""
+        self.request.uri = '/a/resource'
+        self.streamer.cache.lookup.return_value = CacheEntry('/f', {'Content-Type': 'x'}, 6)
+
+        self.streamer._handle_head(self.request)
+
+        self.request.setHeader.assert_has_calls([call('Content-Type', 'x'),
+                                                 call('Content-Length', '6')])
+        self.assertEqual(0, mock_model.LazyCatalogEntry.objects.call_count)
+        self.assertEqual(0, self.streamer.cache.checkout.call_count)
+
+    @patch(MODULE_PREFIX + 'Streamer._fetch')
+    @patch(MODULE_PREFIX + 'model')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_handle_head_catalog(self, mock_model, mock_fetch):
+        """HEAD requests for content that is not cached only check the catalog."""
+        self.request.uri = '/a/resource'
+        self.streamer.cache.lookup.return_value = None
+
+        self.streamer._handle_head(self.request)
+
+        mock_model.LazyCatalogEntry.objects.assert_called_once_with(path='/a/resource')
+        self.assertEqual(0, self.request.setResponseCode.call_count)
+        self.assertEqual(0, mock_fetch.call_count)
+
+    @patch(MODULE_PREFIX + 'model')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_handle_head_not_found(self, mock_model):
+        """HEAD requests for paths that are not in the catalog are answered with a 404."""
+        self.request.uri = '/a/resource'
+        self.streamer.cache.lookup.return_value = None
+        mock_model.LazyCatalogEntry.objects.return_value.only.return_value.first.return_value = \
+            None
+
+        self.streamer._handle_head(self.request)
+
+        self.request.setResponseCode.assert_called_once_with(NOT_FOUND)
 
-    @patch(MODULE_PREFIX + 'repo_controller', autospec=True)
     @patch(MODULE_PREFIX + 'model', Mock())
-    def test_handle_get_no_plugin(self, mock_repo_controller):
+    def test_handle_get_no_plugin(self):
         """
         When the _download helper method fails to find the plugin, it raises an exception.
         """
         self.request.uri = '/a/resource?k=v'
-        mock_repo_controller.get_importer_by_id.side_effect = PluginNotFound()
+        self.streamer.importer_cache.get_importer.side_effect = PluginNotFound()
 
         self.streamer._handle_get(self.request)
         self.request.setResponseCode.assert_called_once_with(INTERNAL_SERVER_ERROR)
@@ -198,42 +466,62 @@ class TestStreamer(unittest.TestCase):
                                                       'handling the request.')
         self.request.setResponseCode.assert_called_once_with(INTERNAL_SERVER_ERROR)
 
+    @patch(MODULE_PREFIX + 'content_models.Request')
     @patch(MODULE_PREFIX + 'content_container.ContentContainer')
-    @patch(MODULE_PREFIX + 'plugins_api.get_unit_model_by_id')
-    @patch(MODULE_PREFIX + 'repo_controller', autospec=True)
-    def test_download(self, mock_repo_controller, mock_get_unit_model, mock_container):
+    def test_download(self, mock_container, mock_request_model):
         # Setup
         mock_catalog = Mock(importer_id='mock_id', url='http://dev.null/', working_dir='/tmp',
                             data={'k': 'v'})
         mock_request = Mock()
         mock_responder = Mock()
         mock_importer = Mock()
-        mock_importer_config = Mock()
         mock_db_importer = Mock()
-        mock_repo_controller.get_importer_by_id.return_value = (
-            mock_importer, mock_importer_config, mock_db_importer)
-        mock_get_unit_model.return_value.unit_key_fields = tuple()
+        importer_cache = self.streamer.importer_cache
+        importer_cache.get_importer.return_value = (mock_importer, mock_db_importer)
 
         # Test
         self.streamer._download(mock_catalog, mock_request, mock_responder)
-        mock_repo_controller.get_importer_by_id.assert_called_once_with(mock_catalog.importer_id)
+        importer_cache.get_importer.assert_called_once_with(mock_catalog.importer_id)
         mock_importer.get_downloader_for_db_importer.assert_called_once_with(
             mock_db_importer,
             mock_catalog.url,
             working_dir=mock_catalog.working_dir)
+        importer_cache.get_unit_key.assert_called_once_with(mock_catalog.unit_type_id,
+                                                            mock_catalog.unit_id)
+        mock_request_model.assert_called_once_with(mock_catalog.unit_type_id,
+                                                   importer_cache.get_unit_key.return_value,
+                                                   mock_catalog.url, mock_responder)
 
         mock_container.return_value.download.assert_called_once()
 
+    @patch(MODULE_PREFIX + 'content_container.ContentContainer')
+    def test_download_missing_unit(self, mock_container):
+        """A catalog entry referencing a unit that does not exist results in a 404."""
+        mock_importer = Mock()
+        self.streamer.importer_cache.get_importer.return_value = (mock_importer, Mock())
+        self.streamer.importer_cache.get_unit_key.side_effect = DoesNotExist()
+
+        self.streamer._download(Mock(), self.request, Mock())
+
+        self.request.setResponseCode.assert_called_once_with(NOT_FOUND)
+        self.assertEqual(0, mock_container.call_count)
+        downloader = mock_importer.get_downloader_for_db_importer.return_value
+        downloader.config.finalize.assert_called_once_with()
+
 
 class TestResponder(unittest.TestCase):
 
-    def test_enter(self):
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_enter(self, mock_reactor):
         """
-        `__enter__` returns the instance of the class.
+        `__enter__` registers the responder as a streaming producer and returns the
+        instance of the class.
         """
         responder = Responder(Mock())
         result = responder.__enter__()
         self.assertTrue(responder is result)
+        mock_reactor.callFromThread.assert_called_once_with(
+            responder.request.registerProducer, responder, True)
 
     def test_exit(self):
         """
@@ -258,6 +546,7 @@ class TestResponder(unittest.TestCase):
         """Assert the ``finish`` method is called by its wrapper"""
         responder = Responder(Mock())
         responder.finish_wrapper()
+        responder.request.unregisterProducer.assert_called_once_with()
         responder.request.finish.assert_called_once_with()
 
     @patch(MODULE_PREFIX + 'logger')
@@ -276,8 +565,118 @@ class TestResponder(unittest.TestCase):
         """
         responder = Responder(Mock())
         responder.write('some data')
-        mock_reactor.callFromThread.assert_called_once_with(responder.request.write,
-                                                            'some data')
+        mock_reactor.callFromThread.assert_called_once_with(responder._write, 'some data')
+        self.assertEqual(responder.buffered, 9)
+
+        responder._write('some data')
+        responder.request.write.assert_called_once_with('some data')
+        self.assertEqual(responder.buffered, 0)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write_spool(self, mock_reactor):
+        """
+        With a spool, `write` only appends to the spool, even while the client is paused,
+        and the spooled data is delivered to the client before the request is finished.
+        """
+        working_dir = tempfile.mkdtemp()
+        try:
+            spool = Spool(os.path.join(working_dir, 'spool'))
+            responder = Responder(Mock(), spool)
+            responder.pauseProducing()
+            responder.write('some data')
+            self.assertEqual(spool.size, 9)
+            self.assertEqual(0, mock_reactor.callFromThread.call_count)
+
+            responder.resumeProducing()
+            spool.finish()
+            responder.close()
+        finally:
+            shutil.rmtree(working_dir)
+
+        self.assertEqual([call(responder._write, 'some data'), call(responder.finish_wrapper)],
+                         mock_reactor.callFromThread.call_args_list)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write_spool_slow_client(self, mock_reactor):
+        """
+        A client that does not keep up does not hold up the writes to the spool.
+        """
+        working_dir = tempfile.mkdtemp()
+        try:
+            spool = Spool(os.path.join(working_dir, 'spool'))
+            responder = Responder(Mock(), spool, high_water_mark=10)
+            responder.write('x' * 10)
+            deadline = time.time() + 5
+            while not mock_reactor.callFromThread.call_count and time.time() < deadline:
+                time.sleep(0.01)
+            for _ in range(4):
+                responder.write('x' * 10)
+            self.assertEqual(spool.size, 50)
+            self.assertEqual(10, responder.buffered)
+
+            spool.finish()
+            responder._delivery.join(0.1)
+            self.assertTrue(responder._delivery.is_alive())
+            responder.stopProducing()
+            responder.close()
+        finally:
+            shutil.rmtree(working_dir)
+
+        self.assertFalse(responder._delivery.is_alive())
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write_stopped(self, mock_reactor):
+        """
+        Once the client has disconnected, data is only written to the spool.
+        """
+        working_dir = tempfile.mkdtemp()
+        try:
+            spool = Spool(os.path.join(working_dir, 'spool'))
+            responder = Responder(Mock(), spool)
+            responder.stopProducing()
+            responder.write('some data')
+            spool.finish()
+            responder._delivery.join(5)
+        finally:
+            shutil.rmtree(working_dir)
+
+        self.assertEqual(spool.size, 9)
+        self.assertEqual(0, mock_reactor.callFromThread.call_count)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write_high_water_mark(self, mock_reactor):
+        """
+        Writes block while the high water mark is reached until the reactor catches up.
+        """
+        responder = Responder(Mock(), high_water_mark=10)
+        responder.write('x' * 10)
+        writer = threading.Thread(target=responder.write, args=('y',))
+        writer.start()
+        writer.join(0.1)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(1, mock_reactor.callFromThread.call_count)
+
+        responder._write('x' * 10)
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(2, mock_reactor.callFromThread.call_count)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write_paused(self, mock_reactor):
+        """
+        Writes block while Twisted has paused the responder.
+        """
+        responder = Responder(Mock())
+        responder.pauseProducing()
+        writer = threading.Thread(target=responder.write, args=('x',))
+        writer.start()
+        writer.join(0.1)
+        self.assertTrue(writer.is_alive())
+
+        responder.resumeProducing()
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        mock_reactor.callFromThread.assert_called_once_with(responder._write, 'x')
 
     @patch(MODULE_PREFIX + 'reactor')
     def test_with(self, mock_reactor):
@@ -289,5 +688,6 @@ class TestResponder(unittest.TestCase):
             r.write('some data')
 
         mock_calls = mock_reactor.callFromThread.call_args_list
-        self.assertEqual((mock_request.write, 'some data'), mock_calls[0][0])
-        self.assertEqual((r.finish_wrapper,), mock_calls[1][0])
+        self.assertEqual((mock_request.registerProducer, r, True), mock_calls[0][0])
+        self.assertEqual((r._write, 'some data'), mock_calls[1][0])
+        self.assertEqual((r.finish_wrapper,), mock_calls[2][0])